@@ -0,0 +1,65 @@
+/**
+ * Cliente de sdd-auditd para los skills de OpenCode
+ *
+ * Habla el mismo protocolo que src/audit/client.py: cada mensaje es un frame
+ * con longitud de 4 bytes (big-endian) seguida de un objeto JSON UTF-8.
+ * Si el daemon no está corriendo, los skills usan su comportamiento local.
+ */
+
+import { createConnection } from 'net';
+import { existsSync } from 'fs';
+
+export const SOCKET_PATH = process.env.SDD_AUDITD_SOCKET || '.local/run/sdd-auditd.sock';
+
+const MAX_FRAME_SIZE = 16 * 1024 * 1024;
+
+let nextId = 0;
+
+/**
+ * Indicar si sdd-auditd parece disponible (socket presente y no desactivado)
+ */
+export function isAvailable() {
+  return (process.env.SDD_AUDITD || 'auto').toLowerCase() !== 'off' && existsSync(SOCKET_PATH);
+}
+
+/**
+ * Invocar una operación del daemon
+ * @param {string} op - Operación ("audit.log_decision", "hitl.get_review_queue", ...)
+ * @param {Array} args - Argumentos posicionales
+ * @param {Object} kwargs - Argumentos con nombre
+ * @param {number} timeoutMs - Timeout de la llamada
+ */
+export function call(op, args = [], kwargs = {}, timeoutMs = 5000) {
+  return new Promise((resolve, reject) => {
+    const id = ++nextId;
+    const body = Buffer.from(JSON.stringify({ id, op, args, kwargs }), 'utf-8');
+    const header = Buffer.alloc(4);
+    header.writeUInt32BE(body.length, 0);
+
+    let buffer = Buffer.alloc(0);
+    const socket = createConnection({ path: SOCKET_PATH });
+    socket.setTimeout(timeoutMs, () => socket.destroy(new Error(`sdd-auditd timeout (${op})`)));
+
+    socket.on('connect', () => socket.write(Buffer.concat([header, body])));
+    socket.on('error', reject);
+    socket.on('data', (chunk) => {
+      buffer = Buffer.concat([buffer, chunk]);
+      if (buffer.length < 4) return;
+
+      const size = buffer.readUInt32BE(0);
+      if (size > MAX_FRAME_SIZE) {
+        socket.destroy(new Error(`Frame demasiado grande: ${size} bytes`));
+        return;
+      }
+      if (buffer.length < 4 + size) return;
+
+      const response = JSON.parse(buffer.subarray(4, 4 + size).toString('utf-8'));
+      socket.end();
+      if (response.ok) {
+        resolve(response.result);
+      } else {
+        reject(new Error(response.error));
+      }
+    });
+  });
+}
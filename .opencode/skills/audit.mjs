@@ -10,10 +10,48 @@ export const description = "Audit logging system for AI agent decisions and acti
 
 import { writeFileSync, appendFileSync, existsSync, mkdirSync } from 'fs';
 import { join } from 'path';
+import { isAvailable, call } from '../lib/auditd-client.mjs';
 
 const AUDIT_DIR = '.local/audit';
 const AUDIT_FILE = 'decisions.jsonl';
 
+/**
+ * Enviar una entrada a sdd-auditd (audit_log en PostgreSQL)
+ * @returns {Promise<boolean>} true si el daemon la registró
+ */
+async function forwardToDaemon({ action, decision, reasoning, context }) {
+  if (!isAvailable()) return false;
+  try {
+    return await call('audit.log_decision', [], {
+      agent_name: 'opencode',
+      action,
+      decision,
+      reasoning,
+      context,
+      // Sin él, el daemon registraría la decisión con su propio SESSION_ID
+      session_id: process.env.SESSION_ID || 'unknown'
+    });
+  } catch (error) {
+    console.warn(`⚠️  sdd-auditd no disponible, usando archivo local: ${error.message}`);
+    return false;
+  }
+}
+
+/**
+ * Registrar una entrada vía sdd-auditd o, si no está corriendo, en archivo
+ */
+async function record(entry, daemonFields) {
+  const forwarded = await forwardToDaemon({
+    ...daemonFields,
+    context: { ...daemonFields.context, entry_id: entry.id, type: entry.type }
+  });
+  if (!forwarded) {
+    ensureAuditDir();
+    appendFileSync(join(AUDIT_DIR, AUDIT_FILE), JSON.stringify(entry) + '\n');
+  }
+  return forwarded ? 'sdd-auditd' : 'file';
+}
+
 /**
  * Asegurar que el directorio de auditoría existe
  */
@@ -32,8 +70,6 @@ function ensureAuditDir() {
  * @param {Object} params.context - Contexto adicional
  */
 export async function logDecision({ decision, reasoning, category = "general", context = {} }) {
-  ensureAuditDir();
-  
   const entry = {
     id: `dec-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
     timestamp: new Date().toISOString(),
@@ -45,14 +81,14 @@ export async function logDecision({ decision, reasoning, category = "general", c
     agent: "opencode"
   };
 
-  const filePath = join(AUDIT_DIR, AUDIT_FILE);
-  appendFileSync(filePath, JSON.stringify(entry) + '\n');
+  const sink = await record(entry, { action: category, decision, reasoning, context });
 
   console.log(`📝 Decision logged: ${decision}`);
   
   return {
     logged: true,
     entryId: entry.id,
+    sink,
     message: `Decision "${decision}" has been logged for audit`
   };
 }
@@ -66,8 +102,6 @@ export async function logDecision({ decision, reasoning, category = "general", c
  * @param {Object} params.metadata - Metadatos adicionales
  */
 export async function logAction({ action, result, status = "success", metadata = {} }) {
-  ensureAuditDir();
-  
   const entry = {
     id: `act-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
     timestamp: new Date().toISOString(),
@@ -79,14 +113,19 @@ export async function logAction({ action, result, status = "success", metadata =
     agent: "opencode"
   };
 
-  const filePath = join(AUDIT_DIR, AUDIT_FILE);
-  appendFileSync(filePath, JSON.stringify(entry) + '\n');
+  const sink = await record(entry, {
+    action,
+    decision: `${status}: ${result}`,
+    reasoning: null,
+    context: metadata
+  });
 
   console.log(`✅ Action logged: ${action} (${status})`);
   
   return {
     logged: true,
     entryId: entry.id,
+    sink,
     message: `Action "${action}" has been logged with status "${status}"`
   };
 }
@@ -99,8 +138,6 @@ export async function logAction({ action, result, status = "success", metadata =
  * @param {Object} params.context - Contexto del error
  */
 export async function logError({ error, stack = "", context = {} }) {
-  ensureAuditDir();
-  
   const entry = {
     id: `err-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
     timestamp: new Date().toISOString(),
@@ -111,14 +148,19 @@ export async function logError({ error, stack = "", context = {} }) {
     agent: "opencode"
   };
 
-  const filePath = join(AUDIT_DIR, AUDIT_FILE);
-  appendFileSync(filePath, JSON.stringify(entry) + '\n');
+  const sink = await record(entry, {
+    action: "error",
+    decision: error,
+    reasoning: stack || null,
+    context
+  });
 
   console.log(`❌ Error logged: ${error}`);
   
   return {
     logged: true,
     entryId: entry.id,
+    sink,
     message: `Error "${error}" has been logged for review`
   };
 }
@@ -8,6 +8,8 @@
 export const name = "hitl";
 export const description = "Human-in-the-Loop checkpoint system for critical operations";
 
+import { isAvailable, call } from '../lib/auditd-client.mjs';
+
 /**
  * Crear un checkpoint de aprobación
  * @param {Object} params - Parámetros del checkpoint
@@ -17,8 +19,27 @@ export const description = "Human-in-the-Loop checkpoint system for critical ope
  * @param {Object} params.context - Contexto adicional
  */
 export async function createCheckpoint({ action, description, priority = "medium", context = {} }) {
+  let id = `cp-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`;
+
+  // Con sdd-auditd corriendo, el checkpoint se persiste en hitl_checkpoints
+  if (isAvailable()) {
+    try {
+      id = await call('hitl.create_checkpoint', [], {
+        checkpoint_name: action,
+        agent_name: 'opencode',
+        data: { action, description },
+        priority,
+        context,
+        // Sin él, el checkpoint se imputaría a la sesión del daemon
+        session_id: process.env.SESSION_ID || 'unknown'
+      });
+    } catch (error) {
+      console.warn(`⚠️  sdd-auditd no disponible: ${error.message}`);
+    }
+  }
+
   const checkpoint = {
-    id: `cp-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
+    id,
     action,
     description,
     priority,
@@ -47,7 +68,19 @@ export async function createCheckpoint({ action, description, priority = "medium
  * @param {string} checkpointId - ID del checkpoint
  */
 export async function checkStatus(checkpointId) {
-  // En una implementación real, esto consultaría una base de datos o API
+  if (isAvailable() && Number.isInteger(Number(checkpointId))) {
+    try {
+      const status = await call('hitl.wait_for_approval', [Number(checkpointId)]);
+      return {
+        id: checkpointId,
+        status,
+        message: status === "pending" ? "Checkpoint is awaiting human review" : `Checkpoint ${status}`
+      };
+    } catch (error) {
+      console.warn(`⚠️  sdd-auditd no disponible: ${error.message}`);
+    }
+  }
+
   return {
     id: checkpointId,
     status: "pending",
@@ -59,6 +92,19 @@ export async function checkStatus(checkpointId) {
  * Listar checkpoints pendientes
  */
 export async function listPending() {
+  if (isAvailable()) {
+    try {
+      const page = await call('hitl.get_review_queue', [], { page_size: 20 });
+      return {
+        checkpoints: page.checkpoints,
+        nextCursor: page.next_cursor,
+        message: `${page.checkpoints.length} pending checkpoint(s)`
+      };
+    } catch (error) {
+      console.warn(`⚠️  sdd-auditd no disponible: ${error.message}`);
+    }
+  }
+
   return {
     checkpoints: [],
     message: "Use 'hitl list' command to see all pending checkpoints"
@@ -0,0 +1,9 @@
+"""
+Benchmarks
+
+Suite de rendimiento para `AuditLogger`, `HITLCheckpointSkill` y `LLMRouter`.
+
+Uso:
+    python -m benchmarks run [-k patrón] [--quick] [-o resultados.json]
+    python -m benchmarks compare base.json nuevo.json [--threshold 0.10]
+"""
@@ -0,0 +1,112 @@
+"""
+CLI de Benchmarks
+
+Uso:
+    python -m benchmarks list [-k patrón]
+    python -m benchmarks run [-k patrón] [--quick] [--seed-rows N] [-o resultados.json]
+    python -m benchmarks compare base.json nuevo.json [--threshold 0.10]
+
+`compare` retorna código de salida 1 si algún escenario empeora más que
+el umbral, para usarlo como gate en CI.
+"""
+import sys
+import argparse
+import importlib
+from datetime import datetime
+from pathlib import Path
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks import harness
+
+SCENARIO_MODULES = (
+    "benchmarks.bench_audit",
+    "benchmarks.bench_events",
+    "benchmarks.bench_hitl",
+    "benchmarks.bench_llm",
+    "benchmarks.bench_metrics",
+    "benchmarks.bench_specs",
+)
+
+
+def _load_scenarios():
+    for module in SCENARIO_MODULES:
+        importlib.import_module(module)
+
+
+def cmd_list(args) -> int:
+    for bench in harness.registered(args.filter):
+        requires = f" (requiere: {', '.join(bench.requires)})" if bench.requires else ""
+        print(f"  {bench.name}{requires}")
+    return 0
+
+
+def cmd_run(args) -> int:
+    from benchmarks.env import BenchEnv
+
+    env = BenchEnv(seed_rows=args.seed_rows, quick=args.quick)
+    print(f"🏁 Ejecutando benchmarks ({'quick' if args.quick else 'completo'})...")
+    print("")
+    try:
+        results = harness.run_all(env, pattern=args.filter, quick=args.quick)
+    finally:
+        env.close()
+
+    output = args.output or f".local/benchmarks/{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    harness.save_results(results, output)
+    print("")
+    print(f"📄 Resultados: {output}")
+    return 0 if results["results"] or not results["skipped"] else 1
+
+
+def cmd_compare(args) -> int:
+    baseline = harness.load_results(args.baseline)
+    current = harness.load_results(args.current)
+    rows, regressed = harness.compare(baseline, current, threshold=args.threshold)
+
+    icons = {"regresión": "❌", "mejora": "🚀", "igual": "✅", "nuevo": "🆕"}
+    width = max((len(r["name"]) for r in rows), default=10)
+    print(f"{'Escenario':<{width}}  {'Base':>10}  {'Actual':>10}  {'Ratio':>6}")
+    for row in rows:
+        base = harness.format_seconds(row["baseline"]) if row["baseline"] is not None else "-"
+        ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "-"
+        print(f"{row['name']:<{width}}  {base:>10}  {harness.format_seconds(row['current']):>10}  "
+              f"{ratio:>6}  {icons[row['status']]} {row['status']}")
+
+    print("")
+    if regressed:
+        print(f"❌ Regresiones por encima del {args.threshold:.0%}")
+        return 1
+    print(f"✅ Sin regresiones (umbral {args.threshold:.0%})")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks de SDD")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = sub.add_parser("list", help="Listar escenarios")
+    list_parser.add_argument("-k", "--filter", default="*", help="Patrón glob de escenarios")
+    list_parser.set_defaults(func=cmd_list)
+
+    run_parser = sub.add_parser("run", help="Ejecutar escenarios")
+    run_parser.add_argument("-k", "--filter", default="*", help="Patrón glob de escenarios")
+    run_parser.add_argument("-o", "--output", help="Archivo JSON de resultados")
+    run_parser.add_argument("--quick", action="store_true", help="Menos repeticiones y 100k filas sembradas")
+    run_parser.add_argument("--seed-rows", type=int, help="Filas sembradas en audit_log (default: BENCH_SEED_ROWS)")
+    run_parser.set_defaults(func=cmd_run)
+
+    compare_parser = sub.add_parser("compare", help="Comparar dos ejecuciones")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Variación tolerada (default: 0.10)")
+    compare_parser.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    _load_scenarios()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,371 @@
+"""
+Benchmarks de AuditLogger: escritura de decisiones y consultas
+"""
+from benchmarks.harness import benchmark
+
+
+@benchmark("audit.log_decision.file_only", number=200)
+def log_decision_file_only(env):
+    """Decisión registrada solo en archivo JSONL"""
+    import os
+
+    os.environ["AUDIT_DB_ENABLED"] = "false"
+    logger = env.audit_logger(file_enabled=True)
+    logger.audit_enabled = False
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context={"n": 1})
+
+
+@benchmark("audit.log_decision.file_shared_legacy", number=200)
+def log_decision_file_shared_legacy(env):
+    """Referencia: append abriendo el archivo diario compartido en cada decisión"""
+    import os
+    from datetime import datetime
+
+    os.environ["AUDIT_DB_ENABLED"] = "false"
+    logger = env.audit_logger(file_enabled=True)
+    logger.audit_enabled = False
+
+    def log_to_file(decision):
+        log_file = logger.log_path / f"audit_{datetime.now().strftime('%Y%m%d')}.jsonl"
+        with open(log_file, "ab") as f:
+            f.write(decision.to_jsonl())
+
+    logger._log_to_file = log_to_file
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context={"n": 1})
+
+
+COMPACT_SEGMENTS = 16
+COMPACT_LINES = 5000
+
+
+@benchmark("audit.segments.compact", repeat=3, segments=COMPACT_SEGMENTS, lines=COMPACT_LINES)
+def segments_compact(env):
+    """Merge k-way de 16 segmentos de 5000 decisiones en el archivo diario"""
+    import os
+    from datetime import datetime, timedelta
+    from pathlib import Path
+
+    from src.audit.segments import SegmentWriter, compact_day, daily_file
+
+    log_path = Path(env.tmp_dir) / "compact"
+    start = datetime(2026, 1, 21, 9)
+    writers = [SegmentWriter(log_path) for _ in range(COMPACT_SEGMENTS)]
+    for i in range(COMPACT_LINES * COMPACT_SEGMENTS):
+        timestamp = start + timedelta(milliseconds=i)
+        line = (b'{"agent_name":"bench_agent","action":"write","decision":"decisi\u00f3n","timestamp":"'
+                + timestamp.isoformat().encode() + b'","context":{"n":%d}}\n' % i)
+        # Cada proceso escribe una franja intercalada del día
+        writers[i % COMPACT_SEGMENTS].write(line, timestamp)
+    for writer in writers:
+        writer.close()
+
+    def compact():
+        daily_file(log_path, "20260121").unlink(missing_ok=True)
+        return compact_day(log_path, "20260121", keep_segments=True)
+
+    return compact
+
+
+@benchmark("audit.log_decision.single", requires=("db",), number=20)
+def log_decision_single(env):
+    """Una decisión por llamada, conexión nueva por escritura (comportamiento del CLI)"""
+    logger = env.audit_logger()
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context={"n": 1})
+
+
+@benchmark("audit.log_decision.pooled", requires=("db",), number=50)
+def log_decision_pooled(env):
+    """Una decisión por llamada reutilizando conexiones del pool (sdd-auditd)"""
+    from src.utils import db
+
+    db.enable_pool(env.bench_db_url, max_size=4)
+    env.on_cleanup(db.close_pools)
+    logger = env.audit_logger()
+    env.on_cleanup(logger.sessions.flush)
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context={"n": 1})
+
+
+def _sqlite_logger(env, name: str):
+    """AuditLogger sobre un SQLite propio del benchmark (sesiones y blobs incluidos)"""
+    import os
+
+    from src.audit.blobs import get_blob_store
+    from src.audit.sessions import get_session_tracker
+    from src.storage.base import get_storage
+
+    logger = env.audit_logger()
+    logger.audit_enabled = True
+    logger.storage = get_storage(f"sqlite:///{os.path.join(env.tmp_dir, name)}")
+    logger.sessions = get_session_tracker(logger.storage)
+    logger.blobs = get_blob_store(logger.storage)
+    env.on_cleanup(logger.storage.flush)
+    return logger
+
+
+@benchmark("audit.log_decision.sqlite", number=500)
+def log_decision_sqlite(env):
+    """Una decisión por llamada en SQLite embebido (WAL, commits en lote)"""
+    logger = _sqlite_logger(env, "bench.db")
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context={"n": 1})
+
+
+@benchmark("audit.log_decision.sqlite_events", requires=("redis",), number=500)
+def log_decision_sqlite_events(env):
+    """Como `audit.log_decision.sqlite`, publicando decision.logged en Redis"""
+    logger = _sqlite_logger(env, "bench_events.db")
+    logger.events = env.event_bus()
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context={"n": 1})
+
+
+BLOB_FILE_KB = 64
+
+
+def _blob_logger(env, name: str, threshold: int):
+    """AuditLogger sobre SQLite con almacén de blobs propio (umbral 0 = contexto completo en audit_log)"""
+    from src.audit.blobs import BlobStore
+
+    logger = _sqlite_logger(env, name)
+    logger.blobs = BlobStore(logger.storage, threshold=threshold)
+    return logger
+
+
+def _file_context(i: int):
+    """El mismo archivo de BLOB_FILE_KB KB en cada decisión (contenido repetido entre decisiones)"""
+    content = "def handler(request):\n    return process(request)\n" * (BLOB_FILE_KB * 1024 // 48)
+    return {"file": "src/app.py", "content": content, "n": i}
+
+
+@benchmark("audit.log_decision.sqlite_blob_inline", number=200, file_kb=BLOB_FILE_KB)
+def log_decision_sqlite_blob_inline(env):
+    """Referencia: archivo de 64 KB en `context` guardado en cada fila"""
+    logger = _blob_logger(env, "blob_inline.db", threshold=0)
+    context = _file_context(0)
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context=context)
+
+
+@benchmark("audit.log_decision.sqlite_blob", number=200, file_kb=BLOB_FILE_KB)
+def log_decision_sqlite_blob(env):
+    """Archivo de 64 KB en `context` guardado una vez en audit_blobs (la fila lleva la referencia)"""
+    logger = _blob_logger(env, "blob.db", threshold=4096)
+    context = _file_context(0)
+    return lambda: logger.log_decision("bench_agent", "write", "decisión", context=context)
+
+
+def _recent_blobs_benchmark(env, name: str, threshold: int):
+    logger = _blob_logger(env, name, threshold=threshold)
+    for i in range(100):
+        logger.log_decision("bench_agent", "write", f"decisión {i}", context=_file_context(i))
+    logger.storage.flush()
+    return lambda: logger.get_recent_decisions(limit=20)
+
+
+@benchmark("audit.query.recent_blobs_inline", number=50, file_kb=BLOB_FILE_KB)
+def query_recent_blobs_inline(env):
+    """Referencia: 20 decisiones recientes con el archivo de 64 KB dentro de cada fila"""
+    return _recent_blobs_benchmark(env, "blob_query_inline.db", threshold=0)
+
+
+@benchmark("audit.query.recent_blobs", number=50, file_kb=BLOB_FILE_KB)
+def query_recent_blobs(env):
+    """20 decisiones recientes con su archivo de 64 KB rehidratado desde audit_blobs"""
+    return _recent_blobs_benchmark(env, "blob_query.db", threshold=4096)
+
+
+@benchmark("audit.log_decision.batch100", requires=("db",), repeat=5, batch_size=100)
+def log_decision_batch(env):
+    """Ráfaga de 100 decisiones consecutivas con pool"""
+    from src.utils import db
+
+    db.enable_pool(env.bench_db_url, max_size=4)
+    env.on_cleanup(db.close_pools)
+    logger = env.audit_logger()
+    env.on_cleanup(logger.sessions.flush)
+
+    def run():
+        for i in range(100):
+            logger.log_decision("bench_agent", "write", f"decisión {i}", context={"n": i})
+
+    return run
+
+
+@benchmark("audit.query.recent", requires=("seeded_db",), number=20)
+def query_recent(env):
+    logger = env.audit_logger()
+    return lambda: logger.get_recent_decisions(limit=20)
+
+
+@benchmark("audit.query.recent_by_agent", requires=("seeded_db",), number=10)
+def query_recent_by_agent(env):
+    logger = env.audit_logger()
+    return lambda: logger.get_recent_decisions(limit=20, agent_name="agent_7")
+
+
+@benchmark("audit.query.by_session", requires=("seeded_db",), number=10)
+def query_by_session(env):
+    logger = env.audit_logger()
+    return lambda: logger.get_decisions_by_session("session_42")
+
+
+@benchmark("audit.query.session_summary", requires=("seeded_db",), number=20)
+def query_session_summary(env):
+    """Resumen precalculado de una sesión (comparar con audit.query.by_session)"""
+    logger = env.audit_logger()
+    # Las filas sembradas no pasaron por log_decision: recalcular una vez
+    logger.rebuild_session_summary("session_42")
+    return lambda: logger.get_session_summary("session_42")
+
+
+@benchmark("audit.query.statistics", requires=("seeded_db",), repeat=3)
+def query_statistics(env):
+    logger = env.audit_logger()
+    return logger.get_statistics
+
+
+@benchmark("audit.search.text", requires=("seeded_db",), number=10)
+def search_text(env):
+    """Búsqueda de texto con ranking (índice GIN sobre search_vector)"""
+    logger = env.audit_logger()
+    return lambda: logger.search_decisions("componente 42", page_size=20)
+
+
+@benchmark("audit.search.text_filtered", requires=("seeded_db",), number=10)
+def search_text_filtered(env):
+    """Texto combinado con agente y rango de tiempo"""
+    from datetime import datetime, timedelta
+
+    logger = env.audit_logger()
+    since = datetime.now() - timedelta(days=3)
+    return lambda: logger.search_decisions("componente 42", agent_name="agent_42", since=since, page_size=20)
+
+
+@benchmark("audit.search.context", requires=("seeded_db",), number=10)
+def search_context(env):
+    """Contención en context (índice GIN jsonb_path_ops), más recientes primero"""
+    logger = env.audit_logger()
+    return lambda: logger.search_decisions(context={"file": "src/module_7.py", "tags": ["tag_3"]}, page_size=20)
+
+
+@benchmark("audit.search.deep_page", requires=("seeded_db",), number=10)
+def search_deep_page(env):
+    """Página 10 de una búsqueda de texto vía cursor"""
+    logger = env.audit_logger()
+    cursor = None
+    for _ in range(9):
+        cursor = logger.search_decisions("componente 42", page_size=20, cursor=cursor)["next_cursor"]
+    return lambda: logger.search_decisions("componente 42", page_size=20, cursor=cursor)
+
+
+def _large_context(size_kb: int):
+    """Contexto con forma realista (archivos, diffs, métricas) de ~size_kb KB"""
+    files = [
+        {"path": f"src/module_{i}.py", "lines_changed": i % 300, "diff": "+ línea modificada\n" * 8,
+         "tags": ["refactor", "tests"], "score": i / 7}
+        for i in range(max(1, size_kb * 1024 // 240))
+    ]
+    return {"files": files, "summary": "Cambios de la sesión", "metrics": {"coverage": 0.87, "lint": 0}}
+
+
+def _legacy_encode(record_args):
+    """Ruta anterior: modelo pydantic + json.dumps del archivo + Jsonb de psycopg"""
+    import json
+
+    from psycopg.adapt import Transformer
+    from psycopg.types.json import Jsonb
+
+    from src.audit.logger import _agent_decision_model
+
+    decision = _agent_decision_model()(**record_args)
+    line = json.dumps({
+        "agent_name": decision.agent_name,
+        "action": decision.action,
+        "decision": decision.decision,
+        "context": decision.context,
+        "reasoning": decision.reasoning,
+        "confidence": decision.confidence,
+        "timestamp": decision.timestamp.isoformat(),
+        "session_id": decision.session_id,
+        "user_id": decision.user_id,
+    }) + "\n"
+    param = Jsonb(decision.context)
+    Transformer().get_dumper(param, "t").dump(param)
+    return line
+
+
+def _fast_encode(record_args):
+    from psycopg.adapt import Transformer
+    from psycopg.types.json import Jsonb
+
+    from src.audit.logger import _DecisionRecord
+
+    record = _DecisionRecord(**record_args)
+    line = record.to_jsonl()
+    param = Jsonb(record.context_json, dumps=lambda obj: obj)
+    Transformer().get_dumper(param, "t").dump(param)
+    return line
+
+
+def _encode_benchmark(encode, size_kb: int):
+    record_args = dict(
+        agent_name="bench_agent", action="write", decision="decisión", context=_large_context(size_kb),
+        reasoning="razonamiento", confidence=0.9, session_id="bench-session", user_id=None,
+    )
+    return lambda: encode(record_args)
+
+
+@benchmark("audit.decision.encode_legacy.1kb", number=200, context_kb=1)
+def encode_legacy_1kb(env):
+    """Validación + serialización por decisión, ruta anterior (referencia)"""
+    return _encode_benchmark(_legacy_encode, 1)
+
+
+@benchmark("audit.decision.encode.1kb", number=200, context_kb=1)
+def encode_fast_1kb(env):
+    """Validación + serialización por decisión, ruta rápida"""
+    return _encode_benchmark(_fast_encode, 1)
+
+
+@benchmark("audit.decision.encode_legacy.256kb", number=20, context_kb=256)
+def encode_legacy_256kb(env):
+    return _encode_benchmark(_legacy_encode, 256)
+
+
+@benchmark("audit.decision.encode.256kb", number=20, context_kb=256)
+def encode_fast_256kb(env):
+    return _encode_benchmark(_fast_encode, 256)
+
+
+SESSION_DECISIONS = 20000
+
+
+def _session_logger(env):
+    """AuditLogger sobre SQLite con una sesión de SESSION_DECISIONS decisiones"""
+    logger = _sqlite_logger(env, "sessions.db")
+    logger.start_session("bench-session")
+    for i in range(SESSION_DECISIONS):
+        logger.log_decision(f"agent_{i % 8}", "write", f"decisión {i}", context={"n": i},
+                            confidence=(i % 100) / 100, session_id="bench-session")
+    logger.sessions.flush()
+    logger.storage.flush()
+    return logger
+
+
+@benchmark("audit.session.summary", number=200, decisions=SESSION_DECISIONS)
+def session_summary(env):
+    """Resumen de sesión desde los contadores por agente (independiente del nº de decisiones)"""
+    logger = _session_logger(env)
+    return lambda: logger.get_session_summary("bench-session")
+
+
+@benchmark("audit.session.summary_scan", number=5, decisions=SESSION_DECISIONS)
+def session_summary_scan(env):
+    """Referencia: el mismo resumen recorriendo las decisiones de la sesión"""
+    logger = _session_logger(env)
+
+    def scan():
+        decisions = logger.get_decisions_by_session("bench-session")
+        by_agent = {}
+        for d in decisions:
+            by_agent[d["agent_name"]] = by_agent.get(d["agent_name"], 0) + 1
+        return len(decisions), sum(d["confidence"] for d in decisions) / len(decisions), by_agent
+
+    return scan
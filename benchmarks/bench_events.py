@@ -0,0 +1,51 @@
+"""
+Benchmarks del bus de eventos: publicación y consumo en grupo
+"""
+import threading
+
+from benchmarks.harness import benchmark
+
+BATCH = 100
+
+
+def _publish_batch(bus):
+    data = {"agent_name": "bench_agent", "action": "write", "decision": "decisión", "confidence": 1.0}
+
+    def run():
+        for _ in range(BATCH):
+            bus.publish("audit", "decision.logged", data)
+        bus.flush()
+
+    return run
+
+
+@benchmark("events.publish.memory", repeat=5, number=20, batch_size=BATCH)
+def publish_memory(env):
+    """Ráfaga de eventos en el bus en memoria del proceso"""
+    from src.utils.event_bus import MemoryEventBus
+
+    return _publish_batch(MemoryEventBus(prefix="sdd-bench"))
+
+
+@benchmark("events.publish.redis", requires=("redis",), repeat=5, number=20, batch_size=BATCH)
+def publish_redis(env):
+    """Ráfaga de eventos enviada a Redis en pipelines desde el hilo de fondo"""
+    return _publish_batch(env.event_bus())
+
+
+@benchmark("events.consume.redis", requires=("redis",), repeat=5, number=5, batch_size=BATCH)
+def consume_redis(env):
+    """Publicar una ráfaga y esperar a que el grupo de consumidores la procese y confirme"""
+    bus = env.event_bus()
+    received = threading.Semaphore(0)
+    consumer = bus.consume("hitl", "bench", lambda event: received.release())
+    env.on_cleanup(consumer.stop)
+
+    def run():
+        for n in range(BATCH):
+            bus.publish("hitl", "checkpoint.created", {"checkpoint_id": n})
+        for _ in range(BATCH):
+            if not received.acquire(timeout=10):
+                raise RuntimeError("El consumidor no procesó la ráfaga")
+
+    return run
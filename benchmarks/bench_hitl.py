@@ -0,0 +1,80 @@
+"""
+Benchmarks de HITL: ciclo de vida de checkpoints, cola de revisión y políticas
+"""
+import threading
+
+from benchmarks.harness import benchmark
+
+
+@benchmark("hitl.checkpoint.round_trip", requires=("db",), number=5)
+def checkpoint_round_trip(env):
+    """create → approve → el agente en wait_for_approval observa la aprobación"""
+    skill = env.hitl_skill()
+
+    def run():
+        checkpoint_id = skill.create_checkpoint("bench-round-trip", "bench_agent", {"n": 1})
+        result = {}
+        waiter = threading.Thread(
+            target=lambda: result.setdefault("status", skill.wait_for_approval(checkpoint_id, timeout_seconds=10))
+        )
+        waiter.start()
+        skill.approve_checkpoint(checkpoint_id, "bench_reviewer")
+        waiter.join()
+        if result.get("status") != "approved":
+            raise RuntimeError(f"Estado inesperado: {result.get('status')}")
+
+    return run
+
+
+def _seed_pending(env, count: int):
+    with env.connect() as conn:
+        pending = conn.execute("SELECT COUNT(*) FROM hitl_checkpoints WHERE status = 'pending'").fetchone()[0]
+        if pending < count:
+            conn.execute("""
+                INSERT INTO hitl_checkpoints (checkpoint_name, agent_name, status, priority, data, created_at)
+                SELECT 'bench-' || g, 'agent_' || (g %% 20), 'pending', g %% 4,
+                       jsonb_build_object('data', jsonb_build_object('n', g), 'context', '{}'::jsonb),
+                       now() - (g || ' seconds')::interval
+                FROM generate_series(1, %s) AS g
+            """, (count - pending,))
+            conn.execute("ANALYZE hitl_checkpoints")
+            conn.commit()
+
+
+@benchmark("hitl.queue.first_page", requires=("db",), number=20)
+def queue_first_page(env):
+    _seed_pending(env, 10_000)
+    skill = env.hitl_skill()
+    return lambda: skill.get_review_queue(page_size=20)
+
+
+@benchmark("hitl.queue.deep_page", requires=("db",), number=20)
+def queue_deep_page(env):
+    """Página profunda vía cursor (keyset) en lugar de OFFSET"""
+    _seed_pending(env, 10_000)
+    skill = env.hitl_skill()
+    page = skill.get_review_queue(page_size=5000)
+    cursor = page["next_cursor"]
+    return lambda: skill.get_review_queue(page_size=20, cursor=cursor)
+
+
+@benchmark("hitl.policies.evaluate_10k_rules", number=10_000, rules=10_000)
+def policies_evaluate(env):
+    import random
+
+    from src.skills.hitl_policies import PRIORITIES, PolicySet, _synthetic_policies
+
+    policy_set = PolicySet(_synthetic_policies(10_000, 100))
+    rng = random.Random(42)
+    inputs = [
+        (f"agent_{rng.randrange(100)}", f"action-{rng.randrange(60)}-{rng.randrange(5)}",
+         rng.choice(PRIORITIES), {"lines_changed": rng.randrange(250), "scope": "docs"})
+        for _ in range(1000)
+    ]
+    state = {"i": 0}
+
+    def run():
+        state["i"] = (state["i"] + 1) % len(inputs)
+        policy_set.evaluate(*inputs[state["i"]])
+
+    return run
@@ -0,0 +1,371 @@
+"""
+Benchmarks de OllamaClient y LLMRouter contra el stub NDJSON
+
+La tasa del stub se configura con BENCH_TOKEN_RATE (tokens/seg, default 2000)
+y la carga de un modelo con BENCH_LOAD_LATENCY (segundos, default 0.2).
+"""
+import os
+
+from benchmarks.harness import benchmark
+
+TOKEN_RATE = float(os.getenv("BENCH_TOKEN_RATE", "2000"))
+TOKENS = int(os.getenv("BENCH_TOKENS", "64"))
+# Segundos que tarda el stub en cargar un modelo que no está en memoria
+LOAD_LATENCY = float(os.getenv("BENCH_LOAD_LATENCY", "0.2"))
+# Tokens de prompt por segundo que procesa el stub en los escenarios de conversación
+PROMPT_RATE = float(os.getenv("BENCH_PROMPT_RATE", "20000"))
+# Segundos de cada llamada a /api/embed del stub en los escenarios RAG
+EMBED_LATENCY = float(os.getenv("BENCH_EMBED_LATENCY", "0.02"))
+# /api/pull del stub: MB por modelo, MB/s por conexión y MB/s del enlace
+PULL_SIZE_MB = int(os.getenv("BENCH_PULL_SIZE_MB", "32"))
+PULL_STREAM_MBPS = float(os.getenv("BENCH_PULL_STREAM_MBPS", "64"))
+PULL_BANDWIDTH_MBPS = float(os.getenv("BENCH_PULL_BANDWIDTH_MBPS", "192"))
+
+
+def _client(env, token_rate: float = TOKEN_RATE, **stub):
+    from src.utils.ollama_client import OllamaClient
+
+    return OllamaClient(base_url=env.ollama_stub(token_rate=token_rate, **stub), model="stub:latest")
+
+
+@benchmark("llm.ollama.client_overhead", requires=("ollama_stub",), number=50)
+def ollama_client_overhead(env):
+    """Coste fijo del cliente: 1 token a tasa prácticamente infinita"""
+    client = _client(env, token_rate=1e9)
+    return lambda: client.generate("hola", max_tokens=1)
+
+
+@benchmark("llm.ollama.generate", requires=("ollama_stub",), number=5, token_rate=TOKEN_RATE, tokens=TOKENS)
+def ollama_generate(env):
+    client = _client(env)
+    return lambda: client.generate("Explica SDD", max_tokens=TOKENS)
+
+
+@benchmark("llm.ollama.stream_first_token", requires=("ollama_stub",), number=10, token_rate=TOKEN_RATE)
+def ollama_stream_first_token(env):
+    """Tiempo hasta el primer token en modo streaming"""
+    client = _client(env)
+
+    def run():
+        stream = client.generate("Explica SDD", max_tokens=TOKENS, stream=True)
+        next(stream)
+        stream.close()
+
+    return run
+
+
+@benchmark("llm.ollama.chat", requires=("ollama_stub",), number=5, token_rate=TOKEN_RATE, tokens=TOKENS)
+def ollama_chat(env):
+    client = _client(env)
+    messages = [{"role": "user", "content": "Explica SDD"}]
+    return lambda: client.chat(messages, max_tokens=TOKENS)
+
+
+@benchmark("llm.router.generate", requires=("ollama_stub",), number=5, token_rate=TOKEN_RATE, tokens=TOKENS)
+def router_generate(env):
+    """LLMRouter.generate con Ollama (stub) como proveedor local"""
+    from src.utils.ollama_client import LLMRouter
+
+    os.environ["OLLAMA_URL"] = env.ollama_stub(token_rate=TOKEN_RATE)
+    os.environ["OLLAMA_MODEL"] = "stub:latest"
+    os.environ["OLLAMA_ENABLED"] = "true"
+    router = LLMRouter()
+    return lambda: router.generate("Explica SDD", max_tokens=TOKENS)
+
+
+def _concurrent_identical(env, coalesce: bool, callers: int = 8):
+    """`callers` hilos lanzan a la vez el mismo prompt a un Ollama de una sola generación"""
+    import threading
+
+    from src.utils.ollama_client import LLMRouter
+
+    os.environ["OLLAMA_URL"] = env.ollama_stub(token_rate=TOKEN_RATE, max_parallel=1)
+    os.environ["OLLAMA_MODEL"] = "stub:latest"
+    os.environ["OLLAMA_ENABLED"] = "true"
+    router = LLMRouter()
+
+    def run():
+        threads = [
+            threading.Thread(target=router.generate, args=("Explica SDD",), kwargs={"max_tokens": TOKENS, "coalesce": coalesce})
+            for _ in range(callers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    return run
+
+
+@benchmark("llm.router.concurrent_identical", requires=("ollama_stub",), number=3, token_rate=TOKEN_RATE, callers=8)
+def router_concurrent_identical(env):
+    """8 llamadas idénticas concurrentes agrupadas en una (single-flight)"""
+    return _concurrent_identical(env, coalesce=True)
+
+
+@benchmark("llm.router.concurrent_identical_uncoalesced", requires=("ollama_stub",), number=3, token_rate=TOKEN_RATE, callers=8)
+def router_concurrent_identical_uncoalesced(env):
+    """Referencia: las mismas 8 llamadas, cada una contra Ollama"""
+    return _concurrent_identical(env, coalesce=False)
+
+
+def _interactive_under_load(env, max_concurrency: int, background_callers: int = 8):
+    """Llamada interactiva mientras `background_callers` hilos saturan Ollama con trabajo de fondo"""
+    import threading
+
+    from src.utils.llm_scheduler import LLMScheduler
+    from src.utils.ollama_client import LLMRouter
+
+    os.environ["OLLAMA_URL"] = env.ollama_stub(token_rate=TOKEN_RATE, max_parallel=2)
+    os.environ["OLLAMA_MODEL"] = "stub:latest"
+    os.environ["OLLAMA_ENABLED"] = "true"
+    router = LLMRouter()
+    router.scheduler = LLMScheduler()
+    router.scheduler.configure("ollama", max_concurrency=max_concurrency)
+
+    stop = threading.Event()
+
+    def background(worker: int):
+        n = 0
+        while not stop.is_set():
+            router.generate(f"Resume el documento {worker}-{n}", max_tokens=TOKENS, priority="background")
+            n += 1
+
+    workers = [threading.Thread(target=background, args=(i,), daemon=True) for i in range(background_callers)]
+    for worker in workers:
+        worker.start()
+
+    def cleanup():
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    env.on_cleanup(cleanup)
+    return lambda: router.generate("¿Qué hace este endpoint?", max_tokens=16, priority="interactive")
+
+
+@benchmark("llm.router.interactive_under_load", requires=("ollama_stub",), number=5, background_callers=8)
+def router_interactive_under_load(env):
+    """Interactiva con el scheduler limitando Ollama a sus 2 generaciones simultáneas"""
+    return _interactive_under_load(env, max_concurrency=2)
+
+
+@benchmark("llm.router.interactive_under_load_unscheduled", requires=("ollama_stub",), number=5, background_callers=8)
+def router_interactive_under_load_unscheduled(env):
+    """Referencia: sin límite en el router, la interactiva hace cola en Ollama tras el fondo"""
+    return _interactive_under_load(env, max_concurrency=64)
+
+
+@benchmark("llm.ollama.cold_start", requires=("ollama_stub",), number=3, load_latency=LOAD_LATENCY)
+def ollama_cold_start(env):
+    """Primera llamada tras descargarse el modelo (paga la carga)"""
+    client = _client(env, load_latency=LOAD_LATENCY)
+
+    def run():
+        client.models.unload("stub:latest")
+        client.generate("Explica SDD", max_tokens=16)
+
+    return run
+
+
+@benchmark("llm.ollama.warm_start", requires=("ollama_stub",), number=3, load_latency=LOAD_LATENCY)
+def ollama_warm_start(env):
+    """La misma llamada con el modelo precargado y mantenido por keep_alive"""
+    client = _client(env, load_latency=LOAD_LATENCY)
+    client.models.warmup()
+    return lambda: client.generate("Explica SDD", max_tokens=16)
+
+
+def _model_switching(env, allow_alternatives: bool):
+    """Pipeline que alterna dos modelos en un Ollama con memoria para uno solo"""
+    from src.utils.ollama_client import LLMRouter
+
+    os.environ["OLLAMA_URL"] = env.ollama_stub(token_rate=TOKEN_RATE, load_latency=LOAD_LATENCY, max_loaded=1)
+    os.environ["OLLAMA_MODEL"] = "stub:latest"
+    os.environ["OLLAMA_ENABLED"] = "true"
+    os.environ["OLLAMA_WARMUP"] = "false"
+    router = LLMRouter()
+    env.on_cleanup(lambda: os.environ.pop("OLLAMA_WARMUP", None))
+    pipeline = ["stub:latest", "stub-coder:latest"]
+
+    def run():
+        for model in pipeline:
+            router.ollama.model = model
+            alternatives = [m for m in pipeline if m != model] if allow_alternatives else None
+            router.generate("Revisa este diff", max_tokens=16, coalesce=False, alternatives=alternatives)
+
+    return run
+
+
+@benchmark("llm.router.model_switch_alternatives", requires=("ollama_stub",), number=3, load_latency=LOAD_LATENCY)
+def router_model_switch_alternatives(env):
+    """Con alternativas aceptadas, cada paso usa el modelo que ya está cargado"""
+    return _model_switching(env, allow_alternatives=True)
+
+
+@benchmark("llm.router.model_switch_pinned", requires=("ollama_stub",), number=3, load_latency=LOAD_LATENCY)
+def router_model_switch_pinned(env):
+    """Referencia: cada paso exige su modelo y expulsa al anterior"""
+    return _model_switching(env, allow_alternatives=False)
+
+
+def _tail_latency(env, hedge: bool):
+    """Ollama con una generación lenta de cada 25; el respaldo es un segundo stub sin cola"""
+    from src.utils.ollama_client import LLMRouter, OllamaClient
+
+    os.environ["OLLAMA_URL"] = env.ollama_stub(token_rate=TOKEN_RATE, tail_latency=0.5, tail_every=25)
+    os.environ["OLLAMA_MODEL"] = "stub:latest"
+    os.environ["OLLAMA_ENABLED"] = "true"
+    os.environ["ANTHROPIC_API_KEY"] = "bench"
+    env.on_cleanup(lambda: os.environ.pop("ANTHROPIC_API_KEY", None))
+    router = LLMRouter()
+    backup = OllamaClient(base_url=env.ollama_stub(token_rate=TOKEN_RATE), model="stub:latest")
+
+    def call_backup(attempt, request):
+        # El proveedor cloud de respaldo se sustituye por el segundo stub
+        attempt.check()
+        text = backup.generate(request.prompt, max_tokens=request.max_tokens, timeout=attempt.timeout(60.0))
+        router._first_token(attempt)
+        return text, {"llm.provider": "anthropic"}
+
+    router._call_anthropic = call_backup
+    # Aprender la latencia de Ollama antes de medir
+    for _ in range(router.latency.min_samples):
+        router.generate("Explica SDD", max_tokens=TOKENS, coalesce=False, hedge=hedge)
+
+    return lambda: router.generate("Explica SDD", max_tokens=TOKENS, coalesce=False, hedge=hedge)
+
+
+@benchmark("llm.router.tail_hedged", requires=("ollama_stub",), number=25, repeat=5, tail_every=25)
+def router_tail_hedged(env):
+    """Hedging: la generación lenta se resuelve con el respaldo tras el p95 aprendido"""
+    return _tail_latency(env, hedge=True)
+
+
+@benchmark("llm.router.tail_unhedged", requires=("ollama_stub",), number=25, repeat=5, tail_every=25)
+def router_tail_unhedged(env):
+    """Referencia: la generación lenta se espera entera"""
+    return _tail_latency(env, hedge=False)
+
+
+def _long_conversation(env, budget: int, turns: int = 150, **options):
+    """Turno nuevo de una conversación que ya lleva `turns` turnos"""
+    client = _client(env, prompt_rate=PROMPT_RATE)
+    conversation = client.conversation(system="Eres un revisor de código", budget=budget, **options)
+    for i in range(turns):
+        conversation.add("user", f"Revisa el cambio {i}: " + "x" * 600)
+        conversation.add("assistant", "tok " * TOKENS)
+    return lambda: conversation.chat("¿Algo más que revisar?", max_tokens=TOKENS)
+
+
+@benchmark("llm.conversation.budgeted", requires=("ollama_stub",), number=10, prompt_rate=PROMPT_RATE, turns=150)
+def conversation_budgeted(env):
+    """Historial recortado y resumido a 2048 tokens"""
+    return _long_conversation(env, budget=2048)
+
+
+@benchmark("llm.conversation.context", requires=("ollama_stub",), number=10, prompt_rate=PROMPT_RATE, turns=150)
+def conversation_context(env):
+    """Presupuesto de 2048 tokens reutilizando el context de Ollama entre turnos"""
+    return _long_conversation(env, budget=2048, use_context=True)
+
+
+@benchmark("llm.conversation.unbounded", requires=("ollama_stub",), number=2, repeat=3, prompt_rate=PROMPT_RATE, turns=150)
+def conversation_unbounded(env):
+    """Referencia: todo el historial en cada turno, como `OllamaClient.chat`"""
+    return _long_conversation(env, budget=10**9)
+
+
+def _rag_builder(env, documents: int = 40, **options):
+    """PromptBuilder sobre SQLite con `documents` documentos indexados en el stub"""
+    from src.storage.base import get_storage
+    from src.utils.ollama_client import LLMRouter
+    from src.utils.prompt_builder import PromptBuilder
+
+    os.environ["OLLAMA_URL"] = env.ollama_stub(token_rate=TOKEN_RATE, prompt_rate=PROMPT_RATE, embed_latency=EMBED_LATENCY)
+    os.environ["OLLAMA_MODEL"] = "stub:latest"
+    os.environ["OLLAMA_ENABLED"] = "true"
+    storage = get_storage(f"sqlite:///{os.path.join(env.tmp_dir, 'rag.db')}")
+    builder = PromptBuilder(router=LLMRouter(), storage=storage, **options)
+    if not storage.search_context([1.0] * 64, 1):
+        topics = ["autenticación", "pagos", "notificaciones", "búsqueda", "facturas", "usuarios", "reportes", "caché"]
+        for i in range(documents):
+            topic = topics[i % len(topics)]
+            lines = [f"Módulo {i} de {topic}: la función {topic}_{n} valida la entrada y registra la decisión" for n in range(120)]
+            builder.index_text("\n".join(lines), source=f"docs/{topic}_{i}.md")
+    return builder
+
+
+def _rag_generate(env, budget: int):
+    builder = _rag_builder(env, budget=budget, cache_ttl=0)
+    return lambda: builder.generate("¿Cómo se validan los pagos?", max_tokens=TOKENS)
+
+
+@benchmark("llm.rag.packed", requires=("ollama_stub",), number=10, prompt_rate=PROMPT_RATE, top_k=20, budget=2048)
+def rag_packed(env):
+    """Top-20 deduplicado y empaquetado por relevancia por token en 2048 tokens"""
+    return _rag_generate(env, budget=2048)
+
+
+@benchmark("llm.rag.unpacked", requires=("ollama_stub",), number=10, prompt_rate=PROMPT_RATE, top_k=20)
+def rag_unpacked(env):
+    """Referencia: los 20 fragmentos recuperados enteros en el prompt"""
+    return _rag_generate(env, budget=10**9)
+
+
+@benchmark("llm.rag.retrieve", requires=("ollama_stub",), number=20, embed_latency=EMBED_LATENCY)
+def rag_retrieve(env):
+    """Recuperación sin caché: embedding de la consulta y búsqueda en SQLite"""
+    builder = _rag_builder(env, cache_ttl=0)
+    return lambda: builder.retrieve("¿Cómo se validan los pagos?", session_id="bench")
+
+
+@benchmark("llm.rag.retrieve_cached", requires=("ollama_stub",), number=200, embed_latency=EMBED_LATENCY)
+def rag_retrieve_cached(env):
+    """Misma consulta en la misma sesión: resultado de la caché"""
+    builder = _rag_builder(env)
+    return lambda: builder.retrieve("¿Cómo se validan los pagos?", session_id="bench")
+
+
+def _prefetch(env, max_concurrency: int, models: int = 4, fail_every: int = 0):
+    """Descarga de `models` modelos nuevos por ronda contra el /api/pull del stub"""
+    import itertools
+
+    from src.utils.ollama_pull import OllamaPullManager
+
+    mb = 1024 * 1024
+    url = env.ollama_stub(
+        pull_size=PULL_SIZE_MB * mb, pull_stream_rate=PULL_STREAM_MBPS * mb,
+        pull_bandwidth=PULL_BANDWIDTH_MBPS * mb, pull_fail_every=fail_every
+    )
+    # Medición corta: cada descarga del stub dura unas décimas de segundo
+    os.environ["OLLAMA_PULL_PROBE_SECONDS"] = "0.1"
+    env.on_cleanup(lambda: os.environ.pop("OLLAMA_PULL_PROBE_SECONDS", None))
+    manager = OllamaPullManager(url, backoff=0.01, max_concurrency=max_concurrency)
+    rounds = itertools.count()
+
+    def run():
+        # Nombres nuevos en cada ronda: el stub conserva lo ya descargado
+        n = next(rounds)
+        results = manager.prefetch([f"bench-{max_concurrency}-{fail_every}-{n}-{i}" for i in range(models)])
+        assert all(r.ok for r in results.values())
+
+    return run
+
+
+@benchmark("llm.ollama.prefetch", requires=("ollama_stub",), number=2, models=4, size_mb=PULL_SIZE_MB)
+def ollama_prefetch(env):
+    """4 modelos en paralelo; la concurrencia sube mientras crece el ancho de banda agregado"""
+    return _prefetch(env, max_concurrency=4)
+
+
+@benchmark("llm.ollama.prefetch_sequential", requires=("ollama_stub",), number=2, models=4, size_mb=PULL_SIZE_MB)
+def ollama_prefetch_sequential(env):
+    """Referencia: los mismos 4 modelos de uno en uno, como scripts/05_setup-ollama.sh antes"""
+    return _prefetch(env, max_concurrency=1)
+
+
+@benchmark("llm.ollama.prefetch_flaky", requires=("ollama_stub",), number=2, models=4, fail_every=3)
+def ollama_prefetch_flaky(env):
+    """Una de cada 3 peticiones corta el stream: los reintentos reanudan las capas parciales"""
+    return _prefetch(env, max_concurrency=4, fail_every=3)
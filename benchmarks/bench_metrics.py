@@ -0,0 +1,117 @@
+"""
+Benchmarks de la instrumentación: coste de métricas y tracing activados y desactivados
+
+`metrics.baseline` mide el mismo bucle sin instrumentar; la diferencia con
+`metrics.disabled.*` es el coste que pagan las rutas críticas por defecto.
+"""
+from benchmarks.harness import benchmark
+
+CALLS = 1000
+
+
+def _with_metrics(env, enabled: bool):
+    from src.utils import metrics
+
+    previous = metrics.is_enabled()
+    metrics.enable() if enabled else metrics.disable()
+    env.on_cleanup(metrics.enable if previous else metrics.disable)
+    return metrics
+
+
+@benchmark("metrics.baseline", number=100, calls=CALLS)
+def baseline(env):
+    def noop():
+        pass
+
+    def run():
+        for _ in range(CALLS):
+            noop()
+
+    return run
+
+
+@benchmark("metrics.disabled.counter_inc", number=100, calls=CALLS)
+def disabled_counter(env):
+    metrics = _with_metrics(env, enabled=False)
+    counter = metrics.LLM_FALLBACKS
+
+    def run():
+        for _ in range(CALLS):
+            counter.inc(source="ollama", reason="error")
+
+    return run
+
+
+@benchmark("metrics.disabled.histogram_time", number=100, calls=CALLS)
+def disabled_timer(env):
+    metrics = _with_metrics(env, enabled=False)
+    histogram = metrics.DB_LATENCY
+
+    def run():
+        for _ in range(CALLS):
+            with histogram.time(operation="audit.insert"):
+                pass
+
+    return run
+
+
+@benchmark("metrics.enabled.counter_inc", number=100, calls=CALLS)
+def enabled_counter(env):
+    metrics = _with_metrics(env, enabled=True)
+    counter = metrics.counter("sdd_bench_counter_total", "Contador de benchmark", ("source",))
+
+    def run():
+        for _ in range(CALLS):
+            counter.inc(source="ollama")
+
+    return run
+
+
+@benchmark("metrics.enabled.histogram_time", number=100, calls=CALLS)
+def enabled_timer(env):
+    metrics = _with_metrics(env, enabled=True)
+    histogram = metrics.histogram("sdd_bench_seconds", "Histograma de benchmark", ("operation",))
+
+    def run():
+        for _ in range(CALLS):
+            with histogram.time(operation="audit.insert"):
+                pass
+
+    return run
+
+
+def _with_tracing(env, enabled: bool):
+    import os
+
+    from src.utils import tracing
+
+    os.environ["TRACING_EXPORT_PATH"] = os.path.join(env.tmp_dir, "traces")
+    previous = tracing.is_enabled()
+    tracing.enable() if enabled else tracing.disable()
+    env.on_cleanup(tracing.enable if previous else tracing.disable)
+    return tracing
+
+
+@benchmark("tracing.disabled.start_span", number=100, calls=CALLS)
+def tracing_disabled(env):
+    tracing = _with_tracing(env, enabled=False)
+
+    def run():
+        for _ in range(CALLS):
+            with tracing.start_span("audit.log_decision", attributes={"agent.name": "bench"}):
+                pass
+
+    return run
+
+
+@benchmark("tracing.enabled.start_span", number=10, calls=CALLS)
+def tracing_enabled(env):
+    tracing = _with_tracing(env, enabled=True)
+    env.on_cleanup(tracing.flush)
+
+    def run():
+        for _ in range(CALLS):
+            with tracing.start_span("audit.log_decision", attributes={"agent.name": "bench"}):
+                pass
+
+    return run
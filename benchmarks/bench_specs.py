@@ -0,0 +1,75 @@
+"""
+Benchmarks de SpecStore: revisiones de una especificación sobre SQLite
+
+Cada revisión cambia una línea de una especificación de ~300 requisitos,
+como las iteraciones de `/speckit.specify` en una sesión larga.
+"""
+import os
+import itertools
+
+from benchmarks.harness import benchmark
+
+REQUIREMENTS = 300
+REVISIONS = 200
+
+
+def _spec(revision: int) -> str:
+    lines = [f"- FR{i}: el sistema debe validar la entrada {i} y registrar la decisión\n" for i in range(REQUIREMENTS)]
+    lines[revision % REQUIREMENTS] = f"- FR{revision % REQUIREMENTS}: requisito revisado en la iteración {revision}\n"
+    return "# Especificación\n\n" + "".join(lines)
+
+
+def _store(env, name: str, **options):
+    from src.skills.spec_store import SpecStore
+    from src.storage.base import get_storage
+
+    storage = get_storage(f"sqlite:///{os.path.join(env.tmp_dir, name)}")
+    return SpecStore(storage, **options)
+
+
+def _save(env, name: str, **options):
+    store = _store(env, name, **options)
+    revisions = itertools.count()
+    return lambda: store.save("bench-session", _spec(next(revisions)))
+
+
+@benchmark("specs.save.delta", number=REVISIONS, requirements=REQUIREMENTS)
+def save_delta(env):
+    """Revisión guardada como delta contra la última versión en memoria"""
+    return _save(env, "specs_delta.db")
+
+
+@benchmark("specs.save.full", number=REVISIONS, requirements=REQUIREMENTS)
+def save_full(env):
+    """Referencia: cada revisión guardada completa"""
+    return _save(env, "specs_full.db", snapshot_interval=1)
+
+
+@benchmark("specs.get.version", number=50, requirements=REQUIREMENTS, revisions=REVISIONS)
+def get_version(env):
+    """Reconstruir una versión antigua: instantánea + deltas en una consulta"""
+    store = _store(env, "specs_get.db")
+    for revision in range(REVISIONS):
+        store.save("bench-session", _spec(revision))
+    versions = itertools.cycle(range(1, REVISIONS, 7))
+    return lambda: store.get("bench-session", version=next(versions))
+
+
+@benchmark("specs.get.latest", number=200, requirements=REQUIREMENTS)
+def get_latest(env):
+    """Última versión: en memoria, solo se consulta su número"""
+    store = _store(env, "specs_latest.db")
+    store.save("bench-session", _spec(0))
+    return lambda: store.get("bench-session")
+
+
+@benchmark("specs.get.latest_events", requires=("redis",), number=200, requirements=REQUIREMENTS)
+def get_latest_events(env):
+    """Última versión con invalidación por eventos de Redis: sin consultas"""
+    from src.skills.spec_store import SpecStore
+    from src.storage.base import get_storage
+
+    store = SpecStore(get_storage(f"sqlite:///{os.path.join(env.tmp_dir, 'specs_events.db')}"), events=env.event_bus())
+    env.on_cleanup(store.close)
+    store.save("bench-session", _spec(0))
+    return lambda: store.get("bench-session")
@@ -0,0 +1,269 @@
+"""
+Entorno de Benchmarks
+
+Prepara los recursos compartidos por los escenarios:
+
+- Esquema `sdd_bench` en PostgreSQL con copias de `audit_log` y
+  `hitl_checkpoints` (los datos reales nunca se tocan)
+- Tablas sembradas con `BENCH_SEED_ROWS` filas (default: 1.000.000)
+- Servidor stub de Ollama que emite NDJSON a una tasa de tokens configurable
+- Streams de Redis con prefijo `sdd-bench` (BENCH_REDIS_URL o REDIS_URL)
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+BENCH_SCHEMA = "sdd_bench"
+# Prefijo de los streams del bus de eventos de benchmark
+BENCH_STREAM_PREFIX = "sdd-bench"
+
+# Tablas copiadas al esquema de benchmark
+BENCH_TABLES = ("audit_log", "hitl_checkpoints")
+
+# Tablas sin columna `id` copiadas al esquema de benchmark
+BENCH_KEYED_TABLES = ("session_summaries",)
+
+
+class BenchEnv:
+    """Recursos compartidos y limpieza entre escenarios"""
+
+    def __init__(self, seed_rows: Optional[int] = None, quick: bool = False):
+        self.quick = quick
+        default_rows = 100_000 if quick else 1_000_000
+        self.seed_rows = seed_rows or int(os.getenv("BENCH_SEED_ROWS", default_rows))
+        self.base_db_url = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+        self.redis_url = os.getenv("BENCH_REDIS_URL") or os.getenv("REDIS_URL")
+        self._redis_ready: Optional[bool] = None
+        self.tmp_dir = tempfile.mkdtemp(prefix="sdd-bench-")
+        self._db_ready: Optional[bool] = None
+        self._seeded = False
+        self._stubs: Dict[Tuple[float, float, Optional[int]], Any] = {}
+        self._cleanups: List[Callable[[], None]] = []
+
+        # Los módulos leen su configuración del entorno al instanciarse
+        os.environ["AUDIT_LOG_PATH"] = os.path.join(self.tmp_dir, "audit")
+        os.environ["HITL_AUTO_APPROVAL"] = "false"
+        os.environ["SESSION_ID"] = "bench-session"
+        os.environ.setdefault("LOG_LEVEL", "ERROR")
+        # Los escenarios que miden Redis crean su bus con `event_bus()`
+        os.environ["EVENT_BUS"] = "memory"
+        if self.base_db_url:
+            os.environ["DATABASE_URL"] = self.bench_db_url
+
+    # --- Capacidades -----------------------------------------------------
+
+    def provides(self, requirement: str) -> bool:
+        if requirement == "db":
+            return self._ensure_db()
+        if requirement == "seeded_db":
+            return self._ensure_db() and self._ensure_seeded()
+        if requirement == "ollama_stub":
+            return True
+        if requirement == "redis":
+            return self._ensure_redis()
+        return False
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "db": bool(self._db_ready),
+            "redis": bool(self._redis_ready),
+            "seed_rows": self.seed_rows if self._seeded else 0,
+        }
+
+    # --- Limpieza --------------------------------------------------------
+
+    def on_cleanup(self, func: Callable[[], None]):
+        """Registrar una función a ejecutar al terminar el escenario actual"""
+        self._cleanups.append(func)
+
+    def run_cleanups(self):
+        while self._cleanups:
+            try:
+                self._cleanups.pop()()
+            except Exception as e:
+                print(f"⚠️  Error en limpieza: {e}")
+
+    def close(self):
+        self.run_cleanups()
+        for stub in self._stubs.values():
+            stub.stop()
+        self._stubs.clear()
+
+    # --- PostgreSQL ------------------------------------------------------
+
+    @property
+    def bench_db_url(self) -> str:
+        """URL de conexión con `search_path` apuntando al esquema de benchmark"""
+        from psycopg.conninfo import make_conninfo
+
+        return make_conninfo(self.base_db_url, options=f"-c search_path={BENCH_SCHEMA},public")
+
+    def connect(self):
+        import psycopg
+
+        return psycopg.connect(self.bench_db_url)
+
+    def _ensure_db(self) -> bool:
+        if self._db_ready is not None:
+            return self._db_ready
+        if not self.base_db_url:
+            self._db_ready = False
+            return False
+
+        from src.storage.postgres import BLOBS_DDL, SEARCH_DDL
+
+        try:
+            with self.connect() as conn:
+                conn.execute(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}")
+                for table in BENCH_TABLES:
+                    conn.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {BENCH_SCHEMA}.{table}
+                        (LIKE public.{table} INCLUDING ALL)
+                    """)
+                    # Secuencia propia para no consumir ids del esquema público
+                    conn.execute(f"CREATE SEQUENCE IF NOT EXISTS {BENCH_SCHEMA}.{table}_id_seq")
+                    conn.execute(f"""
+                        ALTER TABLE {BENCH_SCHEMA}.{table}
+                        ALTER COLUMN id SET DEFAULT nextval('{BENCH_SCHEMA}.{table}_id_seq')
+                    """)
+                for table in BENCH_KEYED_TABLES:
+                    conn.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {BENCH_SCHEMA}.{table}
+                        (LIKE public.{table} INCLUDING ALL)
+                    """)
+                # Columna e índices de búsqueda en esquemas creados antes de que existieran
+                for statement in SEARCH_DDL:
+                    conn.execute(statement)
+                # audit_blobs se crea directamente en el esquema de benchmark (primero en search_path)
+                for statement in BLOBS_DDL:
+                    conn.execute(statement)
+                conn.commit()
+            self._db_ready = True
+        except Exception as e:
+            print(f"⚠️  PostgreSQL no disponible para benchmarks: {e}")
+            self._db_ready = False
+        return self._db_ready
+
+    def _ensure_seeded(self) -> bool:
+        """Sembrar `audit_log` hasta `seed_rows` filas (idempotente)"""
+        if self._seeded:
+            return True
+
+        with self.connect() as conn:
+            existing = conn.execute("SELECT COUNT(*) FROM audit_log").fetchone()[0]
+            missing = self.seed_rows - existing
+            if missing > 0:
+                print(f"🌱 Sembrando {missing:,} filas en {BENCH_SCHEMA}.audit_log...")
+                conn.execute("""
+                    INSERT INTO audit_log (
+                        agent_name, action, decision, context, reasoning,
+                        confidence, timestamp, session_id, user_id
+                    )
+                    SELECT
+                        'agent_' || (g %% 50),
+                        'action_' || (g %% 200),
+                        'Decisión ' || g || ' sobre componente ' || (g %% 1000),
+                        jsonb_build_object(
+                            'file', 'src/module_' || (g %% 500) || '.py',
+                            'lines_changed', g %% 300,
+                            'tags', jsonb_build_array('tag_' || (g %% 7), 'tag_' || (g %% 11))
+                        ),
+                        'Razonamiento ' || md5(g::text),
+                        (g %% 100) / 100.0,
+                        now() - (g || ' seconds')::interval,
+                        'session_' || (g %% 5000),
+                        'user_' || (g %% 20)
+                    FROM generate_series(%s, %s) AS g
+                """, (existing + 1, self.seed_rows))
+                conn.execute("ANALYZE audit_log")
+                conn.commit()
+        self._seeded = True
+        return True
+
+    # --- Redis -----------------------------------------------------------
+
+    def _ensure_redis(self) -> bool:
+        if self._redis_ready is None:
+            self._redis_ready = False
+            if self.redis_url:
+                try:
+                    from src.utils.event_bus import RedisEventBus
+
+                    RedisEventBus(self.redis_url, prefix=BENCH_STREAM_PREFIX).client.ping()
+                    self._redis_ready = True
+                except Exception as e:
+                    print(f"⚠️  Redis no disponible para benchmarks: {e}")
+        return self._redis_ready
+
+    def event_bus(self):
+        """Bus de Redis con los streams de benchmark (se borran al terminar el escenario)"""
+        from src.utils.event_bus import RedisEventBus
+
+        bus = RedisEventBus(self.redis_url, prefix=BENCH_STREAM_PREFIX)
+
+        def cleanup():
+            bus.flush()
+            keys = list(bus.client.scan_iter(f"{BENCH_STREAM_PREFIX}:*"))
+            if keys:
+                bus.client.delete(*keys)
+            bus.close()
+
+        self.on_cleanup(cleanup)
+        return bus
+
+    # --- Componentes -----------------------------------------------------
+
+    def audit_logger(self, file_enabled: bool = False):
+        """AuditLogger apuntando al esquema de benchmark"""
+        from src.audit.logger import AuditLogger
+
+        os.environ["AUDIT_FILE_ENABLED"] = "true" if file_enabled else "false"
+        os.environ["AUDIT_DB_ENABLED"] = "true" if self._db_ready else "false"
+        return AuditLogger()
+
+    def hitl_skill(self):
+        """HITLCheckpointSkill apuntando al esquema de benchmark"""
+        from src.skills.hitl_checkpoint import HITLCheckpointSkill
+
+        return HITLCheckpointSkill()
+
+    def ollama_stub(
+        self,
+        token_rate: float = 2000.0,
+        first_token_latency: float = 0.0,
+        max_parallel: Optional[int] = None,
+        load_latency: float = 0.0,
+        max_loaded: Optional[int] = None,
+        tail_latency: float = 0.0,
+        tail_every: int = 0,
+        prompt_rate: float = 0.0,
+        embed_latency: float = 0.0,
+        pull_size: int = 64 * 1024 * 1024,
+        pull_stream_rate: float = 64 * 1024 * 1024,
+        pull_bandwidth: float = 256 * 1024 * 1024,
+        pull_fail_every: int = 0
+    ) -> str:
+        """URL de un stub de Ollama (se reutiliza por configuración)"""
+        key = (
+            token_rate, first_token_latency, max_parallel, load_latency, max_loaded, tail_latency, tail_every,
+            prompt_rate, embed_latency, pull_size, pull_stream_rate, pull_bandwidth, pull_fail_every,
+        )
+        if key not in self._stubs:
+            from benchmarks.ollama_stub import OllamaStubServer
+
+            stub = OllamaStubServer(
+                token_rate=token_rate, first_token_latency=first_token_latency, max_parallel=max_parallel,
+                load_latency=load_latency, max_loaded=max_loaded,
+                tail_latency=tail_latency, tail_every=tail_every, prompt_rate=prompt_rate,
+                embed_latency=embed_latency, pull_size=pull_size, pull_stream_rate=pull_stream_rate,
+                pull_bandwidth=pull_bandwidth, pull_fail_every=pull_fail_every
+            )
+            stub.start()
+            self._stubs[key] = stub
+        return self._stubs[key].url
@@ -0,0 +1,219 @@
+"""
+Harness de Benchmarks
+
+Registro de escenarios, medición y comparación de resultados (estilo asv,
+solo stdlib). Cada escenario es una función de setup que recibe el
+`BenchEnv` y retorna el callable a medir:
+
+    @benchmark("audit.log_decision.single", requires=("db",), number=20)
+    def log_decision_single(env):
+        logger = env.audit_logger()
+        return lambda: logger.log_decision("bench", "action", "decision")
+
+Cada muestra ejecuta el callable `number` veces; se toman `repeat` muestras
+tras `warmup` ejecuciones descartadas y se reporta el tiempo por llamada.
+"""
+import os
+import sys
+import json
+import time
+import fnmatch
+import platform
+import statistics
+import subprocess
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Benchmark:
+    """Escenario registrado"""
+    name: str
+    setup: Callable[["Any"], Callable[[], Any]]
+    requires: Tuple[str, ...] = ()
+    number: int = 1
+    repeat: int = 10
+    warmup: int = 1
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+_REGISTRY: Dict[str, Benchmark] = {}
+
+
+def benchmark(
+    name: str,
+    requires: Tuple[str, ...] = (),
+    number: int = 1,
+    repeat: int = 10,
+    warmup: int = 1,
+    **params: Any
+):
+    """Registrar un escenario de benchmark"""
+    def decorator(setup: Callable) -> Callable:
+        if name in _REGISTRY:
+            raise ValueError(f"Benchmark duplicado: {name}")
+        _REGISTRY[name] = Benchmark(name, setup, tuple(requires), number, repeat, warmup, params)
+        return setup
+    return decorator
+
+
+def registered(pattern: str = "*") -> List[Benchmark]:
+    """Escenarios registrados cuyo nombre coincide con el patrón glob"""
+    return [b for name, b in sorted(_REGISTRY.items()) if fnmatch.fnmatch(name, pattern)]
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(bench: Benchmark, run: Callable[[], Any], quick: bool = False) -> Dict[str, Any]:
+    """Medir un callable según la configuración del escenario"""
+    number = bench.number
+    repeat = max(3, bench.repeat // 3) if quick else bench.repeat
+
+    for _ in range(bench.warmup * number):
+        run()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - start) / number)
+
+    ordered = sorted(samples)
+    median = statistics.median(ordered)
+    return {
+        "name": bench.name,
+        "params": bench.params,
+        "unit": "seconds",
+        "number": number,
+        "repeat": repeat,
+        "min": ordered[0],
+        "median": median,
+        "mean": statistics.fmean(ordered),
+        "p95": _percentile(ordered, 95),
+        "stddev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "ops_per_sec": 1.0 / median if median > 0 else float("inf"),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_all(
+    env: Any,
+    pattern: str = "*",
+    quick: bool = False,
+    log: Callable[[str], None] = print
+) -> Dict[str, Any]:
+    """
+    Ejecutar los escenarios que coinciden con `pattern`
+
+    Los escenarios cuyos requisitos no ofrece el entorno se marcan como
+    omitidos en lugar de fallar.
+    """
+    results = []
+    skipped = []
+    for bench in registered(pattern):
+        missing = [r for r in bench.requires if not env.provides(r)]
+        if missing:
+            skipped.append({"name": bench.name, "reason": f"requiere: {', '.join(missing)}"})
+            log(f"⏭️  {bench.name}: omitido (requiere {', '.join(missing)})")
+            continue
+
+        try:
+            result = measure(bench, bench.setup(env), quick=quick)
+        except Exception as e:
+            skipped.append({"name": bench.name, "reason": f"error: {type(e).__name__}: {e}"})
+            log(f"❌ {bench.name}: {type(e).__name__}: {e}")
+            continue
+        finally:
+            env.run_cleanups()
+
+        results.append(result)
+        log(f"✅ {bench.name}: {format_seconds(result['median'])} "
+            f"(p95 {format_seconds(result['p95'])}, {result['ops_per_sec']:,.0f} ops/s)")
+
+    return {
+        "metadata": {
+            "timestamp": datetime.now().isoformat(),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "quick": quick,
+            "env": env.describe(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def format_seconds(seconds: float) -> str:
+    """Formatear una duración con la unidad adecuada"""
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    if seconds >= 1e-6:
+        return f"{seconds * 1e6:.2f} µs"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    threshold: float = 0.10
+) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Comparar dos ejecuciones por mediana
+
+    Args:
+        baseline: Resultados de referencia
+        current: Resultados nuevos
+        threshold: Variación relativa tolerada (0.10 = 10%)
+
+    Returns:
+        (filas de comparación, True si hay alguna regresión)
+    """
+    base_by_name = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    regressed = False
+    for result in current.get("results", []):
+        base = base_by_name.get(result["name"])
+        if base is None:
+            rows.append({"name": result["name"], "baseline": None, "current": result["median"],
+                         "ratio": None, "status": "nuevo"})
+            continue
+
+        ratio = result["median"] / base["median"] if base["median"] else float("inf")
+        if ratio > 1 + threshold:
+            status = "regresión"
+            regressed = True
+        elif ratio < 1 - threshold:
+            status = "mejora"
+        else:
+            status = "igual"
+        rows.append({"name": result["name"], "baseline": base["median"], "current": result["median"],
+                     "ratio": ratio, "status": status})
+    return rows, regressed
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_results(results: Dict[str, Any], path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
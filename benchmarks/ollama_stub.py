@@ -0,0 +1,408 @@
+"""
+Stub de Ollama para Benchmarks
+
+Servidor HTTP local que imita `/api/tags`, `/api/ps`, `/api/generate` y
+`/api/chat` emitiendo NDJSON a una tasa de tokens configurable, para medir el
+coste de `OllamaClient`/`LLMRouter` sin depender de un modelo real. Con
+`max_parallel` las generaciones que exceden el límite esperan turno, como con
+`OLLAMA_NUM_PARALLEL` en un host sin GPU.
+
+Con `load_latency` la primera petición a un modelo no cargado espera ese
+tiempo; el modelo sigue cargado según el `keep_alive` de la petición y, con
+`max_loaded`, cargar otro expulsa al usado hace más tiempo (como
+`OLLAMA_MAX_LOADED_MODELS`). Un prompt vacío solo carga el modelo.
+
+Con `tail_every` una de cada N generaciones suma `tail_latency` antes del
+primer token (latencia de cola para medir el hedging del router).
+
+Con `prompt_rate` el prompt se procesa a esa tasa (tokens/seg, ~4 caracteres
+por token) antes del primer token; los tokens ya incluidos en el `context`
+que envía el cliente no se vuelven a procesar, como en Ollama.
+
+`/api/embed` devuelve embeddings de bolsa de palabras (64 dimensiones) tras
+`embed_latency` segundos, suficiente para medir la recuperación de contexto.
+
+`/api/pull` simula la descarga de dos capas de `pull_size` bytes en total sin
+enviar datos: cada conexión avanza como mucho a `pull_stream_rate` bytes/seg
+(límite por conexión del registro) y todas se reparten `pull_bandwidth`
+(enlace del host). Las capas parciales se conservan entre peticiones, como en
+Ollama, y con `pull_fail_every` una de cada N peticiones corta el stream a
+mitad de una capa.
+
+Uso independiente:
+    python benchmarks/ollama_stub.py --port 11435 --token-rate 50
+"""
+import re
+import json
+import hashlib
+import itertools
+import time
+import argparse
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "_StubHTTPServer"
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model}]})
+        elif self.path == "/api/ps":
+            self._send_json({"models": self.server.running()})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        request = self._read_json()
+        if self.path == "/api/pull":
+            self._pull(request.get("model") or request.get("name", self.server.model))
+            return
+        n_tokens = int(request.get("options", {}).get("num_predict", self.server.default_tokens))
+        n_tokens = min(n_tokens, self.server.max_tokens)
+        model = request.get("model", self.server.model)
+
+        if self.path == "/api/embed":
+            inputs = request.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            time.sleep(self.server.embed_latency)
+            self._send_json({"model": model, "embeddings": [_embedding(text) for text in inputs],
+                             "prompt_eval_count": sum(_count_tokens(text) for text in inputs)})
+            return
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        keep_alive = _keep_alive_seconds(request.get("keep_alive", "5m"))
+        if self.path == "/api/generate" and not request.get("prompt"):
+            # Prompt vacío: solo cargar (o descargar con keep_alive 0)
+            load_duration = self.server.load(model, keep_alive)
+            reason = "unload" if keep_alive == 0 else "load"
+            self._send_json({"model": model, "response": "", "done": True, "done_reason": reason,
+                             "load_duration": int(load_duration * 1e9)})
+            return
+
+        slots = self.server.slots
+        if slots is not None:
+            slots.acquire()
+        try:
+            load_duration = self.server.load(model, keep_alive)
+            if self.path == "/api/generate":
+                self._prompt_tokens = _count_tokens(request.get("prompt"))
+                if not request.get("context"):
+                    self._prompt_tokens += _count_tokens(request.get("system"))
+            else:
+                self._prompt_tokens = sum(_count_tokens(m.get("content")) for m in request.get("messages", []))
+            self._first_token = self.server.first_token_delay()
+            if self.server.prompt_rate:
+                self._first_token += self._prompt_tokens / self.server.prompt_rate
+            if self.path == "/api/generate":
+                self._context = request.get("context") or []
+                self._generate(model, n_tokens, stream=request.get("stream", True), load_duration=load_duration)
+            else:
+                self._chat(model, n_tokens, load_duration=load_duration)
+        finally:
+            if slots is not None:
+                slots.release()
+
+    def _pace(self, index: int, started: float):
+        """Esperar hasta el instante en que corresponde emitir el token `index`"""
+        target = started + self._first_token + index / self.server.token_rate
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _generate(self, model: str, n_tokens: int, stream: bool, load_duration: float = 0.0):
+        started = time.perf_counter()
+        if not stream:
+            self._pace(n_tokens, started)
+            self._send_json({
+                "model": model,
+                "response": "tok " * n_tokens,
+                "done": True,
+                "prompt_eval_count": self._prompt_tokens,
+                "eval_count": n_tokens,
+                "load_duration": int(load_duration * 1e9),
+                "context": self._context + list(range(self._prompt_tokens + n_tokens)),
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for i in range(n_tokens):
+                self._pace(i, started)
+                chunk = {"model": model, "response": "tok ", "done": False}
+                self.wfile.write(json.dumps(chunk).encode() + b"\n")
+                self.wfile.flush()
+            done = {"model": model, "response": "", "done": True, "prompt_eval_count": self._prompt_tokens,
+                    "eval_count": n_tokens, "load_duration": int(load_duration * 1e9)}
+            self.wfile.write(json.dumps(done).encode() + b"\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó el stream (p.ej. tras el primer token)
+            self.close_connection = True
+
+    def _chat(self, model: str, n_tokens: int, load_duration: float = 0.0):
+        started = time.perf_counter()
+        self._pace(n_tokens, started)
+        self._send_json({
+            "model": model,
+            "message": {"role": "assistant", "content": "tok " * n_tokens},
+            "done": True,
+            "prompt_eval_count": self._prompt_tokens,
+            "eval_count": n_tokens,
+            "load_duration": int(load_duration * 1e9),
+        })
+
+
+    def _pull(self, model: str):
+        server = self.server
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        def send(payload: Dict[str, Any]):
+            self.wfile.write(json.dumps(payload).encode() + b"\n")
+            self.wfile.flush()
+
+        with server.pull_lock:
+            server.active_pulls += 1
+            attempt = next(server.pull_requests)
+        cut = server.pull_fail_every and attempt % server.pull_fail_every == 0
+        tick = 0.01
+        try:
+            send({"status": "pulling manifest"})
+            for layer in range(2):
+                digest = "sha256:" + hashlib.sha256(f"{model}/{layer}".encode()).hexdigest()
+                total = server.pull_size // 2
+                completed = server.partial.get(digest, 0)
+                send({"status": f"pulling {digest[7:19]}", "digest": digest, "total": total, "completed": completed})
+                while completed < total:
+                    time.sleep(tick)
+                    with server.pull_lock:
+                        rate = min(server.pull_stream_rate, server.pull_bandwidth / server.active_pulls)
+                        completed = min(total, completed + int(rate * tick))
+                        server.partial[digest] = completed
+                    send({"status": f"pulling {digest[7:19]}", "digest": digest, "total": total, "completed": completed})
+                    if cut and completed >= total // 2:
+                        # Conexión caída a mitad de capa: la parte descargada se conserva
+                        self.close_connection = True
+                        return
+            for status in ("verifying sha256 digest", "writing manifest", "success"):
+                send({"status": status})
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            with server.pull_lock:
+                server.active_pulls -= 1
+
+
+def _count_tokens(text: Optional[str]) -> int:
+    return len(text) // 4 + 1 if text else 0
+
+
+def _embedding(text: str, dimensions: int = 64) -> List[float]:
+    """Bolsa de palabras con hashing: textos con palabras en común se parecen"""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        vector[zlib.crc32(word.encode()) % dimensions] += 1.0
+    return vector
+
+
+def _keep_alive_seconds(value: Any) -> Optional[float]:
+    """keep_alive de Ollama en segundos (None = indefinido)"""
+    if isinstance(value, str) and not re.fullmatch(r"-?\d+(\.\d+)?", value.strip()):
+        units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+        text = value.strip()
+        seconds = sum(float(n) * units[u] for n, u in re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", text))
+        seconds = -seconds if text.startswith("-") else seconds
+    else:
+        seconds = float(value)
+    return None if seconds < 0 else seconds
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    model = "stub:latest"
+    token_rate = 2000.0
+    first_token_latency = 0.0
+    tail_latency = 0.0
+    tail_every = 0
+    prompt_rate = 0.0
+    embed_latency = 0.0
+    default_tokens = 64
+    max_tokens = 4096
+    slots: Optional[threading.Semaphore] = None
+    load_latency = 0.0
+    max_loaded: Optional[int] = None
+    pull_size = 64 * 1024 * 1024
+    pull_stream_rate = 64 * 1024 * 1024
+    pull_bandwidth = 256 * 1024 * 1024
+    pull_fail_every = 0
+
+    def server_activate(self):
+        super().server_activate()
+        # Digest de capa -> bytes ya descargados (las descargas se reanudan)
+        self.partial: Dict[str, int] = {}
+        self.active_pulls = 0
+        self.pull_lock = threading.Lock()
+        self.pull_requests = itertools.count(1)
+        # Modelo -> instante (monotonic) de descarga, en orden de último uso
+        self.loaded: "OrderedDict[str, float]" = OrderedDict()
+        self.load_lock = threading.Lock()
+        self.generations = itertools.count(1)
+
+    def load(self, model: str, keep_alive: Optional[float]) -> float:
+        """Cargar `model` si no lo está; retorna los segundos de carga"""
+        with self.load_lock:
+            now = time.monotonic()
+            for name, expires in list(self.loaded.items()):
+                if expires <= now:
+                    del self.loaded[name]
+            if keep_alive == 0:
+                self.loaded.pop(model, None)
+                return 0.0
+            load_duration = 0.0
+            if model in self.loaded:
+                self.loaded.move_to_end(model)
+            else:
+                # Un solo modelo cargándose a la vez, como Ollama
+                time.sleep(self.load_latency)
+                load_duration = self.load_latency
+                if self.max_loaded:
+                    while len(self.loaded) >= self.max_loaded:
+                        self.loaded.popitem(last=False)
+            self.loaded[model] = float("inf") if keep_alive is None else time.monotonic() + keep_alive
+            return load_duration
+
+    def first_token_delay(self) -> float:
+        """Latencia hasta el primer token de la siguiente generación"""
+        tail = self.tail_every and next(self.generations) % self.tail_every == 0
+        return self.first_token_latency + (self.tail_latency if tail else 0.0)
+
+    def running(self) -> List[Dict[str, Any]]:
+        """Modelos cargados en el formato de /api/ps"""
+        with self.load_lock:
+            now = time.monotonic()
+            models = []
+            for name, expires in self.loaded.items():
+                if expires <= now:
+                    continue
+                remaining = timedelta(days=365 * 100) if expires == float("inf") else timedelta(seconds=expires - now)
+                models.append({"name": name, "model": name,
+                               "expires_at": (datetime.now(timezone.utc) + remaining).isoformat()})
+            return models
+
+
+class OllamaStubServer:
+    """Stub de Ollama en un hilo de fondo"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token_rate: float = 2000.0,
+        first_token_latency: float = 0.0,
+        model: str = "stub:latest",
+        max_parallel: Optional[int] = None,
+        load_latency: float = 0.0,
+        max_loaded: Optional[int] = None,
+        tail_latency: float = 0.0,
+        tail_every: int = 0,
+        prompt_rate: float = 0.0,
+        embed_latency: float = 0.0,
+        pull_size: int = 64 * 1024 * 1024,
+        pull_stream_rate: float = 64 * 1024 * 1024,
+        pull_bandwidth: float = 256 * 1024 * 1024,
+        pull_fail_every: int = 0
+    ):
+        self._server = _StubHTTPServer((host, port), _StubHandler)
+        if max_parallel:
+            self._server.slots = threading.Semaphore(max_parallel)
+        self._server.load_latency = load_latency
+        self._server.max_loaded = max_loaded
+        self._server.tail_latency = tail_latency
+        self._server.tail_every = tail_every
+        self._server.prompt_rate = prompt_rate
+        self._server.embed_latency = embed_latency
+        self._server.pull_size = pull_size
+        self._server.pull_stream_rate = pull_stream_rate
+        self._server.pull_bandwidth = pull_bandwidth
+        self._server.pull_fail_every = pull_fail_every
+        self._server.token_rate = token_rate
+        self._server.first_token_latency = first_token_latency
+        self._server.model = model
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "OllamaStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub de Ollama con NDJSON a tasa configurable")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Tokens por segundo")
+    parser.add_argument("--first-token-latency", type=float, default=0.2, help="Segundos hasta el primer token")
+    parser.add_argument("--max-parallel", type=int, help="Generaciones simultáneas (default: sin límite)")
+    parser.add_argument("--load-latency", type=float, default=0.0, help="Segundos de carga de un modelo no cargado")
+    parser.add_argument("--max-loaded", type=int, help="Modelos cargados a la vez (default: sin límite)")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="Segundos extra antes del primer token en la cola")
+    parser.add_argument("--tail-every", type=int, default=0, help="Una de cada N generaciones sufre la latencia de cola")
+    parser.add_argument("--prompt-rate", type=float, default=0.0, help="Tokens de prompt procesados por segundo (0 = instantáneo)")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Segundos de cada llamada a /api/embed")
+    parser.add_argument("--pull-size-mb", type=float, default=64.0, help="Tamaño simulado de cada modelo en /api/pull")
+    parser.add_argument("--pull-stream-mbps", type=float, default=64.0, help="MB/s máximos por descarga")
+    parser.add_argument("--pull-bandwidth-mbps", type=float, default=256.0, help="MB/s del enlace, repartidos entre descargas")
+    parser.add_argument("--pull-fail-every", type=int, default=0, help="Una de cada N descargas corta el stream")
+    args = parser.parse_args()
+
+    stub = OllamaStubServer(
+        args.host, args.port, args.token_rate, args.first_token_latency, max_parallel=args.max_parallel,
+        load_latency=args.load_latency, max_loaded=args.max_loaded,
+        tail_latency=args.tail_latency, tail_every=args.tail_every, prompt_rate=args.prompt_rate,
+        embed_latency=args.embed_latency, pull_size=int(args.pull_size_mb * 1024 * 1024),
+        pull_stream_rate=args.pull_stream_mbps * 1024 * 1024, pull_bandwidth=args.pull_bandwidth_mbps * 1024 * 1024,
+        pull_fail_every=args.pull_fail_every
+    )
+    print(f"🤖 Stub de Ollama en {stub.url} ({args.token_rate} tok/s)")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
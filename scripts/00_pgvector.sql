@@ -4,10 +4,13 @@
 CREATE EXTENSION IF NOT EXISTS vector;
 
 -- Tabla de contexto con embeddings
+-- Dimensión de EMBEDDING_MODEL: 768 para nomic-embed-text (Ollama). Para cambiar
+-- de modelo en una tabla existente: borrar el índice, vaciar la tabla y
+-- ALTER TABLE context_embeddings ALTER COLUMN embedding TYPE vector(<dim>)
 CREATE TABLE IF NOT EXISTS context_embeddings (
     id SERIAL PRIMARY KEY,
     content TEXT NOT NULL,
-    embedding vector(1536),
+    embedding vector(768),
     metadata JSONB,
     source VARCHAR(255),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -18,6 +21,7 @@ CREATE TABLE IF NOT EXISTS context_embeddings (
 CREATE INDEX IF NOT EXISTS context_embeddings_embedding_idx 
 ON context_embeddings USING ivfflat (embedding vector_cosine_ops)
 WITH (lists = 100);
+CREATE INDEX IF NOT EXISTS context_embeddings_source_idx ON context_embeddings(source);
 
 -- Tabla de auditoría de decisiones de IA
 CREATE TABLE IF NOT EXISTS audit_log (
@@ -38,23 +42,77 @@ CREATE INDEX IF NOT EXISTS audit_log_agent_idx ON audit_log(agent_name);
 CREATE INDEX IF NOT EXISTS audit_log_timestamp_idx ON audit_log(timestamp DESC);
 CREATE INDEX IF NOT EXISTS audit_log_session_idx ON audit_log(session_id);
 
+-- Búsqueda de texto (decision, reasoning) y por claves de context
+-- Configuración 'simple' (sin stemming): las decisiones mezclan español e inglés
+ALTER TABLE audit_log ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(decision, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(reasoning, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS audit_log_search_idx ON audit_log USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS audit_log_context_idx ON audit_log USING GIN (context jsonb_path_ops);
+
+-- Valores grandes de context guardados una vez por contenido (sha256, zlib);
+-- audit_log.context guarda {"$blob": digest, "bytes": n} en su lugar
+CREATE TABLE IF NOT EXISTS audit_blobs (
+    digest CHAR(64) PRIMARY KEY,
+    encoding VARCHAR(10) NOT NULL,
+    data BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE audit_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
+
 -- Tabla de checkpoints HITL
 CREATE TABLE IF NOT EXISTS hitl_checkpoints (
     id SERIAL PRIMARY KEY,
     checkpoint_name VARCHAR(255) NOT NULL,
     agent_name VARCHAR(100) NOT NULL,
-    status VARCHAR(50) DEFAULT 'pending', -- pending, approved, rejected
+    status VARCHAR(50) DEFAULT 'pending', -- pending, approved, rejected, timeout
+    priority SMALLINT NOT NULL DEFAULT 1, -- 0=low, 1=medium, 2=high, 3=critical
+    timeout_seconds INTEGER,
+    expires_at TIMESTAMP,
     data JSONB,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    claimed_by VARCHAR(100),
+    claimed_at TIMESTAMP,
     reviewed_at TIMESTAMP,
     reviewer VARCHAR(100),
     comments TEXT
 );
 
+-- Migración para bases existentes: prioridad y timeout como columnas reales
+ALTER TABLE hitl_checkpoints ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 1;
+ALTER TABLE hitl_checkpoints ADD COLUMN IF NOT EXISTS timeout_seconds INTEGER;
+ALTER TABLE hitl_checkpoints ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP;
+ALTER TABLE hitl_checkpoints ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(100);
+ALTER TABLE hitl_checkpoints ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
+
+UPDATE hitl_checkpoints
+SET priority = CASE data->>'priority'
+        WHEN 'low' THEN 0
+        WHEN 'high' THEN 2
+        WHEN 'critical' THEN 3
+        ELSE 1
+    END,
+    timeout_seconds = (data->>'timeout_seconds')::INTEGER,
+    expires_at = created_at + ((data->>'timeout_seconds')::INTEGER * INTERVAL '1 second')
+WHERE data ? 'priority' AND timeout_seconds IS NULL AND expires_at IS NULL;
+
 -- Índices para HITL
 CREATE INDEX IF NOT EXISTS hitl_checkpoints_status_idx ON hitl_checkpoints(status);
 CREATE INDEX IF NOT EXISTS hitl_checkpoints_created_idx ON hitl_checkpoints(created_at DESC);
 
+-- Cola de revisión: solo checkpoints pendientes, ordenados por prioridad y antigüedad
+CREATE INDEX IF NOT EXISTS hitl_checkpoints_pending_queue_idx
+ON hitl_checkpoints(priority DESC, created_at ASC, id ASC)
+WHERE status = 'pending';
+
+-- Sweeper de timeouts: checkpoints pendientes con vencimiento
+CREATE INDEX IF NOT EXISTS hitl_checkpoints_expiry_idx
+ON hitl_checkpoints(expires_at)
+WHERE status = 'pending' AND expires_at IS NOT NULL;
+
 -- Tabla de sesiones de desarrollo
 CREATE TABLE IF NOT EXISTS dev_sessions (
     id SERIAL PRIMARY KEY,
@@ -94,6 +152,68 @@ CREATE TABLE IF NOT EXISTS implementation_plans (
     approved_by VARCHAR(100)
 );
 
+-- Versionado de especificaciones y planes (SpecStore): cada versión se guarda
+-- completa ('full') o como delta contra la anterior ('delta')
+ALTER TABLE specifications ADD COLUMN IF NOT EXISTS encoding VARCHAR(10) NOT NULL DEFAULT 'full';
+ALTER TABLE implementation_plans ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 1;
+ALTER TABLE implementation_plans ADD COLUMN IF NOT EXISTS encoding VARCHAR(10) NOT NULL DEFAULT 'full';
+
+-- Las filas previas al versionado quedan todas con version = 1: antes de crear
+-- los índices únicos se numeran por sesión (y tipo) en orden de creación.
+-- Solo se hace una vez, mientras el índice correspondiente no existe
+DO $$
+BEGIN
+    IF to_regclass('specifications_version_idx') IS NULL THEN
+        UPDATE specifications s
+        SET version = v.version
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY session_id, spec_type ORDER BY created_at, id
+            ) AS version
+            FROM specifications
+        ) v
+        WHERE s.id = v.id AND s.version IS DISTINCT FROM v.version;
+    END IF;
+    IF to_regclass('implementation_plans_version_idx') IS NULL THEN
+        UPDATE implementation_plans p
+        SET version = v.version
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY session_id ORDER BY created_at, id
+            ) AS version
+            FROM implementation_plans
+        ) v
+        WHERE p.id = v.id AND p.version IS DISTINCT FROM v.version;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS specifications_version_idx
+ON specifications(session_id, spec_type, version);
+CREATE UNIQUE INDEX IF NOT EXISTS implementation_plans_version_idx
+ON implementation_plans(session_id, version);
+
+-- Sesiones: listado por estado y resumen incremental por agente (SessionTracker).
+-- Los contadores se suman en lotes en cada escritura, de modo que los reportes
+-- de sesión no recorren audit_log
+CREATE INDEX IF NOT EXISTS dev_sessions_status_idx ON dev_sessions(status, started_at DESC);
+
+CREATE TABLE IF NOT EXISTS session_summaries (
+    session_id VARCHAR(100) NOT NULL,
+    agent_name VARCHAR(100) NOT NULL,
+    decisions BIGINT NOT NULL DEFAULT 0,
+    confidence_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    checkpoints_requested BIGINT NOT NULL DEFAULT 0,
+    checkpoints_approved BIGINT NOT NULL DEFAULT 0,
+    checkpoints_rejected BIGINT NOT NULL DEFAULT 0,
+    checkpoints_timeout BIGINT NOT NULL DEFAULT 0,
+    llm_calls BIGINT NOT NULL DEFAULT 0,
+    prompt_tokens BIGINT NOT NULL DEFAULT 0,
+    completion_tokens BIGINT NOT NULL DEFAULT 0,
+    first_at TIMESTAMP,
+    last_at TIMESTAMP,
+    PRIMARY KEY (session_id, agent_name)
+);
+
 -- Función para actualizar updated_at automáticamente
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
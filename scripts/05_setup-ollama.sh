@@ -18,13 +18,25 @@ fi
 echo "✅ Ollama está disponible"
 echo ""
 
-# Función para pull de modelo
-pull_model() {
+cd "$(dirname "$0")/.."
+
+# Modelos elegidos; se descargan todos juntos al final
+MODELS=()
+
+# Función para elegir un modelo
+choose_model() {
     local model=$1
     local description=$2
     
-    echo "📥 Descargando modelo: $model"
+    echo "📥 Modelo elegido: $model"
     echo "   $description"
+    MODELS+=("$model")
+    echo ""
+}
+
+# Descarga secuencial con curl (si no hay dependencias de Python)
+curl_pull() {
+    local model=$1
     
     if curl -s -X POST http://ollama:11434/api/pull \
         -d "{\"name\": \"$model\"}" \
@@ -33,7 +45,6 @@ pull_model() {
     else
         echo "⚠️  Error descargando $model (puede que ya esté instalado)"
     fi
-    echo ""
 }
 
 # Listar modelos disponibles
@@ -55,14 +66,35 @@ read -p "¿Descargar modelo por defecto (llama3.2:latest)? [Y/n] " -n 1 -r
 echo ""
 
 if [[ $REPLY =~ ^[Yy]$ ]] || [[ -z $REPLY ]]; then
-    pull_model "llama3.2:latest" "General purpose, rápido (8B)"
+    choose_model "llama3.2:latest" "General purpose, rápido (8B)"
 fi
 
 read -p "¿Descargar modelo especializado en código (qwen2.5-coder:latest)? [y/N] " -n 1 -r
 echo ""
 
 if [[ $REPLY =~ ^[Yy]$ ]]; then
-    pull_model "qwen2.5-coder:latest" "Excelente para código (7B)"
+    choose_model "qwen2.5-coder:latest" "Excelente para código (7B)"
+fi
+
+read -p "¿Descargar modelo de embeddings para contexto RAG (nomic-embed-text:latest)? [y/N] " -n 1 -r
+echo ""
+
+if [[ $REPLY =~ ^[Yy]$ ]]; then
+    choose_model "nomic-embed-text:latest" "Embeddings para RAG (137M)"
+fi
+
+# Descargar en paralelo, con progreso y reintentos que reanudan lo descargado
+if [ ${#MODELS[@]} -gt 0 ]; then
+    echo "📥 Descargando ${#MODELS[@]} modelo(s)..."
+    if python3 -c "import requests, loguru" > /dev/null 2>&1; then
+        OLLAMA_URL=${OLLAMA_URL:-http://ollama:11434} python3 src/utils/ollama_pull.py "${MODELS[@]}" \
+            || echo "⚠️  Algún modelo no se pudo descargar"
+    else
+        for model in "${MODELS[@]}"; do
+            curl_pull "$model"
+        done
+    fi
+    echo ""
 fi
 
 # Verificar modelos instalados
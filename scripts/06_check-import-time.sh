@@ -0,0 +1,81 @@
+#!/bin/bash
+set -e
+
+# Verifica el presupuesto de tiempo de importación de los CLIs de auditoría y HITL
+# Uso: ./scripts/06_check-import-time.sh
+#
+# Los agentes invocan estos CLIs en cada acción, así que importar sus módulos
+# no debe cargar psycopg, pydantic ni loguru (se cargan en el primer uso).
+# Falla si algún módulo supera IMPORT_BUDGET_MS o importa una dependencia pesada.
+
+IMPORT_BUDGET_MS=${IMPORT_BUDGET_MS:-60}
+RUNS=${IMPORT_RUNS:-5}
+MODULES="src.audit src.skills src.audit.logger src.audit.client src.skills.hitl_checkpoint src.skills.hitl_policies src.utils.metrics src.utils.tracing src.storage"
+HEAVY_DEPS="psycopg pydantic loguru requests"
+
+# Colores para output
+GREEN='\033[0;32m'
+RED='\033[0;31m'
+NC='\033[0m' # No Color
+
+cd "$(dirname "$0")/.."
+
+echo "⏱️  Verificando tiempo de importación (presupuesto: ${IMPORT_BUDGET_MS} ms)..."
+echo ""
+
+# Imports de nivel superior del arranque del intérprete (site, encodings y
+# los .pth instalados): ya están cargados antes de importar el módulo y no
+# se cuentan; solo suman los que trae el propio módulo
+startup=$(python3 -X importtime -c "pass" 2>&1 >/dev/null | awk -F'|' '
+    /^import time:/ && $3 !~ /^  / { gsub(/ /, "", $3); print $3 }
+')
+
+failed=0
+for module in $MODULES; do
+    best_us=""
+    for _ in $(seq "$RUNS"); do
+        trace=$(python3 -X importtime -c "import $module" 2>&1 >/dev/null)
+
+        # Formato: "import time: self [us] | cumulative | imported package"
+        # Se suma el acumulado de los imports de nivel superior (sin indentar)
+        # que no son del arranque
+        total_us=$(echo "$trace" | awk -F'|' -v startup="$startup" '
+            BEGIN { n = split(startup, names, "\n"); for (i = 1; i <= n; i++) skip[names[i]] = 1 }
+            /^import time:/ && $3 !~ /^  / && $2 ~ /[0-9]/ {
+                name = $3; gsub(/ /, "", name)
+                if (!(name in skip)) sum += $2
+            }
+            END { print sum + 0 }
+        ')
+        if [ -z "$best_us" ] || [ "$total_us" -lt "$best_us" ]; then
+            best_us=$total_us
+        fi
+    done
+
+    heavy=""
+    for dep in $HEAVY_DEPS; do
+        if echo "$trace" | grep -qE "\|[[:space:]]+${dep}$"; then
+            heavy="$heavy $dep"
+        fi
+    done
+
+    best_ms=$((best_us / 1000))
+    if [ -n "$heavy" ]; then
+        echo -e "${RED}❌ $module importa dependencias pesadas:${heavy}${NC}"
+        failed=1
+    elif [ "$best_ms" -gt "$IMPORT_BUDGET_MS" ]; then
+        echo -e "${RED}❌ $module: ${best_ms} ms (> ${IMPORT_BUDGET_MS} ms)${NC}"
+        failed=1
+    else
+        echo -e "${GREEN}✅ $module: ${best_ms} ms${NC}"
+    fi
+done
+
+echo ""
+if [ "$failed" -ne 0 ]; then
+    echo "Presupuesto de importación excedido"
+    echo "Detalle: python3 -X importtime -c 'import <modulo>' 2>&1 | sort -t'|' -k2 -n | tail"
+    exit 1
+fi
+
+echo "✅ Todos los módulos dentro del presupuesto"
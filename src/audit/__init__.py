@@ -2,11 +2,55 @@
 Audit Module
 
 Sistema de auditoría para decisiones de IA.
+
+Los atributos se cargan de forma diferida (PEP 562): importar el paquete no
+importa `logger` ni sus dependencias hasta que se usa un atributo.
 """
-from .logger import AuditLogger, get_audit_logger, AgentDecision
+import importlib
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .logger import AuditLogger, get_audit_logger, AgentDecision
+    from .sessions import SessionTracker, SessionSummary, get_session_tracker
+    from .segments import SegmentWriter, compact_day
+    from .blobs import BlobStore, get_blob_store
+
+# Atributo público -> submódulo que lo define
+_LAZY_ATTRS = {
+    "AuditLogger": ".logger",
+    "get_audit_logger": ".logger",
+    "AgentDecision": ".logger",
+    "SessionTracker": ".sessions",
+    "SessionSummary": ".sessions",
+    "get_session_tracker": ".sessions",
+    "SegmentWriter": ".segments",
+    "compact_day": ".segments",
+    "BlobStore": ".blobs",
+    "get_blob_store": ".blobs",
+}
 
 __all__ = [
     "AuditLogger",
     "get_audit_logger",
     "AgentDecision",
+    "SessionTracker",
+    "SessionSummary",
+    "get_session_tracker",
+    "SegmentWriter",
+    "compact_day",
+    "BlobStore",
+    "get_blob_store",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
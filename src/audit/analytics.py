@@ -0,0 +1,368 @@
+"""
+Analítica de Auditoría por Agente
+
+Detecta agentes cuya confianza o ritmo de decisiones se degrada. Las
+decisiones se agregan por agente y ventana de tiempo (en SQL o desde el
+export Parquet de `export.py`) en matrices NumPy agentes × ventanas, y todas
+las métricas se calculan vectorizadas sobre todos los agentes a la vez:
+
+- Medias móviles de confianza (ponderadas por decisiones) y de ritmo
+- Percentiles p5/p50/p95 de la confianza media por ventana
+- Drift por EWMA: la EWMA de confianza y de ritmo frente a la línea base
+  del agente (ventanas anteriores a las `window` más recientes), en desviaciones
+- Anomalías por z-score: ventanas con confianza o ritmo a más de
+  `z_threshold` desviaciones de la media del agente
+
+Uso:
+    python src/audit/logger.py analytics [--bucket 1h] [--since 2026-01-01] [--window 24] [--parquet DIR] [--json]
+
+Requiere `numpy` (y `pyarrow` para leer Parquet).
+"""
+import argparse
+import re
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/audit/analytics.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.storage.base import StorageBackend, get_storage
+from src.utils.lazy_imports import lazy_module
+
+np = lazy_module("numpy")
+
+_BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_bucket(bucket: str) -> int:
+    """Duración de ventana (`15m`, `1h`, `1d`) en segundos"""
+    match = re.fullmatch(r"(\d+)\s*([smhd])", bucket.strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Ventana inválida: {bucket} (ej: 15m, 1h, 1d)")
+    return int(match.group(1)) * _BUCKET_UNITS[match.group(2)]
+
+
+@dataclass
+class AgentSeries:
+    """Series por agente: filas = agentes, columnas = ventanas consecutivas"""
+    agents: List[str]
+    bucket_seconds: int
+    first_bucket: int
+    counts: Any
+    confidence_sums: Any
+
+    @classmethod
+    def from_buckets(cls, rows: List[Tuple[str, int, int, float]], bucket_seconds: int) -> "AgentSeries":
+        """Construir desde filas (agent_name, bucket, decisiones, suma de confianza)"""
+        agents = sorted({row[0] for row in rows})
+        if not agents:
+            return cls([], bucket_seconds, 0, np.zeros((0, 0)), np.zeros((0, 0)))
+
+        index = {agent: i for i, agent in enumerate(agents)}
+        agent_idx = np.fromiter((index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+        buckets = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        counts = np.fromiter((row[2] for row in rows), dtype=np.float64, count=len(rows))
+        sums = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+        return cls._accumulate(agents, bucket_seconds, agent_idx, buckets, counts, sums)
+
+    @classmethod
+    def _accumulate(cls, agents, bucket_seconds, agent_idx, buckets, counts, sums) -> "AgentSeries":
+        first = int(buckets.min())
+        shape = (len(agents), int(buckets.max()) - first + 1)
+        count_matrix = np.zeros(shape)
+        sum_matrix = np.zeros(shape)
+        np.add.at(count_matrix, (agent_idx, buckets - first), counts)
+        np.add.at(sum_matrix, (agent_idx, buckets - first), sums)
+        return cls(agents, bucket_seconds, first, count_matrix, sum_matrix)
+
+    @property
+    def confidence(self):
+        """Confianza media por ventana (NaN en ventanas sin decisiones)"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.counts > 0, self.confidence_sums / self.counts, np.nan)
+
+    def bucket_start(self, column: int) -> datetime:
+        """Inicio de una ventana (mismo reloj que la columna `timestamp`)"""
+        epoch = (self.first_bucket + column) * self.bucket_seconds
+        return datetime.fromtimestamp(epoch, timezone.utc).replace(tzinfo=None)
+
+
+def load_series(
+    storage: Optional[StorageBackend] = None,
+    bucket: str = "1h",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> AgentSeries:
+    """Agregar `audit_log` por agente y ventana en la base de datos"""
+    bucket_seconds = parse_bucket(bucket)
+    storage = storage or get_storage()
+    return AgentSeries.from_buckets(storage.decision_buckets(bucket_seconds, since, until), bucket_seconds)
+
+
+def load_series_from_parquet(
+    path: str,
+    bucket: str = "1h",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> AgentSeries:
+    """Agregar un export Parquet por agente y ventana (lee solo 3 columnas)"""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    bucket_seconds = parse_bucket(bucket)
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    condition = None
+    if since is not None:
+        condition = ds.field("timestamp") >= since
+    if until is not None:
+        condition = (ds.field("timestamp") < until) if condition is None else condition & (ds.field("timestamp") < until)
+
+    agents: Dict[str, int] = {}
+    parts = []
+    for batch in dataset.to_batches(columns=["agent_name", "timestamp", "confidence"], filter=condition):
+        if batch.num_rows == 0:
+            continue
+        encoded = pc.dictionary_encode(batch.column("agent_name"))
+        remap = np.array([agents.setdefault(name, len(agents)) for name in encoded.dictionary.to_pylist()], dtype=np.intp)
+        agent_idx = remap[encoded.indices.to_numpy(zero_copy_only=False)]
+        micros = batch.column("timestamp").cast("int64").to_numpy(zero_copy_only=False)
+        buckets = micros // (bucket_seconds * 1_000_000)
+        confidence = batch.column("confidence").fill_null(0.0).to_numpy(zero_copy_only=False)
+        parts.append((agent_idx, buckets, confidence))
+
+    if not parts:
+        return AgentSeries([], bucket_seconds, 0, np.zeros((0, 0)), np.zeros((0, 0)))
+
+    # Mismo orden de agentes (alfabético) que `from_buckets`
+    names = sorted(agents)
+    position = {name: i for i, name in enumerate(names)}
+    remap = np.array([position[name] for name in sorted(agents, key=agents.get)], dtype=np.intp)
+    agent_idx, buckets, confidence = (np.concatenate(column) for column in zip(*parts))
+    return AgentSeries._accumulate(
+        names, bucket_seconds, remap[agent_idx], buckets, np.ones(len(buckets)), confidence
+    )
+
+
+def rolling_sum(values, window: int):
+    """Suma móvil por fila (ventanas parciales al inicio)"""
+    cumulative = np.concatenate([np.zeros((values.shape[0], 1)), np.cumsum(values, axis=1)], axis=1)
+    columns = np.arange(values.shape[1])
+    return cumulative[:, columns + 1] - cumulative[:, np.maximum(0, columns + 1 - window)]
+
+
+def ewma(values, alpha: float):
+    """EWMA por fila ignorando NaN; retorna el último valor de cada fila"""
+    current = np.full(values.shape[0], np.nan)
+    for column in values.T:
+        present = ~np.isnan(column)
+        updated = np.where(np.isnan(current), column, alpha * column + (1 - alpha) * current)
+        current = np.where(present, updated, current)
+    return current
+
+
+def zscores(values):
+    """z-score de cada valor respecto a la media y desviación de su fila"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(values, axis=1, keepdims=True)
+        std = np.nanstd(values, axis=1, keepdims=True)
+        return np.where(std > 0, (values - mean) / std, 0.0)
+
+
+def _drift(values, latest, window: int):
+    """Desviaciones entre `latest` y la línea base (ventanas antes de las últimas `window`)"""
+    baseline = values[:, :-window] if values.shape[1] > window else values
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(baseline, axis=1)
+        std = np.nanstd(baseline, axis=1)
+        return np.where(std > 0, (latest - mean) / std, 0.0)
+
+
+def _number(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, 4)
+
+
+def compute_agent_analytics(
+    series: AgentSeries,
+    window: int = 24,
+    alpha: float = 0.3,
+    z_threshold: float = 3.0,
+    drift_threshold: float = 2.0,
+    max_anomalies: int = 50
+) -> Dict[str, Any]:
+    """
+    Calcular medias móviles, percentiles, drift y anomalías de todos los agentes
+
+    Args:
+        series: Series por agente (`load_series` o `load_series_from_parquet`)
+        window: Ventanas de la media móvil y del periodo reciente del drift
+        alpha: Factor de suavizado de la EWMA
+        z_threshold: |z| a partir del cual una ventana es anómala
+        drift_threshold: Desviaciones de caída para marcar un agente como degradado
+        max_anomalies: Máximo de anomalías listadas (las de mayor |z|)
+
+    Returns:
+        {"bucket_seconds", "buckets", "start", "end", "agents": {...}, "anomalies": [...]}
+    """
+    agent_count, bucket_count = series.counts.shape
+    result: Dict[str, Any] = {
+        "bucket_seconds": series.bucket_seconds,
+        "buckets": bucket_count,
+        "start": series.bucket_start(0).isoformat() if bucket_count else None,
+        "end": series.bucket_start(bucket_count).isoformat() if bucket_count else None,
+        "agents": {},
+        "anomalies": [],
+    }
+    if not agent_count:
+        return result
+
+    counts = series.counts
+    confidence = series.confidence
+    window = max(1, min(window, bucket_count))
+
+    # Medias móviles: confianza ponderada por decisiones y decisiones por ventana
+    window_counts = rolling_sum(counts, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rolling_confidence = np.where(window_counts > 0, rolling_sum(series.confidence_sums, window) / window_counts, np.nan)
+    rolling_rate = window_counts / np.minimum(np.arange(1, bucket_count + 1), window)
+
+    percentiles = np.nanpercentile(confidence, [5, 50, 95], axis=1)
+
+    ewma_confidence = ewma(confidence, alpha)
+    ewma_rate = ewma(counts, alpha)
+    confidence_drift = _drift(confidence, ewma_confidence, window)
+    rate_drift = _drift(counts, ewma_rate, window)
+    degraded = (confidence_drift < -drift_threshold) | (rate_drift < -drift_threshold)
+
+    confidence_z = np.where(np.isnan(confidence), 0.0, zscores(confidence))
+    rate_z = zscores(counts)
+    anomalous = (np.abs(confidence_z) > z_threshold) | (np.abs(rate_z) > z_threshold)
+
+    totals = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_confidence = series.confidence_sums.sum(axis=1) / totals
+
+    for i, agent in enumerate(series.agents):
+        result["agents"][agent] = {
+            "decisions": int(totals[i]),
+            "mean_confidence": _number(mean_confidence[i]),
+            "confidence_p05": _number(percentiles[0, i]),
+            "confidence_p50": _number(percentiles[1, i]),
+            "confidence_p95": _number(percentiles[2, i]),
+            "rolling_confidence": _number(rolling_confidence[i, -1]),
+            "rolling_rate": _number(rolling_rate[i, -1]),
+            "ewma_confidence": _number(ewma_confidence[i]),
+            "confidence_drift": _number(confidence_drift[i]),
+            "ewma_rate": _number(ewma_rate[i]),
+            "rate_drift": _number(rate_drift[i]),
+            "degraded": bool(degraded[i]),
+            "anomalies": int(anomalous[i].sum()),
+        }
+
+    for metric, values, z in (("confidence", confidence, confidence_z), ("rate", counts, rate_z)):
+        for i, column in np.argwhere(np.abs(z) > z_threshold):
+            result["anomalies"].append({
+                "agent_name": series.agents[i],
+                "bucket": series.bucket_start(int(column)).isoformat(),
+                "metric": metric,
+                "value": _number(values[i, column]),
+                "z": _number(z[i, column]),
+            })
+    result["anomalies"].sort(key=lambda anomaly: -abs(anomaly["z"]))
+    del result["anomalies"][max_anomalies:]
+    return result
+
+
+def get_agent_analytics(
+    bucket: str = "1h",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    parquet: Optional[str] = None,
+    storage: Optional[StorageBackend] = None,
+    **options: Any
+) -> Dict[str, Any]:
+    """Cargar las series (base de datos o Parquet) y calcular la analítica"""
+    if parquet:
+        series = load_series_from_parquet(parquet, bucket, since, until)
+    else:
+        series = load_series(storage, bucket, since, until)
+    return compute_agent_analytics(series, **options)
+
+
+def format_analytics(analytics: Dict[str, Any], limit: int = 10) -> str:
+    """Resumen en Markdown (usado por el CLI y `generate_report`)"""
+    lines = [
+        "| Agente | Decisiones | Confianza | p5 | EWMA | Drift conf. | Drift ritmo | Anomalías |",
+        "|---|---|---|---|---|---|---|---|",
+    ]
+    for agent, stats in sorted(analytics["agents"].items(), key=lambda item: item[1]["confidence_drift"] or 0):
+        marker = " ⚠️" if stats["degraded"] else ""
+        lines.append(
+            f"| {agent}{marker} | {stats['decisions']} | {stats['mean_confidence'] or 0:.2f} "
+            f"| {stats['confidence_p05'] or 0:.2f} | {stats['ewma_confidence'] or 0:.2f} "
+            f"| {stats['confidence_drift'] or 0:+.1f}σ | {stats['rate_drift'] or 0:+.1f}σ | {stats['anomalies']} |"
+        )
+    if analytics["anomalies"]:
+        lines.append("")
+        lines.append("Anomalías (mayor |z|):")
+        for anomaly in analytics["anomalies"][:limit]:
+            lines.append(
+                f"- {anomaly['bucket']} {anomaly['agent_name']}: {anomaly['metric']}={anomaly['value']} (z={anomaly['z']:+.1f})"
+            )
+    return "\n".join(lines)
+
+
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {value} (formato: YYYY-MM-DD[THH:MM])")
+
+
+def main(argv: Optional[List[str]] = None, logger: Any = None):
+    """CLI de analítica (`python src/audit/logger.py analytics ...`)"""
+    import json
+
+    parser = argparse.ArgumentParser(
+        prog="logger.py analytics",
+        description="Drift de confianza/ritmo y anomalías por agente"
+    )
+    parser.add_argument("--bucket", default="1h", help="Duración de ventana: 15m, 1h, 1d (default: 1h)")
+    parser.add_argument("--since", type=_parse_date, help="Desde (inclusive)")
+    parser.add_argument("--until", type=_parse_date, help="Hasta (exclusive)")
+    parser.add_argument("--window", type=int, default=24, help="Ventanas de la media móvil y del periodo reciente")
+    parser.add_argument("--z", type=float, default=3.0, help="Umbral |z| de anomalía")
+    parser.add_argument("--parquet", help="Leer de un export Parquet en lugar de la base de datos")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    options = {"window": args.window, "z_threshold": args.z}
+    if args.parquet or logger is None:
+        analytics = get_agent_analytics(args.bucket, args.since, args.until, parquet=args.parquet, **options)
+    else:
+        analytics = logger.get_agent_analytics(
+            bucket=args.bucket,
+            since=args.since.isoformat() if args.since else None,
+            until=args.until.isoformat() if args.until else None,
+            **options
+        )
+
+    if args.json:
+        print(json.dumps(analytics, indent=2, ensure_ascii=False))
+        return
+
+    degraded = [agent for agent, stats in analytics["agents"].items() if stats["degraded"]]
+    print(f"\n📈 Analítica de {len(analytics['agents'])} agente(s), {analytics['buckets']} ventanas de {args.bucket}")
+    if analytics["start"]:
+        print(f"  {analytics['start']} → {analytics['end']}\n")
+        print(format_analytics(analytics))
+    if degraded:
+        print(f"\n⚠️  Agentes degradados: {', '.join(degraded)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Blobs de Contexto de Auditoría
+
+Los agentes suelen poner en `context` contenidos grandes y repetidos
+(archivos, diffs, prompts). Cada texto de `context` que ocupa más de
+`AUDIT_BLOB_THRESHOLD` bytes se guarda una sola vez en `audit_blobs`,
+direccionado por su sha256 y comprimido con zlib (sin comprimir si no
+reduce), y en `audit_log.context` queda una referencia:
+
+    {"file": "src/app.py", "content": {"$blob": "9f86d0...", "bytes": 48213}}
+
+`AuditLogger` rehidrata las referencias en `get_recent_decisions`,
+`get_decisions_by_session` y `search_decisions` con una consulta por página
+y una caché LRU de valores (`AUDIT_BLOB_CACHE_SIZE`). Los filtros de
+`search --context` con textos grandes se traducen a su referencia. El
+archivo JSONL y la exportación a Parquet conservan lo que se escribió en
+cada uno: el contexto completo y las referencias, respectivamente.
+
+Las decisiones anteriores se convierten con el backfill, por lotes de ids:
+
+    python src/audit/logger.py blobs backfill [--batch-size 500] [--dry-run]
+    python src/audit/logger.py blobs stats
+
+Configuración:
+    AUDIT_BLOB_THRESHOLD    Bytes a partir de los que un texto va a audit_blobs (default: 4096, 0 = desactivado)
+    AUDIT_BLOB_CACHE_SIZE   Valores rehidratados en caché (default: 256)
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/audit/blobs.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.storage.base import BLOB_RAW, BLOB_ZLIB, StorageBackend, get_storage
+from src.utils import fast_json, metrics
+from src.utils.lazy_imports import logger
+
+# Clave de una referencia a blob dentro de `context`
+BLOB_KEY = "$blob"
+
+_CACHE_NAME = "audit.blobs"
+# Digests que este proceso sabe guardados (evita reinsertar contenidos repetidos)
+_KNOWN_DIGESTS = 4096
+
+
+class BlobStore:
+    """Guardado y rehidratación de los valores grandes de `context`"""
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        threshold: Optional[int] = None,
+        cache_size: Optional[int] = None
+    ):
+        """
+        Args:
+            storage: Backend donde viven `audit_log` y `audit_blobs`
+            threshold: Bytes mínimos de un texto externalizado (default: AUDIT_BLOB_THRESHOLD)
+            cache_size: Valores rehidratados en caché (default: AUDIT_BLOB_CACHE_SIZE)
+        """
+        self.storage = storage
+        self.threshold = int(os.getenv("AUDIT_BLOB_THRESHOLD", "4096")) if threshold is None else threshold
+        self.cache_size = cache_size or int(os.getenv("AUDIT_BLOB_CACHE_SIZE", "256"))
+        self._lock = threading.Lock()
+        self._known: "OrderedDict[str, None]" = OrderedDict()
+        self._values: "OrderedDict[str, str]" = OrderedDict()
+
+    # --- Escritura -------------------------------------------------------
+
+    def externalize(self, context: Dict[str, Any], context_json: bytes) -> bytes:
+        """
+        `context_json` con los textos grandes reemplazados por referencias
+
+        Guarda antes los blobs nuevos, así la decisión nunca referencia un
+        blob inexistente. `context` no se modifica.
+
+        Args:
+            context: Contexto de la decisión
+            context_json: El mismo contexto ya serializado
+
+        Returns:
+            JSON a guardar en `audit_log.context` (el mismo objeto si nada supera el umbral)
+        """
+        # Ningún valor puede superar el umbral si el contexto entero no lo hace
+        if not self.threshold or len(context_json) <= self.threshold:
+            return context_json
+        blobs: Dict[str, bytes] = {}
+        replaced = self._replace(context, blobs)
+        if not blobs:
+            return context_json
+        self.store(blobs)
+        return fast_json.dumps(replaced)
+
+    def store(self, blobs: Dict[str, bytes]):
+        """Guardar los blobs (digest -> texto UTF-8) que este proceso no sepa ya guardados"""
+        import zlib
+
+        with self._lock:
+            new = [digest for digest in blobs if digest not in self._known]
+        if not new:
+            return
+        rows = []
+        for digest in new:
+            data = blobs[digest]
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                rows.append((digest, BLOB_ZLIB, compressed, len(data)))
+            else:
+                rows.append((digest, BLOB_RAW, data, len(data)))
+        self.storage.insert_blobs(rows, datetime.now())
+        # Conocidos solo cuando el lote que los guarda esté confirmado: hasta
+        # entonces las decisiones siguientes los vuelven a insertar (se ignoran)
+        self.storage.after_commit(lambda: self._remember(new))
+
+    def _remember(self, digests: List[str]):
+        with self._lock:
+            for digest in digests:
+                self._known[digest] = None
+            while len(self._known) > _KNOWN_DIGESTS:
+                self._known.popitem(last=False)
+
+    def forget(self):
+        """Olvidar los digests guardados (p.ej. tras borrar filas de audit_blobs a mano)"""
+        with self._lock:
+            self._known.clear()
+
+    def _replace(self, value: Any, blobs: Dict[str, bytes]) -> Any:
+        """Copia de `value` con los textos grandes como referencias (acumula los blobs)"""
+        if isinstance(value, str):
+            # Un carácter ocupa como mucho 4 bytes en UTF-8: los textos cortos no se codifican
+            if len(value) * 4 <= self.threshold:
+                return value
+            data = value.encode("utf-8")
+            if len(data) <= self.threshold:
+                return value
+            import hashlib
+
+            digest = hashlib.sha256(data).hexdigest()
+            blobs[digest] = data
+            return {BLOB_KEY: digest, "bytes": len(data)}
+        if isinstance(value, dict):
+            return {key: self._replace(item, blobs) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._replace(item, blobs) for item in value]
+        return value
+
+    def reference_filter(self, context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Filtro de `search_decisions` con los textos grandes como referencias (solo el digest)"""
+        if not context or not self.threshold:
+            return context
+        blobs: Dict[str, bytes] = {}
+        replaced = self._replace(context, blobs)
+        if not blobs:
+            return context
+        return _strip_sizes(replaced)
+
+    # --- Lectura ---------------------------------------------------------
+
+    def rehydrate(self, contexts: Iterable[Any]):
+        """
+        Reemplazar en su sitio las referencias de varios contextos por sus valores
+
+        Una sola consulta trae los blobs que no están en caché. Una referencia
+        sin blob (p.ej. borrado a mano) se deja como está.
+        """
+        contexts = [context for context in contexts if isinstance(context, (dict, list))]
+        digests: Set[str] = set()
+        for context in contexts:
+            _collect(context, digests)
+        if not digests:
+            return
+
+        values: Dict[str, str] = {}
+        with self._lock:
+            for digest in digests:
+                value = self._values.get(digest)
+                if value is not None:
+                    self._values.move_to_end(digest)
+                    values[digest] = value
+        if values:
+            metrics.CACHE_HITS.inc(len(values), cache=_CACHE_NAME)
+        missing = [digest for digest in digests if digest not in values]
+        if missing:
+            metrics.CACHE_MISSES.inc(len(missing), cache=_CACHE_NAME)
+            loaded = self._load(missing)
+            values.update(loaded)
+            if len(loaded) < len(missing):
+                logger.warning(f"{len(missing) - len(loaded)} blobs de contexto no encontrados en audit_blobs")
+
+        for context in contexts:
+            _substitute(context, values)
+
+    def _load(self, digests: List[str]) -> Dict[str, str]:
+        """Leer, descomprimir y cachear blobs"""
+        import zlib
+
+        values = {}
+        for digest, encoding, data in self.storage.get_blobs(digests):
+            data = bytes(data)
+            values[digest] = (zlib.decompress(data) if encoding == BLOB_ZLIB else data).decode("utf-8")
+        with self._lock:
+            for digest, value in values.items():
+                self._values[digest] = value
+                self._known[digest] = None
+            while len(self._values) > self.cache_size:
+                self._values.popitem(last=False)
+        return values
+
+    # --- Backfill --------------------------------------------------------
+
+    def backfill(self, batch_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+        """
+        Externalizar los textos grandes de las decisiones existentes
+
+        Recorre `audit_log` por id en lotes de `batch_size` filas; cada lote
+        guarda sus blobs y actualiza sus contextos en una transacción, así
+        se puede interrumpir y repetir (las filas ya convertidas no cambian).
+
+        Args:
+            batch_size: Filas por lote
+            dry_run: Solo calcular lo que se ahorraría
+
+        Returns:
+            Diccionario con scanned, updated, blobs, bytes_before y bytes_after
+        """
+        if not self.threshold:
+            raise ValueError("AUDIT_BLOB_THRESHOLD=0: el almacén de blobs está desactivado")
+        summary = {"scanned": 0, "updated": 0, "blobs": 0, "bytes_before": 0, "bytes_after": 0}
+        seen: Set[str] = set()
+        after_id = 0
+        while True:
+            rows = self.storage.decision_contexts(after_id, self.threshold, batch_size)
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            summary["scanned"] += len(rows)
+
+            blobs: Dict[str, bytes] = {}
+            updates = []
+            for decision_id, context_text in rows:
+                if context_text is None:
+                    continue
+                replaced = self._replace(fast_json.loads(context_text), blobs)
+                context_json = fast_json.dumps(replaced)
+                before = len(context_text.encode("utf-8"))
+                if len(context_json) >= before:
+                    continue
+                updates.append((decision_id, context_json))
+                summary["bytes_before"] += before
+                summary["bytes_after"] += len(context_json)
+
+            summary["updated"] += len(updates)
+            summary["blobs"] += len(blobs.keys() - seen)
+            seen.update(blobs)
+            if updates and not dry_run:
+                self.store(blobs)
+                self.storage.update_decision_contexts(updates)
+            logger.debug(f"Backfill de blobs: id {after_id}, {summary['updated']} decisiones actualizadas")
+        return summary
+
+    def statistics(self) -> Dict[str, int]:
+        """Blobs guardados, bytes almacenados (comprimidos) y bytes originales"""
+        count, stored, original = self.storage.blob_statistics()
+        return {"blobs": count, "stored_bytes": int(stored), "original_bytes": int(original)}
+
+
+def _is_reference(value: Dict[str, Any]) -> bool:
+    return BLOB_KEY in value and isinstance(value[BLOB_KEY], str) and len(value) <= 2
+
+
+def _collect(value: Any, digests: Set[str]):
+    """Digests de las referencias dentro de `value`"""
+    if isinstance(value, dict):
+        if _is_reference(value):
+            digests.add(value[BLOB_KEY])
+            return
+        for item in value.values():
+            _collect(item, digests)
+    elif isinstance(value, list):
+        for item in value:
+            _collect(item, digests)
+
+
+def _substitute(container: Any, values: Dict[str, str]):
+    """Reemplazar en su sitio las referencias hijas de `container` con valor conocido"""
+    items = container.items() if isinstance(container, dict) else enumerate(container)
+    for key, item in list(items):
+        if isinstance(item, dict):
+            if _is_reference(item):
+                value = values.get(item[BLOB_KEY])
+                if value is not None:
+                    container[key] = value
+            else:
+                _substitute(item, values)
+        elif isinstance(item, list):
+            _substitute(item, values)
+
+
+def _strip_sizes(value: Any) -> Any:
+    """Referencias reducidas al digest (`context @>` no depende del tamaño)"""
+    if isinstance(value, dict):
+        if _is_reference(value):
+            return {BLOB_KEY: value[BLOB_KEY]}
+        return {key: _strip_sizes(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_strip_sizes(item) for item in value]
+    return value
+
+
+_blob_stores: Dict[str, BlobStore] = {}
+_blob_stores_lock = threading.Lock()
+
+
+def get_blob_store(storage: Optional[StorageBackend] = None) -> BlobStore:
+    """
+    Obtener el almacén de blobs (compartido por proceso) de un backend
+
+    Args:
+        storage: Backend (default: el de DATABASE_URL)
+    """
+    storage = storage or get_storage()
+    store = _blob_stores.get(storage.url)
+    if store is None:
+        with _blob_stores_lock:
+            store = _blob_stores.get(storage.url)
+            if store is None:
+                store = _blob_stores[storage.url] = BlobStore(storage)
+    return store
+
+
+def _size(num_bytes: int) -> str:
+    return f"{num_bytes / 1e6:.1f} MB" if num_bytes >= 1e6 else f"{num_bytes / 1e3:.1f} KB"
+
+
+def main(argv: Optional[List[str]] = None):
+    """CLI de blobs (`python src/audit/logger.py blobs ...`)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="logger.py blobs", description="Blobs de contexto de auditoría")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser("backfill", help="Externalizar los contextos grandes existentes")
+    backfill_parser.add_argument("--batch-size", type=int, default=500, help="Decisiones por lote")
+    backfill_parser.add_argument("--dry-run", action="store_true", help="Solo calcular el ahorro")
+    commands.add_parser("stats", help="Blobs guardados y tamaño")
+    args = parser.parse_args(argv)
+
+    store = get_blob_store()
+    if args.command == "stats":
+        stats = store.statistics()
+        ratio = stats["original_bytes"] / stats["stored_bytes"] if stats["stored_bytes"] else 0
+        print("\n🧱 Blobs de contexto:\n")
+        print(f"Blobs: {stats['blobs']:,}")
+        print(f"Tamaño original: {_size(stats['original_bytes'])}")
+        print(f"Almacenado: {_size(stats['stored_bytes'])} (x{ratio:.1f})")
+        return
+
+    try:
+        summary = store.backfill(batch_size=args.batch_size, dry_run=args.dry_run)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    saved = summary["bytes_before"] - summary["bytes_after"]
+    verb = "se actualizarían" if args.dry_run else "actualizadas"
+    print(f"\n🧱 {summary['scanned']:,} decisiones revisadas, {summary['updated']:,} {verb}")
+    print(f"  Blobs nuevos: {summary['blobs']:,}")
+    print(f"  context: {_size(summary['bytes_before'])} -> {_size(summary['bytes_after'])} "
+          f"({_size(saved)} menos en audit_log)")
+
+
+if __name__ == "__main__":
+    main()
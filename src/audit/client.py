@@ -0,0 +1,222 @@
+"""
+Cliente de sdd-auditd
+
+Cliente ligero (solo stdlib) para el daemon de auditoría y HITL. Lo usan los
+CLIs `logger.py` y `hitl_checkpoint.py` cuando el daemon está corriendo, de
+modo que cada comando cuesta un round trip por socket Unix en lugar de
+importar dependencias y abrir una conexión nueva a PostgreSQL.
+
+Protocolo: cada mensaje es un frame con longitud de 4 bytes (big-endian)
+seguida de un objeto JSON UTF-8.
+
+    request:  {"id": 1, "op": "audit.get_statistics", "args": [], "kwargs": {}}
+    response: {"id": 1, "ok": true, "result": {...}}
+              {"id": 1, "ok": false, "error": "ValueError: ..."}
+"""
+import os
+import json
+import socket
+import struct
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+
+DEFAULT_SOCKET_PATH = ".local/run/sdd-auditd.sock"
+
+# Tamaño máximo de un frame (protege al daemon de mensajes corruptos)
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+_HEADER = struct.Struct("!I")
+
+
+class AuditdError(Exception):
+    """Error retornado por sdd-auditd o de comunicación con él"""
+
+
+def get_socket_path() -> str:
+    """Ruta del socket Unix del daemon (env SDD_AUDITD_SOCKET)"""
+    return os.getenv("SDD_AUDITD_SOCKET", DEFAULT_SOCKET_PATH)
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    """Codificar un mensaje como frame (longitud + JSON)"""
+    body = json.dumps(message, separators=(",", ":"), default=str).encode("utf-8")
+    if len(body) > MAX_FRAME_SIZE:
+        raise AuditdError(f"Frame demasiado grande: {len(body)} bytes")
+    return _HEADER.pack(len(body)) + body
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            return None
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """
+    Leer un frame del socket
+
+    Returns:
+        Mensaje decodificado, o None si el otro extremo cerró la conexión
+    """
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise AuditdError(f"Frame demasiado grande: {size} bytes")
+    body = _recv_exact(sock, size)
+    if body is None:
+        raise AuditdError("Conexión cerrada a mitad de un frame")
+    return json.loads(body)
+
+
+def send_frame(sock: socket.socket, message: Dict[str, Any]):
+    """Enviar un mensaje como frame"""
+    sock.sendall(encode_frame(message))
+
+
+class AuditdClient:
+    """Cliente persistente y thread-safe de sdd-auditd"""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = None):
+        self.socket_path = socket_path or get_socket_path()
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def connect(self) -> "AuditdClient":
+        """Conectar al daemon (lanza OSError si no está corriendo)"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        return self
+
+    def call(self, op: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Invocar una operación del daemon
+
+        Args:
+            op: Operación ("audit.log_decision", "hitl.approve_checkpoint", "ping", ...)
+            *args, **kwargs: Argumentos de la operación
+
+        Returns:
+            Resultado de la operación
+        """
+        with self._lock:
+            if self._sock is None:
+                self.connect()
+            self._next_id += 1
+            request_id = self._next_id
+            try:
+                send_frame(self._sock, {"id": request_id, "op": op, "args": list(args), "kwargs": kwargs})
+                response = recv_frame(self._sock)
+            except (OSError, ValueError) as e:
+                self.close()
+                raise AuditdError(f"Error de comunicación con sdd-auditd: {e}") from e
+
+            if response is None:
+                self.close()
+                raise AuditdError("sdd-auditd cerró la conexión")
+
+        if not response.get("ok"):
+            raise AuditdError(response.get("error", "Error desconocido"))
+        return response.get("result")
+
+    def close(self):
+        """Cerrar la conexión"""
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+
+# Métodos cuyo session_id por defecto es el SESSION_ID del proceso, con la posición
+# del parámetro: el proxy envía el del llamador para que no se use el del daemon
+SESSION_ARGS = {
+    "audit.log_decision": 7,
+    "audit.start_session": 0,
+    "audit.end_session": 0,
+    "audit.get_session_summary": 0,
+    "audit.rebuild_session_summary": 0,
+    "audit.generate_report": 0,
+    "hitl.create_checkpoint": 6,
+}
+
+
+def with_caller_session(op: str, args: tuple, kwargs: Dict[str, Any]) -> Tuple[tuple, Dict[str, Any]]:
+    """Completar el session_id omitido de `op` con el SESSION_ID de este proceso"""
+    position = SESSION_ARGS.get(op)
+    if position is None:
+        return args, kwargs
+    session_id = os.getenv("SESSION_ID", "unknown")
+    if len(args) > position:
+        if args[position] is None:
+            args = args[:position] + (session_id,) + args[position + 1:]
+    elif kwargs.get("session_id") is None:
+        kwargs = {**kwargs, "session_id": session_id}
+    return args, kwargs
+
+
+class RemoteService:
+    """
+    Proxy de un servicio del daemon con la misma interfaz que el objeto local
+
+    `RemoteService(client, "audit").get_statistics()` equivale a
+    `get_audit_logger().get_statistics()` ejecutado dentro del daemon.
+    """
+
+    def __init__(self, client: AuditdClient, service: str):
+        self._client = client
+        self._service = service
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def remote_call(*args: Any, **kwargs: Any) -> Any:
+            op = f"{self._service}.{method}"
+            args, kwargs = with_caller_session(op, args, kwargs)
+            return self._client.call(op, *args, **kwargs)
+
+        remote_call.__name__ = method
+        return remote_call
+
+
+# Singleton instance
+_auditd_client: Optional[AuditdClient] = None
+
+
+def get_auditd_client() -> Optional[AuditdClient]:
+    """
+    Obtener un cliente conectado si sdd-auditd está corriendo
+
+    Returns:
+        Cliente conectado, o None si el daemon no está disponible
+        o está desactivado con SDD_AUDITD=off
+    """
+    global _auditd_client
+    if os.getenv("SDD_AUDITD", "auto").lower() == "off":
+        return None
+    if _auditd_client is not None:
+        return _auditd_client
+
+    socket_path = get_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        _auditd_client = AuditdClient(socket_path).connect()
+    except OSError:
+        return None
+    return _auditd_client
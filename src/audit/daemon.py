@@ -0,0 +1,251 @@
+"""
+sdd-auditd - Daemon de Auditoría y HITL
+
+Proceso de larga duración que mantiene en memoria un pool de conexiones a
+PostgreSQL (o la conexión SQLite), el `AuditLogger` y el `HITLCheckpointSkill`,
+y atiende peticiones por un socket Unix con el protocolo de frames de `src/audit/client.py`.
+
+Uso:
+    python src/audit/daemon.py [--socket PATH] [--pool-size N] [--no-sweeper] [--metrics-port PORT]
+
+Con el daemon corriendo, `logger.py`, `hitl_checkpoint.py` y los skills de
+`.opencode/skills` le delegan sus operaciones automáticamente.
+"""
+import os
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/audit/daemon.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.audit.client import AuditdError, get_socket_path, recv_frame, send_frame
+from src.audit.sessions import flush_session_trackers
+from src.storage.base import close_storages, get_storage
+from src.utils import db, metrics
+from src.utils.event_bus import get_event_bus
+from src.utils.lazy_imports import logger
+
+
+# Métodos expuestos por servicio (el resto no es invocable remotamente)
+AUDIT_METHODS = frozenset({
+    "log_decision",
+    "get_recent_decisions",
+    "get_decisions_by_session",
+    "search_decisions",
+    "get_statistics",
+    "get_agent_analytics",
+    "generate_report",
+    "start_session",
+    "end_session",
+    "get_session_summary",
+    "list_sessions",
+    "rebuild_session_summary",
+})
+
+HITL_METHODS = frozenset({
+    "create_checkpoint",
+    "wait_for_approval",
+    "approve_checkpoint",
+    "reject_checkpoint",
+    "get_pending_checkpoints",
+    "get_review_queue",
+    "claim_checkpoints",
+    "release_checkpoint",
+    "expire_overdue_checkpoints",
+    "count_pending_by_priority",
+})
+
+# Argumentos que un cliente del socket no puede pasar (nombre, posición): el
+# daemon escribiría en cualquier ruta con sus permisos
+FORBIDDEN_ARGS = {
+    "audit.generate_report": ("output_file", 1),
+}
+
+# Operaciones con series de latencia propias (acota la cardinalidad de `op`)
+_KNOWN_OPS = frozenset(
+    {"ping"} | {f"audit.{m}" for m in AUDIT_METHODS} | {f"hitl.{m}" for m in HITL_METHODS}
+)
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Atiende una conexión: frames de petición/respuesta hasta EOF"""
+
+    def handle(self):
+        daemon: "AuditDaemon" = self.server.auditd
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (OSError, ValueError, AuditdError) as e:
+                logger.warning(f"Conexión descartada: {e}")
+                return
+            if request is None:
+                return
+            try:
+                send_frame(self.request, daemon.dispatch(request))
+            except OSError:
+                return
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class AuditDaemon:
+    """Daemon que sirve AuditLogger y HITLCheckpointSkill por socket Unix"""
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        pool_size: int = 10,
+        sweeper: bool = True,
+        metrics_port: Optional[int] = None
+    ):
+        from src.audit.logger import AuditLogger
+
+        self.socket_path = socket_path or get_socket_path()
+        self.started_at = time.time()
+
+        from src.skills.hitl_checkpoint import HITLCheckpointSkill
+
+        # Pool de conexiones en PostgreSQL; SQLite comparte una conexión por proceso
+        get_storage().enable_pool(max_size=pool_size)
+
+        hitl = HITLCheckpointSkill()
+        self.services: Dict[str, Any] = {"audit": AuditLogger(), "hitl": hitl}
+        self.allowed = {"audit": AUDIT_METHODS, "hitl": HITL_METHODS}
+
+        self.sweeper = hitl.start_sweeper() if sweeper else None
+        # Con HITL_NOTIFICATIONS=events el daemon es miembro del grupo de notificaciones
+        self.dispatcher = hitl.start_notification_dispatcher() if hitl.notify_via_events else None
+        metrics.HITL_PENDING.add_collector(
+            lambda: {(priority,): count for priority, count in hitl.count_pending_by_priority().items()}
+        )
+
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = metrics.start_http_server(metrics_port)
+            host, port = self.metrics_server.server_address[:2]
+            logger.info(f"Métricas Prometheus en http://{host}:{port}/metrics")
+
+        self._server: Optional[_UnixServer] = None
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Ejecutar una petición y construir su respuesta"""
+        request_id = request.get("id")
+        op = request.get("op", "")
+        metrics.QUEUE_DEPTH.inc(queue="auditd")
+        started = time.perf_counter()
+        try:
+            if op == "ping":
+                result: Any = {
+                    "pid": os.getpid(),
+                    "uptime_seconds": time.time() - self.started_at,
+                    "services": sorted(self.services),
+                }
+            else:
+                service_name, _, method = op.partition(".")
+                if method not in self.allowed.get(service_name, ()):
+                    raise AuditdError(f"Operación desconocida: {op}")
+                args, kwargs = request.get("args", []), request.get("kwargs", {})
+                forbidden = FORBIDDEN_ARGS.get(op)
+                if forbidden is not None:
+                    name, position = forbidden
+                    if kwargs.get(name) is not None or (len(args) > position and args[position] is not None):
+                        raise AuditdError(f"{op} no admite {name} vía sdd-auditd")
+                handler = getattr(self.services[service_name], method)
+                result = handler(*args, **kwargs)
+            return {"id": request_id, "ok": True, "result": result}
+        except Exception as e:
+            return {"id": request_id, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            metrics.QUEUE_DEPTH.dec(queue="auditd")
+            if op in _KNOWN_OPS:
+                metrics.AUDITD_REQUEST_LATENCY.observe(time.perf_counter() - started, op=op)
+
+    def _prepare_socket(self):
+        """Crear el directorio del socket y eliminar un socket huérfano"""
+        path = Path(self.socket_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists():
+            return
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+        except OSError:
+            path.unlink()
+        else:
+            raise RuntimeError(f"sdd-auditd ya está corriendo en {path}")
+        finally:
+            probe.close()
+
+    def serve_forever(self):
+        """Atender peticiones hasta `shutdown()`"""
+        self._prepare_socket()
+        self._server = _UnixServer(self.socket_path, _RequestHandler)
+        self._server.auditd = self
+        os.chmod(self.socket_path, 0o660)
+        logger.info(f"sdd-auditd escuchando en {self.socket_path} (servicios: {', '.join(self.services)})")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            if self.sweeper is not None:
+                self.sweeper.stop()
+            if self.dispatcher is not None:
+                self.dispatcher.stop()
+            get_event_bus().flush()
+            flush_session_trackers()
+            db.close_pools()
+            close_storages()
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+            logger.info("sdd-auditd detenido")
+
+    def shutdown(self):
+        """Detener el daemon (seguro desde cualquier hilo)"""
+        if self._server is not None:
+            threading.Thread(target=self._server.shutdown, daemon=True).start()
+
+
+def main():
+    """Punto de entrada de sdd-auditd"""
+    parser = argparse.ArgumentParser(prog="sdd-auditd", description="Daemon de auditoría y HITL")
+    parser.add_argument("--socket", default=None, help=f"Socket Unix (default: {get_socket_path()})")
+    parser.add_argument("--pool-size", type=int, default=int(os.getenv("SDD_AUDITD_POOL_SIZE", "10")),
+                        help="Máximo de conexiones a PostgreSQL")
+    parser.add_argument("--no-sweeper", action="store_true", help="No expirar checkpoints vencidos")
+    parser.add_argument("--metrics-port", type=int,
+                        default=int(os.environ["SDD_METRICS_PORT"]) if os.getenv("SDD_METRICS_PORT") else None,
+                        help="Exponer métricas Prometheus en /metrics (default: SDD_METRICS_PORT, desactivado)")
+    args = parser.parse_args()
+
+    daemon = AuditDaemon(
+        socket_path=args.socket,
+        pool_size=args.pool_size,
+        sweeper=not args.no_sweeper,
+        metrics_port=args.metrics_port
+    )
+
+    def handle_signal(signum, _frame):
+        logger.info(f"Señal {signum} recibida, deteniendo sdd-auditd...")
+        daemon.shutdown()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    daemon.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
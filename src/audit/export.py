@@ -0,0 +1,289 @@
+"""
+Exportación de Auditoría a Parquet
+
+Recorre `audit_log` con un cursor del lado del servidor (`iter_decisions`
+del backend), convierte cada lote en un `RecordBatch` de Arrow y escribe
+Parquet particionado por día y agente (estilo Hive):
+
+    <output>/day=2026-01-21/agent=planner/part-20260121T101500-00000.parquet
+
+`context` se guarda completo en `context_json` y además se aplana en
+columnas tipadas `ctx.<ruta>` (bool, int64, float64, string). El tipo de cada
+columna se fija en el primer lote en que aparece; los valores que no encajan
+(y las listas) quedan solo en `context_json`.
+
+La memoria está acotada: un lote del cursor (`EXPORT_BATCH_SIZE`) más las
+particiones en buffer (`EXPORT_MAX_BUFFER_ROWS`). Las filas llegan ordenadas
+por timestamp, así que cada día se escribe en cuanto termina.
+
+Uso:
+    python src/audit/logger.py export <output_dir> [--since 2026-01-01] [--until 2026-02-01] [--agent NOMBRE]
+
+Con DuckDB:
+    SELECT agent, avg(confidence)
+    FROM read_parquet('<output_dir>/**/*.parquet', hive_partitioning = true, union_by_name = true)
+    GROUP BY agent;
+
+Requiere `pyarrow`.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/audit/export.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.storage.base import StorageBackend, get_storage
+from src.utils import fast_json
+from src.utils.lazy_imports import lazy_module, logger
+
+pa = lazy_module("pyarrow")
+pq = lazy_module("pyarrow.parquet")
+
+# Prefijo de las columnas aplanadas de `context`
+CONTEXT_PREFIX = "ctx."
+
+# Profundidad máxima de aplanado de diccionarios anidados
+MAX_CONTEXT_DEPTH = 3
+
+# Columnas tipadas -> tipo de Arrow (nombre de la fábrica en `pyarrow`)
+_SCALAR_TYPES = {bool: "bool_", int: "int64", float: "float64", str: "string"}
+
+
+def _partition_value(value: str) -> str:
+    """Valor seguro como nombre de directorio de partición"""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", value) or "_"
+
+
+class ContextColumns:
+    """
+    Columnas tipadas de `context` con tipo fijo durante toda la exportación
+
+    El tipo de una clave nueva se decide con todos sus valores del lote en
+    que aparece (int y float mezclados -> float64); a partir de ahí no
+    cambia, así todos los archivos coinciden en el tipo de cada columna.
+    """
+
+    def __init__(self, max_columns: int = 64):
+        self.max_columns = max_columns
+        self.types: Dict[str, type] = {}
+
+    def flatten(self, context: Dict[str, Any], prefix: str = CONTEXT_PREFIX, depth: int = 1) -> Dict[str, Any]:
+        """Valores escalares de `context` por ruta (`ctx.a.b`)"""
+        flat: Dict[str, Any] = {}
+        for key, value in context.items():
+            name = f"{prefix}{key}"
+            if isinstance(value, dict):
+                if depth < MAX_CONTEXT_DEPTH:
+                    flat.update(self.flatten(value, f"{name}.", depth + 1))
+            elif type(value) in _SCALAR_TYPES:
+                flat[name] = value
+        return flat
+
+    def register(self, flat_rows: List[Dict[str, Any]]):
+        """Fijar el tipo de las claves vistas por primera vez en este lote"""
+        kinds: Dict[str, set] = {}
+        first_kind: Dict[str, type] = {}
+        for flat in flat_rows:
+            for name, value in flat.items():
+                if name not in self.types:
+                    kinds.setdefault(name, set()).add(type(value))
+                    first_kind.setdefault(name, type(value))
+        for name in first_kind:
+            if len(self.types) >= self.max_columns:
+                break
+            self.types[name] = float if kinds[name] == {int, float} else first_kind[name]
+
+    def column(self, name: str, flat_rows: List[Dict[str, Any]]):
+        """Array de Arrow de una columna; los valores que no encajan quedan nulos"""
+        column_type = self.types[name]
+        values = []
+        for flat in flat_rows:
+            value = flat.get(name)
+            kind = type(value)
+            values.append(value if kind is column_type or (column_type is float and kind is int) else None)
+        return pa.array(values, getattr(pa, _SCALAR_TYPES[column_type])())
+
+
+class PartitionedParquetWriter:
+    """Buffers por (día, agente) que se vuelcan a archivos Parquet"""
+
+    def __init__(self, output_dir: Path, max_buffer_rows: int, compression: str = "zstd"):
+        self.output_dir = output_dir
+        self.max_buffer_rows = max_buffer_rows
+        self.compression = compression
+        self.run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+        self.buffers: Dict[Tuple[str, str], List[Any]] = {}
+        self.buffered_rows: Dict[Tuple[str, str], int] = {}
+        self.file_seq: Dict[Tuple[str, str], int] = {}
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, key: Tuple[str, str], batch):
+        self.buffers.setdefault(key, []).append(batch)
+        self.buffered_rows[key] = self.buffered_rows.get(key, 0) + batch.num_rows
+        # Memoria acotada: se vuelca la partición más grande
+        while sum(self.buffered_rows.values()) > self.max_buffer_rows:
+            self.flush(max(self.buffered_rows, key=self.buffered_rows.get))
+
+    def flush_before(self, day: str):
+        """Volcar los días ya completos (anteriores a `day`)"""
+        for key in [key for key in self.buffers if key[0] < day]:
+            self.flush(key)
+
+    def flush(self, key: Tuple[str, str]):
+        batches = self.buffers.pop(key)
+        self.buffered_rows.pop(key)
+        table = pa.concat_tables(
+            [pa.Table.from_batches([batch]) for batch in batches], promote_options="default"
+        )
+        day, agent = key
+        directory = self.output_dir / f"day={day}" / f"agent={_partition_value(agent)}"
+        directory.mkdir(parents=True, exist_ok=True)
+        seq = self.file_seq.get(key, 0)
+        self.file_seq[key] = seq + 1
+        path = directory / f"part-{self.run_id}-{seq:05d}.parquet"
+        pq.write_table(table, path, compression=self.compression)
+        self.files += 1
+        self.bytes += path.stat().st_size
+
+    def close(self):
+        for key in list(self.buffers):
+            self.flush(key)
+
+
+def _record_batch(rows: List[Tuple], columns: ContextColumns):
+    """Lote de filas de `iter_decisions` -> (RecordBatch, filas por partición)"""
+    flat_rows = []
+    partitions: Dict[Tuple[str, str], List[int]] = {}
+    for index, row in enumerate(rows):
+        context = fast_json.loads(row[4]) if row[4] else {}
+        flat_rows.append(columns.flatten(context) if isinstance(context, dict) else {})
+        partitions.setdefault((row[7].strftime("%Y-%m-%d"), row[1]), []).append(index)
+
+    arrays = {
+        "id": pa.array([row[0] for row in rows], pa.int64()),
+        "timestamp": pa.array([row[7] for row in rows], pa.timestamp("us")),
+        "agent_name": pa.array([row[1] for row in rows], pa.string()),
+        "action": pa.array([row[2] for row in rows], pa.string()),
+        "decision": pa.array([row[3] for row in rows], pa.string()),
+        "reasoning": pa.array([row[5] for row in rows], pa.string()),
+        "confidence": pa.array([row[6] for row in rows], pa.float64()),
+        "session_id": pa.array([row[8] for row in rows], pa.string()),
+        "user_id": pa.array([row[9] for row in rows], pa.string()),
+        "context_json": pa.array([row[4] for row in rows], pa.string()),
+    }
+    columns.register(flat_rows)
+    present = sorted({name for flat in flat_rows for name in flat if name in columns.types})
+    for name in present:
+        arrays[name] = columns.column(name, flat_rows)
+
+    return pa.RecordBatch.from_pydict(arrays), partitions
+
+
+def export_audit_log(
+    output_dir: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    agent_name: Optional[str] = None,
+    storage: Optional[StorageBackend] = None,
+    batch_size: Optional[int] = None,
+    max_buffer_rows: Optional[int] = None,
+    max_context_columns: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Exportar `audit_log` a Parquet particionado por día y agente
+
+    Args:
+        output_dir: Directorio de salida (se crea si no existe)
+        since: Incluir decisiones desde esta fecha (inclusive)
+        until: Incluir decisiones hasta esta fecha (exclusive)
+        agent_name: Exportar solo un agente
+        storage: Backend de origen (default: DATABASE_URL)
+        batch_size: Filas por viaje del cursor (default: EXPORT_BATCH_SIZE)
+        max_buffer_rows: Filas máximas en buffer (default: EXPORT_MAX_BUFFER_ROWS)
+        max_context_columns: Columnas `ctx.*` máximas (default: EXPORT_MAX_CONTEXT_COLUMNS)
+
+    Returns:
+        Resumen: filas, archivos, particiones, bytes, segundos y columnas de contexto
+    """
+    storage = storage or get_storage()
+    batch_size = batch_size or int(os.getenv("EXPORT_BATCH_SIZE", "50000"))
+    max_buffer_rows = max_buffer_rows or int(os.getenv("EXPORT_MAX_BUFFER_ROWS", "250000"))
+    max_context_columns = max_context_columns or int(os.getenv("EXPORT_MAX_CONTEXT_COLUMNS", "64"))
+
+    started = time.perf_counter()
+    output = Path(output_dir)
+    columns = ContextColumns(max_context_columns)
+    writer = PartitionedParquetWriter(output, max_buffer_rows)
+    partitions = set()
+    total = 0
+
+    for rows in storage.iter_decisions(since, until, agent_name, batch_size):
+        batch, batch_partitions = _record_batch(rows, columns)
+        for key, indices in batch_partitions.items():
+            writer.add(key, batch.take(pa.array(indices, pa.int32())))
+            partitions.add(key)
+        writer.flush_before(rows[-1][7].strftime("%Y-%m-%d"))
+        total += len(rows)
+        logger.debug(f"Exportadas {total} decisiones")
+    writer.close()
+
+    return {
+        "rows": total,
+        "files": writer.files,
+        "partitions": len(partitions),
+        "bytes": writer.bytes,
+        "seconds": time.perf_counter() - started,
+        "context_columns": sorted(columns.types),
+        "output": str(output.resolve()),
+    }
+
+
+def _parse_date(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Fecha inválida: {value} (formato: YYYY-MM-DD[THH:MM])")
+
+
+def main(argv: Optional[List[str]] = None):
+    """CLI de exportación (`python src/audit/logger.py export ...`)"""
+    parser = argparse.ArgumentParser(
+        prog="logger.py export",
+        description="Exportar audit_log a Parquet particionado por día y agente"
+    )
+    parser.add_argument("output_dir", help="Directorio de salida")
+    parser.add_argument("--since", type=_parse_date, help="Desde (inclusive), p.ej. 2026-01-01")
+    parser.add_argument("--until", type=_parse_date, help="Hasta (exclusive), p.ej. 2026-02-01")
+    parser.add_argument("--agent", help="Exportar solo este agente")
+    parser.add_argument("--batch-size", type=int, help="Filas por viaje del cursor")
+    args = parser.parse_args(argv)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("❌ pyarrow no instalado: pip install pyarrow")
+        sys.exit(1)
+
+    summary = export_audit_log(
+        args.output_dir, since=args.since, until=args.until,
+        agent_name=args.agent, batch_size=args.batch_size
+    )
+    rate = summary["rows"] / summary["seconds"] if summary["seconds"] else 0
+    print(f"\n📦 {summary['rows']:,} decisiones exportadas a {summary['output']}")
+    print(f"  Archivos: {summary['files']} en {summary['partitions']} particiones (día, agente)")
+    print(f"  Tamaño: {summary['bytes'] / 1e6:.1f} MB")
+    print(f"  Tiempo: {summary['seconds']:.1f}s ({rate:,.0f} filas/s)")
+    if summary["context_columns"]:
+        print(f"  Columnas de contexto: {', '.join(summary['context_columns'])}")
+
+
+if __name__ == "__main__":
+    main()
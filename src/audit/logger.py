@@ -5,47 +5,193 @@ Registra todas las decisiones de agentes de IA para trazabilidad y compliance.
 Basado en mejores prácticas de: https://www.humanlayer.dev/
 """
 import os
-import json
+import sys
+import numbers
+from collections.abc import Mapping
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from functools import lru_cache
+from typing import Dict, Any, Optional, List, Union, TYPE_CHECKING
 from pathlib import Path
 
-import psycopg
-from loguru import logger as loguru_logger
-from pydantic import BaseModel, Field
+if __package__ in (None, ""):
+    # Ejecución como script: python src/audit/logger.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
+from src.storage.base import StorageBackend, get_storage
+from src.utils import fast_json, metrics, tracing
+from src.utils.lazy_imports import lazy_module, logger as loguru_logger
 
-class AgentDecision(BaseModel):
-    """Modelo de decisión de agente"""
-    agent_name: str = Field(..., description="Nombre del agente")
-    action: str = Field(..., description="Acción realizada")
-    decision: str = Field(..., description="Decisión tomada")
-    context: Dict[str, Any] = Field(default_factory=dict, description="Contexto de la decisión")
-    reasoning: Optional[str] = Field(None, description="Razonamiento detrás de la decisión")
-    confidence: float = Field(default=1.0, ge=0.0, le=1.0, description="Confianza en la decisión")
-    session_id: Optional[str] = Field(None, description="ID de sesión")
-    user_id: Optional[str] = Field(None, description="ID de usuario")
-    timestamp: datetime = Field(default_factory=datetime.now)
+# pydantic, y los módulos que solo usa un AuditLogger ya construido, se
+# importan en el primer uso (arranque rápido del CLI)
+_blobs = lazy_module("src.audit.blobs")
+_segments = lazy_module("src.audit.segments")
+_sessions = lazy_module("src.audit.sessions")
+_event_bus = lazy_module("src.utils.event_bus")
+
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+
+    from src.audit.blobs import BlobStore
+    from src.audit.segments import SegmentWriter
+    from src.audit.sessions import SessionTracker
+    from src.utils.event_bus import EventBus
+
+    class AgentDecision(BaseModel): ...
+
+
+@lru_cache(maxsize=None)
+def _agent_decision_model() -> type:
+    """Construir el modelo `AgentDecision` (importa pydantic al primer uso)"""
+    from pydantic import BaseModel, Field
+
+    class AgentDecision(BaseModel):
+        """Modelo de decisión de agente"""
+        agent_name: str = Field(..., description="Nombre del agente")
+        action: str = Field(..., description="Acción realizada")
+        decision: str = Field(..., description="Decisión tomada")
+        context: Dict[str, Any] = Field(default_factory=dict, description="Contexto de la decisión")
+        reasoning: Optional[str] = Field(None, description="Razonamiento detrás de la decisión")
+        confidence: float = Field(default=1.0, ge=0.0, le=1.0, description="Confianza en la decisión")
+        session_id: Optional[str] = Field(None, description="ID de sesión")
+        user_id: Optional[str] = Field(None, description="ID de usuario")
+        timestamp: datetime = Field(default_factory=datetime.now)
+
+    AgentDecision.__module__ = __name__
+    AgentDecision.__qualname__ = "AgentDecision"
+    return AgentDecision
+
+
+def _coerce_confidence(value: Any) -> float:
+    """
+    `confidence` como float con las reglas de `AgentDecision` (pydantic, modo lax)
+
+    Acepta números reales (incluidos los escalares de NumPy), `Decimal` y
+    textos numéricos como `"0.8"`; NaN y valores fuera de [0, 1] se rechazan.
+    """
+    if isinstance(value, float):
+        number = value
+    elif isinstance(value, (str, bytes)):
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError(f"confidence debe ser numérico, no {value!r}") from None
+    elif isinstance(value, numbers.Real):
+        number = float(value)
+    else:
+        from decimal import Decimal
+
+        if not isinstance(value, Decimal):
+            raise ValueError(f"confidence debe ser numérico, no {type(value).__name__}")
+        number = float(value)
+    # NaN no cumple ninguna de las dos comparaciones
+    if not 0.0 <= number <= 1.0:
+        raise ValueError(f"confidence debe estar entre 0.0 y 1.0 (recibido: {value})")
+    return number
+
+
+class _DecisionRecord:
+    """
+    Decisión validada y lista para escribir
+
+    Es la ruta rápida de `log_decision`: aplica las mismas reglas que
+    `AgentDecision` sin construir el modelo pydantic, y serializa `context`
+    una sola vez a bytes que reutilizan el archivo JSONL y el backend de
+    almacenamiento.
+    """
+    __slots__ = ("agent_name", "action", "decision", "context", "context_json", "reasoning",
+                 "confidence", "timestamp", "session_id", "user_id")
+
+    def __init__(
+        self,
+        agent_name: str,
+        action: str,
+        decision: str,
+        context: Optional[Dict[str, Any]],
+        reasoning: Optional[str],
+        confidence: float,
+        session_id: Optional[str],
+        user_id: Optional[str]
+    ):
+        for field, value in (("agent_name", agent_name), ("action", action), ("decision", decision)):
+            if not isinstance(value, str):
+                raise ValueError(f"{field} debe ser str, no {type(value).__name__}")
+        for field, value in (("reasoning", reasoning), ("session_id", session_id), ("user_id", user_id)):
+            if value is not None and not isinstance(value, str):
+                raise ValueError(f"{field} debe ser str o None, no {type(value).__name__}")
+        if context is None:
+            context = {}
+        elif not isinstance(context, dict):
+            if not isinstance(context, Mapping):
+                raise ValueError(f"context debe ser dict, no {type(context).__name__}")
+            context = dict(context)
+
+        self.agent_name = agent_name
+        self.action = action
+        self.decision = decision
+        self.context = context
+        self.context_json = fast_json.dumps(context)
+        self.reasoning = reasoning
+        self.confidence = _coerce_confidence(confidence)
+        self.timestamp = datetime.now()
+        self.session_id = session_id
+        self.user_id = user_id
+
+    def to_jsonl(self) -> bytes:
+        """Línea JSONL con `context` insertado como bytes ya serializados"""
+        head = fast_json.dumps({
+            "agent_name": self.agent_name,
+            "action": self.action,
+            "decision": self.decision,
+            "reasoning": self.reasoning,
+            "confidence": self.confidence,
+            "timestamp": self.timestamp.isoformat(),
+            "session_id": self.session_id,
+            "user_id": self.user_id,
+        })
+        return head[:-1] + b',"context":' + self.context_json + b"}\n"
+
+
+# Evento del stream `audit` del bus
+DECISION_LOGGED = "decision.logged"
+
+
+def __getattr__(name: str) -> Any:
+    if name == "AgentDecision":
+        return _agent_decision_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class AuditLogger:
     """Logger centralizado para auditoría de decisiones de IA"""
     
     def __init__(self):
-        self.db_url = os.getenv("DATABASE_URL")
         self.audit_enabled = os.getenv("AUDIT_DB_ENABLED", "true").lower() == "true"
         self.file_enabled = os.getenv("AUDIT_FILE_ENABLED", "true").lower() == "true"
         self.log_path = Path(os.getenv("AUDIT_LOG_PATH", ".local/audit/logs"))
         self.session_id = os.getenv("SESSION_ID", "unknown")
         
-        if not self.db_url and self.audit_enabled:
-            raise ValueError("DATABASE_URL no configurada pero AUDIT_DB_ENABLED=true")
+        # Solo con AUDIT_DB_ENABLED: un logger de archivo no abre (ni crea) la base de datos
+        self.storage: Optional[StorageBackend] = None
+        self.sessions: Optional["SessionTracker"] = None
+        self.blobs: Optional["BlobStore"] = None
+        if self.audit_enabled:
+            # PostgreSQL o SQLite según DATABASE_URL (sin ella, SQLite local)
+            self.storage = get_storage()
+            # Contadores por sesión que se suman con cada decisión
+            self.sessions = _sessions.get_session_tracker(self.storage)
+            # Textos grandes de `context` guardados una vez en audit_blobs
+            self.blobs = _blobs.get_blob_store(self.storage)
+        # Evento decision.logged para otros procesos (Redis con REDIS_URL)
+        self.events: "EventBus" = _event_bus.get_event_bus()
         
-        # Crear directorio de logs si no existe
+        self.segments: Optional["SegmentWriter"] = None
         if self.file_enabled:
+            # Crear directorio de logs si no existe
             self.log_path.mkdir(parents=True, exist_ok=True)
+            # Segmento propio del proceso; `compact` lo une al archivo diario
+            self.segments = _segments.SegmentWriter(self.log_path)
         
-        loguru_logger.info(f"Audit Logger inicializado (db={self.audit_enabled}, file={self.file_enabled})")
+        loguru_logger.debug(f"Audit Logger inicializado (db={self.audit_enabled}, file={self.file_enabled})")
     
     def log_decision(
         self,
@@ -55,7 +201,8 @@ class AuditLogger:
         context: Optional[Dict[str, Any]] = None,
         reasoning: Optional[str] = None,
         confidence: float = 1.0,
-        user_id: Optional[str] = None
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None
     ) -> bool:
         """
         Registrar una decisión de agente
@@ -68,91 +215,96 @@ class AuditLogger:
             reasoning: Razonamiento detrás de la decisión
             confidence: Confianza en la decisión (0.0-1.0)
             user_id: ID de usuario (opcional)
+            session_id: ID de sesión (default: SESSION_ID del proceso)
             
         Returns:
             True si se registró correctamente
         """
+        session_id = session_id or self.session_id
+        span = tracing.start_span(
+            "audit.log_decision",
+            attributes={"agent.name": agent_name, "audit.action": action},
+            session_id=session_id
+        )
+        with span:
+            try:
+                # La decisión queda enlazada a la traza que la produjo
+                trace_context = span.context()
+                if trace_context is not None:
+                    context = {**(context or {}), "trace": trace_context}
+                
+                record = _DecisionRecord(
+                    agent_name, action, decision, context, reasoning, confidence, session_id, user_id
+                )
+                
+                # Log a base de datos
+                if self.audit_enabled:
+                    self._log_to_db(record)
+                
+                # Log a archivo
+                if self.file_enabled:
+                    self._log_to_file(record)
+                
+                self._publish(record)
+                loguru_logger.info(f"Decisión registrada: {agent_name} - {action}")
+                return True
+                
+            except Exception as e:
+                span.record_error(e)
+                loguru_logger.error(f"Error registrando decisión: {e}")
+                return False
+    
+    def _log_to_db(self, decision: _DecisionRecord):
+        """Registrar decisión en la base de datos (PostgreSQL o SQLite)"""
         try:
-            decision_obj = AgentDecision(
-                agent_name=agent_name,
-                action=action,
-                decision=decision,
-                context=context or {},
-                reasoning=reasoning,
-                confidence=confidence,
-                session_id=self.session_id,
-                user_id=user_id
-            )
-            
-            # Log a base de datos
-            if self.audit_enabled:
-                self._log_to_db(decision_obj)
-            
-            # Log a archivo
-            if self.file_enabled:
-                self._log_to_file(decision_obj)
-            
-            loguru_logger.info(f"Decisión registrada: {agent_name} - {action}")
-            return True
-            
+            context_json = self.blobs.externalize(decision.context, decision.context_json)
         except Exception as e:
-            loguru_logger.error(f"Error registrando decisión: {e}")
-            return False
-    
-    def _log_to_db(self, decision: AgentDecision):
-        """Registrar decisión en PostgreSQL"""
+            # Sin audit_blobs (p.ej. esquema anterior) la decisión se guarda con el contexto completo
+            loguru_logger.error(f"Error guardando blobs de contexto: {e}")
+            context_json = decision.context_json
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO audit_log (
-                            agent_name,
-                            action,
-                            decision,
-                            context,
-                            reasoning,
-                            confidence,
-                            timestamp,
-                            session_id,
-                            user_id
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        decision.agent_name,
-                        decision.action,
-                        decision.decision,
-                        psycopg.types.json.Jsonb(decision.context),
-                        decision.reasoning,
-                        decision.confidence,
-                        decision.timestamp,
-                        decision.session_id,
-                        decision.user_id
-                    ))
-                    conn.commit()
+            with tracing.start_span("db.audit.insert", category="db"), \
+                    metrics.DB_LATENCY.time(operation="audit.insert"):
+                self.storage.insert_decision(
+                    decision.agent_name,
+                    decision.action,
+                    decision.decision,
+                    context_json,
+                    decision.reasoning,
+                    decision.confidence,
+                    decision.timestamp,
+                    decision.session_id,
+                    decision.user_id
+                )
         except Exception as e:
+            metrics.AUDIT_WRITE_FAILURES.inc(sink="db")
             loguru_logger.error(f"Error escribiendo a DB: {e}")
             raise
+        self.sessions.record_decision(
+            decision.session_id, decision.agent_name, decision.confidence, decision.timestamp
+        )
     
-    def _log_to_file(self, decision: AgentDecision):
-        """Registrar decisión en archivo JSON"""
+    def _log_to_file(self, decision: _DecisionRecord):
+        """Registrar decisión en el segmento JSONL del proceso"""
         try:
-            # Archivo por día
-            log_file = self.log_path / f"audit_{datetime.now().strftime('%Y%m%d')}.jsonl"
-            
-            with open(log_file, "a") as f:
-                f.write(json.dumps({
-                    "agent_name": decision.agent_name,
-                    "action": decision.action,
-                    "decision": decision.decision,
-                    "context": decision.context,
-                    "reasoning": decision.reasoning,
-                    "confidence": decision.confidence,
-                    "timestamp": decision.timestamp.isoformat(),
-                    "session_id": decision.session_id,
-                    "user_id": decision.user_id
-                }) + "\n")
+            # Segmento por proceso y día: sin competir con otros agentes por el archivo diario
+            self.segments.write(decision.to_jsonl(), decision.timestamp)
         except Exception as e:
+            metrics.AUDIT_WRITE_FAILURES.inc(sink="file")
             loguru_logger.error(f"Error escribiendo a archivo: {e}")
     
+    def _publish(self, decision: _DecisionRecord):
+        """Publicar la decisión en el bus (sin `context`: puede ser grande)"""
+        self.events.publish(_event_bus.AUDIT_STREAM, DECISION_LOGGED, {
+            "agent_name": decision.agent_name,
+            "action": decision.action,
+            "decision": decision.decision,
+            "confidence": decision.confidence,
+            "timestamp": decision.timestamp.isoformat(),
+            "session_id": decision.session_id,
+            "user_id": decision.user_id,
+        })
+    
     def get_recent_decisions(
         self,
         limit: int = 20,
@@ -172,44 +324,23 @@ class AuditLogger:
             return []
         
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    if agent_name:
-                        cur.execute("""
-                            SELECT id, agent_name, action, decision, context, 
-                                   reasoning, confidence, timestamp, session_id
-                            FROM audit_log
-                            WHERE agent_name = %s
-                            ORDER BY timestamp DESC
-                            LIMIT %s
-                        """, (agent_name, limit))
-                    else:
-                        cur.execute("""
-                            SELECT id, agent_name, action, decision, context, 
-                                   reasoning, confidence, timestamp, session_id
-                            FROM audit_log
-                            ORDER BY timestamp DESC
-                            LIMIT %s
-                        """, (limit,))
-                    
-                    decisions = []
-                    for row in cur.fetchall():
-                        decisions.append({
-                            "id": row[0],
-                            "agent_name": row[1],
-                            "action": row[2],
-                            "decision": row[3],
-                            "context": row[4],
-                            "reasoning": row[5],
-                            "confidence": row[6],
-                            "timestamp": row[7].isoformat(),
-                            "session_id": row[8]
-                        })
-                    
-                    return decisions
+            rows = self.storage.recent_decisions(limit, agent_name)
+            self.blobs.rehydrate(row[4] for row in rows)
         except Exception as e:
             loguru_logger.error(f"Error obteniendo decisiones: {e}")
             return []
+        
+        return [{
+            "id": row[0],
+            "agent_name": row[1],
+            "action": row[2],
+            "decision": row[3],
+            "context": row[4],
+            "reasoning": row[5],
+            "confidence": row[6],
+            "timestamp": row[7].isoformat(),
+            "session_id": row[8]
+        } for row in rows]
     
     def get_decisions_by_session(self, session_id: str) -> List[Dict[str, Any]]:
         """Obtener todas las decisiones de una sesión"""
@@ -217,33 +348,93 @@ class AuditLogger:
             return []
         
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT id, agent_name, action, decision, context, 
-                               reasoning, confidence, timestamp
-                        FROM audit_log
-                        WHERE session_id = %s
-                        ORDER BY timestamp ASC
-                    """, (session_id,))
-                    
-                    decisions = []
-                    for row in cur.fetchall():
-                        decisions.append({
-                            "id": row[0],
-                            "agent_name": row[1],
-                            "action": row[2],
-                            "decision": row[3],
-                            "context": row[4],
-                            "reasoning": row[5],
-                            "confidence": row[6],
-                            "timestamp": row[7].isoformat()
-                        })
-                    
-                    return decisions
+            rows = self.storage.decisions_by_session(session_id)
+            self.blobs.rehydrate(row[4] for row in rows)
         except Exception as e:
             loguru_logger.error(f"Error obteniendo decisiones por sesión: {e}")
             return []
+        
+        return [{
+            "id": row[0],
+            "agent_name": row[1],
+            "action": row[2],
+            "decision": row[3],
+            "context": row[4],
+            "reasoning": row[5],
+            "confidence": row[6],
+            "timestamp": row[7].isoformat()
+        } for row in rows]
+    
+    def search_decisions(
+        self,
+        query: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None,
+        agent_name: Optional[str] = None,
+        session_id: Optional[str] = None,
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+        page_size: int = 20,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Buscar decisiones por texto y por claves de `context`
+        
+        En PostgreSQL usa la columna generada `search_vector` (índice GIN) y
+        `context @> ...` (índice GIN jsonb_path_ops); en SQLite, FTS5 y las
+        funciones JSON. Los resultados se paginan por keyset.
+        
+        Args:
+            query: Texto a buscar en decision/reasoning ("frase", or, -excluir)
+            context: Pares que `context` debe contener, p.ej. {"file": "src/app.py"}
+            agent_name: Filtrar por agente (opcional)
+            session_id: Filtrar por sesión (opcional)
+            since: Desde (datetime o ISO 8601, inclusive)
+            until: Hasta (datetime o ISO 8601, exclusive)
+            page_size: Decisiones por página
+            cursor: Cursor retornado por la página anterior (None = primera página)
+            
+        Returns:
+            {"decisions": [...], "next_cursor": str | None}; con `query`,
+            ordenadas por relevancia (`rank`), si no por timestamp descendente
+        """
+        if not self.audit_enabled:
+            return {"decisions": [], "next_cursor": None}
+        
+        if isinstance(since, str):
+            since = datetime.fromisoformat(since)
+        if isinstance(until, str):
+            until = datetime.fromisoformat(until)
+        after = _decode_search_cursor(cursor, ranked=bool(query)) if cursor else None
+        
+        try:
+            with metrics.DB_LATENCY.time(operation="audit.search"):
+                rows = self.storage.search_decisions(
+                    query or None, self.blobs.reference_filter(context), agent_name, session_id,
+                    since, until, after, page_size + 1
+                )
+            self.blobs.rehydrate(row[4] for row in rows[:page_size])
+        except Exception as e:
+            loguru_logger.error(f"Error buscando decisiones: {e}")
+            return {"decisions": [], "next_cursor": None}
+        
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        
+        return {
+            "decisions": [{
+                "id": row[0],
+                "agent_name": row[1],
+                "action": row[2],
+                "decision": row[3],
+                "context": row[4],
+                "reasoning": row[5],
+                "confidence": row[6],
+                "timestamp": row[7].isoformat(),
+                "session_id": row[8],
+                "rank": row[9]
+            } for row in rows],
+            "next_cursor": _encode_search_cursor(rows[-1], ranked=bool(query)) if has_more else None
+        }
     
     def get_statistics(self) -> Dict[str, Any]:
         """Obtener estadísticas de auditoría"""
@@ -251,45 +442,129 @@ class AuditLogger:
             return {}
         
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    # Total de decisiones
-                    cur.execute("SELECT COUNT(*) FROM audit_log")
-                    total = cur.fetchone()[0]
-                    
-                    # Decisiones por agente
-                    cur.execute("""
-                        SELECT agent_name, COUNT(*) as count
-                        FROM audit_log
-                        GROUP BY agent_name
-                        ORDER BY count DESC
-                    """)
-                    by_agent = {row[0]: row[1] for row in cur.fetchall()}
-                    
-                    # Decisiones por sesión
-                    cur.execute("""
-                        SELECT session_id, COUNT(*) as count
-                        FROM audit_log
-                        GROUP BY session_id
-                        ORDER BY count DESC
-                        LIMIT 10
-                    """)
-                    by_session = {row[0]: row[1] for row in cur.fetchall()}
-                    
-                    # Confianza promedio
-                    cur.execute("SELECT AVG(confidence) FROM audit_log")
-                    avg_confidence = cur.fetchone()[0] or 0.0
-                    
-                    return {
-                        "total_decisions": total,
-                        "by_agent": by_agent,
-                        "by_session": by_session,
-                        "average_confidence": float(avg_confidence)
-                    }
+            return self.storage.decision_statistics()
         except Exception as e:
             loguru_logger.error(f"Error obteniendo estadísticas: {e}")
             return {}
     
+    def start_session(
+        self,
+        session_id: Optional[str] = None,
+        project_type: Optional[str] = None,
+        repo_url: Optional[str] = None,
+        context_file: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """
+        Registrar una sesión de desarrollo en `dev_sessions`
+        
+        Args:
+            session_id: ID de sesión (default: SESSION_ID del proceso)
+            project_type: greenfield o brownfield (default: env PROJECT_TYPE)
+            repo_url: URL del repositorio (default: env REPO_URL)
+            context_file: Archivo de contexto (default: env CONTEXT_FILE)
+            metadata: Datos adicionales
+            
+        Returns:
+            True si se registró correctamente
+        """
+        if not self.audit_enabled:
+            return False
+        
+        try:
+            self.sessions.start(
+                session_id or self.session_id,
+                project_type or os.getenv("PROJECT_TYPE") or None,
+                repo_url or os.getenv("REPO_URL") or None,
+                context_file or os.getenv("CONTEXT_FILE") or None,
+                metadata
+            )
+            return True
+        except Exception as e:
+            loguru_logger.error(f"Error registrando sesión: {e}")
+            return False
+    
+    def end_session(self, session_id: Optional[str] = None, status: str = "completed") -> bool:
+        """Cerrar una sesión (completed, failed); False si no está registrada"""
+        if not self.audit_enabled:
+            return False
+        
+        try:
+            return self.sessions.end(session_id or self.session_id, status)
+        except Exception as e:
+            loguru_logger.error(f"Error cerrando sesión: {e}")
+            return False
+    
+    def get_session_summary(self, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Resumen precalculado de una sesión (sin recorrer `audit_log`)
+        
+        Returns:
+            Estado, decisiones por agente, confianza, checkpoints y tokens LLM
+            (ver `SessionSummary`), o None si la sesión no existe
+        """
+        if not self.audit_enabled:
+            return None
+        
+        try:
+            summary = self.sessions.summary(session_id or self.session_id)
+        except Exception as e:
+            loguru_logger.error(f"Error obteniendo resumen de sesión: {e}")
+            return None
+        return summary.to_dict() if summary is not None else None
+    
+    def list_sessions(self, status: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Sesiones más recientes (opcionalmente por estado) con sus totales"""
+        if not self.audit_enabled:
+            return []
+        
+        try:
+            return self.sessions.sessions(status, limit)
+        except Exception as e:
+            loguru_logger.error(f"Error listando sesiones: {e}")
+            return []
+    
+    def rebuild_session_summary(self, session_id: Optional[str] = None) -> int:
+        """Recalcular desde `audit_log` el resumen de una sesión (decisiones anteriores al resumen)"""
+        if not self.audit_enabled:
+            return 0
+        return self.sessions.rebuild(session_id or self.session_id)
+    
+    def get_agent_analytics(
+        self,
+        bucket: str = "1h",
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+        window: int = 24,
+        z_threshold: float = 3.0
+    ) -> Dict[str, Any]:
+        """
+        Drift de confianza/ritmo y anomalías por agente (requiere numpy)
+        
+        Args:
+            bucket: Duración de cada ventana de la serie (15m, 1h, 1d)
+            since: Desde (datetime o ISO 8601, opcional)
+            until: Hasta (datetime o ISO 8601, opcional)
+            window: Ventanas de la media móvil y del periodo reciente del drift
+            z_threshold: |z| a partir del cual una ventana es anómala
+            
+        Returns:
+            Métricas por agente y anomalías (ver `src/audit/analytics.py`)
+        """
+        from src.audit.analytics import AgentSeries, compute_agent_analytics, get_agent_analytics, parse_bucket
+        
+        if not self.audit_enabled:
+            # Sin base de datos: sin series, con la misma forma de resultado
+            series = AgentSeries.from_buckets([], parse_bucket(bucket))
+            return compute_agent_analytics(series, window=window, z_threshold=z_threshold)
+        if isinstance(since, str):
+            since = datetime.fromisoformat(since)
+        if isinstance(until, str):
+            until = datetime.fromisoformat(until)
+        return get_agent_analytics(
+            bucket, since, until, storage=self.storage, window=window, z_threshold=z_threshold
+        )
+    
     def generate_report(
         self,
         session_id: Optional[str] = None,
@@ -309,14 +584,26 @@ class AuditLogger:
         decisions = self.get_decisions_by_session(session_id)
         stats = self.get_statistics()
         
+        # Resumen precalculado; sin él (p.ej. audit DB desactivada), desde las decisiones
+        summary = None
+        if self.audit_enabled:
+            try:
+                summary = self.sessions.summary(session_id)
+            except Exception as e:
+                loguru_logger.error(f"Error obteniendo resumen de sesión: {e}")
+        if summary is not None:
+            overview = _sessions.format_summary(summary)
+        else:
+            overview = f"""- **Total de Decisiones**: {len(decisions)}
+- **Confianza Promedio**: {sum(d['confidence'] for d in decisions) / len(decisions) if decisions else 0:.2f}"""
+        
         report = f"""# Reporte de Auditoría
 
 ## Sesión: {session_id}
 **Generado**: {datetime.now().isoformat()}
 
 ## Resumen
-- **Total de Decisiones**: {len(decisions)}
-- **Confianza Promedio**: {sum(d['confidence'] for d in decisions) / len(decisions) if decisions else 0:.2f}
+{overview}
 
 ## Decisiones
 
@@ -338,12 +625,39 @@ class AuditLogger:
         for agent, count in stats.get("by_agent", {}).items():
             report += f"- **{agent}**: {count}\n"
         
+        analytics = self._report_analytics()
+        if analytics:
+            report += f"""
+### Analítica por Agente
+
+{analytics}
+"""
+        
         if output_file:
             with open(output_file, "w") as f:
                 f.write(report)
             loguru_logger.info(f"Reporte guardado en: {output_file}")
         
         return report
+    
+    def _report_analytics(self) -> Optional[str]:
+        """Tabla de drift y anomalías para el reporte (None sin numpy o sin datos)"""
+        if not self.audit_enabled:
+            return None
+        
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            return None
+        
+        try:
+            from src.audit.analytics import format_analytics
+            
+            analytics = self.get_agent_analytics()
+        except Exception as e:
+            loguru_logger.error(f"Error calculando analítica: {e}")
+            return None
+        return format_analytics(analytics) if analytics["agents"] else None
 
 
 # Singleton instance
@@ -359,12 +673,178 @@ def get_audit_logger() -> AuditLogger:
 
 
 # CLI para consultas de auditoría
+def _encode_search_cursor(row: tuple, ranked: bool) -> str:
+    """Codificar la posición (rank o timestamp, id) de un resultado de búsqueda"""
+    return f"{row[9]!r}:{row[0]}" if ranked else f"{row[7].isoformat()}:{row[0]}"
+
+
+def _decode_search_cursor(cursor: str, ranked: bool) -> tuple:
+    """Decodificar un cursor generado por `_encode_search_cursor`"""
+    try:
+        position, decision_id = cursor.rsplit(":", 1)
+        return (float(position) if ranked else datetime.fromisoformat(position)), int(decision_id)
+    except ValueError:
+        raise ValueError(f"Cursor inválido: {cursor}")
+
+
+def _search_cli(logger, argv: List[str]):
+    """`python logger.py search ...`"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="logger.py search", description="Buscar decisiones de auditoría")
+    parser.add_argument("query", nargs="?", help='Texto a buscar ("frase", or, -excluir)')
+    parser.add_argument("--context", help='JSON que context debe contener, p.ej. \'{"file": "src/app.py"}\'')
+    parser.add_argument("--agent", help="Filtrar por agente")
+    parser.add_argument("--session", help="Filtrar por sesión")
+    parser.add_argument("--since", help="Desde (ISO 8601, inclusive)")
+    parser.add_argument("--until", help="Hasta (ISO 8601, exclusive)")
+    parser.add_argument("--limit", type=int, default=20, help="Resultados por página")
+    parser.add_argument("--cursor", help="Cursor de la página siguiente")
+    args = parser.parse_args(argv)
+    
+    if not args.query and not args.context:
+        parser.error("indica un texto a buscar y/o --context")
+    
+    page = logger.search_decisions(
+        query=args.query,
+        context=fast_json.loads(args.context) if args.context else None,
+        agent_name=args.agent,
+        session_id=args.session,
+        since=args.since,
+        until=args.until,
+        page_size=args.limit,
+        cursor=args.cursor
+    )
+    
+    print(f"\n🔎 {len(page['decisions'])} decisiones:\n")
+    for d in page["decisions"]:
+        rank = f" (rank {d['rank']:.3f})" if d["rank"] is not None else ""
+        print(f"[{d['timestamp']}] {d['agent_name']} - {d['action']}{rank}")
+        print(f"  Decisión: {d['decision']}")
+        if d["reasoning"]:
+            print(f"  Razonamiento: {d['reasoning']}")
+        print("-" * 50)
+    if page["next_cursor"]:
+        print(f"\nSiguiente página: --cursor '{page['next_cursor']}'")
+
+
+def _session_cli(logger, argv: List[str]):
+    """`python logger.py session ...`"""
+    if not argv or argv[0] not in ("start", "end", "show", "rebuild"):
+        print("Uso:")
+        print("  python logger.py session start [session_id] [project_type] [repo_url]")
+        print("  python logger.py session end [session_id] [completed|failed]")
+        print("  python logger.py session show [session_id]")
+        print("  python logger.py session rebuild [session_id]   # Recalcular desde audit_log")
+        sys.exit(1)
+    
+    action = argv[0]
+    session_id = argv[1] if len(argv) > 1 else None
+    
+    if action == "start":
+        project_type = argv[2] if len(argv) > 2 else None
+        repo_url = argv[3] if len(argv) > 3 else None
+        if not logger.start_session(session_id, project_type=project_type, repo_url=repo_url):
+            sys.exit(1)
+        print(f"✅ Sesión iniciada: {session_id or os.getenv('SESSION_ID', 'unknown')}")
+    
+    elif action == "end":
+        status = argv[2] if len(argv) > 2 else "completed"
+        if not logger.end_session(session_id, status=status):
+            print(f"❌ La sesión no está registrada: {session_id or os.getenv('SESSION_ID', 'unknown')}")
+            sys.exit(1)
+        print(f"✅ Sesión finalizada ({status})")
+    
+    elif action == "rebuild":
+        agents = logger.rebuild_session_summary(session_id)
+        print(f"✅ Resumen recalculado ({agents} agentes)")
+    
+    else:
+        summary = logger.get_session_summary(session_id)
+        if summary is None:
+            print(f"❌ No hay datos de la sesión {session_id or os.getenv('SESSION_ID', 'unknown')}")
+            sys.exit(1)
+        print(f"\n📊 Sesión {summary['session_id']} ({summary['status'] or 'no registrada'}):\n")
+        print(f"Decisiones: {summary['decisions']} (confianza promedio {summary['average_confidence']:.2f})")
+        if summary["duration_seconds"] is not None:
+            print(f"Duración: {summary['duration_seconds'] / 60:.1f} min")
+        for outcome, count in summary["checkpoints"].items():
+            print(f"Checkpoints {outcome}: {count}")
+        if summary["llm_calls"]:
+            print(f"LLM: {summary['llm_calls']} llamadas, {summary['prompt_tokens']} + "
+                  f"{summary['completion_tokens']} tokens")
+        print("\nDecisiones por agente:")
+        for agent, count in summary["by_agent"].items():
+            print(f"  {agent}: {count}")
+
+
+def _tail_cli(argv: List[str]):
+    """`python logger.py tail ...`: decisiones y checkpoints en vivo desde el bus"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="logger.py tail", description="Seguir decisiones y checkpoints en vivo")
+    parser.add_argument("--agent", help="Solo este agente")
+    parser.add_argument("--session", help="Solo esta sesión")
+    parser.add_argument("--hitl", action="store_true", help="Incluir eventos de checkpoints HITL")
+    parser.add_argument("--from-start", action="store_true", help="Empezar por los eventos que retiene el stream")
+    parser.add_argument("--json", action="store_true", help="Un evento JSON por línea")
+    args = parser.parse_args(argv)
+    
+    events = _event_bus.get_event_bus()
+    if not events.shared:
+        print("❌ tail necesita REDIS_URL: sin Redis los eventos no salen de cada proceso")
+        sys.exit(1)
+    
+    streams = [_event_bus.AUDIT_STREAM, _event_bus.HITL_STREAM] if args.hitl else [_event_bus.AUDIT_STREAM]
+    print(f"👀 Siguiendo {', '.join(streams)} (Ctrl+C para salir)\n", file=sys.stderr)
+    try:
+        for event in events.tail(streams, from_start=args.from_start):
+            data = event.data
+            if args.agent and data.get("agent_name", args.agent) != args.agent:
+                continue
+            if args.session and data.get("session_id") != args.session:
+                continue
+            if args.json:
+                sys.stdout.write(fast_json.dumps(event.to_dict()).decode("utf-8") + "\n")
+            else:
+                print(_format_event(event))
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+def _format_event(event) -> str:
+    """Línea legible de un evento del bus"""
+    data = event.data
+    at = f"[{event.timestamp:%H:%M:%S}]"
+    if event.type == DECISION_LOGGED:
+        return (f"{at} {data['agent_name']} - {data['action']}: {data['decision']} "
+                f"({data['confidence']:.2f}, {data.get('session_id') or '-'})")
+    if event.type == "checkpoint.created":
+        return (f"{at} 🔔 checkpoint {data['checkpoint_id']} {data['checkpoint_name']} "
+                f"({data['agent_name']}, {data['priority']}): {data['status']}")
+    if event.type == "checkpoint.resolved":
+        icon = "✅" if data["status"] == "approved" else "❌"
+        return f"{at} {icon} checkpoint {data['checkpoint_id']} {data['status']} por {data['reviewer']}"
+    if event.type == "checkpoint.expired":
+        return f"{at} ⏱️ {data['count']} checkpoint(s) expirado(s)"
+    return f"{at} {event.stream} {event.type} {data}"
+
+
+def _cli_logger():
+    """Logger para el CLI: vía sdd-auditd si está corriendo, local si no"""
+    from src.audit.client import RemoteService, get_auditd_client
+    
+    client = get_auditd_client()
+    if client is not None:
+        return RemoteService(client, "audit")
+    return get_audit_logger()
+
+
 def main():
     """CLI para consultas de auditoría"""
     import sys
     
-    logger = get_audit_logger()
-    
     if len(sys.argv) < 2:
         print("Uso:")
         print("  python logger.py recent [limit]              # Mostrar decisiones recientes")
@@ -372,11 +852,53 @@ def main():
         print("  python logger.py by-session <session_id>     # Decisiones por sesión")
         print("  python logger.py stats                       # Estadísticas")
         print("  python logger.py report [session_id]         # Generar reporte")
+        print("  python logger.py session start|end|show|rebuild [session_id] [...]  # Ciclo de vida y resumen")
+        print("  python logger.py sessions [status] [limit]   # Sesiones recientes con totales")
+        print("  python logger.py search [texto] [--context JSON] [--agent A] [--session S] [--since F]  # Buscar")
+        print("  python logger.py export <dir> [--since F] [--until F] [--agent A]  # Exportar a Parquet")
+        print("  python logger.py analytics [--bucket 1h] [--window 24] [--json]   # Drift y anomalías por agente")
+        print("  python logger.py tail [--agent A] [--session S] [--hitl] [--json]  # Decisiones en vivo (Redis)")
+        print("  python logger.py compact [YYYYMMDD ...] [--keep] [--stdout]  # Unir segmentos en archivos diarios")
+        print("  python logger.py blobs backfill|stats [--batch-size N] [--dry-run]  # Contextos grandes en audit_blobs")
         sys.exit(1)
     
     command = sys.argv[1]
+    logger = _cli_logger() if command not in ("export", "tail", "compact", "blobs") else None
+    
+    if command == "tail":
+        # Lee el bus de eventos, no la base de datos
+        _tail_cli(sys.argv[2:])
+        return
+    
+    if command == "compact":
+        # Trabaja sobre los archivos de AUDIT_LOG_PATH, sin base de datos
+        from src.audit.segments import main as compact_main
+        
+        compact_main(sys.argv[2:])
+        return
     
-    if command == "recent":
+    if command == "blobs":
+        # Recorre audit_log por lotes directamente en el backend, no vía sdd-auditd
+        from src.audit.blobs import main as blobs_main
+        
+        blobs_main(sys.argv[2:])
+        return
+    
+    if command == "export":
+        # Lee directamente del backend (cursor del servidor), no vía sdd-auditd
+        from src.audit.export import main as export_main
+        
+        export_main(sys.argv[2:])
+    
+    elif command == "analytics":
+        from src.audit.analytics import main as analytics_main
+        
+        analytics_main(sys.argv[2:], logger=logger)
+    
+    elif command == "search":
+        _search_cli(logger, sys.argv[2:])
+    
+    elif command == "recent":
         limit = int(sys.argv[2]) if len(sys.argv) > 2 else 20
         decisions = logger.get_recent_decisions(limit=limit)
         
@@ -408,8 +930,11 @@ def main():
         
         session_id = sys.argv[2]
         decisions = logger.get_decisions_by_session(session_id)
+        summary = logger.get_session_summary(session_id)
         
         print(f"\n📋 Decisiones de sesión {session_id}:\n")
+        if summary is not None:
+            print(f"Total: {summary['decisions']} (confianza promedio {summary['average_confidence']:.2f})\n")
         for d in decisions:
             print(f"[{d['timestamp']}] {d['agent_name']} - {d['action']}")
             print(f"  Decisión: {d['decision']}")
@@ -425,11 +950,29 @@ def main():
         for agent, count in stats['by_agent'].items():
             print(f"  {agent}: {count}")
     
+    elif command == "session":
+        _session_cli(logger, sys.argv[2:])
+    
+    elif command == "sessions":
+        status = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != "all" else None
+        limit = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+        sessions = logger.list_sessions(status=status, limit=limit)
+        
+        print(f"\n🗂️  {len(sessions)} sesiones:\n")
+        for s in sessions:
+            print(f"{s['session_id']:<30} {s['status'] or '-':<10} {s['started_at'] or '-':<28} "
+                  f"{s['decisions']:>6} decisiones  {s['llm_tokens']:>8} tokens")
+    
     elif command == "report":
         session_id = sys.argv[2] if len(sys.argv) > 2 else None
-        output_file = f"audit_report_{session_id or 'current'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+        output_file = os.path.abspath(
+            f"audit_report_{session_id or 'current'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+        )
         
-        report = logger.generate_report(session_id=session_id, output_file=output_file)
+        # El reporte se escribe aquí: vía sdd-auditd solo se recibe el texto
+        report = logger.generate_report(session_id=session_id)
+        with open(output_file, "w") as f:
+            f.write(report)
         print(f"\n✅ Reporte generado: {output_file}")
     
     else:
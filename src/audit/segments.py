@@ -0,0 +1,355 @@
+"""
+Segmentos de Auditoría por Proceso
+
+Cada proceso escribe sus decisiones en su propio segmento dentro de
+`<AUDIT_LOG_PATH>/segments/`, así varios agentes que comparten el directorio
+no compiten por el mismo archivo diario:
+
+    segments/audit_20260121.4242.0.jsonl     # día . pid . secuencia
+
+El segmento se crea con O_EXCL (si el nombre ya existe, por ejemplo por un
+pid reutilizado o de otro contenedor, se prueba la secuencia siguiente) y
+cada línea se escribe con una sola llamada `os.write` en modo O_APPEND, sin
+buffer de usuario: nada queda pendiente al terminar el proceso y una línea
+nunca se mezcla con otra. Se abre un segmento nuevo al cambiar el día, al
+superar `AUDIT_SEGMENT_MAX_MB` o tras un `fork`.
+
+La compactación une los segmentos de un día (y el archivo diario previo, si
+existe) en `audit_YYYYMMDD.jsonl` ordenado por timestamp con un merge k-way
+en streaming (`heapq.merge`): en memoria solo hay una línea por entrada.
+Con más de `AUDIT_COMPACT_FAN_IN` entradas el merge se hace en pasadas
+sobre archivos intermedios para no agotar descriptores. El archivo diario
+se reemplaza de forma atómica y después se borran los segmentos.
+
+Uso:
+    python src/audit/logger.py compact [YYYYMMDD ...] [--keep] [--stdout]
+
+Sin días se compactan todos los anteriores a hoy (los segmentos de hoy
+siguen abiertos); `--stdout` solo imprime el merge (por defecto, el de hoy).
+"""
+import heapq
+import os
+import sys
+import threading
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/audit/segments.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.lazy_imports import logger
+
+# Subdirectorio de AUDIT_LOG_PATH con los segmentos
+SEGMENTS_DIR = "segments"
+
+# Buffer de lectura por entrada del merge
+_READ_BUFFER = 256 * 1024
+
+# Clave del timestamp en cada línea (JSON compacto de fast_json)
+_TIMESTAMP_KEY = b'"timestamp":'
+
+
+def daily_file(log_path: Path, day: str) -> Path:
+    """Archivo diario compactado (`audit_YYYYMMDD.jsonl`)"""
+    return Path(log_path) / f"audit_{day}.jsonl"
+
+
+def list_segments(log_path: Path, day: Optional[str] = None) -> Dict[str, List[Path]]:
+    """
+    Segmentos existentes agrupados por día
+
+    Args:
+        log_path: Directorio de logs (AUDIT_LOG_PATH)
+        day: Solo este día (YYYYMMDD)
+
+    Returns:
+        Diccionario día -> segmentos ordenados por nombre
+    """
+    directory = Path(log_path) / SEGMENTS_DIR
+    pattern = f"audit_{day or '*'}.*.jsonl"
+    by_day: Dict[str, List[Path]] = {}
+    for path in sorted(directory.glob(pattern)):
+        by_day.setdefault(path.name[6:14], []).append(path)
+    return by_day
+
+
+class SegmentWriter:
+    """Escritor del segmento de este proceso (seguro entre hilos)"""
+
+    def __init__(self, log_path: Path, max_bytes: Optional[int] = None):
+        self.directory = Path(log_path) / SEGMENTS_DIR
+        self.max_bytes = max_bytes or int(float(os.getenv("AUDIT_SEGMENT_MAX_MB", "64")) * 1024 * 1024)
+        self.path: Optional[Path] = None
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._pid = 0
+        self._date: Optional[date] = None
+        self._seq = 0
+        self._size = 0
+
+    def write(self, line: bytes, timestamp: datetime):
+        """
+        Añadir una línea JSONL al segmento del día de `timestamp`
+
+        Args:
+            line: Línea completa terminada en salto de línea
+            timestamp: Momento de la decisión (elige el día del segmento)
+        """
+        day = timestamp.date()
+        with self._lock:
+            if (self._fd is None or day != self._date or self._pid != os.getpid()
+                    or self._size >= self.max_bytes):
+                self._open(day)
+            view = memoryview(line)
+            while view:
+                # Una sola llamada salvo disco lleno o señal; el lock mantiene la línea contigua
+                view = view[os.write(self._fd, view):]
+            self._size += len(line)
+
+    def _open(self, day: date):
+        """Crear el siguiente segmento libre para este proceso y día"""
+        pid = os.getpid()
+        if self._fd is not None:
+            # Tras un fork se cierra solo la copia del hijo
+            os.close(self._fd)
+        if self._pid != pid or day != self._date:
+            # Proceso hijo tras fork o día nuevo: la secuencia vuelve a empezar
+            self._seq = 0
+        self._fd = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = day.strftime("%Y%m%d")
+        flags = os.O_WRONLY | os.O_APPEND | os.O_CREAT | os.O_EXCL | getattr(os, "O_CLOEXEC", 0)
+        while True:
+            path = self.directory / f"audit_{stamp}.{pid}.{self._seq}.jsonl"
+            self._seq += 1
+            try:
+                self._fd = os.open(path, flags, 0o644)
+                break
+            except FileExistsError:
+                continue
+        self.path = path
+        self._pid = pid
+        self._date = day
+        self._size = 0
+
+    def close(self):
+        """Cerrar el segmento actual (el siguiente `write` abre otro)"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = None
+            self.path = None
+
+
+def _line_timestamp(line: bytes) -> bytes:
+    """
+    Timestamp ISO de una línea sin deserializarla
+
+    `isoformat()` ordena igual como texto que como fecha (también cuando
+    omite los microsegundos), así que se compara el valor en bytes.
+    """
+    start = line.find(_TIMESTAMP_KEY)
+    if start < 0:
+        return b""
+    start = line.find(b'"', start + len(_TIMESTAMP_KEY)) + 1
+    end = line.find(b'"', start) if start else -1
+    return line[start:end] if end > 0 else b""
+
+
+class _MergeStats:
+    """Contadores de un merge"""
+    __slots__ = ("lines", "torn")
+
+    def __init__(self):
+        self.lines = 0
+        self.torn = 0
+
+
+def _read_lines(path: Path, stats: _MergeStats) -> Iterator[bytes]:
+    """Líneas completas de un archivo; descarta una última línea cortada"""
+    with open(path, "rb", buffering=_READ_BUFFER) as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                # Escritura interrumpida (disco lleno o caída a mitad de línea)
+                stats.torn += 1
+                logger.warning(f"Línea incompleta descartada al final de {path}")
+                continue
+            if line.strip():
+                yield line
+
+
+def _merge_into(paths: List[Path], out: BinaryIO, stats: _MergeStats):
+    """Merge k-way en streaming de archivos ordenados por timestamp"""
+    sources = [_read_lines(path, stats) for path in paths]
+    for line in heapq.merge(*sources, key=_line_timestamp):
+        out.write(line)
+        stats.lines += 1
+
+
+def merge_files(
+    paths: Iterable[Path],
+    out: BinaryIO,
+    fan_in: Optional[int] = None,
+    work_dir: Optional[Path] = None
+) -> Dict[str, int]:
+    """
+    Unir archivos JSONL ordenados en uno solo ordenado por timestamp
+
+    Cada entrada debe estar en orden de escritura (un segmento o un archivo
+    diario ya compactado). Con más de `fan_in` entradas se hacen pasadas
+    intermedias en `work_dir`.
+
+    Args:
+        paths: Archivos de entrada
+        out: Archivo binario de salida
+        fan_in: Máximo de archivos abiertos a la vez (default: AUDIT_COMPACT_FAN_IN)
+        work_dir: Directorio de los archivos intermedios
+
+    Returns:
+        Diccionario con lines, torn (líneas cortadas descartadas) y passes
+    """
+    fan_in = max(2, fan_in or int(os.getenv("AUDIT_COMPACT_FAN_IN", "128")))
+    paths = list(paths)
+    stats = _MergeStats()
+    passes = 1
+    temporary: List[Path] = []
+    try:
+        while len(paths) > fan_in:
+            merged = []
+            for i in range(0, len(paths), fan_in):
+                group = paths[i:i + fan_in]
+                if len(group) == 1:
+                    merged.append(group[0])
+                    continue
+                tmp = Path(work_dir or group[0].parent) / f".merge.{os.getpid()}.{passes}.{i // fan_in}.jsonl"
+                with open(tmp, "wb", buffering=_READ_BUFFER) as f:
+                    _merge_into(group, f, stats)
+                temporary.append(tmp)
+                merged.append(tmp)
+            paths = merged
+            passes += 1
+        # Las líneas cortadas solo aparecen en la primera pasada; las líneas se cuentan en la última
+        stats.lines = 0
+        _merge_into(paths, out, stats)
+    finally:
+        for tmp in temporary:
+            tmp.unlink(missing_ok=True)
+    return {"lines": stats.lines, "torn": stats.torn, "passes": passes}
+
+
+def compact_day(
+    log_path: Path,
+    day: str,
+    keep_segments: bool = False,
+    fan_in: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Compactar los segmentos de un día en `audit_YYYYMMDD.jsonl`
+
+    El archivo diario existente entra al merge, así que compactar dos veces
+    el mismo día no pierde líneas. Se escribe a un temporal que reemplaza
+    al diario de forma atómica; los segmentos se borran al final.
+
+    Args:
+        log_path: Directorio de logs (AUDIT_LOG_PATH)
+        day: Día (YYYYMMDD)
+        keep_segments: No borrar los segmentos compactados
+        fan_in: Máximo de archivos abiertos a la vez
+
+    Returns:
+        Diccionario con day, segments, lines, torn, passes y output
+    """
+    import fcntl
+
+    log_path = Path(log_path)
+    (log_path / SEGMENTS_DIR).mkdir(parents=True, exist_ok=True)
+    with open(log_path / SEGMENTS_DIR / ".compact.lock", "w") as lock:
+        # Una compactación a la vez por directorio
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        segments = list_segments(log_path, day).get(day, [])
+        output = daily_file(log_path, day)
+        summary: Dict[str, Any] = {
+            "day": day, "segments": len(segments), "lines": 0, "torn": 0, "passes": 0, "output": str(output)
+        }
+        if not segments:
+            return summary
+
+        inputs = segments + ([output] if output.exists() else [])
+        tmp = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+        try:
+            with open(tmp, "wb", buffering=_READ_BUFFER) as f:
+                summary.update(merge_files(inputs, f, fan_in=fan_in, work_dir=log_path / SEGMENTS_DIR))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, output)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        if not keep_segments:
+            for path in segments:
+                path.unlink(missing_ok=True)
+    logger.info(f"Día {day} compactado: {summary['segments']} segmentos, {summary['lines']} líneas")
+    return summary
+
+
+def _day(value: str) -> str:
+    """Día YYYYMMDD de la línea de comandos"""
+    # strptime acepta días y meses de un dígito ("2026011")
+    if len(value) != 8 or not value.isdigit():
+        raise ValueError(value)
+    datetime.strptime(value, "%Y%m%d")
+    return value
+
+
+def main(argv: Optional[List[str]] = None):
+    """CLI de compactación (`python src/audit/logger.py compact ...`)"""
+    # argparse solo al usar el CLI: AuditLogger importa este módulo en cada proceso
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="logger.py compact",
+        description="Compactar los segmentos por proceso en archivos diarios ordenados"
+    )
+    parser.add_argument("days", nargs="*", type=_day,
+                        help="Días YYYYMMDD (default: los anteriores a hoy; con --stdout, hoy)")
+    parser.add_argument("--keep", action="store_true", help="No borrar los segmentos compactados")
+    parser.add_argument("--stdout", action="store_true",
+                        help="Imprimir el merge sin escribir archivos")
+    parser.add_argument("--fan-in", type=int, help="Máximo de archivos abiertos a la vez")
+    args = parser.parse_args(argv)
+
+    log_path = Path(os.getenv("AUDIT_LOG_PATH", ".local/audit/logs"))
+    today = datetime.now().strftime("%Y%m%d")
+    by_day = list_segments(log_path)
+    if args.stdout:
+        days = args.days or [today]
+        for day in days:
+            inputs = by_day.get(day, [])
+            if daily_file(log_path, day).exists():
+                inputs = inputs + [daily_file(log_path, day)]
+            merge_files(inputs, sys.stdout.buffer, fan_in=args.fan_in, work_dir=log_path / SEGMENTS_DIR)
+        sys.stdout.buffer.flush()
+        return
+
+    days = args.days or [day for day in sorted(by_day) if day < today]
+    if today in days:
+        print(f"❌ Los segmentos de hoy ({today}) siguen abiertos; usa --stdout para leerlos")
+        sys.exit(1)
+    if not days:
+        print("✅ No hay segmentos pendientes de compactar")
+        return
+
+    for day in days:
+        summary = compact_day(log_path, day, keep_segments=args.keep, fan_in=args.fan_in)
+        print(f"🗜️  {day}: {summary['segments']} segmentos -> {summary['output']} "
+              f"({summary['lines']:,} líneas, {summary['passes']} pasadas)")
+        if summary["torn"]:
+            print(f"  ⚠️  {summary['torn']} líneas incompletas descartadas")
+
+
+if __name__ == "__main__":
+    main()
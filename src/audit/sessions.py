@@ -0,0 +1,447 @@
+"""
+Sesiones de desarrollo - Registro y resumen incremental por sesión
+
+Cada sesión tiene su fila en `dev_sessions` (inicio, fin, estado) y una fila
+de contadores por agente en `session_summaries`: decisiones, suma de
+confianza, checkpoints solicitados/aprobados/rechazados/expirados y llamadas
+y tokens LLM. `AuditLogger`, `HITLCheckpointSkill` y `LLMRouter` suman a
+esos contadores en cada escritura, así que el resumen de una sesión es una
+lectura de pocas filas en lugar de recorrer `audit_log`.
+
+- Los incrementos se acumulan en memoria y se escriben sumando en lote (un
+  UPSERT por sesión y agente) cada `SESSION_FLUSH_SIZE` eventos o tras
+  `SESSION_FLUSH_INTERVAL_MS`; registrar un evento no toca la base de datos
+  ni bloquea filas compartidas entre procesos.
+- Las lecturas del propio proceso incluyen lo aún no escrito.
+- `rebuild` recalcula desde `audit_log` lo que se puede recalcular (p.ej.
+  para decisiones anteriores al resumen o tras una caída antes de escribir).
+
+Configuración:
+    SESSION_TRACKING            Mantener los resúmenes (default: true)
+    SESSION_FLUSH_SIZE          Eventos por escritura en lote (default: 100)
+    SESSION_FLUSH_INTERVAL_MS   Espera máxima antes de escribir (default: 1000)
+
+Uso:
+    sessions = get_session_tracker()
+    sessions.start("sess-1", project_type="greenfield")
+    sessions.summary("sess-1").average_confidence
+    sessions.end("sess-1")
+"""
+import atexit
+import os
+import sys
+import threading
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/audit/sessions.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.storage.base import SESSION_COUNTERS, StorageBackend, get_storage
+from src.utils import metrics
+from src.utils.lazy_imports import logger
+
+# Estados de `dev_sessions.status`
+ACTIVE = "active"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Agente con el que HITL registra los resultados de checkpoints en `audit_log`
+HITL_AGENT = "hitl_system"
+
+_CHECKPOINT_OUTCOMES = ("approved", "rejected", "timeout")
+
+
+class _Counters:
+    """Incrementos pendientes de una (sesión, agente)"""
+    __slots__ = SESSION_COUNTERS + ("first_at", "last_at")
+
+    def __init__(self):
+        for name in SESSION_COUNTERS:
+            setattr(self, name, 0)
+        self.first_at: Optional[datetime] = None
+        self.last_at: Optional[datetime] = None
+
+    def touch(self, timestamp: datetime):
+        if self.first_at is None or timestamp < self.first_at:
+            self.first_at = timestamp
+        if self.last_at is None or timestamp > self.last_at:
+            self.last_at = timestamp
+
+    def merge(self, other: "_Counters"):
+        for name in SESSION_COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        if other.first_at is not None:
+            self.touch(other.first_at)
+            self.touch(other.last_at)
+
+    def values(self) -> Tuple:
+        return tuple(getattr(self, name) for name in SESSION_COUNTERS) + (self.first_at, self.last_at)
+
+
+@dataclass
+class SessionSummary:
+    """Estado y contadores de una sesión"""
+    session_id: str
+    status: Optional[str] = None
+    project_type: Optional[str] = None
+    repo_url: Optional[str] = None
+    started_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+    metadata: Optional[Dict[str, Any]] = None
+    decisions: int = 0
+    confidence_sum: float = 0.0
+    by_agent: Dict[str, int] = field(default_factory=dict)
+    confidence_by_agent: Dict[str, float] = field(default_factory=dict)
+    checkpoints: Dict[str, int] = field(default_factory=dict)
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    first_at: Optional[datetime] = None
+    last_at: Optional[datetime] = None
+
+    @property
+    def average_confidence(self) -> float:
+        return self.confidence_sum / self.decisions if self.decisions else 0.0
+
+    @property
+    def duration_seconds(self) -> Optional[float]:
+        """Desde el inicio (o la primera actividad) hasta el fin (o la última)"""
+        start = self.started_at or self.first_at
+        end = self.ended_at or self.last_at
+        return (end - start).total_seconds() if start and end else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        for key in ("started_at", "ended_at", "first_at", "last_at"):
+            if data[key] is not None:
+                data[key] = data[key].isoformat()
+        data["average_confidence"] = self.average_confidence
+        data["duration_seconds"] = self.duration_seconds
+        return data
+
+
+class SessionTracker:
+    """Registro de sesiones y contadores incrementales por sesión y agente"""
+
+    def __init__(
+        self,
+        storage: Optional[StorageBackend] = None,
+        flush_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        """
+        Inicializar tracker
+
+        Args:
+            storage: Backend de almacenamiento (default: el de DATABASE_URL)
+            flush_size: Eventos acumulados que fuerzan la escritura (default: SESSION_FLUSH_SIZE)
+            flush_interval: Segundos máximos antes de escribir (default: SESSION_FLUSH_INTERVAL_MS)
+        """
+        self.storage = storage or get_storage()
+        self.enabled = os.getenv("SESSION_TRACKING", "true").lower() == "true"
+        self.flush_size = max(1, flush_size or int(os.getenv("SESSION_FLUSH_SIZE", "100")))
+        self.flush_interval = (
+            flush_interval if flush_interval is not None
+            else float(os.getenv("SESSION_FLUSH_INTERVAL_MS", "1000")) / 1000
+        )
+
+        self._lock = threading.Lock()
+        # Serializa escrituras y lecturas: una lectura nunca ve un lote a medio escribir
+        self._flush_lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], _Counters] = {}
+        self._events = 0
+        self._dirty = threading.Event()
+        self._full = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    # --- Ciclo de vida ---------------------------------------------------
+
+    def start(
+        self,
+        session_id: str,
+        project_type: Optional[str] = None,
+        repo_url: Optional[str] = None,
+        context_file: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Registrar una sesión activa
+
+        Si ya existe (p.ej. creada al guardar una especificación) se reactiva
+        y se completan los datos que falten.
+        """
+        with metrics.DB_LATENCY.time(operation="sessions.start"):
+            self.storage.start_session(session_id, project_type, repo_url, context_file, metadata, datetime.now())
+        logger.info(f"Sesión iniciada: {session_id}")
+
+    def end(self, session_id: str, status: str = COMPLETED) -> bool:
+        """
+        Cerrar una sesión (escribe antes sus contadores pendientes)
+
+        Returns:
+            False si la sesión no está registrada
+        """
+        self.flush()
+        with metrics.DB_LATENCY.time(operation="sessions.end"):
+            ended = self.storage.end_session(session_id, status, datetime.now())
+        if ended:
+            logger.info(f"Sesión {session_id} finalizada ({status})")
+        return ended
+
+    # --- Contadores ------------------------------------------------------
+
+    def record_decision(
+        self,
+        session_id: str,
+        agent_name: str,
+        confidence: float,
+        timestamp: Optional[datetime] = None
+    ):
+        """Sumar una decisión registrada en `audit_log`"""
+        if not self.enabled:
+            return
+        with self._lock:
+            counters = self._counters(session_id, agent_name, timestamp)
+            counters.decisions += 1
+            counters.confidence_sum += confidence
+            self._added()
+
+    def record_checkpoint(self, session_id: str, outcome: str, agent_name: str = HITL_AGENT, count: int = 1):
+        """
+        Sumar checkpoints por resultado
+
+        `requested` cuenta las solicitudes del agente que pide revisión; los
+        resultados (`approved`, `rejected`, `timeout`) cuentan también la
+        decisión que HITL registra por cada uno en `audit_log` (confianza 1.0).
+        """
+        if not self.enabled or count <= 0:
+            return
+        with self._lock:
+            counters = self._counters(session_id, agent_name, None)
+            name = f"checkpoints_{outcome}"
+            setattr(counters, name, getattr(counters, name) + count)
+            if outcome in _CHECKPOINT_OUTCOMES:
+                counters.decisions += count
+                counters.confidence_sum += count
+            self._added()
+
+    def record_llm(
+        self,
+        session_id: str,
+        agent_name: str,
+        prompt_tokens: Optional[int],
+        completion_tokens: Optional[int]
+    ):
+        """Sumar una llamada LLM y sus tokens (los que el proveedor reporte)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            counters = self._counters(session_id, agent_name, None)
+            counters.llm_calls += 1
+            counters.prompt_tokens += prompt_tokens or 0
+            counters.completion_tokens += completion_tokens or 0
+            self._added()
+
+    def _counters(self, session_id: str, agent_name: str, timestamp: Optional[datetime]) -> _Counters:
+        key = (session_id, agent_name)
+        counters = self._pending.get(key)
+        if counters is None:
+            counters = self._pending[key] = _Counters()
+        counters.touch(timestamp or datetime.now())
+        return counters
+
+    def _added(self):
+        """Contar un evento; llamado con `_lock` tomado"""
+        self._events += 1
+        if self._events >= self.flush_size:
+            # Escribe el hilo de fondo: quien registra nunca espera a la base de datos
+            self._full.set()
+        if not self._dirty.is_set():
+            self._dirty.set()
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="session-summary-flush", daemon=True
+                )
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            # Esperar el intervalo salvo que antes se complete un lote
+            self._full.wait(self.flush_interval)
+            self._full.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Escribir los contadores pendientes en un lote
+
+        Returns:
+            Filas (sesión, agente) actualizadas
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._events = 0
+                self._dirty.clear()
+            if not pending:
+                return 0
+
+            rows = [key + counters.values() for key, counters in pending.items()]
+            try:
+                with metrics.DB_LATENCY.time(operation="sessions.flush"):
+                    self.storage.add_session_counters(rows)
+            except Exception as e:
+                # Se reintentan en la próxima escritura
+                with self._lock:
+                    for key, counters in pending.items():
+                        current = self._pending.get(key)
+                        if current is None:
+                            self._pending[key] = counters
+                        else:
+                            current.merge(counters)
+                    self._dirty.set()
+                logger.error(f"Error escribiendo resumen de sesiones: {e}")
+                return 0
+            return len(rows)
+
+    # --- Consultas -------------------------------------------------------
+
+    def summary(self, session_id: str) -> Optional[SessionSummary]:
+        """
+        Resumen de una sesión: filas de `session_summaries` + lo pendiente del proceso
+
+        Returns:
+            None si la sesión no está registrada ni tiene actividad
+        """
+        with self._flush_lock, metrics.DB_LATENCY.time(operation="sessions.summary"):
+            session, rows = self.storage.session_summary(session_id)
+            with self._lock:
+                local = [(agent, counters.values()) for (sid, agent), counters in self._pending.items()
+                         if sid == session_id]
+        if session is None and not rows and not local:
+            return None
+
+        summary = SessionSummary(session_id)
+        if session is not None:
+            (_, summary.project_type, summary.repo_url, _, summary.started_at,
+             summary.ended_at, summary.status, summary.metadata) = session
+        for row in rows:
+            self._add_row(summary, row[0], row[1:])
+        for agent, values in local:
+            self._add_row(summary, agent, values)
+        return summary
+
+    @staticmethod
+    def _add_row(summary: SessionSummary, agent_name: str, values: Tuple):
+        counters = dict(zip(SESSION_COUNTERS, values))
+        first_at, last_at = values[-2], values[-1]
+        decisions = int(counters["decisions"])
+        if decisions:
+            summary.by_agent[agent_name] = summary.by_agent.get(agent_name, 0) + decisions
+            summary.confidence_by_agent[agent_name] = (
+                summary.confidence_by_agent.get(agent_name, 0.0) + float(counters["confidence_sum"])
+            )
+        summary.decisions += decisions
+        summary.confidence_sum += float(counters["confidence_sum"])
+        for outcome in ("requested",) + _CHECKPOINT_OUTCOMES:
+            count = int(counters[f"checkpoints_{outcome}"])
+            if count:
+                summary.checkpoints[outcome] = summary.checkpoints.get(outcome, 0) + count
+        summary.llm_calls += int(counters["llm_calls"])
+        summary.prompt_tokens += int(counters["prompt_tokens"])
+        summary.completion_tokens += int(counters["completion_tokens"])
+        if first_at is not None and (summary.first_at is None or first_at < summary.first_at):
+            summary.first_at = first_at
+        if last_at is not None and (summary.last_at is None or last_at > summary.last_at):
+            summary.last_at = last_at
+
+    def sessions(self, status: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Sesiones más recientes con sus totales de decisiones y tokens"""
+        self.flush()
+        with metrics.DB_LATENCY.time(operation="sessions.list"):
+            rows = self.storage.list_sessions(status, limit)
+        return [{
+            "session_id": row[0],
+            "project_type": row[1],
+            "status": row[6],
+            "started_at": row[4].isoformat() if row[4] else None,
+            "ended_at": row[5].isoformat() if row[5] else None,
+            "decisions": int(row[8]),
+            "llm_tokens": int(row[9]),
+        } for row in rows]
+
+    def rebuild(self, session_id: str) -> int:
+        """
+        Recalcular desde `audit_log` los contadores de decisiones y checkpoints resueltos
+
+        Returns:
+            Agentes con decisiones en la sesión
+        """
+        self.flush()
+        with metrics.DB_LATENCY.time(operation="sessions.rebuild"):
+            agents = self.storage.rebuild_session_counters(session_id)
+        logger.info(f"Resumen de la sesión {session_id} recalculado ({agents} agentes)")
+        return agents
+
+
+# Un tracker por backend (los incrementos pendientes son por base de datos)
+_trackers: Dict[str, SessionTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_session_tracker(storage: Optional[StorageBackend] = None) -> SessionTracker:
+    """
+    Obtener el tracker (compartido por proceso) de un backend
+
+    Args:
+        storage: Backend (default: el de DATABASE_URL)
+    """
+    storage = storage or get_storage()
+    tracker = _trackers.get(storage.url)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.get(storage.url)
+            if tracker is None:
+                tracker = _trackers[storage.url] = SessionTracker(storage)
+    return tracker
+
+
+def flush_session_trackers():
+    """Escribir los contadores pendientes de todos los trackers (antes de cerrar pools)"""
+    with _trackers_lock:
+        trackers = list(_trackers.values())
+    for tracker in trackers:
+        tracker.flush()
+
+
+def format_summary(summary: SessionSummary) -> str:
+    """Resumen de sesión en Markdown (reportes y CLI)"""
+    duration = summary.duration_seconds
+    lines = [
+        f"- **Estado**: {summary.status or 'no registrada'}",
+        f"- **Total de Decisiones**: {summary.decisions}",
+        f"- **Confianza Promedio**: {summary.average_confidence:.2f}",
+    ]
+    if duration is not None:
+        lines.append(f"- **Duración**: {duration / 60:.1f} min")
+    if summary.checkpoints:
+        lines.append("- **Checkpoints HITL**: " + ", ".join(
+            f"{outcome} {count}" for outcome, count in summary.checkpoints.items()
+        ))
+    if summary.llm_calls:
+        lines.append(
+            f"- **LLM**: {summary.llm_calls} llamadas, "
+            f"{summary.prompt_tokens} tokens de prompt, {summary.completion_tokens} generados"
+        )
+    if summary.by_agent:
+        lines.append("\n### Decisiones por Agente (sesión)")
+        for agent, count in sorted(summary.by_agent.items(), key=lambda item: -item[1]):
+            confidence = summary.confidence_by_agent[agent] / count
+            lines.append(f"- **{agent}**: {count} (confianza {confidence:.2f})")
+    return "\n".join(lines)
@@ -2,11 +2,52 @@
 Agent Skills Module
 
 Contiene las habilidades (skills) que los agentes pueden usar.
+
+Los atributos se cargan de forma diferida (PEP 562): importar el paquete no
+importa los skills ni sus dependencias hasta que se usa un atributo.
 """
-from .hitl_checkpoint import HITLCheckpointSkill, CheckpointStatus, CheckpointPriority
+import importlib
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .hitl_checkpoint import HITLCheckpointSkill, CheckpointStatus, CheckpointPriority
+    from .hitl_policies import PolicyEngine, PolicyDecision, get_policy_engine
+    from .spec_store import SpecStore, DocumentVersion, get_spec_store
+
+# Atributo público -> submódulo que lo define
+_LAZY_ATTRS = {
+    "HITLCheckpointSkill": ".hitl_checkpoint",
+    "CheckpointStatus": ".hitl_checkpoint",
+    "CheckpointPriority": ".hitl_checkpoint",
+    "PolicyEngine": ".hitl_policies",
+    "PolicyDecision": ".hitl_policies",
+    "get_policy_engine": ".hitl_policies",
+    "SpecStore": ".spec_store",
+    "DocumentVersion": ".spec_store",
+    "get_spec_store": ".spec_store",
+}
 
 __all__ = [
     "HITLCheckpointSkill",
     "CheckpointStatus",
     "CheckpointPriority",
+    "PolicyEngine",
+    "PolicyDecision",
+    "get_policy_engine",
+    "SpecStore",
+    "DocumentVersion",
+    "get_spec_store",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -6,13 +6,31 @@ Basado en: https://www.humanlayer.dev/
 """
 import os
 import sys
-from datetime import datetime
-from typing import Dict, Any, Optional, Literal
+import time
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from functools import lru_cache
+from typing import Dict, Any, Optional, Literal, Tuple, TYPE_CHECKING
 from enum import Enum
 
-import psycopg
-from loguru import logger
-from pydantic import BaseModel, Field
+if __package__ in (None, ""):
+    # Ejecución como script: python src/skills/hitl_checkpoint.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.storage.base import StorageBackend, get_storage
+from src.utils import fast_json, metrics, tracing
+from src.utils.lazy_imports import lazy_module, logger
+from src.skills.hitl_policies import PolicyEngine, get_policy_engine
+
+# Se importan al construir HITLCheckpointSkill (arranque rápido del CLI, que
+# con sdd-auditd corriendo ni siquiera construye el skill)
+_sessions = lazy_module("src.audit.sessions")
+_event_bus = lazy_module("src.utils.event_bus")
+
+if TYPE_CHECKING:
+    from src.audit.sessions import SessionTracker
+    from src.utils.event_bus import Event, EventBus, EventConsumer
 
 
 class CheckpointStatus(str, Enum):
@@ -30,31 +48,87 @@ class CheckpointPriority(str, Enum):
     HIGH = "high"
     CRITICAL = "critical"
 
+    @property
+    def rank(self) -> int:
+        """Rango numérico almacenado en la columna `priority` (mayor = más urgente)"""
+        return _PRIORITY_RANK[self]
+
+    @classmethod
+    def from_rank(cls, rank: int) -> "CheckpointPriority":
+        """Obtener la prioridad a partir de su rango numérico"""
+        return _PRIORITY_BY_RANK.get(rank, cls.MEDIUM)
+
+
+_PRIORITY_RANK = {
+    CheckpointPriority.LOW: 0,
+    CheckpointPriority.MEDIUM: 1,
+    CheckpointPriority.HIGH: 2,
+    CheckpointPriority.CRITICAL: 3,
+}
+_PRIORITY_BY_RANK = {rank: priority for priority, rank in _PRIORITY_RANK.items()}
+
+# Revisor registrado en los checkpoints expirados por el sweeper
+SWEEPER_REVIEWER = "hitl_sweeper"
+
+# Eventos del stream `hitl` del bus
+CHECKPOINT_CREATED = "checkpoint.created"
+CHECKPOINT_RESOLVED = "checkpoint.resolved"
+CHECKPOINTS_EXPIRED = "checkpoint.expired"
+# Grupo de consumidores que envía las notificaciones (HITL_NOTIFICATIONS=events)
+NOTIFICATION_GROUP = "hitl-notifications"
+# Relectura del estado al esperar por eventos aunque no llegue ninguno
+_EVENT_RECHECK_SECONDS = 30.0
+
+
+@lru_cache(maxsize=None)
+def _hitl_checkpoint_model() -> type:
+    """Construir el modelo `HITLCheckpoint` (importa pydantic al primer uso)"""
+    from pydantic import BaseModel, Field
+
+    class HITLCheckpoint(BaseModel):
+        """Modelo de checkpoint HITL"""
+        checkpoint_name: str = Field(..., description="Nombre único del checkpoint")
+        agent_name: str = Field(..., description="Nombre del agente que solicita aprobación")
+        priority: CheckpointPriority = Field(default=CheckpointPriority.MEDIUM)
+        data: Dict[str, Any] = Field(default_factory=dict, description="Datos a revisar")
+        context: Dict[str, Any] = Field(default_factory=dict, description="Contexto adicional")
+        timeout_seconds: Optional[int] = Field(default=None, description="Timeout en segundos")
+        notification_channels: list[str] = Field(default_factory=list, description="Canales de notificación")
 
-class HITLCheckpoint(BaseModel):
-    """Modelo de checkpoint HITL"""
-    checkpoint_name: str = Field(..., description="Nombre único del checkpoint")
-    agent_name: str = Field(..., description="Nombre del agente que solicita aprobación")
-    priority: CheckpointPriority = Field(default=CheckpointPriority.MEDIUM)
-    data: Dict[str, Any] = Field(default_factory=dict, description="Datos a revisar")
-    context: Dict[str, Any] = Field(default_factory=dict, description="Contexto adicional")
-    timeout_seconds: Optional[int] = Field(default=None, description="Timeout en segundos")
-    notification_channels: list[str] = Field(default_factory=list, description="Canales de notificación")
+    HITLCheckpoint.__module__ = __name__
+    HITLCheckpoint.__qualname__ = "HITLCheckpoint"
+    return HITLCheckpoint
+
+
+def __getattr__(name: str) -> Any:
+    if name == "HITLCheckpoint":
+        return _hitl_checkpoint_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class HITLCheckpointSkill:
     """Skill para gestionar checkpoints HITL"""
     
     def __init__(self):
-        self.db_url = os.getenv("DATABASE_URL")
         self.hitl_enabled = os.getenv("HITL_ENABLED", "true").lower() == "true"
         self.hitl_webhook = os.getenv("HITL_WEBHOOK_URL", "")
         self.slack_webhook = os.getenv("HITL_SLACK_WEBHOOK", "")
+        self.auto_approval_enabled = os.getenv("HITL_AUTO_APPROVAL", "false").lower() == "true"
+        self.policy_engine: Optional[PolicyEngine] = get_policy_engine() if self.auto_approval_enabled else None
         
-        if not self.db_url:
-            raise ValueError("DATABASE_URL no configurada")
+        # PostgreSQL o SQLite según DATABASE_URL (sin ella, SQLite local)
+        self.storage: StorageBackend = get_storage()
+        # Checkpoints solicitados y resueltos por sesión
+        self.sessions: "SessionTracker" = _sessions.get_session_tracker(self.storage)
+        # Eventos checkpoint.* para otros procesos (Redis con REDIS_URL)
+        self.events: "EventBus" = _event_bus.get_event_bus()
+        # Webhooks desde el grupo de consumidores del bus en lugar de al crear el checkpoint
+        self.notify_via_events = os.getenv("HITL_NOTIFICATIONS", "inline").lower() == "events"
+        if self.notify_via_events and not self.events.shared:
+            logger.warning("HITL_NOTIFICATIONS=events requiere REDIS_URL: notificaciones inline")
+            self.notify_via_events = False
         
-        logger.info(f"HITL Checkpoint Skill inicializado (enabled={self.hitl_enabled})")
+        logger.debug(f"HITL Checkpoint Skill inicializado (enabled={self.hitl_enabled})")
     
     def create_checkpoint(
         self,
@@ -63,7 +137,8 @@ class HITLCheckpointSkill:
         data: Dict[str, Any],
         priority: CheckpointPriority = CheckpointPriority.MEDIUM,
         context: Optional[Dict[str, Any]] = None,
-        timeout_seconds: Optional[int] = None
+        timeout_seconds: Optional[int] = None,
+        session_id: Optional[str] = None
     ) -> int:
         """
         Crear un nuevo checkpoint HITL
@@ -75,6 +150,8 @@ class HITLCheckpointSkill:
             priority: Prioridad del checkpoint
             context: Contexto adicional
             timeout_seconds: Timeout en segundos
+            session_id: Sesión del agente (default: SESSION_ID; vía sdd-auditd
+                la envía el cliente)
             
         Returns:
             ID del checkpoint creado
@@ -83,40 +160,84 @@ class HITLCheckpointSkill:
             logger.warning("HITL deshabilitado, auto-aprobando checkpoint")
             return -1
         
+        # Acepta también el valor como string (ej: llamadas vía sdd-auditd)
+        priority = CheckpointPriority(priority)
+        created_at = datetime.now()
+        expires_at = created_at + timedelta(seconds=timeout_seconds) if timeout_seconds else None
+        
+        # Políticas de auto-aprobación: el checkpoint se guarda ya resuelto
+        status = CheckpointStatus.PENDING
+        reviewer = comments = reviewed_at = None
+        if self.policy_engine is not None:
+            policy_decision = self.policy_engine.evaluate(agent_name, checkpoint_name, priority.value, data)
+            if policy_decision is not None:
+                status = (CheckpointStatus.APPROVED if policy_decision.effect == "approve"
+                          else CheckpointStatus.REJECTED)
+                reviewer = f"policy:{policy_decision.policy_name}"
+                comments = policy_decision.reason
+                reviewed_at = created_at
+        
+        span = tracing.start_span(
+            "hitl.create_checkpoint",
+            category="db",
+            attributes={"hitl.checkpoint_name": checkpoint_name, "agent.name": agent_name,
+                        "hitl.priority": priority.value},
+            session_id=session_id
+        )
+        trace_context = span.context()
+        session_id = session_id or _session_id(trace_context)
+        # La sesión queda con el checkpoint: resolución y timeout se le imputan
+        stored = {"data": data, "context": context or {}, "session_id": session_id}
+        if trace_context is not None:
+            # Quien resuelva el checkpoint (otro proceso) continúa esta traza
+            stored["trace"] = trace_context
+        
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO hitl_checkpoints (
-                            checkpoint_name,
-                            agent_name,
-                            status,
-                            data,
-                            created_at
-                        ) VALUES (%s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (
+            with span:
+                with metrics.DB_LATENCY.time(operation="hitl.create"):
+                    checkpoint_id = self.storage.insert_checkpoint(
                         checkpoint_name,
                         agent_name,
-                        CheckpointStatus.PENDING.value,
-                        psycopg.types.json.Jsonb({
-                            "data": data,
-                            "context": context or {},
-                            "priority": priority.value,
-                            "timeout_seconds": timeout_seconds
-                        }),
-                        datetime.now()
-                    ))
-                    checkpoint_id = cur.fetchone()[0]
-                    conn.commit()
-                    
-                    logger.info(f"Checkpoint creado: {checkpoint_name} (ID: {checkpoint_id})")
-                    
-                    # Notificar
-                    self._notify_checkpoint(checkpoint_id, checkpoint_name, agent_name, data, priority)
-                    
+                        status.value,
+                        priority.rank,
+                        timeout_seconds,
+                        expires_at,
+                        stored,
+                        created_at,
+                        reviewed_at,
+                        reviewer,
+                        comments
+                    )
+                metrics.HITL_CHECKPOINTS.inc(outcome=status.value)
+                self.sessions.record_checkpoint(session_id, "requested", agent_name=agent_name)
+                span.set_attributes({"hitl.checkpoint_id": checkpoint_id, "hitl.status": status.value})
+                self.events.publish(_event_bus.HITL_STREAM, CHECKPOINT_CREATED, {
+                    "checkpoint_id": checkpoint_id,
+                    "checkpoint_name": checkpoint_name,
+                    "agent_name": agent_name,
+                    "priority": priority.value,
+                    "status": status.value,
+                    "reviewer": reviewer,
+                    "session_id": session_id,
+                    "data": data,
+                    # Solo los del modo events los notifica el dispatcher (el resto ya se notificó)
+                    "notify": self.notify_via_events,
+                })
+                
+                if status != CheckpointStatus.PENDING:
+                    logger.info(f"Checkpoint {checkpoint_name} (ID: {checkpoint_id}) {status.value} por {reviewer}")
+                    self._log_checkpoint_decision(
+                        checkpoint_id, status, reviewer, comments, session_id, trace_context
+                    )
                     return checkpoint_id
-                    
+                
+                logger.info(f"Checkpoint creado: {checkpoint_name} (ID: {checkpoint_id})")
+                
+                # Notificar
+                self._notify_checkpoint(checkpoint_id, checkpoint_name, agent_name, data, priority)
+                
+                return checkpoint_id
+                
         except Exception as e:
             logger.error(f"Error creando checkpoint: {e}")
             raise
@@ -141,27 +262,68 @@ class HITLCheckpointSkill:
         
         logger.info(f"Esperando aprobación del checkpoint {checkpoint_id}...")
         
-        # En producción, esto debería usar un mecanismo de polling o webhooks
-        # Por ahora, simplemente verificamos el estado actual
+        # La espera es tiempo humano en el camino crítico de la sesión
+        with tracing.start_span(
+            "hitl.wait_for_approval",
+            category="human",
+            attributes={"hitl.checkpoint_id": checkpoint_id, "hitl.timeout_seconds": timeout_seconds}
+        ) as span:
+            status = self._wait_for_status(checkpoint_id, timeout_seconds)
+            span.set_attribute("hitl.status", status.value)
+        return status
+    
+    def _wait_for_status(
+        self,
+        checkpoint_id: int,
+        timeout_seconds: Optional[int]
+    ) -> CheckpointStatus:
+        """Leer el estado y, con timeout, esperar su resolución"""
+        # Sin timeout solo se consulta el estado actual. Con timeout el backend
+        # espera la resolución (LISTEN/NOTIFY en PostgreSQL): la aprobación, el
+        # rechazo o el sweeper despiertan al agente. Si el backend consultaría
+        # en bucle (SQLite) y hay bus compartido, despiertan sus eventos.
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT status FROM hitl_checkpoints WHERE id = %s
-                    """, (checkpoint_id,))
-                    result = cur.fetchone()
-                    
-                    if result:
-                        status = CheckpointStatus(result[0])
-                        logger.info(f"Checkpoint {checkpoint_id} status: {status}")
-                        return status
-                    else:
-                        logger.error(f"Checkpoint {checkpoint_id} no encontrado")
-                        return CheckpointStatus.TIMEOUT
-                        
+            if timeout_seconds and self.events.shared and not self.storage.notifies_status:
+                status = self._wait_for_event(checkpoint_id, timeout_seconds)
+            else:
+                status = self.storage.wait_for_status(checkpoint_id, timeout_seconds)
         except Exception as e:
             logger.error(f"Error verificando checkpoint: {e}")
             return CheckpointStatus.TIMEOUT
+        
+        if status is None:
+            logger.error(f"Checkpoint {checkpoint_id} no encontrado")
+            return CheckpointStatus.TIMEOUT
+        
+        status = CheckpointStatus(status)
+        if status == CheckpointStatus.PENDING and timeout_seconds:
+            logger.warning(f"Timeout esperando checkpoint {checkpoint_id}")
+            return CheckpointStatus.TIMEOUT
+        
+        logger.info(f"Checkpoint {checkpoint_id} status: {status}")
+        return status
+    
+    def _wait_for_event(self, checkpoint_id: int, timeout_seconds: float) -> Optional[str]:
+        """Esperar la resolución leyendo el stream `hitl` (una consulta por evento relevante)"""
+        deadline = time.monotonic() + timeout_seconds
+        # La posición se toma antes de leer el estado: una resolución intermedia no se pierde
+        position = self.events.last_id(_event_bus.HITL_STREAM)
+        status = self.storage.wait_for_status(checkpoint_id, None)
+        recheck_at = time.monotonic() + _EVENT_RECHECK_SECONDS
+        while status == CheckpointStatus.PENDING.value:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            events = self.events.read({_event_bus.HITL_STREAM: position}, block=min(deadline, recheck_at) - now)
+            if events:
+                position = events[-1].id
+            # También se relee cada _EVENT_RECHECK_SECONDS por si se perdió un evento
+            if time.monotonic() >= recheck_at or any(
+                e.type == CHECKPOINTS_EXPIRED or e.data.get("checkpoint_id") == checkpoint_id for e in events
+            ):
+                status = self.storage.wait_for_status(checkpoint_id, None)
+                recheck_at = time.monotonic() + _EVENT_RECHECK_SECONDS
+        return status
     
     def approve_checkpoint(
         self,
@@ -218,64 +380,264 @@ class HITLCheckpointSkill:
         reviewer: str,
         comments: Optional[str] = None
     ) -> bool:
-        """Actualizar estado de un checkpoint"""
+        """
+        Actualizar estado de un checkpoint
+        
+        Solo se resuelven checkpoints pendientes, de modo que dos revisores
+        no pueden decidir el mismo checkpoint.
+        """
+        resolve_started_ns = time.time_ns()
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        UPDATE hitl_checkpoints
-                        SET status = %s,
-                            reviewed_at = %s,
-                            reviewer = %s,
-                            comments = %s
-                        WHERE id = %s
-                    """, (
-                        status.value,
-                        datetime.now(),
-                        reviewer,
-                        comments,
-                        checkpoint_id
-                    ))
-                    conn.commit()
-                    
-                    logger.info(f"Checkpoint {checkpoint_id} {status.value} por {reviewer}")
-                    
-                    # Registrar en audit log
-                    self._log_checkpoint_decision(checkpoint_id, status, reviewer, comments)
-                    
-                    return True
-                    
+            with metrics.DB_LATENCY.time(operation="hitl.resolve"):
+                updated = self.storage.resolve_checkpoint(
+                    checkpoint_id, status.value, reviewer, comments, datetime.now()
+                )
         except Exception as e:
             logger.error(f"Error actualizando checkpoint: {e}")
             return False
+        
+        if not updated:
+            logger.warning(f"Checkpoint {checkpoint_id} no existe o ya fue resuelto")
+            return False
+        
+        logger.info(f"Checkpoint {checkpoint_id} {status.value} por {reviewer}")
+        
+        created_at, trace_context, session_id = updated
+        # Checkpoints anteriores sin sesión guardada: la de su traza
+        session_id = session_id or _session_id(trace_context)
+        self.events.publish(_event_bus.HITL_STREAM, CHECKPOINT_RESOLVED, {
+            "checkpoint_id": checkpoint_id,
+            "status": status.value,
+            "reviewer": reviewer,
+            "comments": comments,
+            "session_id": session_id,
+        })
+        if trace_context:
+            self._trace_resolution(
+                checkpoint_id, status, reviewer, created_at, trace_context, resolve_started_ns
+            )
+        
+        # Registrar en audit log
+        self._log_checkpoint_decision(checkpoint_id, status, reviewer, comments, session_id, trace_context)
+        
+        return True
     
-    def get_pending_checkpoints(self) -> list[Dict[str, Any]]:
-        """Obtener todos los checkpoints pendientes"""
+    def get_pending_checkpoints(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        include_data: bool = True
+    ) -> list[Dict[str, Any]]:
+        """
+        Obtener checkpoints pendientes ordenados por prioridad y antigüedad
+        
+        Args:
+            limit: Máximo de checkpoints a retornar (None = todos)
+            offset: Checkpoints a saltar
+            include_data: Si False, no se lee la columna JSONB `data`
+            
+        Returns:
+            Lista de checkpoints pendientes
+        """
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        SELECT id, checkpoint_name, agent_name, data, created_at
-                        FROM hitl_checkpoints
-                        WHERE status = %s
-                        ORDER BY created_at DESC
-                    """, (CheckpointStatus.PENDING.value,))
-                    
-                    checkpoints = []
-                    for row in cur.fetchall():
-                        checkpoints.append({
-                            "id": row[0],
-                            "checkpoint_name": row[1],
-                            "agent_name": row[2],
-                            "data": row[3],
-                            "created_at": row[4].isoformat()
-                        })
-                    
-                    return checkpoints
-                    
+            rows = self.storage.pending_checkpoints(limit, offset, include_data)
         except Exception as e:
             logger.error(f"Error obteniendo checkpoints pendientes: {e}")
             return []
+        
+        return [self._row_to_checkpoint(row, include_data) for row in rows]
+
+    def count_pending_by_priority(self) -> Dict[str, int]:
+        """
+        Contar checkpoints pendientes por prioridad
+
+        Returns:
+            {"low": n, "medium": n, "high": n, "critical": n}
+        """
+        counts = {p.value: 0 for p in CheckpointPriority}
+        try:
+            rows = self.storage.count_pending_by_priority()
+        except Exception as e:
+            logger.error(f"Error contando checkpoints pendientes: {e}")
+            return counts
+
+        for rank, count in rows:
+            counts[CheckpointPriority.from_rank(rank).value] = count
+        return counts
+
+    def get_review_queue(
+        self,
+        page_size: int = 20,
+        cursor: Optional[str] = None,
+        include_data: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Obtener una página de la cola de revisión (paginación por keyset)
+        
+        A diferencia de `offset`, el cursor mantiene el coste constante en
+        páginas profundas porque recorre directamente el índice parcial
+        `hitl_checkpoints_pending_queue_idx`.
+        
+        Args:
+            page_size: Checkpoints por página
+            cursor: Cursor retornado por la página anterior (None = primera página)
+            include_data: Si True, incluye la columna JSONB `data`
+            
+        Returns:
+            {"checkpoints": [...], "next_cursor": str | None}
+        """
+        after = _decode_cursor(cursor) if cursor else None
+        try:
+            with metrics.DB_LATENCY.time(operation="hitl.queue"):
+                rows = self.storage.review_queue(after, page_size + 1, include_data)
+        except Exception as e:
+            logger.error(f"Error obteniendo cola de revisión: {e}")
+            return {"checkpoints": [], "next_cursor": None}
+        
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = _encode_cursor(rows[-1]) if has_more else None
+        
+        return {
+            "checkpoints": [self._row_to_checkpoint(row, include_data) for row in rows],
+            "next_cursor": next_cursor
+        }
+    
+    def claim_checkpoints(
+        self,
+        reviewer: str,
+        limit: int = 1,
+        lease_seconds: int = 900
+    ) -> list[Dict[str, Any]]:
+        """
+        Reclamar los siguientes checkpoints de la cola para un revisor
+        
+        Usa `SELECT ... FOR UPDATE SKIP LOCKED` (`BEGIN IMMEDIATE` en SQLite),
+        por lo que varios revisores pueden trabajar la cola en paralelo sin
+        recibir el mismo checkpoint.
+        Un reclamo expira tras `lease_seconds` si no se resuelve.
+        
+        Args:
+            reviewer: Nombre del revisor
+            limit: Máximo de checkpoints a reclamar
+            lease_seconds: Duración del reclamo en segundos
+            
+        Returns:
+            Checkpoints reclamados (con `data`)
+        """
+        now = datetime.now()
+        try:
+            with metrics.DB_LATENCY.time(operation="hitl.claim"):
+                rows = self.storage.claim_checkpoints(
+                    reviewer, limit, now - timedelta(seconds=lease_seconds), now
+                )
+        except Exception as e:
+            logger.error(f"Error reclamando checkpoints: {e}")
+            return []
+        
+        checkpoints = [self._row_to_checkpoint(row, True) for row in rows]
+        checkpoints.sort(key=lambda cp: (-cp["priority_rank"], cp["created_at"], cp["id"]))
+        logger.info(f"{len(checkpoints)} checkpoint(s) reclamado(s) por {reviewer}")
+        return checkpoints
+    
+    def release_checkpoint(self, checkpoint_id: int, reviewer: str) -> bool:
+        """Liberar un checkpoint reclamado para que otro revisor lo tome"""
+        try:
+            return self.storage.release_checkpoint(checkpoint_id, reviewer)
+        except Exception as e:
+            logger.error(f"Error liberando checkpoint: {e}")
+            return False
+    
+    def expire_overdue_checkpoints(
+        self,
+        batch_size: int = 500,
+        max_batches: int = 20
+    ) -> int:
+        """
+        Expirar checkpoints pendientes cuyo `expires_at` ya pasó
+        
+        Cada lote es una única transacción: marca los checkpoints como
+        `timeout` (vía el índice parcial `hitl_checkpoints_expiry_idx`),
+        los registra en `audit_log` en la sesión que creó cada checkpoint y
+        despierta a `wait_for_approval`.
+        
+        Args:
+            batch_size: Checkpoints expirados por lote
+            max_batches: Máximo de lotes por ejecución (acota el trabajo)
+            
+        Returns:
+            Número de checkpoints expirados
+        """
+        expired: Dict[str, int] = {}
+        try:
+            with metrics.DB_LATENCY.time(operation="hitl.sweep"):
+                expired = self.storage.expire_overdue_checkpoints(
+                    batch_size, max_batches, SWEEPER_REVIEWER, os.getenv("SESSION_ID", "unknown")
+                )
+        except Exception as e:
+            logger.error(f"Error expirando checkpoints: {e}")
+        for session_id, count in expired.items():
+            self.sessions.record_checkpoint(session_id, CheckpointStatus.TIMEOUT.value, count=count)
+        total = sum(expired.values())
+        
+        if total:
+            # El sweeper no conoce los IDs: quien espera relee su checkpoint
+            self.events.publish(_event_bus.HITL_STREAM, CHECKPOINTS_EXPIRED, {"count": total, "reviewer": SWEEPER_REVIEWER})
+            logger.info(f"{total} checkpoint(s) expirado(s) por timeout")
+        return total
+    
+    def start_sweeper(
+        self,
+        interval_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ) -> "CheckpointSweeper":
+        """Iniciar el sweeper de timeouts en un hilo de fondo (daemon)"""
+        sweeper = CheckpointSweeper(self, interval_seconds, batch_size)
+        sweeper.start()
+        return sweeper
+    
+    def start_notification_dispatcher(self, consumer: Optional[str] = None) -> "EventConsumer":
+        """
+        Enviar las notificaciones de checkpoints nuevos desde el bus
+        
+        Los dispatchers de todos los procesos forman el grupo
+        `NOTIFICATION_GROUP`: cada checkpoint se notifica una sola vez, y si
+        un dispatcher cae otro reclama sus eventos sin confirmar.
+        
+        Args:
+            consumer: Nombre del miembro del grupo (default: host:pid)
+        """
+        return self.events.consume(_event_bus.HITL_STREAM, NOTIFICATION_GROUP, self._dispatch_notification, consumer)
+    
+    def _dispatch_notification(self, event: "Event"):
+        """Handler del grupo de notificaciones"""
+        data = event.data
+        if event.type != CHECKPOINT_CREATED or not data.get("notify") or data["status"] != CheckpointStatus.PENDING.value:
+            return
+        message = self._notification_message(
+            data["checkpoint_id"], data["checkpoint_name"], data["agent_name"],
+            data.get("data"), CheckpointPriority(data["priority"])
+        )
+        self._send_notifications(message)
+    
+    @staticmethod
+    def _row_to_checkpoint(row: Tuple, include_data: bool) -> Dict[str, Any]:
+        """Convertir una fila de `QUEUE_COLUMNS` (+ data) en diccionario"""
+        checkpoint = {
+            "id": row[0],
+            "checkpoint_name": row[1],
+            "agent_name": row[2],
+            "priority": CheckpointPriority.from_rank(row[3]).value,
+            "priority_rank": row[3],
+            "timeout_seconds": row[4],
+            "expires_at": row[5].isoformat() if row[5] else None,
+            "created_at": row[6].isoformat(),
+            "claimed_by": row[7],
+            "claimed_at": row[8].isoformat() if row[8] else None,
+        }
+        if include_data:
+            checkpoint["data"] = row[9]
+        return checkpoint
     
     def _notify_checkpoint(
         self,
@@ -286,7 +648,23 @@ class HITLCheckpointSkill:
         priority: CheckpointPriority
     ):
         """Notificar creación de checkpoint"""
-        message = f"""
+        message = self._notification_message(checkpoint_id, checkpoint_name, agent_name, data, priority)
+        logger.info(message)
+        
+        # Con HITL_NOTIFICATIONS=events los webhooks los envía el dispatcher del bus
+        if not self.notify_via_events:
+            self._send_notifications(message)
+    
+    @staticmethod
+    def _notification_message(
+        checkpoint_id: int,
+        checkpoint_name: str,
+        agent_name: str,
+        data: Dict[str, Any],
+        priority: CheckpointPriority
+    ) -> str:
+        """Mensaje de un checkpoint nuevo para consola, Slack, etc."""
+        return f"""
 🔔 Nuevo Checkpoint HITL
 
 **ID**: {checkpoint_id}
@@ -302,10 +680,10 @@ class HITLCheckpointSkill:
 Para aprobar: `python src/skills/hitl_checkpoint.py approve {checkpoint_id} <reviewer>`
 Para rechazar: `python src/skills/hitl_checkpoint.py reject {checkpoint_id} <reviewer> "<comentarios>"`
 """
-        
-        logger.info(message)
-        
-        # Aquí se pueden agregar notificaciones a Slack, email, etc.
+    
+    def _send_notifications(self, message: str):
+        """Enviar un mensaje a los canales configurados"""
+        # Aquí se pueden agregar notificaciones a email, etc.
         if self.slack_webhook:
             self._send_slack_notification(message)
     
@@ -317,63 +695,155 @@ Para rechazar: `python src/skills/hitl_checkpoint.py reject {checkpoint_id} <rev
         except Exception as e:
             logger.warning(f"Error enviando notificación a Slack: {e}")
     
+    @staticmethod
+    def _trace_resolution(
+        checkpoint_id: int,
+        status: CheckpointStatus,
+        reviewer: str,
+        created_at: datetime,
+        trace_context: Dict[str, str],
+        resolve_started_ns: int
+    ):
+        """
+        Continuar la traza del agente que creó el checkpoint
+
+        Emite `hitl.human_review` (desde la creación hasta la decisión, tiempo
+        humano) y `hitl.resolve` (la escritura de la decisión) en la traza
+        guardada con el checkpoint, aunque se resuelva desde otro proceso.
+        """
+        attributes = {"hitl.checkpoint_id": checkpoint_id, "hitl.status": status.value, "hitl.reviewer": reviewer}
+        review = tracing.start_span(
+            "hitl.human_review",
+            category="human",
+            attributes=attributes,
+            # Raíz dentro de la traza: la espera no cuelga del span de creación, ya cerrado
+            parent={"trace_id": trace_context["trace_id"], "session_id": trace_context.get("session_id")},
+            start_ns=int(created_at.timestamp() * 1e9)
+        )
+        review.end(resolve_started_ns)
+        resolve = tracing.start_span(
+            "hitl.resolve",
+            category="db",
+            attributes=attributes,
+            parent={"trace_id": trace_context["trace_id"], "span_id": review.span_id,
+                    "session_id": trace_context.get("session_id")},
+            start_ns=resolve_started_ns
+        )
+        resolve.end()
+    
     def _log_checkpoint_decision(
         self,
         checkpoint_id: int,
         status: CheckpointStatus,
         reviewer: str,
-        comments: Optional[str]
+        comments: Optional[str],
+        session_id: str,
+        trace_context: Optional[Dict[str, str]] = None
     ):
-        """Registrar decisión en audit log"""
+        """Registrar decisión en audit log (en la sesión que creó el checkpoint)"""
+        context = {"checkpoint_id": checkpoint_id, "reviewer": reviewer, "comments": comments}
+        if trace_context:
+            context["trace"] = trace_context
         try:
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO audit_log (
-                            agent_name,
-                            action,
-                            decision,
-                            context,
-                            reasoning,
-                            confidence,
-                            session_id
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        "hitl_system",
-                        f"checkpoint_{status.value}",
-                        f"Checkpoint {checkpoint_id} {status.value}",
-                        psycopg.types.json.Jsonb({
-                            "checkpoint_id": checkpoint_id,
-                            "reviewer": reviewer,
-                            "comments": comments
-                        }),
-                        comments or f"Checkpoint {status.value} por {reviewer}",
-                        1.0,
-                        os.getenv("SESSION_ID", "unknown")
-                    ))
-                    conn.commit()
+            self.storage.insert_decision(
+                "hitl_system",
+                f"checkpoint_{status.value}",
+                f"Checkpoint {checkpoint_id} {status.value}",
+                fast_json.dumps(context),
+                comments or f"Checkpoint {status.value} por {reviewer}",
+                1.0,
+                datetime.now(),
+                session_id,
+                None
+            )
         except Exception as e:
             logger.error(f"Error registrando en audit log: {e}")
+            return
+        self.sessions.record_checkpoint(session_id, status.value)
+
+
+class CheckpointSweeper(threading.Thread):
+    """Hilo que expira periódicamente los checkpoints vencidos"""
+    
+    def __init__(
+        self,
+        skill: HITLCheckpointSkill,
+        interval_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None
+    ):
+        super().__init__(name="hitl-checkpoint-sweeper", daemon=True)
+        self.skill = skill
+        self.interval_seconds = interval_seconds or float(os.getenv("HITL_SWEEP_INTERVAL", "30"))
+        self.batch_size = batch_size or int(os.getenv("HITL_SWEEP_BATCH_SIZE", "500"))
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        logger.info(f"Sweeper de checkpoints iniciado (interval={self.interval_seconds}s)")
+        while not self._stop_event.is_set():
+            self.skill.expire_overdue_checkpoints(batch_size=self.batch_size)
+            self._stop_event.wait(self.interval_seconds)
+        logger.info("Sweeper de checkpoints detenido")
+    
+    def stop(self, timeout: Optional[float] = None):
+        """Detener el sweeper y esperar a que termine el lote en curso"""
+        self._stop_event.set()
+        self.join(timeout)
+
+
+def _session_id(trace_context: Optional[Dict[str, str]]) -> str:
+    """Sesión de un checkpoint: la de su traza o SESSION_ID del proceso"""
+    return (trace_context or {}).get("session_id") or os.getenv("SESSION_ID", "unknown")
+
+
+def _encode_cursor(row: Tuple) -> str:
+    """Codificar la posición (priority, created_at, id) de una fila de la cola"""
+    return f"{row[3]}:{row[6].isoformat()}:{row[0]}"
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, datetime, int]:
+    """Decodificar un cursor generado por `_encode_cursor`"""
+    try:
+        rank, rest = cursor.split(":", 1)
+        created_at, checkpoint_id = rest.rsplit(":", 1)
+        return int(rank), datetime.fromisoformat(created_at), int(checkpoint_id)
+    except ValueError:
+        raise ValueError(f"Cursor inválido: {cursor}")
 
 
 # CLI para gestión manual de checkpoints
+def _cli_skill():
+    """Skill para el CLI: vía sdd-auditd si está corriendo, local si no"""
+    from src.audit.client import RemoteService, get_auditd_client
+    
+    client = get_auditd_client()
+    if client is not None:
+        return RemoteService(client, "hitl")
+    return HITLCheckpointSkill()
+
+
 def main():
     """CLI para gestión de checkpoints"""
     import sys
     
-    skill = HITLCheckpointSkill()
+    skill = _cli_skill()
     
     if len(sys.argv) < 2:
         print("Uso:")
-        print("  python hitl_checkpoint.py list                          # Listar pendientes")
+        print("  python hitl_checkpoint.py list [page_size] [cursor]     # Listar pendientes por prioridad")
+        print("  python hitl_checkpoint.py claim <reviewer> [n]          # Reclamar siguientes de la cola")
         print("  python hitl_checkpoint.py approve <id> <reviewer>       # Aprobar")
         print("  python hitl_checkpoint.py reject <id> <reviewer> <msg>  # Rechazar")
+        print("  python hitl_checkpoint.py sweep [--daemon] [interval]   # Expirar checkpoints vencidos")
+        print("  python hitl_checkpoint.py dispatch [consumer]           # Enviar notificaciones desde el bus")
         sys.exit(1)
     
     command = sys.argv[1]
     
     if command == "list":
-        checkpoints = skill.get_pending_checkpoints()
+        page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        cursor = sys.argv[3] if len(sys.argv) > 3 else None
+        page = skill.get_review_queue(page_size=page_size, cursor=cursor, include_data=True)
+        checkpoints = page["checkpoints"]
         if not checkpoints:
             print("No hay checkpoints pendientes")
         else:
@@ -382,7 +852,29 @@ def main():
                 print(f"ID: {cp['id']}")
                 print(f"Nombre: {cp['checkpoint_name']}")
                 print(f"Agente: {cp['agent_name']}")
+                print(f"Prioridad: {cp['priority']}")
                 print(f"Creado: {cp['created_at']}")
+                if cp['claimed_by']:
+                    print(f"Reclamado por: {cp['claimed_by']}")
+                print(f"Datos: {cp['data']}")
+                print("-" * 50)
+            if page["next_cursor"]:
+                print(f"Siguiente página: python hitl_checkpoint.py list {page_size} {page['next_cursor']}")
+    
+    elif command == "claim":
+        if len(sys.argv) < 3:
+            print("Uso: python hitl_checkpoint.py claim <reviewer> [n]")
+            sys.exit(1)
+        
+        reviewer = sys.argv[2]
+        limit = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+        checkpoints = skill.claim_checkpoints(reviewer, limit=limit)
+        if not checkpoints:
+            print("No hay checkpoints disponibles en la cola")
+        else:
+            print(f"\n🔒 {len(checkpoints)} checkpoint(s) reclamado(s) por {reviewer}:\n")
+            for cp in checkpoints:
+                print(f"ID: {cp['id']} [{cp['priority']}] {cp['checkpoint_name']} ({cp['agent_name']})")
                 print(f"Datos: {cp['data']}")
                 print("-" * 50)
     
@@ -413,6 +905,38 @@ def main():
         else:
             print(f"❌ Error rechazando checkpoint {checkpoint_id}")
     
+    elif command == "sweep":
+        args = sys.argv[2:]
+        daemon = "--daemon" in args
+        args = [a for a in args if a != "--daemon"]
+        interval = float(args[0]) if args else None
+        
+        if not daemon:
+            expired = skill.expire_overdue_checkpoints()
+            print(f"⏱️ {expired} checkpoint(s) expirado(s)")
+        else:
+            # El hilo corre en este proceso: siempre local, aunque sdd-auditd esté
+            # corriendo (puede hacerlo sin sweeper; dos sweepers no se pisan)
+            sweeper = HITLCheckpointSkill().start_sweeper(interval_seconds=interval)
+            try:
+                while sweeper.is_alive():
+                    sweeper.join(1)
+            except KeyboardInterrupt:
+                sweeper.stop()
+    
+    elif command == "dispatch":
+        # Consume el bus de este proceso: siempre local, nunca vía sdd-auditd
+        local = HITLCheckpointSkill()
+        if not local.events.shared:
+            print("❌ El dispatcher necesita REDIS_URL (bus de eventos compartido)")
+            sys.exit(1)
+        dispatcher = local.start_notification_dispatcher(consumer=sys.argv[2] if len(sys.argv) > 2 else None)
+        try:
+            while dispatcher.is_alive():
+                dispatcher.join(1)
+        except KeyboardInterrupt:
+            dispatcher.stop()
+    
     else:
         print(f"Comando desconocido: {command}")
         sys.exit(1)
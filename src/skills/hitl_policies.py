@@ -0,0 +1,486 @@
+"""
+Motor de Políticas de Auto-Aprobación HITL
+
+Evalúa checkpoints contra políticas declarativas (JSON) para aprobar o
+rechazar automáticamente acciones triviales sin esperar a un humano.
+
+Las políticas se compilan una sola vez (patrones glob → regex, operadores →
+predicados) y se indexan por `agent_name` exacto; las candidatas de cada par
+(agent_name, checkpoint_name) se cachean, de modo que cada evaluación solo
+prueba prioridad y `data`. El archivo se recarga automáticamente cuando
+cambia su `mtime`.
+
+Formato del archivo:
+
+    {
+      "policies": [
+        {
+          "name": "auto-approve-reads",
+          "effect": "approve",
+          "reason": "Lecturas sin efectos secundarios",
+          "match": {
+            "agent_name": ["dev_agent", "plan_*"],
+            "checkpoint_name": "read-*",
+            "priority": ["low", "medium"],
+            "data": {
+              "action": ["read_file", "list_directory"],
+              "lines_changed": {"lt": 50},
+              "files.count": {"lte": 3}
+            }
+          }
+        }
+      ]
+    }
+
+La primera política que coincide (en orden de archivo) decide.
+"""
+import os
+import re
+import sys
+import json
+import time
+import fnmatch
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Callable, Tuple
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/skills/hitl_policies.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils import metrics
+from src.utils.lazy_imports import logger
+
+
+DEFAULT_POLICY_FILE = ".opencode/hitl-policies.json"
+
+EFFECTS = ("approve", "reject")
+
+PRIORITIES = ("low", "medium", "high", "critical")
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class PolicyDecision:
+    """Resultado de evaluar un checkpoint contra las políticas"""
+    effect: str
+    policy_name: str
+    reason: str
+
+
+@dataclass(frozen=True)
+class _CompiledPolicy:
+    """Política compilada: predicados listos para evaluar"""
+    index: int
+    name: str
+    effect: str
+    reason: str
+    agent_exact: Optional[frozenset]
+    agent_match: Callable[[str], bool]
+    checkpoint_match: Callable[[str], bool]
+    priorities: Optional[frozenset]
+    data_match: Callable[[Dict[str, Any]], bool]
+
+
+def _always(_value: Any) -> bool:
+    return True
+
+
+def _compile_names(spec: Any) -> Tuple[Optional[frozenset], Callable[[str], bool]]:
+    """
+    Compilar un selector de nombres (string o lista, admite globs)
+
+    Returns:
+        (nombres exactos o None si hay globs, predicado)
+    """
+    if spec is None:
+        return None, _always
+
+    patterns = [spec] if isinstance(spec, str) else list(spec)
+    if not all(isinstance(p, str) for p in patterns):
+        raise ValueError(f"Selector de nombres inválido: {spec!r}")
+
+    if not any(ch in p for p in patterns for ch in "*?["):
+        exact = frozenset(patterns)
+        return exact, exact.__contains__
+
+    regex = re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+    return None, lambda value: regex.match(value) is not None
+
+
+def _lookup(data: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+    """Obtener un valor anidado por ruta con puntos ("files.count")"""
+    value: Any = data
+    for key in path:
+        if not isinstance(value, dict):
+            return _MISSING
+        value = value.get(key, _MISSING)
+        if value is _MISSING:
+            return _MISSING
+    return value
+
+
+def _compile_condition(condition: Any) -> Callable[[Any], bool]:
+    """Compilar la condición sobre un valor de `data`"""
+    if isinstance(condition, list):
+        allowed = condition
+        try:
+            allowed_set = frozenset(condition)
+            return lambda value: value is not _MISSING and _hashable_in(value, allowed_set, allowed)
+        except TypeError:
+            return lambda value: value in allowed
+
+    if not isinstance(condition, dict):
+        return lambda value: value == condition
+
+    checks: List[Callable[[Any], bool]] = []
+    for op, operand in condition.items():
+        if op == "eq":
+            checks.append(lambda v, o=operand: v == o)
+        elif op == "ne":
+            checks.append(lambda v, o=operand: v is not _MISSING and v != o)
+        elif op == "in":
+            checks.append(_compile_condition(list(operand)))
+        elif op == "not_in":
+            inner = _compile_condition(list(operand))
+            checks.append(lambda v, f=inner: v is not _MISSING and not f(v))
+        elif op in ("lt", "lte", "gt", "gte"):
+            if not _is_number(operand):
+                # Se rechaza al cargar: comparar con un no número fallaría en cada evaluación
+                raise ValueError(f"Operador {op}: se esperaba un número, no {operand!r}")
+            compare = {
+                "lt": lambda v, o: v < o,
+                "lte": lambda v, o: v <= o,
+                "gt": lambda v, o: v > o,
+                "gte": lambda v, o: v >= o,
+            }[op]
+            checks.append(lambda v, o=operand, c=compare: _is_number(v) and c(v, o))
+        elif op == "glob":
+            regex = re.compile(fnmatch.translate(operand))
+            checks.append(lambda v, r=regex: isinstance(v, str) and r.match(v) is not None)
+        elif op == "regex":
+            regex = re.compile(operand)
+            checks.append(lambda v, r=regex: isinstance(v, str) and r.search(v) is not None)
+        elif op == "exists":
+            checks.append(lambda v, o=bool(operand): (v is not _MISSING) == o)
+        elif op == "max_len":
+            checks.append(lambda v, o=operand: v is not _MISSING and hasattr(v, "__len__") and len(v) <= o)
+        else:
+            raise ValueError(f"Operador desconocido: {op}")
+
+    if len(checks) == 1:
+        return checks[0]
+    return lambda value: all(check(value) for check in checks)
+
+
+def _hashable_in(value: Any, allowed_set: frozenset, allowed: list) -> bool:
+    try:
+        return value in allowed_set
+    except TypeError:
+        return value in allowed
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _compile_data(spec: Optional[Dict[str, Any]]) -> Callable[[Dict[str, Any]], bool]:
+    """Compilar las condiciones sobre `data` en un único predicado"""
+    if not spec:
+        return _always
+
+    conditions = [
+        (tuple(key.split(".")), _compile_condition(condition))
+        for key, condition in spec.items()
+    ]
+
+    def match(data: Dict[str, Any]) -> bool:
+        for path, check in conditions:
+            if not check(_lookup(data, path)):
+                return False
+        return True
+
+    return match
+
+
+def compile_policy(index: int, raw: Dict[str, Any]) -> _CompiledPolicy:
+    """Compilar una política declarativa"""
+    name = raw.get("name") or f"policy-{index}"
+    effect = raw.get("effect")
+    if effect not in EFFECTS:
+        raise ValueError(f"Política {name}: effect debe ser uno de {EFFECTS}")
+
+    match = raw.get("match", {})
+    agent_exact, agent_match = _compile_names(match.get("agent_name"))
+    _, checkpoint_match = _compile_names(match.get("checkpoint_name"))
+
+    priorities = match.get("priority")
+    if priorities is not None:
+        priorities = frozenset([priorities] if isinstance(priorities, str) else priorities)
+        unknown = priorities - set(PRIORITIES)
+        if unknown:
+            raise ValueError(f"Política {name}: prioridades desconocidas {sorted(unknown)}")
+
+    return _CompiledPolicy(
+        index=index,
+        name=name,
+        effect=effect,
+        reason=raw.get("reason") or f"Política {name}",
+        agent_exact=agent_exact,
+        agent_match=agent_match,
+        checkpoint_match=checkpoint_match,
+        priorities=priorities,
+        data_match=_compile_data(match.get("data")),
+    )
+
+
+class PolicySet:
+    """Conjunto inmutable de políticas compiladas e indexadas"""
+
+    def __init__(self, raw_policies: List[Dict[str, Any]]):
+        self.policies = [compile_policy(i, raw) for i, raw in enumerate(raw_policies)]
+
+        # Índice: agent_name exacto -> políticas; el resto va a `_agent_any`
+        self._by_agent: Dict[str, List[_CompiledPolicy]] = {}
+        self._agent_any: List[_CompiledPolicy] = []
+        for policy in self.policies:
+            if policy.agent_exact is None:
+                self._agent_any.append(policy)
+            else:
+                for agent in policy.agent_exact:
+                    self._by_agent.setdefault(agent, []).append(policy)
+
+        # Dos niveles de caché: por agente y por (agente, checkpoint)
+        self._agent_candidates = lru_cache(maxsize=1024)(self._agent_candidates)
+        self.candidates = lru_cache(maxsize=65536)(self._candidates)
+
+    def __len__(self) -> int:
+        return len(self.policies)
+
+    def _agent_candidates(self, agent_name: str) -> Tuple[_CompiledPolicy, ...]:
+        """Políticas aplicables a un agente, en orden de archivo"""
+        pool = self._by_agent.get(agent_name, [])
+        if self._agent_any:
+            pool = sorted(
+                pool + [p for p in self._agent_any if p.agent_match(agent_name)],
+                key=lambda p: p.index
+            )
+        return tuple(pool)
+
+    def _candidates(self, agent_name: str, checkpoint_name: str) -> Tuple[_CompiledPolicy, ...]:
+        """Políticas aplicables a (agent, checkpoint), en orden de archivo"""
+        return tuple(
+            policy for policy in self._agent_candidates(agent_name)
+            if policy.checkpoint_match(checkpoint_name)
+        )
+
+    def evaluate(
+        self,
+        agent_name: str,
+        checkpoint_name: str,
+        priority: str,
+        data: Dict[str, Any]
+    ) -> Optional[PolicyDecision]:
+        """Evaluar un checkpoint; None si ninguna política coincide"""
+        for policy in self.candidates(agent_name, checkpoint_name):
+            if policy.priorities is not None and priority not in policy.priorities:
+                continue
+            if policy.data_match(data):
+                return PolicyDecision(policy.effect, policy.name, policy.reason)
+        return None
+
+
+class PolicyEngine:
+    """
+    Motor de políticas con recarga en caliente
+
+    El archivo se revisa como máximo cada `reload_interval` segundos; si su
+    `mtime` cambió se recompila y se reemplaza el `PolicySet` de forma atómica.
+    Un archivo inválido deja activas las políticas anteriores.
+    """
+
+    def __init__(
+        self,
+        policy_file: Optional[str] = None,
+        reload_interval: float = 1.0
+    ):
+        self.policy_file = policy_file or os.getenv("HITL_POLICY_FILE", DEFAULT_POLICY_FILE)
+        self.reload_interval = reload_interval
+        self._policy_set = PolicySet([])
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    @property
+    def policy_set(self) -> PolicySet:
+        return self._policy_set
+
+    def _maybe_reload(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+
+        with self._lock:
+            if not force and now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+
+            try:
+                mtime = os.stat(self.policy_file).st_mtime
+            except OSError:
+                if self._mtime is not None:
+                    logger.info(f"Archivo de políticas eliminado: {self.policy_file}")
+                    self._policy_set = PolicySet([])
+                    self._mtime = None
+                return
+
+            if mtime == self._mtime:
+                return
+
+            try:
+                with open(self.policy_file) as f:
+                    raw = json.load(f)
+                self._policy_set = PolicySet(raw.get("policies", []))
+                self._mtime = mtime
+                logger.debug(f"Políticas HITL cargadas: {len(self._policy_set)} desde {self.policy_file}")
+            except Exception as e:
+                logger.error(f"Error cargando políticas HITL ({self.policy_file}): {e}")
+                self._mtime = mtime
+
+    def evaluate(
+        self,
+        agent_name: str,
+        checkpoint_name: str,
+        priority: str,
+        data: Dict[str, Any]
+    ) -> Optional[PolicyDecision]:
+        """Evaluar un checkpoint contra las políticas vigentes"""
+        self._maybe_reload()
+        return self._policy_set.evaluate(agent_name, checkpoint_name, priority, data)
+
+
+# Singleton instance
+_policy_engine: Optional[PolicyEngine] = None
+
+
+def get_policy_engine() -> PolicyEngine:
+    """Obtener instancia singleton del motor de políticas"""
+    global _policy_engine
+    if _policy_engine is None:
+        engine = _policy_engine = PolicyEngine()
+        # Hits de la caché (agente, checkpoint) de la versión vigente de las políticas
+        metrics.CACHE_HITS.add_collector(
+            lambda: {("hitl_policies",): engine.policy_set.candidates.cache_info().hits}
+        )
+        metrics.CACHE_MISSES.add_collector(
+            lambda: {("hitl_policies",): engine.policy_set.candidates.cache_info().misses}
+        )
+    return _policy_engine
+
+
+def _synthetic_policies(n_rules: int, n_agents: int) -> List[Dict[str, Any]]:
+    """Generar políticas sintéticas para el benchmark"""
+    policies = []
+    for i in range(n_rules):
+        match: Dict[str, Any] = {
+            "checkpoint_name": f"action-{i % 50}-*",
+            "priority": ["low", "medium"],
+            "data": {"lines_changed": {"lt": i % 200}, "scope": ["docs", "tests"]},
+        }
+        if i % 10:
+            match["agent_name"] = f"agent_{i % n_agents}"
+        else:
+            match["agent_name"] = f"agent_{i % n_agents}*"
+        policies.append({"name": f"rule-{i}", "effect": EFFECTS[i % 2], "match": match})
+    return policies
+
+
+def benchmark(n_rules: int = 10000, n_evals: int = 200000, n_agents: int = 100) -> Dict[str, float]:
+    """Medir evaluaciones/segundo sobre un conjunto grande de políticas"""
+    import random
+
+    rng = random.Random(42)
+
+    start = time.perf_counter()
+    policy_set = PolicySet(_synthetic_policies(n_rules, n_agents))
+    compile_seconds = time.perf_counter() - start
+
+    inputs = [
+        (
+            f"agent_{rng.randrange(n_agents)}",
+            f"action-{rng.randrange(60)}-{rng.randrange(5)}",
+            rng.choice(PRIORITIES),
+            {"lines_changed": rng.randrange(250), "scope": rng.choice(["docs", "tests", "src"])},
+        )
+        for _ in range(min(n_evals, 5000))
+    ]
+
+    matched = 0
+    start = time.perf_counter()
+    for i in range(n_evals):
+        if policy_set.evaluate(*inputs[i % len(inputs)]) is not None:
+            matched += 1
+    eval_seconds = time.perf_counter() - start
+
+    return {
+        "rules": n_rules,
+        "evaluations": n_evals,
+        "compile_seconds": compile_seconds,
+        "evaluations_per_second": n_evals / eval_seconds,
+        "matched_ratio": matched / n_evals,
+    }
+
+
+# CLI para validar, evaluar y medir políticas
+def main():
+    """CLI del motor de políticas"""
+    if len(sys.argv) < 2:
+        print("Uso:")
+        print("  python hitl_policies.py check [file]                                   # Validar políticas")
+        print("  python hitl_policies.py eval <agent> <checkpoint> <priority> [json]    # Evaluar un checkpoint")
+        print("  python hitl_policies.py bench [n_rules] [n_evals]                      # Benchmark evals/seg")
+        sys.exit(1)
+
+    command = sys.argv[1]
+
+    if command == "check":
+        policy_file = sys.argv[2] if len(sys.argv) > 2 else os.getenv("HITL_POLICY_FILE", DEFAULT_POLICY_FILE)
+        with open(policy_file) as f:
+            policy_set = PolicySet(json.load(f).get("policies", []))
+        print(f"✅ {len(policy_set)} política(s) válida(s) en {policy_file}")
+
+    elif command == "eval":
+        if len(sys.argv) < 5:
+            print("Uso: python hitl_policies.py eval <agent> <checkpoint> <priority> [json]")
+            sys.exit(1)
+
+        data = json.loads(sys.argv[5]) if len(sys.argv) > 5 else {}
+        decision = get_policy_engine().evaluate(sys.argv[2], sys.argv[3], sys.argv[4], data)
+        if decision is None:
+            print("👤 Sin política aplicable: requiere revisión humana")
+        else:
+            print(f"🤖 {decision.effect} por política '{decision.policy_name}': {decision.reason}")
+
+    elif command == "bench":
+        n_rules = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+        n_evals = int(sys.argv[3]) if len(sys.argv) > 3 else 200000
+        result = benchmark(n_rules=n_rules, n_evals=n_evals)
+
+        print("\n⚡ Benchmark de políticas HITL:\n")
+        print(f"Reglas: {result['rules']}")
+        print(f"Compilación: {result['compile_seconds'] * 1000:.1f} ms")
+        print(f"Evaluaciones: {result['evaluations']}")
+        print(f"Evaluaciones/seg: {result['evaluations_per_second']:,.0f}")
+        print(f"Coincidencias: {result['matched_ratio']:.1%}")
+
+    else:
+        print(f"Comando desconocido: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
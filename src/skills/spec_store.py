@@ -0,0 +1,468 @@
+"""
+Spec Store - Versiones de especificaciones y planes con deltas
+
+Cada revisión de `/speckit.specify` o `/speckit.plan` se guarda como una
+versión nueva: en `specifications` por (sesión, `spec_type`) o, con
+`doc_type="plan"`, en `implementation_plans` por sesión.
+
+- Solo se guarda el delta por líneas contra la versión anterior. Cada
+  `SPEC_SNAPSHOT_INTERVAL` versiones (o cuando el delta ocupa más de la
+  mitad del texto) se guarda el texto completo, así reconstruir cualquier
+  versión es una consulta que trae una instantánea y como mucho
+  `SPEC_SNAPSHOT_INTERVAL - 1` deltas.
+- La última versión de cada documento se mantiene en memoria: guardar una
+  revisión calcula el delta sin leer la base de datos y leer la última solo
+  consulta su número. Con bus de eventos compartido (REDIS_URL) ni eso: los
+  guardados y aprobaciones de otros procesos llegan como eventos del stream
+  `specs` e invalidan la caché.
+- Si otro proceso guardó antes la misma versión (índice único por documento
+  y versión), se recarga la última y se reintenta.
+
+Configuración:
+    SPEC_SNAPSHOT_INTERVAL   Versiones entre textos completos (default: 16)
+
+Uso:
+    store = get_spec_store()
+    spec = store.save("sess-1", Path(".speckit/memory/specification.md").read_text())
+    store.save("sess-1", plan_md, doc_type="plan", tasks=tasks, specification_id=spec.id)
+    store.get("sess-1", version=3).content
+    store.approve("sess-1", spec.version, "tech-lead")
+"""
+import difflib
+import os
+import sys
+import threading
+from dataclasses import dataclass, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/skills/spec_store.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.storage.base import DELTA, FULL, StorageBackend, get_storage
+from src.utils import fast_json, metrics
+from src.utils.event_bus import SPECS_STREAM, Event, EventBus, EventSubscriber, get_event_bus
+from src.utils.lazy_imports import logger
+
+SPECIFICATION = "specification"
+PLAN = "plan"
+
+_CACHE_NAME = "specs.latest"
+# Eventos del stream `specs` del bus
+DOCUMENT_SAVED = "document.saved"
+DOCUMENT_APPROVED = "document.approved"
+# Reintentos cuando otro proceso guarda la misma versión a la vez
+_SAVE_ATTEMPTS = 5
+
+
+@dataclass(frozen=True)
+class DocumentVersion:
+    """Versión de una especificación o plan (`content` es None en los listados)"""
+    id: int
+    session_id: str
+    doc_type: str
+    version: int
+    encoding: str
+    size: int
+    created_at: datetime
+    approved: bool = False
+    approved_at: Optional[datetime] = None
+    approved_by: Optional[str] = None
+    tasks: Optional[Any] = None
+    specification_id: Optional[int] = None
+    content: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "doc_type": self.doc_type,
+            "version": self.version,
+            "encoding": self.encoding,
+            "size": self.size,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "approved": self.approved,
+            "approved_at": self.approved_at.isoformat() if self.approved_at else None,
+            "approved_by": self.approved_by,
+            "tasks": self.tasks,
+            "specification_id": self.specification_id,
+        }
+
+
+class _Latest:
+    """Última versión de un documento con sus líneas y deltas desde la instantánea"""
+    __slots__ = ("document", "lines", "deltas")
+
+    def __init__(self, document: DocumentVersion, lines: List[str], deltas: int):
+        self.document = document
+        self.lines = lines
+        self.deltas = deltas
+
+
+def make_delta(old: List[str], new: List[str]) -> List[list]:
+    """
+    Delta por líneas: operaciones [inicio, fin, líneas nuevas] sobre `old`
+
+    Args:
+        old: Líneas de la versión anterior (con sus saltos de línea)
+        new: Líneas de la versión nueva
+
+    Returns:
+        Reemplazos de `old[inicio:fin]` en orden ascendente
+    """
+    matcher = difflib.SequenceMatcher(None, old, new)
+    return [
+        [i1, i2, new[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def apply_delta(old: List[str], delta: List[list]) -> List[str]:
+    """Aplicar un delta de `make_delta` a las líneas de la versión anterior"""
+    lines: List[str] = []
+    position = 0
+    for start, end, replacement in delta:
+        lines.extend(old[position:start])
+        lines.extend(replacement)
+        position = end
+    lines.extend(old[position:])
+    return lines
+
+
+def _kind(doc_type: str) -> Tuple[str, Optional[str]]:
+    """(tabla lógica, spec_type) de un tipo de documento"""
+    return (PLAN, None) if doc_type == PLAN else (SPECIFICATION, doc_type)
+
+
+class SpecStore:
+    """Especificaciones y planes versionados con deltas e instantáneas periódicas"""
+
+    def __init__(
+        self,
+        storage: Optional[StorageBackend] = None,
+        snapshot_interval: Optional[int] = None,
+        events: Optional[EventBus] = None
+    ):
+        """
+        Inicializar store
+
+        Args:
+            storage: Backend de almacenamiento (default: DATABASE_URL o SQLite local)
+            snapshot_interval: Versiones entre textos completos (default: SPEC_SNAPSHOT_INTERVAL)
+            events: Bus de eventos (default: el del proceso)
+        """
+        self.storage = storage or get_storage()
+        self.snapshot_interval = max(1, snapshot_interval or int(os.getenv("SPEC_SNAPSHOT_INTERVAL", "16")))
+        self._lock = threading.Lock()
+        # (session_id, doc_type) -> última versión conocida
+        self._latest: Dict[Tuple[str, str], _Latest] = {}
+        self.events = events or get_event_bus()
+        # Con bus compartido la caché se invalida por eventos en lugar de validarse en cada lectura
+        self._invalidations: Optional[EventSubscriber] = None
+        if self.events.shared:
+            self._invalidations = self.events.subscribe(
+                [SPECS_STREAM], self._on_event, name="spec-store-invalidation", on_resync=self._clear
+            )
+
+    def save(
+        self,
+        session_id: str,
+        content: str,
+        doc_type: str = SPECIFICATION,
+        tasks: Optional[Any] = None,
+        specification_id: Optional[int] = None
+    ) -> DocumentVersion:
+        """
+        Guardar una revisión como versión nueva
+
+        Args:
+            session_id: Sesión de desarrollo
+            content: Texto completo de la revisión
+            doc_type: `spec_type` de la especificación o `plan`
+            tasks: Tareas del plan (solo planes)
+            specification_id: Fila de la especificación de la que sale el plan (solo planes)
+
+        Returns:
+            DocumentVersion guardada (la última sin cambios si el contenido es el mismo)
+        """
+        kind, spec_type = _kind(doc_type)
+        key = (session_id, doc_type)
+        lines = content.splitlines(keepends=True)
+
+        for _ in range(_SAVE_ATTEMPTS):
+            latest = self._cached(key) or self._load(key)
+            if latest is not None and latest.document.content == content and (
+                kind != PLAN or (latest.document.tasks == tasks and latest.document.specification_id == specification_id)
+            ):
+                return latest.document
+
+            version = latest.document.version + 1 if latest else 1
+            encoding, stored, deltas = FULL, content, 0
+            if latest is not None and latest.deltas + 1 < self.snapshot_interval:
+                delta = fast_json.dumps(make_delta(latest.lines, lines)).decode("utf-8")
+                # Un delta casi tan grande como el texto no ahorra nada y alarga la cadena
+                if len(delta) < len(content) // 2:
+                    encoding, stored, deltas = DELTA, delta, latest.deltas + 1
+
+            created_at = datetime.now()
+            with metrics.DB_LATENCY.time(operation="specs.save"):
+                row_id = self.storage.insert_document_version(
+                    kind, session_id, spec_type, version, encoding, stored, created_at,
+                    tasks=tasks, specification_id=specification_id
+                )
+            if row_id is None:
+                # Otro proceso guardó esta versión: partir de la suya
+                logger.debug(f"Versión {version} de {doc_type} ({session_id}) ya existe, reintentando")
+                with self._lock:
+                    self._latest.pop(key, None)
+                continue
+
+            document = DocumentVersion(
+                row_id, session_id, doc_type, version, encoding, len(stored), created_at,
+                tasks=tasks, specification_id=specification_id, content=content
+            )
+            with self._lock:
+                self._latest[key] = _Latest(document, lines, deltas)
+            self.events.publish(SPECS_STREAM, DOCUMENT_SAVED, {
+                "session_id": session_id, "doc_type": doc_type, "version": version
+            })
+            logger.debug(f"{doc_type} v{version} guardada ({encoding}, {len(stored)}/{len(content)} caracteres)")
+            return document
+
+        raise RuntimeError(f"No se pudo guardar {doc_type} de {session_id}: escrituras concurrentes")
+
+    def get(
+        self,
+        session_id: str,
+        doc_type: str = SPECIFICATION,
+        version: Optional[int] = None
+    ) -> Optional[DocumentVersion]:
+        """
+        Obtener una versión con su contenido
+
+        Args:
+            session_id: Sesión de desarrollo
+            doc_type: `spec_type` de la especificación o `plan`
+            version: Versión (default: la última)
+
+        Returns:
+            DocumentVersion o None si no existe
+        """
+        kind, spec_type = _kind(doc_type)
+        key = (session_id, doc_type)
+        cached = self._cached(key)
+        if cached is not None:
+            if version is None and self._invalidations is not None and self._invalidations.listening:
+                # Un guardado de otro proceso habría llegado como evento y quitado la entrada
+                metrics.CACHE_HITS.inc(cache=_CACHE_NAME)
+                return cached.document
+            # Para la última solo se comprueba que nadie haya guardado una versión posterior
+            wanted = version or self.storage.latest_document_version(kind, session_id, spec_type)
+            if wanted == cached.document.version:
+                metrics.CACHE_HITS.inc(cache=_CACHE_NAME)
+                return cached.document
+        metrics.CACHE_MISSES.inc(cache=_CACHE_NAME)
+
+        if version is None:
+            latest = self._load(key)
+            return latest.document if latest else None
+        rebuilt = self._rebuild(key, version)
+        return rebuilt.document if rebuilt else None
+
+    def versions(self, session_id: str, doc_type: str = SPECIFICATION) -> List[DocumentVersion]:
+        """
+        Listar las versiones de un documento (sin contenido)
+
+        Returns:
+            Versiones en orden ascendente; `size` es lo almacenado (delta o texto)
+        """
+        kind, spec_type = _kind(doc_type)
+        rows = self.storage.document_versions(kind, session_id, spec_type)
+        return [self._document(session_id, doc_type, row, content=None) for row in rows]
+
+    def latest_approved(self, session_id: str, doc_type: str = SPECIFICATION) -> Optional[DocumentVersion]:
+        """Última versión aprobada con su contenido (None si ninguna lo está)"""
+        approved = [v for v in self.versions(session_id, doc_type) if v.approved]
+        return self.get(session_id, doc_type, approved[-1].version) if approved else None
+
+    def approve(
+        self,
+        session_id: str,
+        version: int,
+        approved_by: str,
+        doc_type: str = SPECIFICATION
+    ) -> bool:
+        """
+        Aprobar una versión
+
+        Args:
+            session_id: Sesión de desarrollo
+            version: Versión a aprobar
+            approved_by: Quien aprueba
+            doc_type: `spec_type` de la especificación o `plan`
+
+        Returns:
+            True si la versión existe y quedó aprobada
+        """
+        kind, spec_type = _kind(doc_type)
+        approved_at = datetime.now()
+        if not self.storage.approve_document_version(kind, session_id, spec_type, version, approved_by, approved_at):
+            return False
+
+        key = (session_id, doc_type)
+        with self._lock:
+            latest = self._latest.get(key)
+            if latest is not None and latest.document.version == version:
+                latest.document = replace(latest.document, approved=True, approved_at=approved_at, approved_by=approved_by)
+        self.events.publish(SPECS_STREAM, DOCUMENT_APPROVED, {
+            "session_id": session_id, "doc_type": doc_type, "version": version
+        })
+        logger.info(f"{doc_type} v{version} de {session_id} aprobada por {approved_by}")
+        return True
+
+    def close(self):
+        """Dejar de escuchar los eventos de invalidación"""
+        if self._invalidations is not None:
+            self._invalidations.stop()
+            self._invalidations = None
+
+    def _on_event(self, event: Event):
+        """Quitar de la caché las entradas que un evento deja desactualizadas"""
+        data = event.data
+        key = (data["session_id"], data["doc_type"])
+        with self._lock:
+            latest = self._latest.get(key)
+            if latest is None:
+                return
+            document = latest.document
+            # Los eventos propios (o ya vistos) no cambian nada
+            stale = (
+                data["version"] > document.version if event.type == DOCUMENT_SAVED
+                else data["version"] == document.version and not document.approved
+            )
+            if stale:
+                del self._latest[key]
+
+    def _clear(self):
+        """Vaciar la caché tras perder eventos (p.ej. Redis caído)"""
+        with self._lock:
+            self._latest.clear()
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[_Latest]:
+        with self._lock:
+            return self._latest.get(key)
+
+    def _load(self, key: Tuple[str, str]) -> Optional[_Latest]:
+        """Reconstruir la última versión desde la base de datos y guardarla en memoria"""
+        latest = self._rebuild(key, None)
+        if latest is not None:
+            with self._lock:
+                current = self._latest.get(key)
+                if current is None or current.document.version < latest.document.version:
+                    self._latest[key] = latest
+        return latest
+
+    def _rebuild(self, key: Tuple[str, str], version: Optional[int]) -> Optional[_Latest]:
+        """Aplicar los deltas desde la última instantánea hasta `version`"""
+        session_id, doc_type = key
+        kind, spec_type = _kind(doc_type)
+        with metrics.DB_LATENCY.time(operation="specs.get"):
+            rows = self.storage.document_chain(kind, session_id, spec_type, version)
+        if not rows:
+            return None
+
+        lines = rows[0][3].splitlines(keepends=True)
+        for row in rows[1:]:
+            lines = apply_delta(lines, fast_json.loads(row[3]))
+        document = self._document(session_id, doc_type, rows[-1], content="".join(lines))
+        return _Latest(document, lines, len(rows) - 1)
+
+    @staticmethod
+    def _document(session_id: str, doc_type: str, row: Tuple, content: Optional[str]) -> DocumentVersion:
+        """DocumentVersion desde una fila de `document_columns`"""
+        row_id, version, encoding, stored, created_at, approved, approved_at, approved_by, tasks, spec_id = row
+        size = stored if isinstance(stored, int) else len(stored)
+        return DocumentVersion(
+            row_id, session_id, doc_type, version, encoding, size, created_at,
+            bool(approved), approved_at, approved_by, tasks, spec_id, content
+        )
+
+
+# Singleton global
+_spec_store: Optional[SpecStore] = None
+
+
+def get_spec_store() -> SpecStore:
+    """
+    Obtener instancia global de SpecStore
+
+    Returns:
+        SpecStore: Instancia singleton
+    """
+    global _spec_store
+    if _spec_store is None:
+        _spec_store = SpecStore()
+    return _spec_store
+
+
+def main():
+    """CLI para versiones de especificaciones y planes"""
+    if len(sys.argv) < 3:
+        print("Uso:")
+        print("  python spec_store.py save <session_id> <archivo> [tipo|plan]           # Guardar revisión")
+        print("  python spec_store.py show <session_id> [tipo|plan] [versión]           # Mostrar versión")
+        print("  python spec_store.py versions <session_id> [tipo|plan]                 # Listar versiones")
+        print("  python spec_store.py approve <session_id> <versión> <aprobador> [tipo|plan]")
+        sys.exit(1)
+
+    store = get_spec_store()
+    command, session_id = sys.argv[1], sys.argv[2]
+
+    if command == "save":
+        if len(sys.argv) < 4:
+            print("Uso: python spec_store.py save <session_id> <archivo> [tipo|plan]")
+            sys.exit(1)
+        doc_type = sys.argv[4] if len(sys.argv) > 4 else SPECIFICATION
+        document = store.save(session_id, Path(sys.argv[3]).read_text(encoding="utf-8"), doc_type=doc_type)
+        print(f"📋 {doc_type} v{document.version} ({document.encoding}, {document.size} caracteres guardados)")
+
+    elif command == "show":
+        doc_type = sys.argv[3] if len(sys.argv) > 3 else SPECIFICATION
+        version = int(sys.argv[4]) if len(sys.argv) > 4 else None
+        document = store.get(session_id, doc_type, version)
+        if document is None:
+            print(f"❌ No existe {doc_type} para {session_id}")
+            sys.exit(1)
+        print(document.content, end="")
+
+    elif command == "versions":
+        doc_type = sys.argv[3] if len(sys.argv) > 3 else SPECIFICATION
+        versions = store.versions(session_id, doc_type)
+        if not versions:
+            print(f"No hay versiones de {doc_type} para {session_id}")
+        for document in versions:
+            approved = f"✅ {document.approved_by}" if document.approved else ""
+            print(f"v{document.version:<4} {document.encoding:<6} {document.size:>8}  {document.created_at:%Y-%m-%d %H:%M:%S}  {approved}")
+
+    elif command == "approve":
+        if len(sys.argv) < 5:
+            print("Uso: python spec_store.py approve <session_id> <versión> <aprobador> [tipo|plan]")
+            sys.exit(1)
+        version, approved_by = int(sys.argv[3]), sys.argv[4]
+        doc_type = sys.argv[5] if len(sys.argv) > 5 else SPECIFICATION
+        if store.approve(session_id, version, approved_by, doc_type):
+            print(f"✅ {doc_type} v{version} aprobada por {approved_by}")
+        else:
+            print(f"❌ No existe la versión {version} de {doc_type}")
+            sys.exit(1)
+
+    else:
+        print(f"Comando desconocido: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
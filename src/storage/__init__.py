@@ -0,0 +1,43 @@
+"""
+Storage Module
+
+Backends de almacenamiento para `audit_log` y `hitl_checkpoints`:
+PostgreSQL (`postgresql://...`) y SQLite embebido (`sqlite:///ruta.db`),
+seleccionados por el esquema de `DATABASE_URL`.
+
+Los atributos se cargan de forma diferida (PEP 562): importar el paquete no
+importa ningún backend hasta que se usa un atributo.
+"""
+import importlib
+from typing import Any, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .base import StorageBackend, get_storage, resolve_url, close_storages
+
+# Atributo público -> submódulo que lo define
+_LAZY_ATTRS = {
+    "StorageBackend": ".base",
+    "get_storage": ".base",
+    "resolve_url": ".base",
+    "close_storages": ".base",
+}
+
+__all__ = [
+    "StorageBackend",
+    "get_storage",
+    "resolve_url",
+    "close_storages",
+]
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,653 @@
+"""
+Storage - Interfaz común de los backends de almacenamiento
+
+`AuditLogger`, `HITLCheckpointSkill`, `PromptBuilder`, `SpecStore` y
+`SessionTracker` solo hablan con esta interfaz; el backend concreto se elige por el esquema de la URL:
+
+- `postgresql://...` / `postgres://...` (o conninfo `key=value`): PostgreSQL
+- `sqlite:///ruta/relativa.db`, `sqlite:////ruta/absoluta.db`,
+  `sqlite:///:memory:`: SQLite embebido (WAL, escrituras en lote)
+
+Sin `DATABASE_URL` se usa `DEFAULT_URL` (SQLite en `.local/sdd.db`), de modo
+que el stack completo funciona y se puede probar sin PostgreSQL.
+
+Las filas se devuelven como tuplas con tipos Python (`datetime`, `dict`)
+independientemente del backend.
+"""
+import importlib
+import os
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.utils.lazy_imports import logger
+
+# Base de datos usada cuando DATABASE_URL no está configurada
+DEFAULT_URL = "sqlite:///.local/sdd.db"
+
+# Esquema de URL -> módulo del backend
+_BACKEND_MODULES = {
+    "sqlite": "src.storage.sqlite",
+    "postgresql": "src.storage.postgres",
+    "postgres": "src.storage.postgres",
+}
+
+# Estados de checkpoint que las consultas necesitan conocer (ver CheckpointStatus)
+PENDING = "pending"
+TIMEOUT = "timeout"
+
+# Columnas devueltas por las consultas de la cola de revisión (+ data opcional)
+QUEUE_COLUMN_NAMES = (
+    "id", "checkpoint_name", "agent_name", "priority", "timeout_seconds",
+    "expires_at", "created_at", "claimed_by", "claimed_at",
+)
+QUEUE_COLUMNS = ", ".join(QUEUE_COLUMN_NAMES)
+
+# Columnas de las consultas de decisiones de auditoría
+DECISION_COLUMNS = "id, agent_name, action, decision, context, reasoning, confidence, timestamp"
+
+# Codificación de los blobs de `audit_blobs`
+BLOB_RAW = "raw"
+BLOB_ZLIB = "zlib"
+
+# Columnas de `iter_decisions` (context como texto JSON)
+EXPORT_COLUMN_NAMES = (
+    "id", "agent_name", "action", "decision", "context", "reasoning",
+    "confidence", "timestamp", "session_id", "user_id",
+)
+
+# Documentos versionados: tipo -> (tabla, columna de contenido, columna de subtipo)
+DOCUMENT_TABLES = {
+    "specification": ("specifications", "content", "spec_type"),
+    "plan": ("implementation_plans", "plan_content", None),
+}
+
+# Codificación de cada versión: texto completo o delta contra la anterior
+FULL = "full"
+DELTA = "delta"
+
+# Columnas de las consultas de `dev_sessions`
+SESSION_COLUMN_NAMES = (
+    "session_id", "project_type", "repo_url", "context_file", "started_at", "ended_at", "status", "metadata",
+)
+SESSION_COLUMNS = ", ".join(SESSION_COLUMN_NAMES)
+
+# Contadores de `session_summaries` por (sesión, agente), que se suman en cada escritura
+SESSION_COUNTERS = (
+    "decisions", "confidence_sum", "checkpoints_requested", "checkpoints_approved",
+    "checkpoints_rejected", "checkpoints_timeout", "llm_calls", "prompt_tokens", "completion_tokens",
+)
+
+
+class StorageBackend(ABC):
+    """Operaciones de auditoría y checkpoints HITL sobre un almacenamiento"""
+
+    scheme: str = ""
+    # True si `wait_for_status` despierta con resoluciones de otros procesos sin consultar en bucle
+    notifies_status: bool = False
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def enable_pool(self, max_size: int = 10) -> bool:
+        """Reutilizar conexiones en procesos de larga duración (si aplica)"""
+        return False
+
+    def flush(self):
+        """Hacer durables las escrituras pendientes (si el backend agrupa)"""
+
+    def after_commit(self, callback: Callable[[], None]):
+        """
+        Ejecutar `callback` cuando lo escrito hasta ahora esté confirmado
+
+        Los backends que confirman cada escritura lo ejecutan de inmediato; los
+        que agrupan, al confirmar el lote (y nunca si el lote se pierde).
+        """
+        callback()
+
+    def close(self):
+        """Liberar conexiones y recursos del backend"""
+
+    # --- audit_log -------------------------------------------------------
+
+    @abstractmethod
+    def insert_decision(
+        self,
+        agent_name: str,
+        action: str,
+        decision: str,
+        context_json: bytes,
+        reasoning: Optional[str],
+        confidence: float,
+        timestamp: datetime,
+        session_id: Optional[str],
+        user_id: Optional[str]
+    ):
+        """Insertar una decisión (`context_json` ya serializado)"""
+
+    @abstractmethod
+    def recent_decisions(self, limit: int, agent_name: Optional[str] = None) -> List[Tuple]:
+        """Decisiones más recientes: `DECISION_COLUMNS` + session_id"""
+
+    @abstractmethod
+    def decisions_by_session(self, session_id: str) -> List[Tuple]:
+        """Decisiones de una sesión en orden cronológico: `DECISION_COLUMNS`"""
+
+    @abstractmethod
+    def decision_statistics(self) -> Dict[str, Any]:
+        """Totales, decisiones por agente/sesión y confianza promedio"""
+
+    @abstractmethod
+    def decision_buckets(
+        self,
+        bucket_seconds: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> List[Tuple[str, int, int, float]]:
+        """
+        Decisiones agregadas por agente y ventana de tiempo
+
+        Returns:
+            Filas (agent_name, bucket, decisiones, suma de confianza), donde
+            `bucket` es `epoch // bucket_seconds`
+        """
+
+    @abstractmethod
+    def search_decisions(
+        self,
+        text: Optional[str],
+        context: Optional[Dict[str, Any]],
+        agent_name: Optional[str],
+        session_id: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        after: Optional[Tuple[Any, int]],
+        limit: int
+    ) -> List[Tuple]:
+        """
+        Buscar decisiones por texto (`decision`/`reasoning`) y claves de `context`
+
+        Con `text` el orden es (relevancia DESC, id DESC); sin texto,
+        (timestamp DESC, id DESC). `after` es la posición (relevancia o
+        timestamp, id) de la última fila de la página anterior.
+
+        Returns:
+            Filas `DECISION_COLUMNS` + session_id + relevancia (None sin texto)
+        """
+
+    @abstractmethod
+    def iter_decisions(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        agent_name: Optional[str] = None,
+        batch_size: int = 10000
+    ) -> Iterator[List[Tuple]]:
+        """
+        Recorrer `audit_log` en orden (timestamp, id) por lotes de filas
+
+        Las filas siguen `EXPORT_COLUMN_NAMES` con `context` como texto JSON;
+        la memoria usada es la de un lote, no la de la tabla.
+        """
+
+    # --- audit_blobs -----------------------------------------------------
+
+    @abstractmethod
+    def insert_blobs(self, blobs: List[Tuple[str, str, bytes, int]], created_at: datetime):
+        """
+        Guardar blobs de contexto que no existan ya
+
+        Args:
+            blobs: Filas (digest, encoding, data, tamaño original)
+            created_at: Momento del guardado
+        """
+
+    @abstractmethod
+    def get_blobs(self, digests: List[str]) -> List[Tuple[str, str, bytes]]:
+        """Filas (digest, encoding, data) de los digests que existan"""
+
+    @abstractmethod
+    def decision_contexts(self, after_id: int, min_bytes: int, limit: int) -> List[Tuple[int, Optional[str]]]:
+        """
+        Siguientes `limit` decisiones por id tras `after_id` (backfill por lotes)
+
+        Returns:
+            Filas (id, context como texto JSON si ocupa más de `min_bytes`, si no None)
+        """
+
+    @abstractmethod
+    def update_decision_contexts(self, rows: List[Tuple[int, bytes]]):
+        """Reemplazar en una transacción el `context` (ya serializado) de filas (id, context_json)"""
+
+    @abstractmethod
+    def blob_statistics(self) -> Tuple[int, int, int]:
+        """(blobs, bytes almacenados, bytes originales)"""
+
+    # --- hitl_checkpoints ------------------------------------------------
+
+    @abstractmethod
+    def insert_checkpoint(
+        self,
+        checkpoint_name: str,
+        agent_name: str,
+        status: str,
+        priority: int,
+        timeout_seconds: Optional[int],
+        expires_at: Optional[datetime],
+        data: Dict[str, Any],
+        created_at: datetime,
+        reviewed_at: Optional[datetime],
+        reviewer: Optional[str],
+        comments: Optional[str]
+    ) -> int:
+        """Insertar un checkpoint y retornar su ID"""
+
+    @abstractmethod
+    def wait_for_status(self, checkpoint_id: int, timeout_seconds: Optional[float]) -> Optional[str]:
+        """
+        Estado del checkpoint, esperando hasta `timeout_seconds` a que deje
+        de estar pendiente (None si no existe)
+        """
+
+    @abstractmethod
+    def resolve_checkpoint(
+        self,
+        checkpoint_id: int,
+        status: str,
+        reviewer: str,
+        comments: Optional[str],
+        reviewed_at: datetime
+    ) -> Optional[Tuple[datetime, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Resolver un checkpoint pendiente y despertar a quien lo espera
+
+        Returns:
+            (created_at, trace, session_id guardado al crearlo) o None si no
+            existe o ya fue resuelto
+        """
+
+    @abstractmethod
+    def pending_checkpoints(self, limit: Optional[int], offset: int, include_data: bool) -> List[Tuple]:
+        """Pendientes por prioridad y antigüedad: `QUEUE_COLUMNS` (+ data)"""
+
+    @abstractmethod
+    def count_pending_by_priority(self) -> List[Tuple[int, int]]:
+        """Pares (rango de prioridad, pendientes)"""
+
+    @abstractmethod
+    def review_queue(
+        self,
+        after: Optional[Tuple[int, datetime, int]],
+        limit: int,
+        include_data: bool
+    ) -> List[Tuple]:
+        """Página de la cola tras la posición (priority, created_at, id)"""
+
+    @abstractmethod
+    def claim_checkpoints(
+        self,
+        reviewer: str,
+        limit: int,
+        stale_before: datetime,
+        now: datetime
+    ) -> List[Tuple]:
+        """Reclamar atómicamente los siguientes pendientes: `QUEUE_COLUMNS` + data"""
+
+    @abstractmethod
+    def release_checkpoint(self, checkpoint_id: int, reviewer: str) -> bool:
+        """Liberar un checkpoint reclamado por `reviewer`"""
+
+    @abstractmethod
+    def expire_overdue_checkpoints(
+        self,
+        batch_size: int,
+        max_batches: int,
+        reviewer: str,
+        session_id: str
+    ) -> Dict[str, int]:
+        """
+        Marcar como `timeout` los pendientes vencidos y registrarlos en `audit_log`
+
+        Cada uno se registra en la sesión guardada al crearlo; `session_id`
+        solo se usa para los checkpoints que no la tienen.
+
+        Returns:
+            Checkpoints expirados por sesión
+        """
+
+    # --- context_embeddings ----------------------------------------------
+
+    @abstractmethod
+    def insert_context_chunks(
+        self,
+        chunks: List[Tuple[str, List[float], Dict[str, Any], Optional[str]]]
+    ) -> List[int]:
+        """Insertar fragmentos (content, embedding, metadata, source) y retornar sus IDs"""
+
+    @abstractmethod
+    def search_context(
+        self,
+        embedding: List[float],
+        limit: int,
+        source: Optional[str] = None
+    ) -> List[Tuple[int, str, Dict[str, Any], Optional[str], float]]:
+        """
+        Fragmentos más parecidos a `embedding` (similitud coseno)
+
+        Returns:
+            Filas (id, content, metadata, source, similitud) por similitud DESC
+        """
+
+    @abstractmethod
+    def delete_context(self, source: Optional[str] = None) -> int:
+        """Borrar los fragmentos de `source` (todos con None) y retornar cuántos"""
+
+    # --- specifications / implementation_plans ---------------------------
+
+    @abstractmethod
+    def insert_document_version(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: int,
+        encoding: str,
+        content: str,
+        created_at: datetime,
+        tasks: Optional[Any] = None,
+        specification_id: Optional[int] = None
+    ) -> Optional[int]:
+        """
+        Insertar una versión de un documento (registra la sesión si no existe)
+
+        Returns:
+            ID de la fila o None si esa versión ya existe (otro proceso se adelantó)
+        """
+
+    @abstractmethod
+    def document_chain(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: Optional[int] = None
+    ) -> List[Tuple]:
+        """
+        Filas necesarias para reconstruir una versión (la última con None)
+
+        Returns:
+            `document_columns` desde la última versión `full` hasta `version`, en orden
+        """
+
+    @abstractmethod
+    def document_versions(self, kind: str, session_id: str, doc_type: Optional[str]) -> List[Tuple]:
+        """`document_columns` de todas las versiones, con el tamaño almacenado en lugar del contenido"""
+
+    @abstractmethod
+    def latest_document_version(self, kind: str, session_id: str, doc_type: Optional[str]) -> Optional[int]:
+        """Número de la última versión (None si el documento no existe)"""
+
+    @abstractmethod
+    def approve_document_version(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: int,
+        approved_by: str,
+        approved_at: datetime
+    ) -> bool:
+        """Marcar una versión como aprobada (False si no existe)"""
+
+    # --- dev_sessions / session_summaries ---------------------------------
+
+    @abstractmethod
+    def start_session(
+        self,
+        session_id: str,
+        project_type: Optional[str],
+        repo_url: Optional[str],
+        context_file: Optional[str],
+        metadata: Optional[Dict[str, Any]],
+        started_at: datetime
+    ):
+        """Registrar una sesión activa (o reactivarla completando los datos que falten)"""
+
+    @abstractmethod
+    def end_session(self, session_id: str, status: str, ended_at: datetime) -> bool:
+        """Cerrar una sesión con su estado final (False si no existe)"""
+
+    @abstractmethod
+    def list_sessions(self, status: Optional[str], limit: int) -> List[Tuple]:
+        """
+        Sesiones más recientes, opcionalmente por estado
+
+        Returns:
+            Filas `SESSION_COLUMNS` + decisiones + tokens LLM, leídos de `session_summaries`
+        """
+
+    @abstractmethod
+    def add_session_counters(self, rows: List[Tuple]):
+        """
+        Sumar contadores a `session_summaries` en una transacción
+
+        Args:
+            rows: Filas (session_id, agent_name, *`SESSION_COUNTERS`, first_at, last_at)
+        """
+
+    @abstractmethod
+    def session_summary(self, session_id: str) -> Tuple[Optional[Tuple], List[Tuple]]:
+        """
+        Sesión y sus contadores en una sola conexión
+
+        Returns:
+            (fila `SESSION_COLUMNS` o None si no está registrada,
+            filas (agent_name, *`SESSION_COUNTERS`, first_at, last_at))
+        """
+
+    @abstractmethod
+    def rebuild_session_counters(self, session_id: str) -> int:
+        """
+        Recalcular desde `audit_log` las decisiones, la confianza y los
+        resultados de checkpoints de una sesión (los checkpoints solicitados
+        y los tokens LLM no están en `audit_log` y se conservan)
+
+        Returns:
+            Agentes con decisiones en la sesión
+        """
+
+
+def decision_filters(
+    since: Optional[datetime],
+    until: Optional[datetime],
+    agent_name: Optional[str],
+    placeholder: str,
+    session_id: Optional[str] = None
+) -> Tuple[str, List[Any]]:
+    """Cláusula WHERE (rango de timestamp, agente y sesión) y sus parámetros"""
+    conditions, params = [], []
+    if since is not None:
+        conditions.append(f"timestamp >= {placeholder}")
+        params.append(since)
+    if until is not None:
+        conditions.append(f"timestamp < {placeholder}")
+        params.append(until)
+    if agent_name:
+        conditions.append(f"agent_name = {placeholder}")
+        params.append(agent_name)
+    if session_id:
+        conditions.append(f"session_id = {placeholder}")
+        params.append(session_id)
+    return ("WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def document_columns(kind: str, content: str = "content") -> str:
+    """
+    Columnas de una versión de documento, iguales para especificaciones y planes
+
+    (id, version, encoding, contenido, created_at, approved, approved_at,
+    approved_by, tasks, specification_id); los planes no tienen subtipo y las
+    especificaciones no tienen tasks ni especificación de origen.
+
+    Args:
+        kind: Tipo de documento (`specification`, `plan`)
+        content: Expresión sobre la columna de contenido (`{}`) o `content`
+    """
+    content_column = DOCUMENT_TABLES[kind][1]
+    expression = content_column if content == "content" else content.format(content_column)
+    extra = "tasks, specification_id" if kind == "plan" else "NULL, NULL"
+    return f"id, version, encoding, {expression}, created_at, approved, approved_at, approved_by, {extra}"
+
+
+def document_filter(
+    kind: str,
+    session_id: str,
+    doc_type: Optional[str],
+    placeholder: str
+) -> Tuple[str, str, List[Any]]:
+    """
+    Tabla y condición que identifican un documento
+
+    Returns:
+        (tabla, condición WHERE sin la palabra clave, parámetros)
+    """
+    table, _, type_column = DOCUMENT_TABLES[kind]
+    if type_column is None:
+        return table, f"session_id = {placeholder}", [session_id]
+    return table, f"session_id = {placeholder} AND {type_column} = {placeholder}", [session_id, doc_type]
+
+
+def session_counters_upsert(placeholder: str, least: str = "LEAST", greatest: str = "GREATEST") -> str:
+    """INSERT que suma una fila de contadores a la de su (sesión, agente)"""
+    columns = ("session_id", "agent_name") + SESSION_COUNTERS + ("first_at", "last_at")
+    added = ",\n        ".join(f"{c} = session_summaries.{c} + excluded.{c}" for c in SESSION_COUNTERS)
+    return f"""
+    INSERT INTO session_summaries ({", ".join(columns)})
+    VALUES ({", ".join([placeholder] * len(columns))})
+    ON CONFLICT (session_id, agent_name) DO UPDATE SET
+        {added},
+        first_at = {least}(session_summaries.first_at, excluded.first_at),
+        last_at = {greatest}(session_summaries.last_at, excluded.last_at)
+    """
+
+
+def session_rebuild_statements(placeholder: str) -> Tuple[str, str]:
+    """
+    Sentencias de `rebuild_session_counters` (ambas con `session_id` como único parámetro)
+
+    Returns:
+        (UPDATE que pone a cero lo recalculable, INSERT ... SELECT desde `audit_log`)
+    """
+    outcomes = ("approved", "rejected", "timeout")
+    reset = ", ".join(["decisions = 0", "confidence_sum = 0"] + [f"checkpoints_{o} = 0" for o in outcomes])
+    counted = ", ".join(
+        f"sum(CASE WHEN action = 'checkpoint_{o}' THEN 1 ELSE 0 END)" for o in outcomes
+    )
+    columns = ", ".join(f"checkpoints_{o}" for o in outcomes)
+    replaced = ", ".join(
+        f"{c} = excluded.{c}"
+        for c in ("decisions", "confidence_sum") + tuple(f"checkpoints_{o}" for o in outcomes) + ("first_at", "last_at")
+    )
+    return (
+        f"UPDATE session_summaries SET {reset} WHERE session_id = {placeholder}",
+        f"""
+        INSERT INTO session_summaries (session_id, agent_name, decisions, confidence_sum, {columns}, first_at, last_at)
+        SELECT session_id, agent_name, count(*), sum(confidence), {counted}, min(timestamp), max(timestamp)
+        FROM audit_log
+        WHERE session_id = {placeholder}
+        GROUP BY session_id, agent_name
+        ON CONFLICT (session_id, agent_name) DO UPDATE SET {replaced}
+        """,
+    )
+
+
+def query_decision_statistics(cur) -> Dict[str, Any]:
+    """Estadísticas de `audit_log` con un cursor DB-API (común a los backends)"""
+    # Total de decisiones
+    cur.execute("SELECT COUNT(*) FROM audit_log")
+    total = cur.fetchone()[0]
+
+    # Decisiones por agente
+    cur.execute("""
+        SELECT agent_name, COUNT(*) as count
+        FROM audit_log
+        GROUP BY agent_name
+        ORDER BY count DESC
+    """)
+    by_agent = {row[0]: row[1] for row in cur.fetchall()}
+
+    # Decisiones por sesión
+    cur.execute("""
+        SELECT session_id, COUNT(*) as count
+        FROM audit_log
+        GROUP BY session_id
+        ORDER BY count DESC
+        LIMIT 10
+    """)
+    by_session = {row[0]: row[1] for row in cur.fetchall()}
+
+    # Confianza promedio
+    cur.execute("SELECT AVG(confidence) FROM audit_log")
+    avg_confidence = cur.fetchone()[0] or 0.0
+
+    return {
+        "total_decisions": total,
+        "by_agent": by_agent,
+        "by_session": by_session,
+        "average_confidence": float(avg_confidence)
+    }
+
+
+def resolve_url(url: Optional[str] = None) -> str:
+    """URL efectiva: la indicada, `DATABASE_URL` o `DEFAULT_URL`"""
+    return url or os.getenv("DATABASE_URL") or DEFAULT_URL
+
+
+def _scheme(url: str) -> str:
+    """Esquema de la URL (`postgresql` para conninfo `key=value`)"""
+    if "://" not in url:
+        return "postgresql"
+    return url.split("://", 1)[0].split("+", 1)[0].lower()
+
+
+_storages: Dict[str, StorageBackend] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(url: Optional[str] = None) -> StorageBackend:
+    """
+    Obtener el backend (compartido por proceso) para una URL
+
+    Args:
+        url: URL de la base de datos (default: DATABASE_URL o SQLite local)
+
+    Returns:
+        Backend PostgreSQL o SQLite según el esquema
+    """
+    url = resolve_url(url)
+    storage = _storages.get(url)
+    if storage is not None:
+        return storage
+
+    scheme = _scheme(url)
+    module_name = _BACKEND_MODULES.get(scheme)
+    if module_name is None:
+        raise ValueError(f"Esquema de base de datos no soportado: {scheme}")
+
+    with _storages_lock:
+        storage = _storages.get(url)
+        if storage is None:
+            if url == DEFAULT_URL and not os.getenv("DATABASE_URL"):
+                logger.debug(f"DATABASE_URL no configurada, usando {DEFAULT_URL}")
+            backend_class = importlib.import_module(module_name).BACKEND
+            storage = _storages[url] = backend_class(url)
+    return storage
+
+
+def close_storages():
+    """Cerrar todos los backends abiertos (hace durables las escrituras en lote)"""
+    with _storages_lock:
+        for storage in _storages.values():
+            storage.close()
+        _storages.clear()
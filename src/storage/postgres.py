@@ -0,0 +1,809 @@
+"""
+Storage - Backend PostgreSQL
+
+Las conexiones se obtienen con `src.utils.db.connect`, por lo que un pool
+activado con `enable_pool` (p.ej. en `sdd-auditd`) se reutiliza en todas las
+operaciones. `wait_for_status` espera vía LISTEN/NOTIFY y la cola de revisión
+se reclama con `FOR UPDATE SKIP LOCKED`.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from src.storage.base import (
+    PENDING, TIMEOUT, FULL, QUEUE_COLUMN_NAMES, QUEUE_COLUMNS, DECISION_COLUMNS, EXPORT_COLUMN_NAMES, DOCUMENT_TABLES,
+    SESSION_COLUMN_NAMES, SESSION_COLUMNS, SESSION_COUNTERS,
+    StorageBackend, decision_filters, document_columns, document_filter, query_decision_statistics,
+    session_counters_upsert, session_rebuild_statements,
+)
+from src.utils import db
+from src.utils.lazy_imports import lazy_module
+
+psycopg = lazy_module("psycopg")
+
+# Canal LISTEN/NOTIFY por el que se anuncian los cambios de estado
+EVENTS_CHANNEL = "hitl_checkpoint_events"
+
+# Configuración de texto de `audit_log.search_vector` (sin stemming: las
+# decisiones mezclan español e inglés)
+SEARCH_CONFIG = "simple"
+
+# Listas del índice ivfflat de `context_embeddings` recorridas en cada búsqueda
+CONTEXT_PROBES = int(os.getenv("CONTEXT_IVFFLAT_PROBES", "10"))
+
+# Columna e índices de búsqueda (mismas sentencias que scripts/00_pgvector.sql)
+SEARCH_DDL = (
+    f"""
+    ALTER TABLE audit_log ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(decision, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(reasoning, '')), 'B')
+        ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS audit_log_search_idx ON audit_log USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS audit_log_context_idx ON audit_log USING GIN (context jsonb_path_ops)",
+)
+
+
+# Tabla de blobs de context (mismas sentencias que scripts/00_pgvector.sql)
+BLOBS_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS audit_blobs (
+        digest CHAR(64) PRIMARY KEY,
+        encoding VARCHAR(10) NOT NULL,
+        data BYTEA NOT NULL,
+        size INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Los datos ya llegan comprimidos: TOAST los guarda fuera de línea sin recomprimir
+    "ALTER TABLE audit_blobs ALTER COLUMN data SET STORAGE EXTERNAL",
+)
+
+
+class PostgresStorage(StorageBackend):
+    """Backend sobre PostgreSQL (psycopg 3)"""
+
+    scheme = "postgresql"
+    # wait_for_status espera con LISTEN/NOTIFY
+    notifies_status = True
+
+    def enable_pool(self, max_size: int = 10) -> bool:
+        return db.enable_pool(self.url, max_size=max_size)
+
+    # --- audit_log -------------------------------------------------------
+
+    def insert_decision(
+        self,
+        agent_name: str,
+        action: str,
+        decision: str,
+        context_json: bytes,
+        reasoning: Optional[str],
+        confidence: float,
+        timestamp: datetime,
+        session_id: Optional[str],
+        user_id: Optional[str]
+    ):
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO audit_log (
+                        agent_name,
+                        action,
+                        decision,
+                        context,
+                        reasoning,
+                        confidence,
+                        timestamp,
+                        session_id,
+                        user_id
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    agent_name,
+                    action,
+                    decision,
+                    # Parámetro `jsonb` que envía los bytes ya serializados
+                    psycopg.types.json.Jsonb(context_json, dumps=lambda obj: obj),
+                    reasoning,
+                    confidence,
+                    timestamp,
+                    session_id,
+                    user_id
+                ))
+                conn.commit()
+
+    def recent_decisions(self, limit: int, agent_name: Optional[str] = None) -> List[Tuple]:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                if agent_name:
+                    cur.execute(f"""
+                        SELECT {DECISION_COLUMNS}, session_id
+                        FROM audit_log
+                        WHERE agent_name = %s
+                        ORDER BY timestamp DESC
+                        LIMIT %s
+                    """, (agent_name, limit))
+                else:
+                    cur.execute(f"""
+                        SELECT {DECISION_COLUMNS}, session_id
+                        FROM audit_log
+                        ORDER BY timestamp DESC
+                        LIMIT %s
+                    """, (limit,))
+                return cur.fetchall()
+
+    def decisions_by_session(self, session_id: str) -> List[Tuple]:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {DECISION_COLUMNS}
+                    FROM audit_log
+                    WHERE session_id = %s
+                    ORDER BY timestamp ASC
+                """, (session_id,))
+                return cur.fetchall()
+
+    def decision_statistics(self) -> Dict[str, Any]:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                return query_decision_statistics(cur)
+
+    def decision_buckets(
+        self,
+        bucket_seconds: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> List[Tuple[str, int, int, float]]:
+        where, params = decision_filters(since, until, None, "%s")
+        with db.connect(self.url) as conn:
+            return conn.execute(f"""
+                SELECT agent_name,
+                       floor(extract(epoch FROM timestamp) / %s)::bigint AS bucket,
+                       COUNT(*),
+                       COALESCE(SUM(confidence), 0)
+                FROM audit_log
+                {where}
+                GROUP BY agent_name, bucket
+                ORDER BY agent_name, bucket
+            """, [bucket_seconds, *params]).fetchall()
+
+    def search_decisions(
+        self,
+        text: Optional[str],
+        context: Optional[Dict[str, Any]],
+        agent_name: Optional[str],
+        session_id: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        after: Optional[Tuple[Any, int]],
+        limit: int
+    ) -> List[Tuple]:
+        where, params = decision_filters(since, until, agent_name, "%s", session_id)
+        conditions = [where[len("WHERE "):]] if where else []
+        if context:
+            # `@>` usa el índice GIN jsonb_path_ops
+            conditions.append("context @> %s")
+            params.append(psycopg.types.json.Jsonb(context))
+
+        if text:
+            conditions.append("search_vector @@ query")
+            source = f"audit_log, websearch_to_tsquery('{SEARCH_CONFIG}', %s) AS query"
+            rank, order = "ts_rank(search_vector, query)", "rank"
+            # El rank llega redondeado como texto: compararlo como real, no float8
+            position = "%s::real"
+            params.insert(0, text)
+        else:
+            source = "audit_log"
+            rank, order, position = "NULL::real", "timestamp", "%s"
+
+        keyset = ""
+        if after:
+            # Paginación por keyset sobre el orden de la página
+            keyset = f"WHERE ({order}, id) < ({position}, %s)"
+            params.extend(after)
+        params.append(limit)
+
+        with db.connect(self.url) as conn:
+            return conn.execute(f"""
+                SELECT * FROM (
+                    SELECT {DECISION_COLUMNS}, session_id, {rank} AS rank
+                    FROM {source}
+                    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                ) AS matches
+                {keyset}
+                ORDER BY {order} DESC, id DESC
+                LIMIT %s
+            """, params).fetchall()
+
+    def iter_decisions(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        agent_name: Optional[str] = None,
+        batch_size: int = 10000
+    ) -> Iterator[List[Tuple]]:
+        where, params = decision_filters(since, until, agent_name, "%s")
+        columns = ", ".join("context::text" if col == "context" else col for col in EXPORT_COLUMN_NAMES)
+        # Cursor del lado del servidor: PostgreSQL envía `batch_size` filas por viaje
+        with db.connect(self.url) as conn:
+            with conn.cursor(name="audit_log_export") as cur:
+                cur.itersize = batch_size
+                cur.execute(f"""
+                    SELECT {columns}
+                    FROM audit_log
+                    {where}
+                    ORDER BY timestamp ASC, id ASC
+                """, params)
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield rows
+
+    # --- audit_blobs -----------------------------------------------------
+
+    def insert_blobs(self, blobs: List[Tuple[str, str, bytes, int]], created_at: datetime):
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.executemany("""
+                    INSERT INTO audit_blobs (digest, encoding, data, size, created_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (digest) DO NOTHING
+                """, [(digest, encoding, data, size, created_at) for digest, encoding, data, size in blobs])
+            conn.commit()
+
+    def get_blobs(self, digests: List[str]) -> List[Tuple[str, str, bytes]]:
+        with db.connect(self.url) as conn:
+            return conn.execute("""
+                SELECT digest, encoding, data FROM audit_blobs WHERE digest = ANY(%s)
+            """, (digests,)).fetchall()
+
+    def decision_contexts(self, after_id: int, min_bytes: int, limit: int) -> List[Tuple[int, Optional[str]]]:
+        with db.connect(self.url) as conn:
+            return conn.execute("""
+                SELECT id, CASE WHEN octet_length(context::text) > %s THEN context::text END
+                FROM audit_log
+                WHERE id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (min_bytes, after_id, limit)).fetchall()
+
+    def update_decision_contexts(self, rows: List[Tuple[int, bytes]]):
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.executemany("UPDATE audit_log SET context = %s WHERE id = %s", [
+                    (psycopg.types.json.Jsonb(context_json, dumps=lambda obj: obj), decision_id)
+                    for decision_id, context_json in rows
+                ])
+            conn.commit()
+
+    def blob_statistics(self) -> Tuple[int, int, int]:
+        with db.connect(self.url) as conn:
+            return conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(octet_length(data)), 0), COALESCE(SUM(size), 0) FROM audit_blobs
+            """).fetchone()
+
+    # --- hitl_checkpoints ------------------------------------------------
+
+    def insert_checkpoint(
+        self,
+        checkpoint_name: str,
+        agent_name: str,
+        status: str,
+        priority: int,
+        timeout_seconds: Optional[int],
+        expires_at: Optional[datetime],
+        data: Dict[str, Any],
+        created_at: datetime,
+        reviewed_at: Optional[datetime],
+        reviewer: Optional[str],
+        comments: Optional[str]
+    ) -> int:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO hitl_checkpoints (
+                        checkpoint_name,
+                        agent_name,
+                        status,
+                        priority,
+                        timeout_seconds,
+                        expires_at,
+                        data,
+                        created_at,
+                        reviewed_at,
+                        reviewer,
+                        comments
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    RETURNING id
+                """, (
+                    checkpoint_name,
+                    agent_name,
+                    status,
+                    priority,
+                    timeout_seconds,
+                    expires_at,
+                    psycopg.types.json.Jsonb(data),
+                    created_at,
+                    reviewed_at,
+                    reviewer,
+                    comments
+                ))
+                checkpoint_id = cur.fetchone()[0]
+                conn.commit()
+                return checkpoint_id
+
+    def wait_for_status(self, checkpoint_id: int, timeout_seconds: Optional[float]) -> Optional[str]:
+        # Con timeout se escucha el canal NOTIFY: la aprobación, el rechazo o
+        # el sweeper despiertan al agente sin hacer polling sobre la tabla.
+        with db.connect(self.url, autocommit=True) as conn:
+            if timeout_seconds:
+                conn.execute(f"LISTEN {EVENTS_CHANNEL}")
+
+            row = conn.execute("""
+                SELECT status FROM hitl_checkpoints WHERE id = %s
+            """, (checkpoint_id,)).fetchone()
+            if not row:
+                return None
+
+            status = row[0]
+            deadline = time.monotonic() + (timeout_seconds or 0)
+            while status == PENDING and timeout_seconds:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                for notify in conn.notifies(timeout=remaining, stop_after=1):
+                    event = json.loads(notify.payload)
+                    if event.get("id") == checkpoint_id:
+                        status = event["status"]
+            return status
+
+    def resolve_checkpoint(
+        self,
+        checkpoint_id: int,
+        status: str,
+        reviewer: str,
+        comments: Optional[str],
+        reviewed_at: datetime
+    ) -> Optional[Tuple[datetime, Optional[Dict[str, Any]], Optional[str]]]:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE hitl_checkpoints
+                    SET status = %s,
+                        reviewed_at = %s,
+                        reviewer = %s,
+                        comments = %s
+                    WHERE id = %s AND status = %s
+                    RETURNING created_at, data->'trace', data->>'session_id'
+                """, (status, reviewed_at, reviewer, comments, checkpoint_id, PENDING))
+                updated = cur.fetchone()
+                if updated:
+                    # Se entrega al hacer commit, despertando a los waiters
+                    cur.execute("SELECT pg_notify(%s, %s)", (
+                        EVENTS_CHANNEL,
+                        json.dumps({"id": checkpoint_id, "status": status})
+                    ))
+                conn.commit()
+                return updated
+
+    def pending_checkpoints(self, limit: Optional[int], offset: int, include_data: bool) -> List[Tuple]:
+        data_column = ", data" if include_data else ""
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {QUEUE_COLUMNS}{data_column}
+                    FROM hitl_checkpoints
+                    WHERE status = %s
+                    ORDER BY priority DESC, created_at ASC, id ASC
+                    LIMIT %s OFFSET %s
+                """, (PENDING, limit, offset))
+                return cur.fetchall()
+
+    def count_pending_by_priority(self) -> List[Tuple[int, int]]:
+        with db.connect(self.url) as conn:
+            return conn.execute("""
+                SELECT priority, COUNT(*)
+                FROM hitl_checkpoints
+                WHERE status = %s
+                GROUP BY priority
+            """, (PENDING,)).fetchall()
+
+    def review_queue(
+        self,
+        after: Optional[Tuple[int, datetime, int]],
+        limit: int,
+        include_data: bool
+    ) -> List[Tuple]:
+        data_column = ", data" if include_data else ""
+        params: list[Any] = [PENDING]
+        keyset = ""
+        if after:
+            rank, created_at, checkpoint_id = after
+            # Orden (priority DESC, created_at ASC, id ASC)
+            keyset = """
+                AND (priority < %s
+                     OR (priority = %s AND (created_at, id) > (%s, %s)))
+            """
+            params.extend([rank, rank, created_at, checkpoint_id])
+        params.append(limit)
+
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT {QUEUE_COLUMNS}{data_column}
+                    FROM hitl_checkpoints
+                    WHERE status = %s {keyset}
+                    ORDER BY priority DESC, created_at ASC, id ASC
+                    LIMIT %s
+                """, params)
+                return cur.fetchall()
+
+    def claim_checkpoints(
+        self,
+        reviewer: str,
+        limit: int,
+        stale_before: datetime,
+        now: datetime
+    ) -> List[Tuple]:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    WITH next AS (
+                        SELECT id
+                        FROM hitl_checkpoints
+                        WHERE status = %s
+                          AND (claimed_at IS NULL OR claimed_at < %s OR claimed_by = %s)
+                        ORDER BY priority DESC, created_at ASC, id ASC
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE hitl_checkpoints c
+                    SET claimed_by = %s,
+                        claimed_at = %s
+                    FROM next
+                    WHERE c.id = next.id
+                    RETURNING {", ".join("c." + col for col in QUEUE_COLUMN_NAMES)}, c.data
+                """, (PENDING, stale_before, reviewer, limit, reviewer, now))
+                rows = cur.fetchall()
+                conn.commit()
+                return rows
+
+    def release_checkpoint(self, checkpoint_id: int, reviewer: str) -> bool:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    UPDATE hitl_checkpoints
+                    SET claimed_by = NULL,
+                        claimed_at = NULL
+                    WHERE id = %s AND claimed_by = %s AND status = %s
+                """, (checkpoint_id, reviewer, PENDING))
+                released = cur.rowcount > 0
+                conn.commit()
+                return released
+
+    def expire_overdue_checkpoints(
+        self,
+        batch_size: int,
+        max_batches: int,
+        reviewer: str,
+        session_id: str
+    ) -> Dict[str, int]:
+        # Cada lote es una única sentencia: marca los checkpoints como
+        # `timeout` (vía el índice parcial `hitl_checkpoints_expiry_idx`),
+        # los registra en `audit_log` con un solo INSERT ... SELECT en la
+        # sesión de cada checkpoint y emite un NOTIFY por checkpoint para
+        # despertar a `wait_for_approval`.
+        counts: Dict[str, int] = {}
+        with db.connect(self.url) as conn:
+            for _ in range(max_batches):
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        WITH overdue AS (
+                            SELECT id
+                            FROM hitl_checkpoints
+                            WHERE status = %(pending)s::text
+                              AND expires_at <= %(now)s
+                            ORDER BY expires_at
+                            LIMIT %(batch_size)s
+                            FOR UPDATE SKIP LOCKED
+                        ),
+                        expired AS (
+                            UPDATE hitl_checkpoints c
+                            SET status = %(timeout)s::text,
+                                reviewed_at = %(now)s,
+                                reviewer = %(reviewer)s::text,
+                                comments = 'Expirado tras ' || c.timeout_seconds || 's sin revisión'
+                            FROM overdue
+                            WHERE c.id = overdue.id
+                            RETURNING c.id, c.timeout_seconds, COALESCE(
+                                c.data->>'session_id',
+                                c.data->'trace'->>'session_id',
+                                %(session_id)s::text
+                            ) AS session_id
+                        ),
+                        logged AS (
+                            INSERT INTO audit_log (
+                                agent_name,
+                                action,
+                                decision,
+                                context,
+                                reasoning,
+                                confidence,
+                                session_id
+                            )
+                            SELECT
+                                'hitl_system',
+                                'checkpoint_' || %(timeout)s::text,
+                                'Checkpoint ' || id || ' ' || %(timeout)s::text,
+                                jsonb_build_object(
+                                    'checkpoint_id', id,
+                                    'reviewer', %(reviewer)s::text,
+                                    'timeout_seconds', timeout_seconds
+                                ),
+                                'Checkpoint expirado sin revisión',
+                                1.0,
+                                session_id
+                            FROM expired
+                        )
+                        SELECT session_id, pg_notify(
+                            %(channel)s::text,
+                            json_build_object('id', id, 'status', %(timeout)s::text)::text
+                        )
+                        FROM expired
+                    """, {
+                        "pending": PENDING,
+                        "timeout": TIMEOUT,
+                        "now": datetime.now(),
+                        "batch_size": batch_size,
+                        "reviewer": reviewer,
+                        "session_id": session_id,
+                        "channel": EVENTS_CHANNEL,
+                    })
+                    expired = cur.fetchall()
+                conn.commit()
+
+                for session, _ in expired:
+                    counts[session] = counts.get(session, 0) + 1
+                if len(expired) < batch_size:
+                    break
+        return counts
+
+    # --- context_embeddings ----------------------------------------------
+
+    def insert_context_chunks(
+        self,
+        chunks: List[Tuple[str, List[float], Dict[str, Any], Optional[str]]]
+    ) -> List[int]:
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.executemany("""
+                    INSERT INTO context_embeddings (content, embedding, metadata, source)
+                    VALUES (%s, %s::vector, %s, %s)
+                    RETURNING id
+                """, [
+                    (content, _vector(embedding), psycopg.types.json.Jsonb(metadata), source)
+                    for content, embedding, metadata, source in chunks
+                ], returning=True)
+                ids = []
+                while True:
+                    ids.append(cur.fetchone()[0])
+                    if not cur.nextset():
+                        break
+            conn.commit()
+        return ids
+
+    def search_context(
+        self,
+        embedding: List[float],
+        limit: int,
+        source: Optional[str] = None
+    ) -> List[Tuple[int, str, Dict[str, Any], Optional[str], float]]:
+        vector = _vector(embedding)
+        with db.connect(self.url) as conn:
+            # ivfflat con un solo probe pierde vecinos en tablas pequeñas o recién indexadas
+            conn.execute(f"SET LOCAL ivfflat.probes = {CONTEXT_PROBES}")
+            rows = conn.execute(f"""
+                SELECT id, content, metadata, source, 1 - (embedding <=> %s::vector)
+                FROM context_embeddings
+                {"WHERE source = %s" if source is not None else ""}
+                ORDER BY embedding <=> %s::vector
+                LIMIT %s
+            """, [vector, *([source] if source is not None else []), vector, limit]).fetchall()
+            conn.commit()
+        return rows
+
+    def delete_context(self, source: Optional[str] = None) -> int:
+        with db.connect(self.url) as conn:
+            if source is None:
+                deleted = conn.execute("DELETE FROM context_embeddings").rowcount
+            else:
+                deleted = conn.execute("DELETE FROM context_embeddings WHERE source = %s", (source,)).rowcount
+            conn.commit()
+        return deleted
+
+    # --- specifications / implementation_plans ---------------------------
+
+    def insert_document_version(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: int,
+        encoding: str,
+        content: str,
+        created_at: datetime,
+        tasks: Optional[Any] = None,
+        specification_id: Optional[int] = None
+    ) -> Optional[int]:
+        table, content_column, type_column = DOCUMENT_TABLES[kind]
+        values = {"session_id": session_id, content_column: content, "version": version,
+                  "encoding": encoding, "created_at": created_at}
+        if type_column is not None:
+            values[type_column] = doc_type
+        if kind == "plan":
+            values["tasks"] = psycopg.types.json.Jsonb(tasks) if tasks is not None else None
+            values["specification_id"] = specification_id
+
+        with db.connect(self.url) as conn:
+            # `session_id` referencia a dev_sessions
+            conn.execute("""
+                INSERT INTO dev_sessions (session_id) VALUES (%s)
+                ON CONFLICT (session_id) DO NOTHING
+            """, (session_id,))
+            # El índice único (documento, versión) resuelve escrituras concurrentes
+            row = conn.execute(f"""
+                INSERT INTO {table} ({", ".join(values)})
+                VALUES ({", ".join(["%s"] * len(values))})
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """, list(values.values())).fetchone()
+            conn.commit()
+        return row[0] if row else None
+
+    def document_chain(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: Optional[int] = None
+    ) -> List[Tuple]:
+        table, condition, params = document_filter(kind, session_id, doc_type, "%s")
+        with db.connect(self.url) as conn:
+            return conn.execute(f"""
+                WITH target AS (
+                    SELECT COALESCE(%s::int, max(version)) AS v FROM {table} WHERE {condition}
+                ), snapshot AS (
+                    SELECT max(version) AS v
+                    FROM {table}, target
+                    WHERE {condition} AND version <= target.v AND encoding = '{FULL}'
+                )
+                SELECT {document_columns(kind)}
+                FROM {table}, target, snapshot
+                WHERE {condition} AND version BETWEEN snapshot.v AND target.v
+                ORDER BY version
+            """, [version, *params, *params, *params]).fetchall()
+
+    def document_versions(self, kind: str, session_id: str, doc_type: Optional[str]) -> List[Tuple]:
+        table, condition, params = document_filter(kind, session_id, doc_type, "%s")
+        with db.connect(self.url) as conn:
+            return conn.execute(f"""
+                SELECT {document_columns(kind, "length({})")}
+                FROM {table}
+                WHERE {condition}
+                ORDER BY version
+            """, params).fetchall()
+
+    def latest_document_version(self, kind: str, session_id: str, doc_type: Optional[str]) -> Optional[int]:
+        table, condition, params = document_filter(kind, session_id, doc_type, "%s")
+        with db.connect(self.url) as conn:
+            return conn.execute(f"SELECT max(version) FROM {table} WHERE {condition}", params).fetchone()[0]
+
+    def approve_document_version(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: int,
+        approved_by: str,
+        approved_at: datetime
+    ) -> bool:
+        table, condition, params = document_filter(kind, session_id, doc_type, "%s")
+        with db.connect(self.url) as conn:
+            updated = conn.execute(f"""
+                UPDATE {table}
+                SET approved = true,
+                    approved_at = %s,
+                    approved_by = %s
+                WHERE {condition} AND version = %s
+            """, [approved_at, approved_by, *params, version]).rowcount
+            conn.commit()
+        return updated > 0
+
+    # --- dev_sessions / session_summaries ---------------------------------
+
+    def start_session(
+        self,
+        session_id: str,
+        project_type: Optional[str],
+        repo_url: Optional[str],
+        context_file: Optional[str],
+        metadata: Optional[Dict[str, Any]],
+        started_at: datetime
+    ):
+        with db.connect(self.url) as conn:
+            conn.execute("""
+                INSERT INTO dev_sessions (session_id, project_type, repo_url, context_file, started_at, status, metadata)
+                VALUES (%s, %s, %s, %s, %s, 'active', %s)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    project_type = COALESCE(excluded.project_type, dev_sessions.project_type),
+                    repo_url = COALESCE(excluded.repo_url, dev_sessions.repo_url),
+                    context_file = COALESCE(excluded.context_file, dev_sessions.context_file),
+                    metadata = COALESCE(excluded.metadata, dev_sessions.metadata),
+                    status = 'active',
+                    ended_at = NULL
+            """, (session_id, project_type, repo_url, context_file, started_at,
+                  psycopg.types.json.Jsonb(metadata) if metadata is not None else None))
+            conn.commit()
+
+    def end_session(self, session_id: str, status: str, ended_at: datetime) -> bool:
+        with db.connect(self.url) as conn:
+            updated = conn.execute("""
+                UPDATE dev_sessions SET status = %s, ended_at = %s WHERE session_id = %s
+            """, (status, ended_at, session_id)).rowcount
+            conn.commit()
+        return updated > 0
+
+    def list_sessions(self, status: Optional[str], limit: int) -> List[Tuple]:
+        columns = ", ".join(f"s.{c}" for c in SESSION_COLUMN_NAMES)
+        where, params = ("WHERE s.status = %s", [status]) if status else ("", [])
+        with db.connect(self.url) as conn:
+            return conn.execute(f"""
+                SELECT {columns},
+                       COALESCE(sum(c.decisions), 0)::bigint,
+                       COALESCE(sum(c.prompt_tokens + c.completion_tokens), 0)::bigint
+                FROM dev_sessions s
+                LEFT JOIN session_summaries c ON c.session_id = s.session_id
+                {where}
+                GROUP BY s.id
+                ORDER BY s.started_at DESC NULLS LAST, s.id DESC
+                LIMIT %s
+            """, [*params, limit]).fetchall()
+
+    def add_session_counters(self, rows: List[Tuple]):
+        with db.connect(self.url) as conn:
+            with conn.cursor() as cur:
+                cur.executemany(session_counters_upsert("%s"), rows)
+            conn.commit()
+
+    def session_summary(self, session_id: str) -> Tuple[Optional[Tuple], List[Tuple]]:
+        with db.connect(self.url) as conn:
+            session = conn.execute(
+                f"SELECT {SESSION_COLUMNS} FROM dev_sessions WHERE session_id = %s", (session_id,)
+            ).fetchone()
+            counters = conn.execute(f"""
+                SELECT agent_name, {", ".join(SESSION_COUNTERS)}, first_at, last_at
+                FROM session_summaries
+                WHERE session_id = %s
+                ORDER BY decisions DESC, agent_name
+            """, (session_id,)).fetchall()
+        return session, counters
+
+    def rebuild_session_counters(self, session_id: str) -> int:
+        reset, recount = session_rebuild_statements("%s")
+        with db.connect(self.url) as conn:
+            conn.execute(reset, (session_id,))
+            agents = conn.execute(recount, (session_id,)).rowcount
+            conn.commit()
+        return agents
+
+
+def _vector(embedding: List[float]) -> str:
+    """Embedding como literal de pgvector (`[0.1,0.2,...]`)"""
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+
+BACKEND = PostgresStorage
@@ -0,0 +1,1170 @@
+"""
+Storage - Backend SQLite embebido
+
+Alternativa local a PostgreSQL con la misma API de consultas: auditoría,
+estadísticas, cola de revisión HITL, reclamos, sweeper de timeouts,
+búsqueda de contexto por embeddings (fuerza bruta sobre vectores float32),
+versiones de especificaciones y planes, y sesiones con sus resúmenes.
+
+- Una conexión por proceso en modo WAL (`synchronous=NORMAL`), de modo que
+  las lecturas no bloquean a las escrituras ni entre procesos
+- Las decisiones de auditoría se agrupan en una transacción abierta que se
+  confirma cada `SQLITE_BATCH_SIZE` decisiones o tras
+  `SQLITE_COMMIT_INTERVAL_MS`; un `log_decision` cuesta un INSERT en memoria
+  (sub-milisegundo) en lugar de un fsync
+- A cambio, `log_decision` retorna True antes de que la fila esté confirmada:
+  si el proceso muere sin pasar por `flush()`/`close()` (los llama `atexit`
+  al salir normalmente) se pierden hasta `SQLITE_BATCH_SIZE` decisiones o las
+  de los últimos `SQLITE_COMMIT_INTERVAL_MS`. Quien termine el proceso por
+  otra vía (`os._exit`, señales sin manejar) debe llamar antes a `flush()`.
+  `SQLITE_BATCH_SIZE=1` confirma cada decisión, como PostgreSQL
+- Las operaciones HITL confirman de inmediato (`BEGIN IMMEDIATE` para los
+  reclamos y el sweeper) y despiertan a los waiters del mismo proceso; los
+  de otros procesos consultan cada `SQLITE_POLL_INTERVAL` segundos
+
+El esquema se crea al abrir la base de datos. Las fechas se guardan como
+texto ISO 8601 (ordenable) y los campos JSON como texto.
+"""
+import atexit
+import heapq
+import math
+import operator
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.storage.base import (
+    PENDING, TIMEOUT, FULL, QUEUE_COLUMNS, DECISION_COLUMNS, EXPORT_COLUMN_NAMES, DOCUMENT_TABLES,
+    SESSION_COLUMN_NAMES, SESSION_COLUMNS, SESSION_COUNTERS, StorageBackend,
+    decision_filters, document_columns, document_filter, query_decision_statistics,
+    session_counters_upsert, session_rebuild_statements,
+)
+from src.utils import fast_json
+from src.utils.lazy_imports import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    agent_name TEXT NOT NULL,
+    action TEXT NOT NULL,
+    decision TEXT NOT NULL,
+    context TEXT,
+    reasoning TEXT,
+    confidence REAL,
+    timestamp TEXT NOT NULL,
+    session_id TEXT,
+    user_id TEXT
+);
+
+CREATE INDEX IF NOT EXISTS audit_log_agent_idx ON audit_log(agent_name);
+CREATE INDEX IF NOT EXISTS audit_log_timestamp_idx ON audit_log(timestamp DESC);
+CREATE INDEX IF NOT EXISTS audit_log_session_idx ON audit_log(session_id);
+
+-- Búsqueda de texto: índice FTS5 sobre audit_log mantenido por triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS audit_log_fts USING fts5(
+    decision, reasoning,
+    content='audit_log', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 0'
+);
+
+CREATE TRIGGER IF NOT EXISTS audit_log_fts_insert AFTER INSERT ON audit_log BEGIN
+    INSERT INTO audit_log_fts(rowid, decision, reasoning) VALUES (new.id, new.decision, new.reasoning);
+END;
+
+CREATE TRIGGER IF NOT EXISTS audit_log_fts_delete AFTER DELETE ON audit_log BEGIN
+    INSERT INTO audit_log_fts(audit_log_fts, rowid, decision, reasoning)
+    VALUES ('delete', old.id, old.decision, old.reasoning);
+END;
+
+-- Valores grandes de context guardados una vez por contenido (ver src/audit/blobs.py)
+CREATE TABLE IF NOT EXISTS audit_blobs (
+    digest TEXT PRIMARY KEY,
+    encoding TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS hitl_checkpoints (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    checkpoint_name TEXT NOT NULL,
+    agent_name TEXT NOT NULL,
+    status TEXT DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 1,
+    timeout_seconds INTEGER,
+    expires_at TEXT,
+    data TEXT,
+    created_at TEXT NOT NULL,
+    claimed_by TEXT,
+    claimed_at TEXT,
+    reviewed_at TEXT,
+    reviewer TEXT,
+    comments TEXT
+);
+
+CREATE INDEX IF NOT EXISTS hitl_checkpoints_status_idx ON hitl_checkpoints(status);
+CREATE INDEX IF NOT EXISTS hitl_checkpoints_created_idx ON hitl_checkpoints(created_at DESC);
+
+CREATE INDEX IF NOT EXISTS hitl_checkpoints_pending_queue_idx
+ON hitl_checkpoints(priority DESC, created_at ASC, id ASC)
+WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS hitl_checkpoints_expiry_idx
+ON hitl_checkpoints(expires_at)
+WHERE status = 'pending' AND expires_at IS NOT NULL;
+
+-- Embeddings normalizados como float32 (búsqueda por fuerza bruta)
+CREATE TABLE IF NOT EXISTS context_embeddings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    metadata TEXT,
+    source TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS context_embeddings_source_idx ON context_embeddings(source);
+
+CREATE TABLE IF NOT EXISTS dev_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT UNIQUE NOT NULL,
+    project_type TEXT,
+    repo_url TEXT,
+    context_file TEXT,
+    started_at TEXT,
+    ended_at TEXT,
+    status TEXT DEFAULT 'active',
+    metadata TEXT
+);
+
+-- Versiones como texto completo (`full`) o delta contra la anterior (`delta`)
+CREATE TABLE IF NOT EXISTS specifications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT REFERENCES dev_sessions(session_id),
+    spec_type TEXT,
+    content TEXT NOT NULL,
+    version INTEGER DEFAULT 1,
+    encoding TEXT NOT NULL DEFAULT 'full',
+    approved INTEGER DEFAULT 0,
+    created_at TEXT NOT NULL,
+    approved_at TEXT,
+    approved_by TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS specifications_version_idx
+ON specifications(session_id, spec_type, version);
+
+CREATE TABLE IF NOT EXISTS implementation_plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT REFERENCES dev_sessions(session_id),
+    specification_id INTEGER REFERENCES specifications(id),
+    plan_content TEXT NOT NULL,
+    tasks TEXT,
+    version INTEGER DEFAULT 1,
+    encoding TEXT NOT NULL DEFAULT 'full',
+    approved INTEGER DEFAULT 0,
+    created_at TEXT NOT NULL,
+    approved_at TEXT,
+    approved_by TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS implementation_plans_version_idx
+ON implementation_plans(session_id, version);
+
+CREATE INDEX IF NOT EXISTS dev_sessions_status_idx ON dev_sessions(status, started_at);
+
+-- Contadores por sesión y agente que se suman en cada escritura (SessionTracker)
+CREATE TABLE IF NOT EXISTS session_summaries (
+    session_id TEXT NOT NULL,
+    agent_name TEXT NOT NULL,
+    decisions INTEGER NOT NULL DEFAULT 0,
+    confidence_sum REAL NOT NULL DEFAULT 0,
+    checkpoints_requested INTEGER NOT NULL DEFAULT 0,
+    checkpoints_approved INTEGER NOT NULL DEFAULT 0,
+    checkpoints_rejected INTEGER NOT NULL DEFAULT 0,
+    checkpoints_timeout INTEGER NOT NULL DEFAULT 0,
+    llm_calls INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    first_at TEXT,
+    last_at TEXT,
+    PRIMARY KEY (session_id, agent_name)
+);
+"""
+
+
+def _ts(value: Optional[datetime]) -> Optional[str]:
+    """datetime -> texto ISO 8601 con precisión fija (ordenable como texto)"""
+    return value.isoformat(sep=" ", timespec="microseconds") if value is not None else None
+
+
+def _dt(value: Optional[str]) -> Optional[datetime]:
+    """Texto ISO 8601 -> datetime"""
+    return datetime.fromisoformat(value) if value is not None else None
+
+
+def _json(value: Optional[str]) -> Any:
+    return fast_json.loads(value) if value is not None else None
+
+
+def _decision_row(row: Tuple) -> Tuple:
+    """Fila de `DECISION_COLUMNS` (+ session_id) con context y timestamp decodificados"""
+    return row[:4] + (_json(row[4]),) + row[5:7] + (_dt(row[7]),) + row[8:]
+
+
+def _fts_query(text: str) -> str:
+    """
+    Consulta estilo `websearch_to_tsquery` -> sintaxis FTS5
+
+    Términos sueltos (AND), "frases", `or` y `-excluido`; cada término se
+    cita para que la puntuación no se interprete como operador.
+    """
+    terms: List[str] = []
+    for token in re.findall(r'"[^"]*"|\S+', text):
+        if token.lower() == "or":
+            if terms and terms[-1] not in ("OR", "NOT"):
+                terms.append("OR")
+            continue
+        negated = token.startswith("-") and len(token) > 1
+        phrase = token[1:] if negated else token
+        phrase = phrase[1:-1] if len(phrase) > 1 and phrase.startswith('"') else phrase
+        if not phrase.strip():
+            continue
+        if negated:
+            if not terms or terms[-1] in ("OR", "NOT"):
+                continue
+            terms.append("NOT")
+        terms.append('"' + phrase.replace('"', '""') + '"')
+    while terms and terms[-1] in ("OR", "NOT"):
+        terms.pop()
+    return " ".join(terms)
+
+
+def _context_conditions(context: Dict[str, Any], path: str = "$") -> Tuple[List[str], List[Any]]:
+    """Condiciones equivalentes a `context @> ...` de PostgreSQL con las funciones JSON"""
+    conditions: List[str] = []
+    params: List[Any] = []
+    for key, value in context.items():
+        key_path = f'{path}."{key}"'
+        if isinstance(value, dict):
+            nested_conditions, nested_params = _context_conditions(value, key_path)
+            conditions.extend(nested_conditions)
+            params.extend(nested_params)
+        elif isinstance(value, list):
+            # Cada elemento debe estar en el array
+            for item in value:
+                if isinstance(item, (dict, list)):
+                    raise ValueError(f"Filtro de context no soportado en SQLite: {key}")
+                conditions.append("EXISTS (SELECT 1 FROM json_each(context, ?) WHERE value = ?)")
+                params.extend([key_path, item])
+        elif value is None:
+            conditions.append("json_type(context, ?) = 'null'")
+            params.append(key_path)
+        else:
+            conditions.append("json_extract(context, ?) = ?")
+            params.extend([key_path, value])
+    return conditions, params
+
+
+def _queue_row(row: Tuple) -> Tuple:
+    """Fila de `QUEUE_COLUMNS` (+ data) con fechas y JSON decodificados"""
+    decoded = row[:5] + (_dt(row[5]), _dt(row[6]), row[7], _dt(row[8]))
+    if len(row) > 9:
+        decoded += (_json(row[9]),)
+    return decoded
+
+
+def path_from_url(url: str) -> str:
+    """
+    Ruta del archivo de una URL `sqlite:///...`
+
+    `sqlite:///rel.db` es relativa al directorio actual, `sqlite:////abs.db`
+    absoluta y `sqlite:///:memory:` una base de datos en memoria.
+    """
+    prefix = "sqlite:///"
+    if not url.startswith(prefix) or len(url) == len(prefix):
+        raise ValueError(f"URL SQLite inválida: {url} (formato: sqlite:///ruta.db)")
+    return url[len(prefix):].split("?", 1)[0]
+
+
+class SQLiteStorage(StorageBackend):
+    """Backend sobre un archivo SQLite compartido por los hilos del proceso"""
+
+    scheme = "sqlite"
+
+    def __init__(self, url: str):
+        super().__init__(url)
+        self.path = path_from_url(url)
+        self.batch_size = max(1, int(os.getenv("SQLITE_BATCH_SIZE", "100")))
+        self.commit_interval = float(os.getenv("SQLITE_COMMIT_INTERVAL_MS", "50")) / 1000
+        self.poll_interval = float(os.getenv("SQLITE_POLL_INTERVAL", "0.25"))
+        self.busy_timeout = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        # Notifica cambios de estado de checkpoints a los waiters del proceso
+        self._changed = threading.Condition(self._lock)
+        self._pending_writes = 0
+        # Callbacks de after_commit que esperan a que se confirme el lote
+        self._commit_callbacks: List[Callable[[], None]] = []
+        self._dirty = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    # --- Conexión y transacciones ----------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._lock:
+                if self._conn is None:
+                    if self.path != ":memory:":
+                        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                    # isolation_level=None: las transacciones se abren explícitamente
+                    conn = sqlite3.connect(
+                        self.path,
+                        timeout=self.busy_timeout,
+                        isolation_level=None,
+                        check_same_thread=False
+                    )
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    has_fts = conn.execute(
+                        "SELECT 1 FROM sqlite_master WHERE name = 'audit_log_fts'"
+                    ).fetchone()
+                    conn.executescript(SCHEMA)
+                    if not has_fts:
+                        # Bases anteriores a la búsqueda: indexar las decisiones existentes
+                        conn.execute("INSERT INTO audit_log_fts(audit_log_fts) VALUES ('rebuild')")
+                    self._conn = conn
+                    atexit.register(self.close)
+                    logger.debug(f"SQLite abierto en {self.path} (batch={self.batch_size})")
+        return self._conn
+
+    @contextmanager
+    def _savepoint(self, conn: sqlite3.Connection):
+        """
+        Deshacer solo las sentencias del bloque si falla (con el lock)
+
+        Las decisiones en lote ya escritas en la transacción abierta se
+        conservan: `log_decision` ya las dio por registradas.
+        """
+        conn.execute("SAVEPOINT operation")
+        try:
+            yield
+        except BaseException:
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK TO operation")
+                    conn.execute("RELEASE operation")
+                except sqlite3.Error:
+                    conn.rollback()
+            if not self._pending_writes:
+                # Transacción abierta solo para este bloque
+                if conn.in_transaction:
+                    conn.rollback()
+            elif not conn.in_transaction:
+                # SQLite deshizo la transacción entera (p.ej. disco lleno)
+                logger.error(f"Lote SQLite perdido: {self._pending_writes} escrituras sin confirmar")
+                self._pending_writes = 0
+                self._commit_callbacks.clear()
+            raise
+        conn.execute("RELEASE operation")
+
+    @contextmanager
+    def _write(self):
+        """
+        Transacción de escritura que se confirma al salir del bloque
+
+        Si hay decisiones en lote pendientes, la transacción ya tiene el
+        bloqueo de escritura y se confirman junto con esta operación. Si el
+        bloque falla solo se deshace lo suyo y el lote sigue pendiente.
+        """
+        with self._lock:
+            conn = self._connection()
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            with self._savepoint(conn):
+                yield conn
+            conn.commit()
+            self._committed()
+
+    def flush(self):
+        """Confirmar las decisiones en lote pendientes"""
+        with self._lock:
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.commit()
+            self._committed()
+
+    def _committed(self):
+        """Lote confirmado: ejecutar sus callbacks de after_commit (con el lock)"""
+        self._pending_writes = 0
+        self._dirty.clear()
+        callbacks, self._commit_callbacks = self._commit_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error en callback tras confirmar lote SQLite: {e}")
+
+    def after_commit(self, callback: Callable[[], None]):
+        with self._lock:
+            if self._pending_writes:
+                self._commit_callbacks.append(callback)
+                return
+        callback()
+
+    def _flush_loop(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.commit_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.error(f"Error confirmando lote SQLite: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+                self._conn = None
+
+    # --- audit_log -------------------------------------------------------
+
+    def insert_decision(
+        self,
+        agent_name: str,
+        action: str,
+        decision: str,
+        context_json: bytes,
+        reasoning: Optional[str],
+        confidence: float,
+        timestamp: datetime,
+        session_id: Optional[str],
+        user_id: Optional[str]
+    ):
+        with self._lock:
+            conn = self._connection()
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            with self._savepoint(conn):
+                conn.execute("""
+                    INSERT INTO audit_log (
+                        agent_name,
+                        action,
+                        decision,
+                        context,
+                        reasoning,
+                        confidence,
+                        timestamp,
+                        session_id,
+                        user_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    agent_name,
+                    action,
+                    decision,
+                    context_json.decode("utf-8"),
+                    reasoning,
+                    confidence,
+                    _ts(timestamp),
+                    session_id,
+                    user_id
+                ))
+            self._batch_written()
+
+    def _batch_written(self):
+        """Contar una escritura del lote abierto y programar su confirmación (con el lock)"""
+        self._pending_writes += 1
+        if self._pending_writes >= self.batch_size:
+            self.flush()
+        elif not self._dirty.is_set():
+            self._dirty.set()
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="sqlite-batch-commit", daemon=True
+                )
+                self._flusher.start()
+
+    def recent_decisions(self, limit: int, agent_name: Optional[str] = None) -> List[Tuple]:
+        with self._lock:
+            conn = self._connection()
+            if agent_name:
+                rows = conn.execute(f"""
+                    SELECT {DECISION_COLUMNS}, session_id
+                    FROM audit_log
+                    WHERE agent_name = ?
+                    ORDER BY timestamp DESC
+                    LIMIT ?
+                """, (agent_name, limit)).fetchall()
+            else:
+                rows = conn.execute(f"""
+                    SELECT {DECISION_COLUMNS}, session_id
+                    FROM audit_log
+                    ORDER BY timestamp DESC
+                    LIMIT ?
+                """, (limit,)).fetchall()
+        return [_decision_row(row) for row in rows]
+
+    def decisions_by_session(self, session_id: str) -> List[Tuple]:
+        with self._lock:
+            rows = self._connection().execute(f"""
+                SELECT {DECISION_COLUMNS}
+                FROM audit_log
+                WHERE session_id = ?
+                ORDER BY timestamp ASC
+            """, (session_id,)).fetchall()
+        return [_decision_row(row) for row in rows]
+
+    def decision_statistics(self) -> Dict[str, Any]:
+        with self._lock:
+            return query_decision_statistics(self._connection().cursor())
+
+    def decision_buckets(
+        self,
+        bucket_seconds: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ) -> List[Tuple[str, int, int, float]]:
+        where, params = decision_filters(since, until, None, "?")
+        params = [_ts(p) for p in params]
+        with self._lock:
+            return self._connection().execute(f"""
+                SELECT agent_name,
+                       CAST(strftime('%s', timestamp) AS INTEGER) / ? AS bucket,
+                       COUNT(*),
+                       COALESCE(SUM(confidence), 0)
+                FROM audit_log
+                {where}
+                GROUP BY agent_name, bucket
+                ORDER BY agent_name, bucket
+            """, [bucket_seconds, *params]).fetchall()
+
+    def search_decisions(
+        self,
+        text: Optional[str],
+        context: Optional[Dict[str, Any]],
+        agent_name: Optional[str],
+        session_id: Optional[str],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        after: Optional[Tuple[Any, int]],
+        limit: int
+    ) -> List[Tuple]:
+        where, params = decision_filters(since, until, agent_name, "?", session_id)
+        conditions = [where[len("WHERE "):]] if where else []
+        params = [_ts(p) if isinstance(p, datetime) else p for p in params]
+        if context:
+            context_conditions, context_params = _context_conditions(context)
+            conditions.extend(context_conditions)
+            params.extend(context_params)
+
+        if text:
+            match = _fts_query(text)
+            if not match:
+                return []
+            # bm25: menor es mejor; pesos como setweight A/B de PostgreSQL
+            hits = """
+                WITH hits AS (
+                    SELECT rowid AS hit_id, -bm25(audit_log_fts, 2.0, 1.0) AS rank
+                    FROM audit_log_fts
+                    WHERE audit_log_fts MATCH ?
+                )
+            """
+            source, rank, order = "audit_log JOIN hits ON id = hit_id", "rank", "rank"
+            params.insert(0, match)
+        else:
+            hits, source, rank, order = "", "audit_log", "NULL", "timestamp"
+
+        keyset = ""
+        if after:
+            keyset = f"WHERE ({order}, id) < (?, ?)"
+            params.extend([_ts(after[0]) if isinstance(after[0], datetime) else after[0], after[1]])
+        params.append(limit)
+
+        with self._lock:
+            rows = self._connection().execute(f"""
+                {hits}
+                SELECT * FROM (
+                    SELECT {DECISION_COLUMNS}, session_id, {rank} AS rank
+                    FROM {source}
+                    {"WHERE " + " AND ".join(conditions) if conditions else ""}
+                )
+                {keyset}
+                ORDER BY {order} DESC, id DESC
+                LIMIT ?
+            """, params).fetchall()
+        return [_decision_row(row) for row in rows]
+
+    def iter_decisions(
+        self,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        agent_name: Optional[str] = None,
+        batch_size: int = 10000
+    ) -> Iterator[List[Tuple]]:
+        where, params = decision_filters(since, until, agent_name, "?")
+        params = [_ts(p) if isinstance(p, datetime) else p for p in params]
+        self._connection()
+        self.flush()
+        if self.path == ":memory:":
+            conn, lock = self._connection(), self._lock
+        else:
+            # Conexión de solo lectura propia: en WAL no bloquea a los escritores
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            lock = threading.Lock()
+        try:
+            with lock:
+                cur = conn.execute(f"""
+                    SELECT {", ".join(EXPORT_COLUMN_NAMES)}
+                    FROM audit_log
+                    {where}
+                    ORDER BY timestamp ASC, id ASC
+                """, params)
+            while True:
+                with lock:
+                    rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [row[:7] + (_dt(row[7]),) + row[8:] for row in rows]
+        finally:
+            if conn is not self._conn:
+                conn.close()
+
+    # --- audit_blobs -----------------------------------------------------
+
+    def insert_blobs(self, blobs: List[Tuple[str, str, bytes, int]], created_at: datetime):
+        # En el mismo lote que la decisión que los referencia
+        with self._lock:
+            conn = self._connection()
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            with self._savepoint(conn):
+                conn.executemany("""
+                    INSERT OR IGNORE INTO audit_blobs (digest, encoding, data, size, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(digest, encoding, data, size, _ts(created_at)) for digest, encoding, data, size in blobs])
+            self._batch_written()
+
+    def get_blobs(self, digests: List[str]) -> List[Tuple[str, str, bytes]]:
+        rows: List[Tuple[str, str, bytes]] = []
+        with self._lock:
+            conn = self._connection()
+            # Por tandas: SQLite limita los parámetros por sentencia
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                rows.extend(conn.execute(f"""
+                    SELECT digest, encoding, data FROM audit_blobs
+                    WHERE digest IN ({", ".join("?" * len(chunk))})
+                """, chunk).fetchall())
+        return rows
+
+    def decision_contexts(self, after_id: int, min_bytes: int, limit: int) -> List[Tuple[int, Optional[str]]]:
+        with self._lock:
+            return self._connection().execute("""
+                SELECT id, CASE WHEN length(CAST(context AS BLOB)) > ? THEN context END
+                FROM audit_log
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (min_bytes, after_id, limit)).fetchall()
+
+    def update_decision_contexts(self, rows: List[Tuple[int, bytes]]):
+        with self._write() as conn:
+            conn.executemany(
+                "UPDATE audit_log SET context = ? WHERE id = ?",
+                [(context_json.decode("utf-8"), decision_id) for decision_id, context_json in rows]
+            )
+
+    def blob_statistics(self) -> Tuple[int, int, int]:
+        with self._lock:
+            return self._connection().execute("""
+                SELECT COUNT(*), COALESCE(SUM(length(data)), 0), COALESCE(SUM(size), 0) FROM audit_blobs
+            """).fetchone()
+
+    # --- hitl_checkpoints ------------------------------------------------
+
+    def insert_checkpoint(
+        self,
+        checkpoint_name: str,
+        agent_name: str,
+        status: str,
+        priority: int,
+        timeout_seconds: Optional[int],
+        expires_at: Optional[datetime],
+        data: Dict[str, Any],
+        created_at: datetime,
+        reviewed_at: Optional[datetime],
+        reviewer: Optional[str],
+        comments: Optional[str]
+    ) -> int:
+        with self._write() as conn:
+            return conn.execute("""
+                INSERT INTO hitl_checkpoints (
+                    checkpoint_name,
+                    agent_name,
+                    status,
+                    priority,
+                    timeout_seconds,
+                    expires_at,
+                    data,
+                    created_at,
+                    reviewed_at,
+                    reviewer,
+                    comments
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                checkpoint_name,
+                agent_name,
+                status,
+                priority,
+                timeout_seconds,
+                _ts(expires_at),
+                fast_json.dumps(data).decode("utf-8"),
+                _ts(created_at),
+                _ts(reviewed_at),
+                reviewer,
+                comments
+            )).lastrowid
+
+    def wait_for_status(self, checkpoint_id: int, timeout_seconds: Optional[float]) -> Optional[str]:
+        deadline = time.monotonic() + (timeout_seconds or 0)
+        with self._changed:
+            while True:
+                row = self._connection().execute("""
+                    SELECT status FROM hitl_checkpoints WHERE id = ?
+                """, (checkpoint_id,)).fetchone()
+                if not row:
+                    return None
+                remaining = deadline - time.monotonic()
+                if row[0] != PENDING or not timeout_seconds or remaining <= 0:
+                    return row[0]
+                # Despierta al resolver en este proceso; si no, vuelve a consultar
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def resolve_checkpoint(
+        self,
+        checkpoint_id: int,
+        status: str,
+        reviewer: str,
+        comments: Optional[str],
+        reviewed_at: datetime
+    ) -> Optional[Tuple[datetime, Optional[Dict[str, Any]], Optional[str]]]:
+        with self._write() as conn:
+            updated = conn.execute("""
+                UPDATE hitl_checkpoints
+                SET status = ?,
+                    reviewed_at = ?,
+                    reviewer = ?,
+                    comments = ?
+                WHERE id = ? AND status = ?
+                RETURNING created_at, json_extract(data, '$.trace'), json_extract(data, '$.session_id')
+            """, (status, _ts(reviewed_at), reviewer, comments, checkpoint_id, PENDING)).fetchone()
+        if not updated:
+            return None
+        with self._changed:
+            self._changed.notify_all()
+        return _dt(updated[0]), _json(updated[1]), updated[2]
+
+    def pending_checkpoints(self, limit: Optional[int], offset: int, include_data: bool) -> List[Tuple]:
+        data_column = ", data" if include_data else ""
+        with self._lock:
+            rows = self._connection().execute(f"""
+                SELECT {QUEUE_COLUMNS}{data_column}
+                FROM hitl_checkpoints
+                WHERE status = ?
+                ORDER BY priority DESC, created_at ASC, id ASC
+                LIMIT ? OFFSET ?
+            """, (PENDING, -1 if limit is None else limit, offset)).fetchall()
+        return [_queue_row(row) for row in rows]
+
+    def count_pending_by_priority(self) -> List[Tuple[int, int]]:
+        with self._lock:
+            return self._connection().execute("""
+                SELECT priority, COUNT(*)
+                FROM hitl_checkpoints
+                WHERE status = ?
+                GROUP BY priority
+            """, (PENDING,)).fetchall()
+
+    def review_queue(
+        self,
+        after: Optional[Tuple[int, datetime, int]],
+        limit: int,
+        include_data: bool
+    ) -> List[Tuple]:
+        data_column = ", data" if include_data else ""
+        params: list[Any] = [PENDING]
+        keyset = ""
+        if after:
+            rank, created_at, checkpoint_id = after
+            # Orden (priority DESC, created_at ASC, id ASC)
+            keyset = """
+                AND (priority < ?
+                     OR (priority = ? AND (created_at, id) > (?, ?)))
+            """
+            params.extend([rank, rank, _ts(created_at), checkpoint_id])
+        params.append(limit)
+
+        with self._lock:
+            rows = self._connection().execute(f"""
+                SELECT {QUEUE_COLUMNS}{data_column}
+                FROM hitl_checkpoints
+                WHERE status = ? {keyset}
+                ORDER BY priority DESC, created_at ASC, id ASC
+                LIMIT ?
+            """, params).fetchall()
+        return [_queue_row(row) for row in rows]
+
+    def claim_checkpoints(
+        self,
+        reviewer: str,
+        limit: int,
+        stale_before: datetime,
+        now: datetime
+    ) -> List[Tuple]:
+        # BEGIN IMMEDIATE serializa a los revisores de todos los procesos:
+        # equivale a FOR UPDATE SKIP LOCKED con un único escritor
+        with self._write() as conn:
+            rows = conn.execute(f"""
+                UPDATE hitl_checkpoints
+                SET claimed_by = ?,
+                    claimed_at = ?
+                WHERE id IN (
+                    SELECT id
+                    FROM hitl_checkpoints
+                    WHERE status = ?
+                      AND (claimed_at IS NULL OR claimed_at < ? OR claimed_by = ?)
+                    ORDER BY priority DESC, created_at ASC, id ASC
+                    LIMIT ?
+                )
+                RETURNING {QUEUE_COLUMNS}, data
+            """, (reviewer, _ts(now), PENDING, _ts(stale_before), reviewer, limit)).fetchall()
+        return [_queue_row(row) for row in rows]
+
+    def release_checkpoint(self, checkpoint_id: int, reviewer: str) -> bool:
+        with self._write() as conn:
+            return conn.execute("""
+                UPDATE hitl_checkpoints
+                SET claimed_by = NULL,
+                    claimed_at = NULL
+                WHERE id = ? AND claimed_by = ? AND status = ?
+            """, (checkpoint_id, reviewer, PENDING)).rowcount > 0
+
+    def expire_overdue_checkpoints(
+        self,
+        batch_size: int,
+        max_batches: int,
+        reviewer: str,
+        session_id: str
+    ) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for _ in range(max_batches):
+            now = datetime.now()
+            with self._write() as conn:
+                expired = conn.execute("""
+                    UPDATE hitl_checkpoints
+                    SET status = ?,
+                        reviewed_at = ?,
+                        reviewer = ?,
+                        comments = 'Expirado tras ' || timeout_seconds || 's sin revisión'
+                    WHERE id IN (
+                        SELECT id
+                        FROM hitl_checkpoints
+                        WHERE status = ?
+                          AND expires_at IS NOT NULL
+                          AND expires_at <= ?
+                        ORDER BY expires_at
+                        LIMIT ?
+                    )
+                    RETURNING id, timeout_seconds, COALESCE(
+                        json_extract(data, '$.session_id'),
+                        json_extract(data, '$.trace.session_id'),
+                        ?
+                    )
+                """, (TIMEOUT, _ts(now), reviewer, PENDING, _ts(now), batch_size, session_id)).fetchall()
+                conn.executemany("""
+                    INSERT INTO audit_log (
+                        agent_name,
+                        action,
+                        decision,
+                        context,
+                        reasoning,
+                        confidence,
+                        timestamp,
+                        session_id
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [(
+                    "hitl_system",
+                    f"checkpoint_{TIMEOUT}",
+                    f"Checkpoint {checkpoint_id} {TIMEOUT}",
+                    fast_json.dumps({
+                        "checkpoint_id": checkpoint_id,
+                        "reviewer": reviewer,
+                        "timeout_seconds": timeout_seconds
+                    }).decode("utf-8"),
+                    "Checkpoint expirado sin revisión",
+                    1.0,
+                    _ts(now),
+                    checkpoint_session
+                ) for checkpoint_id, timeout_seconds, checkpoint_session in expired])
+
+            if expired:
+                with self._changed:
+                    self._changed.notify_all()
+            for _, _, checkpoint_session in expired:
+                counts[checkpoint_session] = counts.get(checkpoint_session, 0) + 1
+            if len(expired) < batch_size:
+                break
+        return counts
+
+    # --- context_embeddings ----------------------------------------------
+
+    def insert_context_chunks(
+        self,
+        chunks: List[Tuple[str, List[float], Dict[str, Any], Optional[str]]]
+    ) -> List[int]:
+        now = _ts(datetime.now())
+        with self._write() as conn:
+            return [conn.execute("""
+                INSERT INTO context_embeddings (content, embedding, metadata, source, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                content,
+                _unit_vector(embedding).tobytes(),
+                fast_json.dumps(metadata).decode("utf-8"),
+                source,
+                now,
+                now
+            )).lastrowid for content, embedding, metadata, source in chunks]
+
+    def search_context(
+        self,
+        embedding: List[float],
+        limit: int,
+        source: Optional[str] = None
+    ) -> List[Tuple[int, str, Dict[str, Any], Optional[str], float]]:
+        query = _unit_vector(embedding)
+        where, params = ("WHERE source = ?", (source,)) if source is not None else ("", ())
+        with self._lock:
+            conn = self._connection()
+            # Con vectores normalizados la similitud coseno es el producto escalar
+            scores = []
+            for chunk_id, blob in conn.execute(f"SELECT id, embedding FROM context_embeddings {where}", params):
+                vector = array("f")
+                vector.frombytes(blob)
+                scores.append((sum(map(operator.mul, query, vector)), chunk_id))
+            best = heapq.nlargest(limit, scores)
+            if not best:
+                return []
+            rows = {row[0]: row for row in conn.execute(f"""
+                SELECT id, content, metadata, source
+                FROM context_embeddings
+                WHERE id IN ({", ".join("?" * len(best))})
+            """, [chunk_id for _, chunk_id in best])}
+        return [rows[chunk_id][:2] + (_json(rows[chunk_id][2]), rows[chunk_id][3], score) for score, chunk_id in best]
+
+    def delete_context(self, source: Optional[str] = None) -> int:
+        with self._write() as conn:
+            if source is None:
+                return conn.execute("DELETE FROM context_embeddings").rowcount
+            return conn.execute("DELETE FROM context_embeddings WHERE source = ?", (source,)).rowcount
+
+    # --- specifications / implementation_plans ---------------------------
+
+    def insert_document_version(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: int,
+        encoding: str,
+        content: str,
+        created_at: datetime,
+        tasks: Optional[Any] = None,
+        specification_id: Optional[int] = None
+    ) -> Optional[int]:
+        table, content_column, type_column = DOCUMENT_TABLES[kind]
+        values = {"session_id": session_id, content_column: content, "version": version,
+                  "encoding": encoding, "created_at": _ts(created_at)}
+        if type_column is not None:
+            values[type_column] = doc_type
+        if kind == "plan":
+            values["tasks"] = fast_json.dumps(tasks).decode("utf-8") if tasks is not None else None
+            values["specification_id"] = specification_id
+
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO dev_sessions (session_id, started_at) VALUES (?, ?)",
+                         (session_id, _ts(created_at)))
+            row = conn.execute(f"""
+                INSERT OR IGNORE INTO {table} ({", ".join(values)})
+                VALUES ({", ".join("?" * len(values))})
+                RETURNING id
+            """, list(values.values())).fetchone()
+        return row[0] if row else None
+
+    def document_chain(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: Optional[int] = None
+    ) -> List[Tuple]:
+        table, condition, params = document_filter(kind, session_id, doc_type, "?")
+        with self._lock:
+            rows = self._connection().execute(f"""
+                WITH target AS (
+                    SELECT COALESCE(?, max(version)) AS v FROM {table} WHERE {condition}
+                ), snapshot AS (
+                    SELECT max(version) AS v
+                    FROM {table}, target
+                    WHERE {condition} AND version <= target.v AND encoding = '{FULL}'
+                )
+                SELECT {document_columns(kind)}
+                FROM {table}, target, snapshot
+                WHERE {condition} AND version BETWEEN snapshot.v AND target.v
+                ORDER BY version
+            """, [version, *params, *params, *params]).fetchall()
+        return [_document_row(row) for row in rows]
+
+    def document_versions(self, kind: str, session_id: str, doc_type: Optional[str]) -> List[Tuple]:
+        table, condition, params = document_filter(kind, session_id, doc_type, "?")
+        with self._lock:
+            rows = self._connection().execute(f"""
+                SELECT {document_columns(kind, "length({})")}
+                FROM {table}
+                WHERE {condition}
+                ORDER BY version
+            """, params).fetchall()
+        return [_document_row(row) for row in rows]
+
+    def latest_document_version(self, kind: str, session_id: str, doc_type: Optional[str]) -> Optional[int]:
+        table, condition, params = document_filter(kind, session_id, doc_type, "?")
+        with self._lock:
+            return self._connection().execute(f"SELECT max(version) FROM {table} WHERE {condition}", params).fetchone()[0]
+
+    def approve_document_version(
+        self,
+        kind: str,
+        session_id: str,
+        doc_type: Optional[str],
+        version: int,
+        approved_by: str,
+        approved_at: datetime
+    ) -> bool:
+        table, condition, params = document_filter(kind, session_id, doc_type, "?")
+        with self._write() as conn:
+            return conn.execute(f"""
+                UPDATE {table}
+                SET approved = 1,
+                    approved_at = ?,
+                    approved_by = ?
+                WHERE {condition} AND version = ?
+            """, [_ts(approved_at), approved_by, *params, version]).rowcount > 0
+
+    # --- dev_sessions / session_summaries ---------------------------------
+
+    def start_session(
+        self,
+        session_id: str,
+        project_type: Optional[str],
+        repo_url: Optional[str],
+        context_file: Optional[str],
+        metadata: Optional[Dict[str, Any]],
+        started_at: datetime
+    ):
+        with self._write() as conn:
+            conn.execute("""
+                INSERT INTO dev_sessions (session_id, project_type, repo_url, context_file, started_at, status, metadata)
+                VALUES (?, ?, ?, ?, ?, 'active', ?)
+                ON CONFLICT (session_id) DO UPDATE SET
+                    project_type = COALESCE(excluded.project_type, dev_sessions.project_type),
+                    repo_url = COALESCE(excluded.repo_url, dev_sessions.repo_url),
+                    context_file = COALESCE(excluded.context_file, dev_sessions.context_file),
+                    metadata = COALESCE(excluded.metadata, dev_sessions.metadata),
+                    status = 'active',
+                    ended_at = NULL
+            """, (session_id, project_type, repo_url, context_file, _ts(started_at),
+                  fast_json.dumps(metadata).decode("utf-8") if metadata is not None else None))
+
+    def end_session(self, session_id: str, status: str, ended_at: datetime) -> bool:
+        with self._write() as conn:
+            return conn.execute(
+                "UPDATE dev_sessions SET status = ?, ended_at = ? WHERE session_id = ?",
+                (status, _ts(ended_at), session_id)
+            ).rowcount > 0
+
+    def list_sessions(self, status: Optional[str], limit: int) -> List[Tuple]:
+        columns = ", ".join(f"s.{c}" for c in SESSION_COLUMN_NAMES)
+        where, params = ("WHERE s.status = ?", [status]) if status else ("", [])
+        with self._lock:
+            rows = self._connection().execute(f"""
+                SELECT {columns},
+                       COALESCE(sum(c.decisions), 0),
+                       COALESCE(sum(c.prompt_tokens + c.completion_tokens), 0)
+                FROM dev_sessions s
+                LEFT JOIN session_summaries c ON c.session_id = s.session_id
+                {where}
+                GROUP BY s.id
+                ORDER BY s.started_at IS NULL, s.started_at DESC, s.id DESC
+                LIMIT ?
+            """, [*params, limit]).fetchall()
+        return [_session_row(row) for row in rows]
+
+    def add_session_counters(self, rows: List[Tuple]):
+        # min()/max() escalares de SQLite equivalen a LEAST/GREATEST (las fechas son texto ISO)
+        statement = session_counters_upsert("?", least="min", greatest="max")
+        with self._write() as conn:
+            conn.executemany(statement, [row[:-2] + (_ts(row[-2]), _ts(row[-1])) for row in rows])
+
+    def session_summary(self, session_id: str) -> Tuple[Optional[Tuple], List[Tuple]]:
+        with self._lock:
+            conn = self._connection()
+            session = conn.execute(
+                f"SELECT {SESSION_COLUMNS} FROM dev_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            counters = conn.execute(f"""
+                SELECT agent_name, {", ".join(SESSION_COUNTERS)}, first_at, last_at
+                FROM session_summaries
+                WHERE session_id = ?
+                ORDER BY decisions DESC, agent_name
+            """, (session_id,)).fetchall()
+        return (
+            _session_row(session) if session else None,
+            [row[:-2] + (_dt(row[-2]), _dt(row[-1])) for row in counters],
+        )
+
+    def rebuild_session_counters(self, session_id: str) -> int:
+        reset, recount = session_rebuild_statements("?")
+        with self._write() as conn:
+            conn.execute(reset, (session_id,))
+            return conn.execute(recount, (session_id,)).rowcount
+
+
+def _session_row(row: Tuple) -> Tuple:
+    """Fila de `SESSION_COLUMNS` (+ totales) con fechas y metadata decodificados"""
+    return row[:4] + (_dt(row[4]), _dt(row[5]), row[6], _json(row[7])) + row[8:]
+
+
+def _document_row(row: Tuple) -> Tuple:
+    """Fila de `document_columns` con fechas, aprobación y tasks decodificados"""
+    return row[:4] + (_dt(row[4]), bool(row[5]), _dt(row[6]), row[7], _json(row[8]), row[9])
+
+
+def _unit_vector(embedding: List[float]) -> "array":
+    """Embedding normalizado (norma 1) como float32"""
+    norm = math.sqrt(sum(x * x for x in embedding)) or 1.0
+    return array("f", (x / norm for x in embedding))
+
+
+BACKEND = SQLiteStorage
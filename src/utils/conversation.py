@@ -0,0 +1,250 @@
+"""
+Conversation - Historial de chat con presupuesto de tokens para Ollama
+
+`OllamaClient.chat` envía la lista completa de mensajes en cada llamada, así
+que en conversaciones largas el prompt (y el tiempo de procesarlo) crece sin
+límite. `Conversation` mantiene el historial y envía solo lo que cabe en
+`budget` tokens:
+
+- El system prompt y los últimos `keep_recent` mensajes siempre se envían.
+- Los tokens se estiman una vez por mensaje y el total se mantiene al añadir
+  y quitar mensajes (no se recuenta el historial en cada turno).
+- Al pasarse del presupuesto se compacta de una vez hasta `low_water` del
+  presupuesto: los turnos más viejos se resumen con el propio modelo (o se
+  descartan con `summarize=False`). Compactar en bloque deja el inicio del
+  prompt igual durante varios turnos, y Ollama reutiliza su caché de prompt.
+- Con `use_context=True` los turnos van por `/api/generate` pasando el
+  `context` de la respuesta anterior: Ollama solo procesa el mensaje nuevo.
+  Cuando el context no cabe se compacta y se reconstruye desde el resumen.
+
+Configuración:
+    CONVERSATION_TOKEN_BUDGET   Tokens del prompt por turno (default: 3072)
+    CONVERSATION_KEEP_RECENT    Mensajes recientes fijos (default: 4)
+
+Uso:
+    conversation = OllamaClient().conversation(system="Eres un revisor de código")
+    conversation.chat("Revisa este diff: ...")
+    conversation.chat("¿Y los tests?")
+"""
+import os
+from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
+
+from src.utils.lazy_imports import logger
+from src.utils.llm_scheduler import estimate_tokens
+
+if TYPE_CHECKING:
+    from src.utils.ollama_client import OllamaClient
+
+# Tokens de formato por mensaje (rol y delimitadores de la plantilla)
+_MESSAGE_OVERHEAD = 4
+
+_SUMMARY_SYSTEM = (
+    "Resume la conversación de forma concisa, conservando decisiones, datos, "
+    "nombres, requisitos y preguntas pendientes. Responde solo con el resumen."
+)
+_SUMMARY_PREFIX = "Resumen de la conversación anterior:\n"
+_ROLE_LABELS = {"user": "Usuario", "assistant": "Asistente", "system": "Sistema"}
+
+
+class _Message:
+    """Mensaje del historial con sus tokens ya contados"""
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str, tokens: int):
+        self.role = role
+        self.content = content
+        self.tokens = tokens
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+class Conversation:
+    """Conversación multi-turno que cabe en un presupuesto de tokens"""
+
+    def __init__(
+        self,
+        client: "OllamaClient",
+        system: Optional[str] = None,
+        budget: Optional[int] = None,
+        keep_recent: Optional[int] = None,
+        summarize: bool = True,
+        low_water: float = 0.6,
+        use_context: bool = False,
+        model: Optional[str] = None,
+        count_tokens: Callable[[str], int] = estimate_tokens
+    ):
+        """
+        Inicializar conversación
+
+        Args:
+            client: OllamaClient con el que hablar
+            system: System prompt (siempre se envía)
+            budget: Tokens máximos del prompt de cada turno (default: CONVERSATION_TOKEN_BUDGET);
+                con `max_tokens` de la respuesta debe caber en el `num_ctx` del modelo
+            keep_recent: Mensajes finales que nunca se compactan (default: CONVERSATION_KEEP_RECENT)
+            summarize: Resumir los turnos compactados (False = descartarlos)
+            low_water: Fracción del presupuesto a la que se compacta
+            use_context: Reutilizar el `context` de Ollama entre turnos (/api/generate)
+            model: Modelo a usar (default: el del cliente)
+            count_tokens: Contador de tokens de un texto (default: ~4 caracteres por token)
+        """
+        self.client = client
+        self.model = model
+        self.budget = budget or int(os.getenv("CONVERSATION_TOKEN_BUDGET", "3072"))
+        self.keep_recent = keep_recent if keep_recent is not None else int(os.getenv("CONVERSATION_KEEP_RECENT", "4"))
+        self.summarize = summarize
+        self.low_water = low_water
+        self.use_context = use_context
+        self.count_tokens = count_tokens
+
+        self._system: Optional[_Message] = self._message("system", system) if system else None
+        self._summary: Optional[_Message] = None
+        self._messages: List[_Message] = []
+        # Tokens de los mensajes del historial (sin system ni resumen)
+        self._tokens = 0
+        self._context: Optional[List[int]] = None
+        self.compactions = 0
+        self.summarized_messages = 0
+
+    def _message(self, role: str, content: str) -> _Message:
+        return _Message(role, content, self.count_tokens(content) + _MESSAGE_OVERHEAD)
+
+    @property
+    def tokens(self) -> int:
+        """Tokens estimados del prompt que se enviaría ahora"""
+        fixed = (self._system.tokens if self._system else 0) + (self._summary.tokens if self._summary else 0)
+        return fixed + self._tokens
+
+    @property
+    def summary(self) -> Optional[str]:
+        """Resumen de los turnos compactados (None si aún no hay)"""
+        return self._summary.content[len(_SUMMARY_PREFIX):] if self._summary else None
+
+    def add(self, role: str, content: str):
+        """Añadir un mensaje al historial (p.ej. respuestas de herramientas)"""
+        message = self._message(role, content)
+        self._messages.append(message)
+        self._tokens += message.tokens
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Mensajes a enviar: system, resumen y el historial que queda"""
+        window = [m for m in (self._system, self._summary) if m is not None] + self._messages
+        return [m.as_dict() for m in window]
+
+    def chat(self, content: str, temperature: float = 0.7, max_tokens: int = 2000) -> str:
+        """
+        Enviar un mensaje del usuario y registrar la respuesta
+
+        Args:
+            content: Mensaje del usuario
+            temperature: Temperatura (0.0-1.0)
+            max_tokens: Máximo de tokens a generar
+
+        Returns:
+            str: Respuesta del modelo
+        """
+        self.add("user", content)
+        if self.use_context:
+            reply = self._chat_with_context(temperature, max_tokens)
+        else:
+            if self.tokens > self.budget:
+                self._compact()
+            reply = self.client.chat(
+                self.messages(), model=self.model, temperature=temperature, max_tokens=max_tokens
+            )
+        self.add("assistant", reply)
+        return reply
+
+    def _chat_with_context(self, temperature: float, max_tokens: int) -> str:
+        """Turno por /api/generate continuando el context de Ollama"""
+        message = self._messages[-1]
+        # El context ya contiene system, resumen e historial: su longitud es exacta
+        if self._context is not None and len(self._context) + message.tokens <= self.budget:
+            reply, self._context = self.client.generate_with_context(
+                message.content, context=self._context, model=self.model,
+                temperature=temperature, max_tokens=max_tokens
+            )
+            return reply
+
+        # Primer turno o context lleno: compactar y reconstruir desde el historial que queda
+        if self._context is not None:
+            # El context dice cuántos tokens ocupa de verdad lo que se estimó
+            self._compact(scale=max(1.0, (len(self._context) + message.tokens) / max(1, self.tokens)))
+        elif self.tokens > self.budget:
+            self._compact()
+        system = "\n\n".join(m.content for m in (self._system, self._summary) if m is not None)
+        reply, self._context = self.client.generate_with_context(
+            self._transcript(), context=None, model=self.model, system=system or None,
+            temperature=temperature, max_tokens=max_tokens
+        )
+        return reply
+
+    def _transcript(self) -> str:
+        """Historial como texto para empezar un context nuevo"""
+        if len(self._messages) == 1:
+            return self._messages[0].content
+        return "\n\n".join(f"{_ROLE_LABELS.get(m.role, m.role)}: {m.content}" for m in self._messages)
+
+    def _compact(self, scale: float = 1.0):
+        """
+        Quitar los mensajes más viejos hasta `low_water` del presupuesto
+
+        Args:
+            scale: Corrección de la estimación de tokens (tokens reales / estimados)
+        """
+        target = self.budget * self.low_water / scale
+        limit = self.budget / scale
+        removable = max(0, len(self._messages) - self.keep_recent)
+        removed: List[_Message] = []
+        # Los fijos solo se sacrifican si ni quitando todo lo demás se cabe (nunca el último)
+        while self._messages[:-1] and self.tokens > target and (
+            len(removed) < removable or self.tokens > limit
+        ):
+            message = self._messages.pop(0)
+            self._tokens -= message.tokens
+            removed.append(message)
+        if not removed:
+            return
+
+        self.compactions += 1
+        self._context = None
+        if self.summarize:
+            self._update_summary(removed)
+        logger.debug(
+            f"Conversation compacted: {len(removed)} messages removed, {self.tokens}/{self.budget} tokens"
+        )
+
+    def _update_summary(self, removed: List[_Message]):
+        """Incorporar los mensajes compactados al resumen"""
+        parts = []
+        if self._summary is not None:
+            parts.append(f"Resumen previo:\n{self.summary}")
+        parts.append("\n\n".join(f"{_ROLE_LABELS.get(m.role, m.role)}: {m.content}" for m in removed))
+        # El resumen ocupa como mucho lo que deja libre el objetivo de compactación
+        room = max(64, int(self.budget * (1 - self.low_water)) // 2)
+        try:
+            text = self.client.generate(
+                prompt="\n\n".join(parts),
+                model=self.model,
+                system=_SUMMARY_SYSTEM,
+                temperature=0.2,
+                max_tokens=room
+            )
+        except Exception as e:
+            # Sin resumen la conversación sigue: los turnos viejos simplemente se pierden
+            logger.warning(f"Could not summarize conversation, dropping {len(removed)} messages: {e}")
+            return
+        self._summary = self._message("system", _SUMMARY_PREFIX + text.strip())
+        self.summarized_messages += len(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamaño actual y compactaciones realizadas"""
+        return {
+            "messages": len(self._messages),
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "context_tokens": len(self._context) if self._context is not None else None,
+            "compactions": self.compactions,
+            "summarized_messages": self.summarized_messages,
+        }
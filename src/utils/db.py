@@ -0,0 +1,65 @@
+"""
+DB - Conexiones a PostgreSQL con pool opcional
+
+Por defecto cada operación abre su propia conexión (`psycopg.connect`), lo
+adecuado para CLIs de un solo comando. Los procesos de larga duración (como
+`sdd-auditd`) pueden activar un pool por URL con `enable_pool`, y todas las
+llamadas a `connect` reutilizan conexiones del pool sin cambiar el código
+de `AuditLogger` ni de `HITLCheckpointSkill`.
+"""
+import threading
+from typing import Any, Dict
+
+from src.utils.lazy_imports import lazy_module, logger
+
+psycopg = lazy_module("psycopg")
+
+_pools: Dict[str, Any] = {}
+_pools_lock = threading.Lock()
+
+
+def enable_pool(db_url: str, min_size: int = 1, max_size: int = 10) -> bool:
+    """
+    Activar un pool de conexiones para `db_url`
+
+    Requiere `psycopg-pool`; si no está instalado se mantiene una conexión
+    por operación.
+
+    Returns:
+        True si el pool quedó activo
+    """
+    with _pools_lock:
+        if db_url in _pools:
+            return True
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError:
+            logger.warning("psycopg-pool no instalado, se usará una conexión por operación")
+            return False
+
+        pool = ConnectionPool(db_url, min_size=min_size, max_size=max_size, open=True)
+        _pools[db_url] = pool
+        logger.info(f"Pool de conexiones activo (min={min_size}, max={max_size})")
+        return True
+
+
+def connect(db_url: str, **kwargs: Any):
+    """
+    Obtener una conexión para usar como context manager
+
+    Con pool activo (y sin opciones especiales como `autocommit`) la conexión
+    se devuelve al pool al salir del bloque; si no, se abre y cierra una
+    conexión nueva.
+    """
+    pool = _pools.get(db_url)
+    if pool is not None and not kwargs:
+        return pool.connection()
+    return psycopg.connect(db_url, **kwargs)
+
+
+def close_pools():
+    """Cerrar todos los pools abiertos"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
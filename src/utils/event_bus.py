@@ -0,0 +1,766 @@
+"""
+Event Bus - Eventos de auditoría y HITL entre procesos (Redis Streams)
+
+`AuditLogger`, `HITLCheckpointSkill` y `SpecStore` publican lo que escriben
+en streams de Redis; otros procesos se enteran leyendo el stream en lugar de
+consultar la base de datos una y otra vez.
+
+Streams (con el prefijo EVENT_STREAM_PREFIX):
+    audit   `decision.logged` por cada decisión registrada
+    hitl    `checkpoint.created`, `checkpoint.resolved`, `checkpoint.expired`
+    specs   `document.saved`, `document.approved` (invalidación de cachés)
+
+- Publicar nunca bloquea ni hace fallar la escritura que lo origina: con
+  Redis los eventos se envían en lote (pipeline de XADD) desde un hilo de
+  fondo y un error solo se registra y cuenta.
+- Cada stream se recorta a ~EVENT_STREAM_MAXLEN entradas (`MAXLEN ~`).
+- `consume()`: grupo de consumidores (XREADGROUP/XACK). Cada evento lo
+  procesa un solo miembro del grupo y se confirma al terminar; los que
+  quedan sin confirmar (handler con error, consumidor caído) los reclama
+  otro miembro tras EVENT_CLAIM_IDLE_MS.
+- `subscribe()`/`tail()`: todos los lectores ven todos los eventos (XREAD),
+  p.ej. para invalidar cachés o seguir las decisiones en vivo.
+- Sin REDIS_URL el bus es `MemoryEventBus`: la misma semántica dentro del
+  proceso (tests, SQLite local), sin ver a otros procesos.
+
+Configuración:
+    REDIS_URL              Redis del bus (sin ella: bus en memoria del proceso)
+    EVENT_BUS              redis | memory (default: redis si hay REDIS_URL)
+    EVENT_STREAM_PREFIX    Prefijo de las claves de los streams (default: sdd)
+    EVENT_STREAM_MAXLEN    Entradas aproximadas por stream (default: 100000)
+    EVENT_CLAIM_IDLE_MS    Espera antes de reclamar eventos sin confirmar (default: 60000)
+
+Uso:
+    bus = get_event_bus()
+    bus.publish(AUDIT_STREAM, "decision.logged", {"agent_name": "planner", ...})
+    bus.consume(HITL_STREAM, "notifications", handler)
+    for event in bus.tail([AUDIT_STREAM, HITL_STREAM]):
+        print(event.type, event.data)
+"""
+import atexit
+import importlib.util
+import os
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.utils import fast_json, metrics
+from src.utils.lazy_imports import logger
+
+AUDIT_STREAM = "audit"
+HITL_STREAM = "hitl"
+SPECS_STREAM = "specs"
+
+# Posiciones especiales: "$" = solo lo nuevo, "0" = desde el principio
+LATEST = "$"
+EARLIEST = "0-0"
+
+# Entradas que retiene cada stream del bus en memoria
+_MEMORY_MAXLEN = 10_000
+# Eventos por pipeline de XADD
+_PUBLISH_BATCH = 500
+# Espera entre reintentos de un consumidor tras un error de lectura
+_RETRY_SECONDS = 1.0
+# Espera máxima de un XREAD con BLOCK (por debajo del socket_timeout de redis-py, 5 s)
+_MAX_BLOCK_SECONDS = 2.0
+
+Handler = Callable[["Event"], None]
+
+
+@dataclass(frozen=True)
+class Event:
+    """Evento de un stream (`id` es el ID de Redis: "<ms>-<secuencia>")"""
+    stream: str
+    type: str
+    data: Dict[str, Any] = field(default_factory=dict)
+    id: str = ""
+    origin: str = ""
+
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        """Momento en que el stream recibió el evento"""
+        if not self.id:
+            return None
+        return datetime.fromtimestamp(int(self.id.split("-", 1)[0]) / 1000)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "stream": self.stream,
+            "type": self.type,
+            "origin": self.origin,
+            "timestamp": self.timestamp.isoformat() if self.id else None,
+            "data": self.data,
+        }
+
+
+def _parse_id(event_id: str) -> Tuple[int, int]:
+    ms, _, seq = event_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+class EventBus(ABC):
+    """Streams de eventos con grupos de consumidores"""
+
+    # True si otros procesos ven los eventos publicados
+    shared: bool = False
+
+    def __init__(self, prefix: Optional[str] = None, maxlen: Optional[int] = None):
+        """
+        Args:
+            prefix: Prefijo de las claves (default: EVENT_STREAM_PREFIX)
+            maxlen: Entradas aproximadas por stream (default: EVENT_STREAM_MAXLEN)
+        """
+        self.prefix = prefix if prefix is not None else os.getenv("EVENT_STREAM_PREFIX", "sdd")
+        self.maxlen = maxlen or int(os.getenv("EVENT_STREAM_MAXLEN", "100000"))
+        # Identifica al proceso que publica (p.ej. para ignorar los eventos propios)
+        self.origin = f"{socket.gethostname()}:{os.getpid()}"
+
+    def key(self, stream: str) -> str:
+        return f"{self.prefix}:{stream}" if self.prefix else stream
+
+    @abstractmethod
+    def publish(self, stream: str, event_type: str, data: Dict[str, Any]):
+        """Publicar un evento (no bloquea ni lanza excepciones)"""
+
+    def flush(self, timeout: Optional[float] = None):
+        """Esperar a que se envíen los eventos publicados (si el bus los agrupa)"""
+
+    def close(self):
+        """Enviar lo pendiente y liberar conexiones"""
+
+    @abstractmethod
+    def last_id(self, stream: str) -> str:
+        """ID del último evento del stream (`EARLIEST` si está vacío)"""
+
+    @abstractmethod
+    def read(
+        self,
+        positions: Dict[str, str],
+        count: int = 100,
+        block: Optional[float] = None
+    ) -> List[Event]:
+        """
+        Leer eventos posteriores a cada posición (XREAD)
+
+        Args:
+            positions: stream -> último ID ya visto
+            count: Máximo de eventos por stream
+            block: Segundos a esperar como mucho si no hay eventos (None = no
+                esperar); puede retornar vacío antes, quien espera vuelve a leer
+
+        Returns:
+            Eventos en orden de cada stream
+        """
+
+    @abstractmethod
+    def ensure_group(self, stream: str, group: str, start_id: str = LATEST):
+        """Crear el grupo de consumidores si no existe (empieza en `start_id`)"""
+
+    @abstractmethod
+    def read_group(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        count: int = 100,
+        block: Optional[float] = None
+    ) -> List[Event]:
+        """Leer eventos nuevos para un miembro del grupo (XREADGROUP)"""
+
+    @abstractmethod
+    def ack(self, stream: str, group: str, ids: Iterable[str]) -> int:
+        """Confirmar eventos procesados por el grupo"""
+
+    @abstractmethod
+    def claim_stale(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        min_idle: float,
+        count: int = 100
+    ) -> List[Event]:
+        """Reclamar eventos sin confirmar desde hace `min_idle` segundos (XAUTOCLAIM)"""
+
+    def tail(
+        self,
+        streams: Iterable[str],
+        from_start: bool = False,
+        block: float = 1.0,
+        stop: Optional[threading.Event] = None
+    ) -> Iterator[Event]:
+        """
+        Seguir uno o varios streams en vivo
+
+        Args:
+            streams: Streams a seguir
+            from_start: Empezar por los eventos que aún retiene el stream
+            block: Segundos de cada espera
+            stop: Evento que termina la iteración
+        """
+        positions = {s: EARLIEST if from_start else self.last_id(s) for s in streams}
+        while stop is None or not stop.is_set():
+            for event in self.read(positions, block=block):
+                positions[event.stream] = event.id
+                yield event
+
+    def subscribe(
+        self,
+        streams: Iterable[str],
+        handler: Handler,
+        name: Optional[str] = None,
+        on_resync: Optional[Callable[[], None]] = None
+    ) -> "EventSubscriber":
+        """Procesar en un hilo de fondo todos los eventos nuevos de los streams"""
+        subscriber = EventSubscriber(self, list(streams), handler, name, on_resync)
+        subscriber.start()
+        return subscriber
+
+    def consume(
+        self,
+        stream: str,
+        group: str,
+        handler: Handler,
+        consumer: Optional[str] = None,
+        start_id: str = LATEST
+    ) -> "EventConsumer":
+        """Procesar en un hilo de fondo los eventos del stream como miembro de `group`"""
+        member = EventConsumer(self, stream, group, handler, consumer, start_id=start_id)
+        member.start()
+        return member
+
+
+class _MemoryGroup:
+    """Grupo de consumidores del bus en memoria"""
+    __slots__ = ("last", "pending")
+
+    def __init__(self, last: Tuple[int, int]):
+        self.last = last
+        # ID -> (consumidor, entregado en monotonic, evento)
+        self.pending: Dict[str, Tuple[str, float, Event]] = {}
+
+
+class _MemoryStream:
+    __slots__ = ("entries", "groups", "last")
+
+    def __init__(self, maxlen: int):
+        self.entries: Deque[Tuple[Tuple[int, int], Event]] = deque(maxlen=maxlen)
+        self.groups: Dict[str, _MemoryGroup] = {}
+        self.last = (0, 0)
+
+    def after(self, position: Tuple[int, int], count: int) -> List[Event]:
+        events = []
+        # Los más nuevos están al final: se recorre hacia atrás hasta la posición
+        for entry_id, event in reversed(self.entries):
+            if entry_id <= position:
+                break
+            events.append(event)
+        events.reverse()
+        return events[:count]
+
+
+class MemoryEventBus(EventBus):
+    """Bus dentro del proceso con la semántica de Redis Streams"""
+
+    def __init__(self, prefix: Optional[str] = None, maxlen: Optional[int] = None):
+        super().__init__(prefix, maxlen or _MEMORY_MAXLEN)
+        self._changed = threading.Condition()
+        self._streams: Dict[str, _MemoryStream] = {}
+
+    def _stream(self, stream: str) -> _MemoryStream:
+        entry = self._streams.get(stream)
+        if entry is None:
+            entry = self._streams[stream] = _MemoryStream(self.maxlen)
+        return entry
+
+    def _position(self, entry: _MemoryStream, event_id: str) -> Tuple[int, int]:
+        return entry.last if event_id == LATEST else _parse_id(event_id)
+
+    def publish(self, stream: str, event_type: str, data: Dict[str, Any]):
+        with self._changed:
+            entry = self._stream(stream)
+            ms = int(time.time() * 1000)
+            # IDs crecientes aunque el reloj no avance (o retroceda), como en Redis
+            entry_id = (ms, 0) if ms > entry.last[0] else (entry.last[0], entry.last[1] + 1)
+            entry.last = entry_id
+            event = Event(stream, event_type, data, f"{entry_id[0]}-{entry_id[1]}", self.origin)
+            entry.entries.append((entry_id, event))
+            self._changed.notify_all()
+
+    def last_id(self, stream: str) -> str:
+        with self._changed:
+            last = self._stream(stream).last
+        return f"{last[0]}-{last[1]}"
+
+    def _wait(self, fetch: Callable[[], List[Event]], block: Optional[float]) -> List[Event]:
+        """Ejecutar `fetch` (con el lock tomado) hasta que retorne eventos o venza `block`"""
+        deadline = time.monotonic() + (block or 0)
+        with self._changed:
+            while True:
+                events = fetch()
+                remaining = deadline - time.monotonic()
+                if events or not block or remaining <= 0:
+                    return events
+                self._changed.wait(remaining)
+
+    def read(
+        self,
+        positions: Dict[str, str],
+        count: int = 100,
+        block: Optional[float] = None
+    ) -> List[Event]:
+        with self._changed:
+            # "$" se resuelve al empezar a esperar, como en XREAD
+            resolved = {s: self._position(self._stream(s), p) for s, p in positions.items()}
+
+        def fetch() -> List[Event]:
+            events: List[Event] = []
+            for stream, position in resolved.items():
+                events.extend(self._stream(stream).after(position, count))
+            return events
+
+        return self._wait(fetch, block)
+
+    def ensure_group(self, stream: str, group: str, start_id: str = LATEST):
+        with self._changed:
+            entry = self._stream(stream)
+            if group not in entry.groups:
+                entry.groups[group] = _MemoryGroup(self._position(entry, start_id))
+
+    def _group(self, stream: str, group: str) -> _MemoryGroup:
+        found = self._stream(stream).groups.get(group)
+        if found is None:
+            raise KeyError(f"NOGROUP: no existe el grupo {group} en {stream}")
+        return found
+
+    def read_group(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        count: int = 100,
+        block: Optional[float] = None
+    ) -> List[Event]:
+        def fetch() -> List[Event]:
+            entry = self._stream(stream)
+            members = self._group(stream, group)
+            events = entry.after(members.last, count)
+            if events:
+                members.last = _parse_id(events[-1].id)
+                now = time.monotonic()
+                for event in events:
+                    members.pending[event.id] = (consumer, now, event)
+            return events
+
+        return self._wait(fetch, block)
+
+    def ack(self, stream: str, group: str, ids: Iterable[str]) -> int:
+        with self._changed:
+            pending = self._group(stream, group).pending
+            return sum(1 for event_id in ids if pending.pop(event_id, None) is not None)
+
+    def claim_stale(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        min_idle: float,
+        count: int = 100
+    ) -> List[Event]:
+        with self._changed:
+            pending = self._group(stream, group).pending
+            now = time.monotonic()
+            claimed = []
+            for event_id, (_, delivered, event) in list(pending.items()):
+                if now - delivered >= min_idle:
+                    pending[event_id] = (consumer, now, event)
+                    claimed.append(event)
+                    if len(claimed) >= count:
+                        break
+            return claimed
+
+
+class RedisEventBus(EventBus):
+    """
+    Bus sobre Redis Streams
+
+    Publicar solo encola: un hilo de fondo envía lo acumulado en pipelines,
+    y al salir del intérprete se espera a que envíe lo pendiente (los CLIs no
+    pierden eventos). redis-py (~100 ms de importación) se importa en la
+    primera publicación o lectura, nunca al crear el bus: los procesos que no
+    lo usan no lo pagan.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: Optional[str] = None, maxlen: Optional[int] = None):
+        """
+        Args:
+            url: URL de Redis (ej: redis://redis:6379/0)
+            prefix: Prefijo de las claves (default: EVENT_STREAM_PREFIX)
+            maxlen: Entradas aproximadas por stream (default: EVENT_STREAM_MAXLEN)
+        """
+        super().__init__(prefix, maxlen)
+        self.url = url
+        self._client: Any = None
+
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        self._ready = threading.Event()
+        self._outbox: Deque[Tuple[str, str, Dict[str, Any]]] = deque()
+        self._sending = False
+        self._publisher: Optional[threading.Thread] = None
+        atexit.register(self.close)
+
+    @property
+    def client(self) -> Any:
+        """Cliente redis-py (se crea en el primer uso)"""
+        if self._client is None:
+            import redis
+
+            with self._lock:
+                if self._client is None:
+                    self._client = redis.Redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    @client.setter
+    def client(self, client: Any):
+        self._client = client
+
+    def publish(self, stream: str, event_type: str, data: Dict[str, Any]):
+        if self._client is None:
+            # En el hilo que publica: durante atexit ya no se puede importar redis
+            try:
+                self.client
+            except Exception as e:
+                metrics.EVENT_PUBLISH_FAILURES.inc(stream=stream)
+                logger.warning(f"No se pudo crear el cliente de Redis ({self.url}): {e}")
+                return
+        with self._lock:
+            self._outbox.append((stream, event_type, data))
+            if self._publisher is None:
+                # Quien publica nunca espera a Redis
+                self._publisher = threading.Thread(target=self._publish_loop, name="event-bus-publish", daemon=True)
+                self._publisher.start()
+        self._ready.set()
+
+    def _publish_loop(self):
+        while True:
+            self._ready.wait()
+            self._ready.clear()
+            self._drain()
+
+    def _drain(self):
+        """Enviar la cola en pipelines de hasta `_PUBLISH_BATCH` eventos hasta vaciarla"""
+        while True:
+            with self._lock:
+                if not self._outbox:
+                    self._sending = False
+                    self._drained.notify_all()
+                    return
+                batch = [self._outbox.popleft() for _ in range(min(_PUBLISH_BATCH, len(self._outbox)))]
+                self._sending = True
+            try:
+                pipe = self.client.pipeline(transaction=False)
+                for stream, event_type, data in batch:
+                    pipe.xadd(
+                        self.key(stream),
+                        {"type": event_type, "origin": self.origin, "data": fast_json.dumps(data)},
+                        maxlen=self.maxlen,
+                        approximate=True
+                    )
+                pipe.execute()
+            except Exception as e:
+                # Los eventos son avisos: la fuente de verdad sigue siendo la base de datos
+                metrics.EVENT_PUBLISH_FAILURES.inc(len(batch), stream=batch[0][0])
+                logger.warning(f"No se pudieron publicar {len(batch)} eventos en Redis: {e}")
+
+    def flush(self, timeout: Optional[float] = None):
+        deadline = time.monotonic() + (timeout if timeout is not None else 5.0)
+        with self._lock:
+            while self._outbox or self._sending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._drained.wait(remaining)
+
+    def close(self):
+        self.flush()
+        if self._client is not None:
+            self._client.close()
+
+    def last_id(self, stream: str) -> str:
+        entries = self.client.xrevrange(self.key(stream), count=1)
+        return entries[0][0] if entries else EARLIEST
+
+    def _events(self, stream: str, entries: List[Tuple[str, Optional[Dict[str, str]]]]) -> List[Event]:
+        events = []
+        for event_id, fields in entries:
+            if not fields:
+                # Entrada recortada del stream mientras estaba pendiente
+                continue
+            events.append(Event(
+                stream, fields.get("type", ""), fast_json.loads(fields.get("data") or "{}"),
+                event_id, fields.get("origin", "")
+            ))
+        return events
+
+    def _streams(self, response: Any) -> List[Event]:
+        events: List[Event] = []
+        prefix = f"{self.prefix}:" if self.prefix else ""
+        for key, entries in response or []:
+            events.extend(self._events(key[len(prefix):], entries))
+        return events
+
+    @staticmethod
+    def _block_ms(block: Optional[float]) -> Optional[int]:
+        # BLOCK 0 espera para siempre: sin `block` no se espera
+        return max(1, int(min(block, _MAX_BLOCK_SECONDS) * 1000)) if block else None
+
+    def read(
+        self,
+        positions: Dict[str, str],
+        count: int = 100,
+        block: Optional[float] = None
+    ) -> List[Event]:
+        response = self.client.xread(
+            {self.key(s): p for s, p in positions.items()}, count=count, block=self._block_ms(block)
+        )
+        return self._streams(response)
+
+    def ensure_group(self, stream: str, group: str, start_id: str = LATEST):
+        from redis.exceptions import ResponseError
+
+        try:
+            self.client.xgroup_create(self.key(stream), group, id=start_id, mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read_group(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        count: int = 100,
+        block: Optional[float] = None
+    ) -> List[Event]:
+        response = self.client.xreadgroup(
+            group, consumer, {self.key(stream): ">"}, count=count, block=self._block_ms(block)
+        )
+        return self._streams(response)
+
+    def ack(self, stream: str, group: str, ids: Iterable[str]) -> int:
+        ids = list(ids)
+        return self.client.xack(self.key(stream), group, *ids) if ids else 0
+
+    def claim_stale(
+        self,
+        stream: str,
+        group: str,
+        consumer: str,
+        min_idle: float,
+        count: int = 100
+    ) -> List[Event]:
+        response = self.client.xautoclaim(
+            self.key(stream), group, consumer, int(min_idle * 1000), start_id=EARLIEST, count=count
+        )
+        return self._events(stream, response[1])
+
+
+class EventSubscriber(threading.Thread):
+    """Hilo que entrega a `handler` todos los eventos nuevos de unos streams"""
+
+    def __init__(
+        self,
+        bus: EventBus,
+        streams: List[str],
+        handler: Handler,
+        name: Optional[str] = None,
+        on_resync: Optional[Callable[[], None]] = None
+    ):
+        """
+        Args:
+            bus: Bus a leer
+            streams: Streams a seguir
+            handler: Función llamada con cada evento
+            name: Nombre del hilo
+            on_resync: Llamada al volver a leer tras un error (pudo perderse algún evento)
+        """
+        super().__init__(name=name or f"event-subscriber-{'-'.join(streams)}", daemon=True)
+        self.bus = bus
+        self.streams = streams
+        self.handler = handler
+        self.on_resync = on_resync
+        self._stop_event = threading.Event()
+        # False mientras la lectura falla (p.ej. Redis caído): los eventos pueden llegar tarde
+        self.listening = False
+        self.positions: Optional[Dict[str, str]] = None
+        try:
+            # Se fija la posición ahora: lo publicado después de suscribirse se entrega
+            self.positions = {s: bus.last_id(s) for s in streams}
+            self.listening = True
+        except Exception as e:
+            logger.warning(f"{self.name}: no se pudo leer el bus, reintentando en segundo plano: {e}")
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                if self.positions is None:
+                    self.positions = {s: self.bus.last_id(s) for s in self.streams}
+                events = self.bus.read(self.positions, block=_RETRY_SECONDS)
+            except Exception as e:
+                if self.listening:
+                    logger.warning(f"{self.name}: error leyendo eventos, reintentando: {e}")
+                self.listening = False
+                self._stop_event.wait(_RETRY_SECONDS)
+                continue
+            if not self.listening:
+                self.listening = True
+                if self.on_resync is not None:
+                    self.on_resync()
+            for event in events:
+                self.positions[event.stream] = event.id
+                try:
+                    self.handler(event)
+                except Exception as e:
+                    logger.error(f"{self.name}: error procesando {event.type} {event.id}: {e}")
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        self.join(timeout)
+
+
+class EventConsumer(threading.Thread):
+    """Miembro de un grupo de consumidores: procesa y confirma eventos de un stream"""
+
+    def __init__(
+        self,
+        bus: EventBus,
+        stream: str,
+        group: str,
+        handler: Handler,
+        consumer: Optional[str] = None,
+        claim_idle: Optional[float] = None,
+        batch_size: int = 100,
+        start_id: str = LATEST
+    ):
+        """
+        Args:
+            bus: Bus a leer
+            stream: Stream del grupo
+            group: Grupo de consumidores (se crea en `start_id` si no existe)
+            handler: Función llamada con cada evento; si lanza, el evento queda pendiente
+            consumer: Nombre del miembro (default: host:pid)
+            claim_idle: Segundos tras los que se reclaman pendientes (default: EVENT_CLAIM_IDLE_MS)
+            batch_size: Eventos por lectura
+            start_id: Posición inicial del grupo al crearlo
+        """
+        super().__init__(name=f"event-consumer-{group}", daemon=True)
+        self.bus = bus
+        self.stream = stream
+        self.group = group
+        self.start_id = start_id
+        self.handler = handler
+        self.consumer = consumer or bus.origin
+        self.claim_idle = (
+            claim_idle if claim_idle is not None
+            else float(os.getenv("EVENT_CLAIM_IDLE_MS", "60000")) / 1000
+        )
+        self.batch_size = batch_size
+        self.processed = 0
+        self.failed = 0
+        self._stop_event = threading.Event()
+        self._joined = False
+        try:
+            # El grupo existe antes de retornar: no se pierde lo publicado justo después
+            self._join()
+        except Exception as e:
+            logger.warning(f"Consumidor {group}: no se pudo crear el grupo, reintentando en segundo plano: {e}")
+
+    def _join(self):
+        self.bus.ensure_group(self.stream, self.group, self.start_id)
+        self._joined = True
+
+    def run(self):
+        logger.info(f"Consumidor {self.consumer} del grupo {self.group} ({self.stream}) iniciado")
+        next_claim = time.monotonic() + self.claim_idle
+        while not self._stop_event.is_set():
+            try:
+                if not self._joined:
+                    self._join()
+                events = self.bus.read_group(
+                    self.stream, self.group, self.consumer, self.batch_size, block=_RETRY_SECONDS
+                )
+                if not events and time.monotonic() >= next_claim:
+                    # Sin trabajo nuevo: recuperar lo que otro miembro dejó sin confirmar
+                    events = self.bus.claim_stale(
+                        self.stream, self.group, self.consumer, self.claim_idle, self.batch_size
+                    )
+                    next_claim = time.monotonic() + self.claim_idle
+            except Exception as e:
+                logger.warning(f"Consumidor {self.group}: error leyendo {self.stream}, reintentando: {e}")
+                self._stop_event.wait(_RETRY_SECONDS)
+                continue
+            if events:
+                self._process(events)
+        logger.info(f"Consumidor {self.consumer} del grupo {self.group} detenido")
+
+    def _process(self, events: List[Event]):
+        done = []
+        for event in events:
+            try:
+                self.handler(event)
+            except Exception as e:
+                # Queda pendiente: se reintenta cuando se reclame
+                self.failed += 1
+                logger.error(f"Consumidor {self.group}: error procesando {event.type} {event.id}: {e}")
+                continue
+            done.append(event.id)
+        self.processed += len(done)
+        try:
+            self.bus.ack(self.stream, self.group, done)
+        except Exception as e:
+            logger.warning(f"Consumidor {self.group}: error confirmando {len(done)} eventos: {e}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Detener el consumidor tras el lote en curso"""
+        self._stop_event.set()
+        self.join(timeout)
+
+
+# Singleton global
+_event_bus: Optional[EventBus] = None
+_event_bus_lock = threading.Lock()
+
+
+def get_event_bus() -> EventBus:
+    """
+    Obtener el bus del proceso: Redis con REDIS_URL, en memoria sin ella
+
+    Si redis-py no está instalado o EVENT_BUS=memory se usa el bus en memoria.
+    """
+    global _event_bus
+    if _event_bus is None:
+        with _event_bus_lock:
+            if _event_bus is None:
+                _event_bus = _create_event_bus()
+    return _event_bus
+
+
+def _create_event_bus() -> EventBus:
+    url = os.getenv("REDIS_URL", "")
+    kind = os.getenv("EVENT_BUS", "redis" if url else "memory").lower()
+    if kind == "redis" and url:
+        if importlib.util.find_spec("redis") is not None:
+            return RedisEventBus(url)
+        logger.warning("redis no está instalado (pip install redis): eventos solo dentro del proceso")
+    elif kind == "redis":
+        logger.warning("EVENT_BUS=redis sin REDIS_URL: eventos solo dentro del proceso")
+    return MemoryEventBus()
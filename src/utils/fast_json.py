@@ -0,0 +1,74 @@
+"""
+Fast JSON - Serialización JSON a bytes
+
+Usa orjson si está instalado (varias veces más rápido y sin pasar por `str`)
+y cae a la stdlib si no. Ambas rutas producen JSON UTF-8 compacto, válido
+tanto para archivos JSONL como para parámetros `jsonb` de PostgreSQL, y
+aceptan las mismas entradas: fechas en ISO 8601 y cualquier otro tipo no
+serializable como `str()`. Lo que orjson rechaza y la stdlib no (enteros de
+más de 64 bits) se reintenta con la stdlib.
+
+orjson se importa en la primera serialización para no penalizar el arranque
+de los CLIs que no escriben JSON.
+"""
+import json
+from datetime import date, time
+from typing import Any, Callable, Optional
+
+_dumps: Optional[Callable[[Any], bytes]] = None
+_loads: Optional[Callable[[Any], Any]] = None
+
+
+def _default(obj: Any) -> str:
+    """Valor de los tipos sin representación JSON (el mismo con orjson y sin él)"""
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    return str(obj)
+
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return _encoder.encode(obj).encode("utf-8")
+
+
+def _load_backend() -> Callable[[Any], bytes]:
+    global _dumps, _loads
+    try:
+        import orjson
+    except ImportError:
+        _dumps = _stdlib_dumps
+        _loads = json.loads
+    else:
+        option = orjson.OPT_NON_STR_KEYS
+
+        def _orjson_dumps(obj: Any) -> bytes:
+            try:
+                return orjson.dumps(obj, default=_default, option=option)
+            except TypeError:
+                # "Integer exceeds 64-bit range": la stdlib sí los serializa
+                return _stdlib_dumps(obj)
+
+        _dumps = _orjson_dumps
+        _loads = orjson.loads
+    return _dumps
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializar a JSON UTF-8 compacto (bytes)"""
+    return (_dumps or _load_backend())(obj)
+
+
+def loads(data: Any) -> Any:
+    """Deserializar JSON desde bytes o str"""
+    if _loads is None:
+        _load_backend()
+    return _loads(data)
+
+
+def backend() -> str:
+    """Nombre del backend activo ("orjson" o "json")"""
+    if _dumps is None:
+        _load_backend()
+    return "json" if _loads is json.loads else "orjson"
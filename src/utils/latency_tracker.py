@@ -0,0 +1,132 @@
+"""
+Latency Tracker - Percentiles de latencia por proveedor aprendidos en línea
+
+Cada proveedor LLM tiene un histograma con buckets logarítmicos (de 10 ms a
+~10 min) cuyos pesos decaen con cada observación, así el percentil sigue a
+los cambios de carga sin guardar muestras. `LLMRouter` lo usa para decidir
+cuándo lanzar una petición de respaldo (hedging): si el proveedor no ha
+dado el primer token en su p95, probablemente va a tardar mucho más.
+
+Configuración:
+    LLM_HEDGE_QUANTILE      Percentil del retraso de hedging (default: 0.95)
+    LLM_HEDGE_DELAY         Retraso mientras no hay muestras suficientes (default: 2.0 s)
+    LLM_HEDGE_MIN_DELAY     Retraso mínimo (default: 0.05 s)
+    LLM_HEDGE_MIN_SAMPLES   Muestras antes de usar el percentil (default: 20)
+"""
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+# Buckets geométricos: cada uno un 20% mayor que el anterior
+_MIN_LATENCY = 0.01
+_GROWTH = 1.2
+_BUCKETS = 64
+_LOG_GROWTH = math.log(_GROWTH)
+
+
+def _bucket(seconds: float) -> int:
+    if seconds <= _MIN_LATENCY:
+        return 0
+    return min(_BUCKETS - 1, int(math.log(seconds / _MIN_LATENCY) / _LOG_GROWTH) + 1)
+
+
+def _upper_bound(index: int) -> float:
+    return _MIN_LATENCY * _GROWTH ** index
+
+
+class _DecayingHistogram:
+    """Histograma en el que cada observación pesa `1 / decay` veces más que la anterior"""
+    __slots__ = ("weights", "total", "increment", "decay", "samples")
+
+    def __init__(self, decay: float):
+        self.weights = [0.0] * _BUCKETS
+        self.total = 0.0
+        self.increment = 1.0
+        self.decay = decay
+        self.samples = 0
+
+    def observe(self, seconds: float):
+        # Subir el peso de lo nuevo equivale a decaer lo viejo sin recorrer los buckets
+        self.increment /= self.decay
+        if self.increment > 1e100:
+            self.weights = [w / self.increment for w in self.weights]
+            self.total /= self.increment
+            self.increment = 1.0
+        self.weights[_bucket(seconds)] += self.increment
+        self.total += self.increment
+        self.samples += 1
+
+    def quantile(self, q: float) -> float:
+        target = q * self.total
+        cumulative = 0.0
+        for index, weight in enumerate(self.weights):
+            cumulative += weight
+            if cumulative >= target:
+                return _upper_bound(index)
+        return _upper_bound(_BUCKETS - 1)
+
+
+class LatencyTracker:
+    """Percentiles de latencia hasta el primer token por proveedor"""
+
+    def __init__(self, decay: float = 0.98):
+        """
+        Inicializar tracker
+
+        Args:
+            decay: Factor de olvido por observación (0.98 ≈ las últimas ~50 pesan la mitad)
+        """
+        self.decay = decay
+        self.quantile_target = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+        self.default_delay = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+        self.min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.05"))
+        self.min_samples = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, _DecayingHistogram] = {}
+
+    def observe(self, provider: str, seconds: float):
+        """Registrar la latencia hasta el primer token de una llamada"""
+        with self._lock:
+            histogram = self._histograms.get(provider)
+            if histogram is None:
+                histogram = self._histograms[provider] = _DecayingHistogram(self.decay)
+            histogram.observe(seconds)
+
+    def quantile(self, provider: str, q: Optional[float] = None) -> Optional[float]:
+        """
+        Percentil aprendido para un proveedor
+
+        Args:
+            provider: Proveedor (`ollama`, `anthropic`, `openai`)
+            q: Percentil entre 0 y 1 (default: LLM_HEDGE_QUANTILE)
+
+        Returns:
+            Segundos (cota superior del bucket) o None si aún no hay muestras
+        """
+        with self._lock:
+            histogram = self._histograms.get(provider)
+            if histogram is None or histogram.samples == 0:
+                return None
+            return histogram.quantile(self.quantile_target if q is None else q)
+
+    def hedge_delay(self, provider: str) -> float:
+        """Espera antes de lanzar la petición de respaldo si `provider` no ha respondido"""
+        with self._lock:
+            histogram = self._histograms.get(provider)
+            if histogram is None or histogram.samples < self.min_samples:
+                return self.default_delay
+            return max(self.min_delay, histogram.quantile(self.quantile_target))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """p50, p95, retraso de hedging y muestras por proveedor"""
+        providers: List[str] = list(self._histograms)
+        return {
+            provider: {
+                "p50": self.quantile(provider, 0.5),
+                "p95": self.quantile(provider, 0.95),
+                "hedge_delay": self.hedge_delay(provider),
+                "samples": self._histograms[provider].samples,
+            }
+            for provider in providers
+        }
@@ -0,0 +1,122 @@
+"""
+Lazy Imports - Carga diferida de dependencias pesadas
+
+Los CLIs de auditoría y HITL se ejecutan como procesos nuevos en cada acción
+de un agente, así que importar psycopg, pydantic y loguru al arrancar se paga
+constantemente. Este módulo ofrece proxies que difieren la importación hasta
+el primer uso real.
+"""
+import os
+import sys
+import importlib
+from types import ModuleType
+from typing import Any, Optional
+
+
+class LazyModule(ModuleType):
+    """Proxy de módulo que se importa en el primer acceso a un atributo"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name: str) -> ModuleType:
+    """
+    Obtener un módulo sin importarlo todavía
+
+    Si el módulo ya está importado se retorna directamente.
+
+    Args:
+        name: Nombre del módulo (ej: "psycopg")
+
+    Returns:
+        Módulo real o proxy `LazyModule`
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+# Niveles de loguru
+_LEVELS = {
+    "TRACE": 5,
+    "DEBUG": 10,
+    "INFO": 20,
+    "SUCCESS": 25,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+
+
+class LazyLogger:
+    """
+    Proxy de loguru que solo lo importa al emitir un mensaje
+
+    Los mensajes por debajo de `LOG_LEVEL` se descartan sin importar loguru.
+    El default es DEBUG, como el handler por defecto de loguru; con
+    `LOG_LEVEL=INFO` los mensajes de debug no tienen coste de arranque.
+    """
+
+    def __init__(self, level: Optional[str] = None):
+        level_name = (level or os.getenv("LOG_LEVEL", "DEBUG")).upper()
+        self._min_level = _LEVELS.get(level_name, _LEVELS["DEBUG"])
+        self._logger = None
+
+    def _load(self):
+        if self._logger is None:
+            from loguru import logger
+            self._logger = logger
+        return self._logger
+
+    def _emit(self, level: str, message: str, *args: Any, **kwargs: Any):
+        if _LEVELS[level] < self._min_level:
+            return
+        self._load().opt(depth=2).log(level, message, *args, **kwargs)
+
+    def trace(self, message: str, *args: Any, **kwargs: Any):
+        self._emit("TRACE", message, *args, **kwargs)
+
+    def debug(self, message: str, *args: Any, **kwargs: Any):
+        self._emit("DEBUG", message, *args, **kwargs)
+
+    def info(self, message: str, *args: Any, **kwargs: Any):
+        self._emit("INFO", message, *args, **kwargs)
+
+    def success(self, message: str, *args: Any, **kwargs: Any):
+        self._emit("SUCCESS", message, *args, **kwargs)
+
+    def warning(self, message: str, *args: Any, **kwargs: Any):
+        self._emit("WARNING", message, *args, **kwargs)
+
+    def error(self, message: str, *args: Any, **kwargs: Any):
+        self._emit("ERROR", message, *args, **kwargs)
+
+    def critical(self, message: str, *args: Any, **kwargs: Any):
+        self._emit("CRITICAL", message, *args, **kwargs)
+
+    def exception(self, message: str, *args: Any, **kwargs: Any):
+        self._load().opt(depth=1, exception=True).error(message, *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        # bind, add, remove, opt...: requieren loguru real
+        return getattr(self._load(), name)
+
+
+# Logger compartido
+logger = LazyLogger()
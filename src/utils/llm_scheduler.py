@@ -0,0 +1,299 @@
+"""
+LLM Scheduler - Cola con prioridades delante de los proveedores LLM
+
+`LLMRouter` pide un turno antes de cada llamada a un proveedor. El
+scheduler limita las llamadas simultáneas por proveedor y decide quién
+entra cuando se libera un turno:
+
+1. Prioridad: `interactive` > `normal` > `background`. Una petición que
+   espera más de `LLM_SCHEDULER_AGING_SECONDS` sube una clase por cada
+   intervalo, así el trabajo de fondo no se queda sin turno.
+2. Equidad: dentro de una clase, turno rotatorio entre claves (sesión/agente),
+   de modo que un agente con una ráfaga no acapara al resto.
+3. Presupuesto de tokens (proveedores cloud): token bucket de
+   `LLM_TOKENS_PER_MINUTE_<PROVEEDOR>` tokens por minuto; una petición
+   consume su estimación (prompt + max_tokens) y se devuelve lo no usado.
+
+Configuración por proveedor (`OLLAMA`, `ANTHROPIC`, `OPENAI`):
+    LLM_MAX_CONCURRENCY_<PROVEEDOR>   Llamadas simultáneas (default: 2 Ollama, 8 cloud)
+    LLM_TOKENS_PER_MINUTE_<PROVEEDOR> Presupuesto de tokens (0 = sin límite)
+
+La espera en cola se mide en `sdd_llm_queue_wait_seconds{provider,priority}`
+y las peticiones en espera en `sdd_queue_depth{queue="llm.<proveedor>"}`.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from enum import Enum
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from src.utils import metrics
+
+
+class LLMPriority(str, Enum):
+    """Clases de prioridad de las peticiones LLM"""
+    INTERACTIVE = "interactive"
+    NORMAL = "normal"
+    BACKGROUND = "background"
+
+
+# Orden de servicio (menor = antes)
+_PRIORITY_RANK = {LLMPriority.INTERACTIVE: 0, LLMPriority.NORMAL: 1, LLMPriority.BACKGROUND: 2}
+
+# Llamadas simultáneas por defecto: Ollama en CPU atiende pocas a la vez
+_DEFAULT_CONCURRENCY = {"ollama": 2}
+_DEFAULT_CLOUD_CONCURRENCY = 8
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Estimación barata de tokens (~4 caracteres por token)"""
+    return len(text) // 4 + 1 if text else 0
+
+
+class _Waiter:
+    __slots__ = ("rank", "key", "cost", "enqueued")
+
+    def __init__(self, rank: int, key: str, cost: int):
+        self.rank = rank
+        self.key = key
+        self.cost = cost
+        self.enqueued = time.monotonic()
+
+
+class _TokenBucket:
+    """Presupuesto de tokens por minuto que se recarga de forma continua"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: int) -> float:
+        """Segundos hasta poder gastar `cost` (0 si ya se puede)"""
+        self._refill()
+        # Una petición mayor que el presupuesto entero espera a tenerlo lleno
+        needed = min(float(cost), self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def spend(self, cost: int):
+        self._refill()
+        self.tokens -= cost
+
+    def refund(self, tokens: int):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + tokens)
+
+
+class _ProviderQueue:
+    """Turnos, cola y presupuesto de un proveedor"""
+
+    def __init__(self, name: str, max_concurrency: int, tokens_per_minute: int):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.budget = _TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.active = 0
+        # Por clase de prioridad: clave de equidad -> peticiones en orden de llegada
+        self.classes: List["OrderedDict[str, Deque[_Waiter]]"] = [OrderedDict() for _ in _PRIORITY_RANK]
+        self.waiting = 0
+
+    def push(self, waiter: _Waiter):
+        self.classes[waiter.rank].setdefault(waiter.key, deque()).append(waiter)
+        self.waiting += 1
+
+    def remove(self, waiter: _Waiter):
+        queues = self.classes[waiter.rank]
+        queue = queues.get(waiter.key)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del queues[waiter.key]
+            self.waiting -= 1
+
+    def head(self, aging: float) -> Optional[_Waiter]:
+        """Siguiente petición: mejor clase efectiva y, dentro de ella, la clave en turno"""
+        now = time.monotonic()
+        best: Optional[Tuple[int, int, float]] = None
+        for rank, queues in enumerate(self.classes):
+            if not queues:
+                continue
+            # Antigüedad de la petición más vieja de la clase (cabezas de cada clave)
+            oldest = min(queue[0].enqueued for queue in queues.values())
+            effective = rank - int((now - oldest) / aging) if aging > 0 else rank
+            if best is None or (effective, oldest) < (best[0], best[2]):
+                best = (effective, rank, oldest)
+        if best is None:
+            return None
+        # Turno rotatorio: la primera clave de la clase; al servirla pasa al final
+        return next(iter(self.classes[best[1]].values()))[0]
+
+    def pop(self, waiter: _Waiter):
+        queues = self.classes[waiter.rank]
+        queue = queues.pop(waiter.key)
+        queue.popleft()
+        if queue:
+            queues[waiter.key] = queue
+        self.waiting -= 1
+
+
+class LLMScheduler:
+    """Concurrencia, prioridades, equidad y presupuesto de tokens por proveedor"""
+
+    def __init__(self, aging_seconds: Optional[float] = None):
+        self.aging_seconds = aging_seconds if aging_seconds is not None else float(
+            os.getenv("LLM_SCHEDULER_AGING_SECONDS", "30")
+        )
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._providers: Dict[str, _ProviderQueue] = {}
+
+    def configure(
+        self,
+        provider: str,
+        max_concurrency: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None
+    ):
+        """Cambiar los límites de un proveedor (por defecto vienen del entorno)"""
+        with self._lock:
+            queue = self._queue(provider)
+            if max_concurrency is not None:
+                queue.max_concurrency = max(1, max_concurrency)
+            if tokens_per_minute is not None:
+                queue.budget = _TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+            self._changed.notify_all()
+
+    def _queue(self, provider: str) -> _ProviderQueue:
+        queue = self._providers.get(provider)
+        if queue is None:
+            env = provider.upper()
+            default = _DEFAULT_CONCURRENCY.get(provider, _DEFAULT_CLOUD_CONCURRENCY)
+            queue = self._providers[provider] = _ProviderQueue(
+                provider,
+                int(os.getenv(f"LLM_MAX_CONCURRENCY_{env}", default)),
+                int(os.getenv(f"LLM_TOKENS_PER_MINUTE_{env}", "0")),
+            )
+        return queue
+
+    @contextmanager
+    def slot(
+        self,
+        provider: str,
+        priority: str = LLMPriority.NORMAL,
+        key: str = "default",
+        cost: int = 0,
+        timeout: Optional[float] = None
+    ) -> Iterator["_Slot"]:
+        """
+        Esperar turno para llamar a un proveedor
+
+        Args:
+            provider: Proveedor (`ollama`, `anthropic`, `openai`)
+            priority: Clase de prioridad (`interactive`, `normal`, `background`)
+            key: Clave de equidad (p.ej. sesión/agente)
+            cost: Tokens estimados (prompt + max_tokens) para el presupuesto
+            timeout: Espera máxima en cola (None = sin límite)
+
+        Yields:
+            Turno; `slot.used(tokens)` devuelve al presupuesto lo no consumido
+
+        Raises:
+            TimeoutError: Si no hay turno dentro de `timeout`
+        """
+        priority = LLMPriority(priority)
+        waiter = _Waiter(_PRIORITY_RANK[priority], key, cost)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._lock:
+            queue = self._queue(provider)
+            queue.push(waiter)
+            metrics.QUEUE_DEPTH.inc(queue=f"llm.{provider}")
+            try:
+                while True:
+                    wait = self._admission_wait(queue, waiter)
+                    if wait == 0.0:
+                        break
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(f"Sin turno para {provider} en {timeout}s")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._changed.wait(wait)
+            except BaseException:
+                queue.remove(waiter)
+                self._changed.notify_all()
+                raise
+            finally:
+                metrics.QUEUE_DEPTH.dec(queue=f"llm.{provider}")
+            queue.pop(waiter)
+            queue.active += 1
+            if queue.budget is not None:
+                queue.budget.spend(cost)
+            # Puede haber más turnos libres para los siguientes
+            self._changed.notify_all()
+
+        metrics.LLM_QUEUE_WAIT.observe(time.monotonic() - waiter.enqueued, provider=provider, priority=priority.value)
+        slot = _Slot(cost)
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                queue.active -= 1
+                if queue.budget is not None and slot.tokens is not None and slot.tokens < cost:
+                    queue.budget.refund(cost - slot.tokens)
+                self._changed.notify_all()
+
+    def _admission_wait(self, queue: _ProviderQueue, waiter: _Waiter) -> Optional[float]:
+        """0 si `waiter` puede entrar ya; si no, cuánto esperar (None = hasta un aviso)"""
+        if queue.active >= queue.max_concurrency or queue.head(self.aging_seconds) is not waiter:
+            # El envejecimiento puede cambiar el orden sin que nadie avise
+            return self.aging_seconds if self.aging_seconds > 0 and queue.waiting > 1 else None
+        if queue.budget is None:
+            return 0.0
+        return queue.budget.wait_time(waiter.cost)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Llamadas en curso y en espera por proveedor"""
+        with self._lock:
+            return {
+                name: {"active": queue.active, "waiting": queue.waiting, "max_concurrency": queue.max_concurrency}
+                for name, queue in self._providers.items()
+            }
+
+
+class _Slot:
+    """Turno concedido; permite informar los tokens realmente consumidos"""
+    __slots__ = ("cost", "tokens")
+
+    def __init__(self, cost: int):
+        self.cost = cost
+        self.tokens: Optional[int] = None
+
+    def used(self, tokens: Optional[int]):
+        self.tokens = tokens
+
+
+# Singleton global: los límites son por proceso, no por router
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Obtener instancia global de LLMScheduler
+
+    Returns:
+        LLMScheduler: Instancia singleton
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler()
+    return _scheduler
@@ -0,0 +1,475 @@
+"""
+Metrics - Instrumentación de rutas críticas
+
+Contadores, gauges e histogramas con etiquetas, exportables en formato de
+texto de Prometheus y observables mediante hooks. Solo usa la stdlib.
+
+Desactivado por defecto (`METRICS_ENABLED=false`): cada registro retorna tras
+comprobar un flag, y `Histogram.time()` devuelve un context manager no-op
+compartido, así que instrumentar una ruta crítica cuesta unos cientos de ns
+(ver `python -m benchmarks run -k 'metrics.*'`).
+
+Uso:
+    from src.utils import metrics
+
+    with metrics.DB_LATENCY.time(operation="audit.insert"):
+        ...
+    metrics.LLM_FALLBACKS.inc(source="ollama", reason="error")
+
+    metrics.add_hook(lambda name, kind, value, labels: ...)
+    metrics.start_http_server(9464)   # GET /metrics (o: sdd-auditd --metrics-port)
+"""
+import os
+import time
+import bisect
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Buckets por defecto (segundos): de 0.5 ms a 60 s, cubren DB y LLM
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Hook: (nombre_métrica, tipo, valor, etiquetas)
+MetricHook = Callable[[str, str, float, Dict[str, str]], None]
+
+LabelKey = Tuple[str, ...]
+
+
+class _State:
+    """Estado global: un solo atributo que leen todas las rutas críticas"""
+    __slots__ = ("enabled", "hooks")
+
+    def __init__(self):
+        self.enabled = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+        self.hooks: Tuple[MetricHook, ...] = ()
+
+
+_state = _State()
+_registry: Dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def enable():
+    """Activar el registro de métricas"""
+    _state.enabled = True
+
+
+def disable():
+    """Desactivar el registro de métricas (los valores acumulados se conservan)"""
+    _state.enabled = False
+
+
+def is_enabled() -> bool:
+    return _state.enabled
+
+
+def add_hook(hook: MetricHook):
+    """
+    Registrar un hook que recibe cada observación
+
+    Registrar un hook activa las métricas. Los errores del hook se ignoran
+    para no afectar la ruta instrumentada.
+    """
+    _state.hooks = _state.hooks + (hook,)
+    enable()
+
+
+def remove_hook(hook: MetricHook):
+    _state.hooks = tuple(h for h in _state.hooks if h is not hook)
+
+
+def _notify(name: str, kind: str, value: float, labels: Dict[str, str]):
+    for hook in _state.hooks:
+        try:
+            hook(name, kind, value, labels)
+        except Exception:
+            pass
+
+
+class _Metric:
+    """Base de las métricas con etiquetas"""
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._collectors: List[Callable[[], Any]] = []
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} espera etiquetas {self.labelnames}, recibió {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def add_collector(self, collect: Callable[[], Any]):
+        """
+        Añadir valores calculados al exportar en lugar de registrarlos
+
+        `collect` retorna un número (métrica sin etiquetas) o un dict
+        {tupla_de_etiquetas: valor}. Útil para valores caros de mantener en
+        la ruta crítica (p.ej. checkpoints pendientes, hits de una lru_cache).
+        """
+        self._collectors.append(collect)
+
+    def _current_values(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            values = dict(self._values)
+        for collect in self._collectors:
+            try:
+                result = collect()
+            except Exception:
+                continue
+            if isinstance(result, dict):
+                for key, value in result.items():
+                    key = key if isinstance(key, tuple) else (key,)
+                    values[tuple(str(v) for v in key)] = float(value)
+            else:
+                values[()] = float(result)
+        return values
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Contador monótono"""
+    kind = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        if not _state.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        if _state.hooks:
+            _notify(self.name, self.kind, amount, labels)
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        return [(self.name, key, value) for key, value in sorted(self._current_values().items())]
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja"""
+    kind = "gauge"
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: Any):
+        if not _state.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+        if _state.hooks:
+            _notify(self.name, self.kind, value, labels)
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        if not _state.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            value = self._values[key] = self._values.get(key, 0.0) + amount
+        if _state.hooks:
+            _notify(self.name, self.kind, value, labels)
+
+    def dec(self, amount: float = 1.0, **labels: Any):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        return [(self.name, key, value) for key, value in sorted(self._current_values().items())]
+
+
+class _NoopTimer:
+    """Context manager compartido cuando las métricas están desactivadas"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc: Any):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class _Timer:
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, Any]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any):
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribución de valores en buckets acumulativos (latencias en segundos)"""
+    kind = "histogram"
+
+    def __init__(self, *args: Any, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [conteo por bucket (+Inf al final), suma, total]
+        self._values: Dict[LabelKey, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any):
+        if not _state.enabled:
+            return
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+        if _state.hooks:
+            _notify(self.name, self.kind, value, labels)
+
+    def time(self, **labels: Any):
+        """Context manager que observa la duración del bloque"""
+        if not _state.enabled:
+            return _NOOP_TIMER
+        return _Timer(self, labels)
+
+    def count(self, **labels: Any) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            snapshot = {k: (list(v[0]), v[1], v[2]) for k, v in self._values.items()}
+        out = []
+        for key, (counts, total_sum, total_count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                out.append((f"{self.name}_bucket", key + (_format_value(bound),), cumulative))
+            out.append((f"{self.name}_sum", key, total_sum))
+            out.append((f"{self.name}_count", key, total_count))
+        return out
+
+
+def _register(metric: _Metric) -> Any:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                raise ValueError(f"Métrica {metric.name} ya registrada con otra definición")
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs: Any) -> Counter:
+    """Obtener (o crear) un contador registrado"""
+    return _register(Counter(name, documentation, labelnames, **kwargs))
+
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs: Any) -> Gauge:
+    """Obtener (o crear) un gauge registrado"""
+    return _register(Gauge(name, documentation, labelnames, **kwargs))
+
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs: Any) -> Histogram:
+    """Obtener (o crear) un histograma registrado"""
+    return _register(Histogram(name, documentation, labelnames, **kwargs))
+
+
+# --- Exportación Prometheus --------------------------------------------------
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render() -> str:
+    """Todas las métricas registradas en formato de texto de Prometheus 0.0.4"""
+    lines = []
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        labelnames = metric.labelnames
+        for sample_name, key, value in metric.samples():
+            names = labelnames + ("le",) if sample_name.endswith("_bucket") else labelnames
+            if names:
+                label_text = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, key))
+                lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{sample_name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def start_http_server(port: Optional[int] = None, host: Optional[str] = None) -> Any:
+    """
+    Exponer `/metrics` en un hilo de fondo y activar las métricas
+
+    Args:
+        port: Puerto (default: env SDD_METRICS_PORT o 9464)
+        host: Interfaz (default: env SDD_METRICS_HOST o 127.0.0.1)
+
+    Returns:
+        Servidor HTTP (usar `.shutdown()` para detenerlo)
+    """
+    # http.server se importa solo si se expone el endpoint (arranque rápido)
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    port = port if port is not None else int(os.getenv("SDD_METRICS_PORT", "9464"))
+    host = host or os.getenv("SDD_METRICS_HOST", "127.0.0.1")
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    enable()
+    return server
+
+
+# --- Métricas de SDD ---------------------------------------------------------
+
+DB_LATENCY = histogram(
+    "sdd_db_operation_seconds",
+    "Latencia de operaciones en PostgreSQL",
+    ("operation",),
+)
+LLM_LATENCY = histogram(
+    "sdd_llm_request_seconds",
+    "Latencia de peticiones a proveedores LLM",
+    ("provider", "operation"),
+)
+LLM_QUEUE_WAIT = histogram(
+    "sdd_llm_queue_wait_seconds",
+    "Espera en la cola del scheduler LLM antes de llamar al proveedor",
+    ("provider", "priority"),
+)
+LLM_MODEL_LOAD = histogram(
+    "sdd_llm_model_load_seconds",
+    "Tiempo de carga del modelo reportado por Ollama (load_duration)",
+    ("model",),
+)
+LLM_FIRST_TOKEN = histogram(
+    "sdd_llm_first_token_seconds",
+    "Tiempo hasta el primer token por proveedor (cola incluida; cloud: respuesta completa)",
+    ("provider",),
+)
+LLM_HEDGES = counter(
+    "sdd_llm_hedges_total",
+    "Peticiones de respaldo lanzadas por hedging y si ganaron o perdieron",
+    ("provider", "outcome"),
+)
+LLM_ERRORS = counter(
+    "sdd_llm_errors_total",
+    "Peticiones LLM fallidas por proveedor",
+    ("provider", "operation"),
+)
+LLM_FALLBACKS = counter(
+    "sdd_llm_fallbacks_total",
+    "Fallbacks del LLMRouter desde un proveedor",
+    ("source", "reason"),
+)
+COALESCED_CALLS = counter(
+    "sdd_coalesced_calls_total",
+    "Llamadas resueltas con el resultado de otra idéntica en curso (single-flight)",
+    ("flight",),
+)
+AUDIT_WRITE_FAILURES = counter(
+    "sdd_audit_write_failures_total",
+    "Escrituras de auditoría fallidas por destino",
+    ("sink",),
+)
+CACHE_HITS = counter(
+    "sdd_cache_hits_total",
+    "Hits de caché por caché",
+    ("cache",),
+)
+CACHE_MISSES = counter(
+    "sdd_cache_misses_total",
+    "Misses de caché por caché",
+    ("cache",),
+)
+HITL_CHECKPOINTS = counter(
+    "sdd_hitl_checkpoints_total",
+    "Checkpoints creados por resultado inicial",
+    ("outcome",),
+)
+HITL_PENDING = gauge(
+    "sdd_hitl_pending_checkpoints",
+    "Checkpoints pendientes por prioridad",
+    ("priority",),
+)
+QUEUE_DEPTH = gauge(
+    "sdd_queue_depth",
+    "Trabajo en curso o en espera por cola",
+    ("queue",),
+)
+EVENT_PUBLISH_FAILURES = counter(
+    "sdd_event_publish_failures_total",
+    "Eventos que no se pudieron publicar en el bus por stream",
+    ("stream",),
+)
+OLLAMA_PULLS = counter(
+    "sdd_ollama_pulls_total",
+    "Descargas de modelos de Ollama por resultado (success, error) y reintentos (retry)",
+    ("outcome",),
+)
+OLLAMA_PULL_BYTES = counter(
+    "sdd_ollama_pull_bytes_total",
+    "Bytes descargados por modelo en /api/pull (sin contar lo reanudado)",
+    ("model",),
+)
+AUDITD_REQUEST_LATENCY = histogram(
+    "sdd_auditd_request_seconds",
+    "Latencia de peticiones atendidas por sdd-auditd",
+    ("op",),
+)
+
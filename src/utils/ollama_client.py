@@ -5,9 +5,32 @@ Proporciona interfaz unificada para interactuar con modelos locales,
 con fallback automático a modelos cloud si Ollama no está disponible.
 """
 import os
+import sys
+import json
+import time
+import queue
+import socket
+import threading
+import contextvars
 import requests
-from typing import Optional, Dict, Any, List
-from loguru import logger
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Union, Callable, Tuple, TYPE_CHECKING
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/utils/ollama_client.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.audit.sessions import get_session_tracker
+from src.utils import metrics, tracing
+from src.utils.latency_tracker import LatencyTracker
+from src.utils.lazy_imports import logger
+from src.utils.llm_scheduler import LLMPriority, estimate_tokens, get_llm_scheduler
+from src.utils.ollama_models import OllamaModelManager
+from src.utils.ollama_pull import OllamaPullManager, ProgressCallback
+from src.utils.single_flight import AsyncSingleFlight, SingleFlight
+
+if TYPE_CHECKING:
+    from src.utils.conversation import Conversation
 
 
 class OllamaClient:
@@ -29,8 +52,13 @@ class OllamaClient:
         """
         self.base_url = base_url or os.getenv("OLLAMA_URL", "http://ollama:11434")
         self.model = model or os.getenv("OLLAMA_MODEL", "llama3.2:latest")
+        self.embed_model = os.getenv("EMBEDDING_MODEL", "nomic-embed-text:latest")
         self.timeout = timeout
         self.enabled = os.getenv("OLLAMA_ENABLED", "true").lower() == "true"
+        # Precarga, keep_alive y modelos cargados en memoria
+        self.models = OllamaModelManager(self.base_url, self.model, timeout)
+        # Descargas con progreso, reintentos y precarga en paralelo
+        self.pulls = OllamaPullManager(self.base_url)
         
         logger.info(f"OllamaClient initialized: {self.base_url}, model: {self.model}")
     
@@ -74,37 +102,21 @@ class OllamaClient:
             logger.error(f"Error listing Ollama models: {e}")
             return []
     
-    def pull_model(self, model: Optional[str] = None) -> bool:
+    def pull_model(self, model: Optional[str] = None, on_progress: Optional[ProgressCallback] = None) -> bool:
         """
         Descargar modelo si no existe
         
+        Reintenta los fallos transitorios; cada reintento reanuda la descarga
+        donde quedó. Para varios modelos en paralelo: `self.pulls.prefetch()`.
+        
         Args:
             model: Nombre del modelo (default: self.model)
+            on_progress: Callback con cada avance (p.ej. `ProgressBar()`)
         
         Returns:
-            bool: True si descarga exitosa, False si falla
+            bool: True si Ollama terminó con `success`, False si falla
         """
-        model = model or self.model
-        
-        try:
-            logger.info(f"Pulling Ollama model: {model}")
-            response = requests.post(
-                f"{self.base_url}/api/pull",
-                json={"name": model},
-                timeout=600,  # 10 minutos para descarga
-                stream=True
-            )
-            
-            # Procesar respuesta streaming
-            for line in response.iter_lines():
-                if line:
-                    data = line.decode('utf-8')
-                    logger.debug(f"Pull progress: {data}")
-            
-            return True
-        except Exception as e:
-            logger.error(f"Error pulling model {model}: {e}")
-            return False
+        return self.pulls.pull(model or self.model, on_progress=on_progress).ok
     
     def generate(
         self,
@@ -113,7 +125,10 @@ class OllamaClient:
         system: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 2000,
-        stream: bool = False
+        stream: bool = False,
+        keep_alive: Optional[Union[str, int]] = None,
+        alternatives: Optional[List[str]] = None,
+        timeout: Optional[float] = None
     ) -> str:
         """
         Generar texto con Ollama
@@ -124,17 +139,22 @@ class OllamaClient:
             system: System prompt opcional
             temperature: Temperatura (0.0-1.0)
             max_tokens: Máximo de tokens a generar
-            stream: Si True, retorna generator; si False, retorna string completo
+            stream: Si True, retorna un iterador de fragmentos; si False, el texto completo
+            keep_alive: Tiempo que el modelo sigue cargado (default: OLLAMA_KEEP_ALIVE)
+            alternatives: Modelos aceptables en lugar de `model`; se usa el primero ya cargado
+            timeout: Timeout de la petición en segundos (default: self.timeout)
         
         Returns:
-            str: Texto generado
+            str: Texto generado (en streaming, iterador cuyo `close()` corta la
+            generación, también desde otro hilo)
         """
-        model = model or self.model
+        model = self.models.select(model or self.model, alternatives)
         
         payload = {
             "model": model,
             "prompt": prompt,
             "stream": stream,
+            "keep_alive": keep_alive if keep_alive is not None else self.models.keep_alive_for(model),
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens
@@ -144,49 +164,140 @@ class OllamaClient:
         if system:
             payload["system"] = system
         
+        # En streaming el span termina al agotar o cerrar el iterador
+        span = tracing.start_span(
+            "llm.ollama.generate",
+            category="llm",
+            attributes={"llm.provider": "ollama", "llm.model": model, "llm.stream": stream}
+        )
+        started = time.perf_counter()
         try:
             response = requests.post(
                 f"{self.base_url}/api/generate",
                 json=payload,
-                timeout=self.timeout,
+                timeout=timeout if timeout is not None else self.timeout,
                 stream=stream
             )
             response.raise_for_status()
+            self.models.loaded(model)
             
             if stream:
-                # Retornar generator para streaming
-                def stream_generator():
-                    for line in response.iter_lines():
-                        if line:
-                            data = line.decode('utf-8')
-                            import json
-                            chunk = json.loads(data)
-                            if "response" in chunk:
-                                yield chunk["response"]
-                return stream_generator()
+                # En streaming se mide hasta recibir la respuesta (inicio del stream)
+                metrics.LLM_LATENCY.observe(time.perf_counter() - started, provider="ollama", operation="generate_stream")
+                return _OllamaStream(response, span)
             else:
                 # Retornar texto completo
                 full_response = ""
                 for line in response.iter_lines():
                     if line:
                         data = line.decode('utf-8')
-                        import json
                         chunk = json.loads(data)
+                        if chunk.get("done"):
+                            _set_token_attributes(span, chunk)
                         if "response" in chunk:
                             full_response += chunk["response"]
                 
+                metrics.LLM_LATENCY.observe(time.perf_counter() - started, provider="ollama", operation="generate")
+                span.end()
                 return full_response
         
         except Exception as e:
+            metrics.LLM_ERRORS.inc(provider="ollama", operation="generate")
+            span.record_error(e)
+            span.end()
+            logger.error(f"Error generating with Ollama: {e}")
+            raise
+    
+    def generate_with_context(
+        self,
+        prompt: str,
+        context: Optional[List[int]] = None,
+        model: Optional[str] = None,
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        keep_alive: Optional[Union[str, int]] = None
+    ) -> Tuple[str, List[int]]:
+        """
+        Generar continuando una conversación con el `context` que devuelve Ollama
+        
+        El `context` son los tokens de la conversación ya evaluada; al
+        pasarlo, Ollama solo procesa el prompt nuevo en lugar de todo el historial.
+        
+        Args:
+            prompt: Prompt del turno
+            context: `context` de la respuesta anterior (None = conversación nueva)
+            model: Modelo a usar (default: self.model)
+            system: System prompt (solo se envía al empezar, ya forma parte del context)
+            temperature: Temperatura (0.0-1.0)
+            max_tokens: Máximo de tokens a generar
+            keep_alive: Tiempo que el modelo sigue cargado (default: OLLAMA_KEEP_ALIVE)
+        
+        Returns:
+            (texto, context): El context incluye el prompt y la respuesta, para el siguiente turno
+        """
+        model = self.models.select(model or self.model)
+        
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": keep_alive if keep_alive is not None else self.models.keep_alive_for(model),
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens
+            }
+        }
+        if context:
+            payload["context"] = context
+        elif system:
+            payload["system"] = system
+        
+        try:
+            with tracing.start_span(
+                "llm.ollama.generate",
+                category="llm",
+                attributes={"llm.provider": "ollama", "llm.model": model, "llm.context_tokens": len(context or ())}
+            ) as span, metrics.LLM_LATENCY.time(provider="ollama", operation="generate"):
+                response = requests.post(
+                    f"{self.base_url}/api/generate",
+                    json=payload,
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                self.models.loaded(model)
+                data = response.json()
+                _set_token_attributes(span, data)
+            
+            return data.get("response", ""), data.get("context") or []
+        
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(provider="ollama", operation="generate")
             logger.error(f"Error generating with Ollama: {e}")
             raise
     
+    def conversation(self, system: Optional[str] = None, **kwargs: Any) -> "Conversation":
+        """
+        Conversación con presupuesto de tokens sobre este cliente
+        
+        Args:
+            system: System prompt (siempre se envía)
+            **kwargs: Opciones de `Conversation` (budget, keep_recent, summarize, use_context...)
+        
+        Returns:
+            Conversation: Historial que se recorta o resume para caber en el presupuesto
+        """
+        from src.utils.conversation import Conversation
+        return Conversation(self, system=system, **kwargs)
+    
     def chat(
         self,
         messages: List[Dict[str, str]],
         model: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        keep_alive: Optional[Union[str, int]] = None,
+        alternatives: Optional[List[str]] = None
     ) -> str:
         """
         Chat con Ollama (formato OpenAI-compatible)
@@ -196,16 +307,19 @@ class OllamaClient:
             model: Modelo a usar (default: self.model)
             temperature: Temperatura (0.0-1.0)
             max_tokens: Máximo de tokens a generar
+            keep_alive: Tiempo que el modelo sigue cargado (default: OLLAMA_KEEP_ALIVE)
+            alternatives: Modelos aceptables en lugar de `model`; se usa el primero ya cargado
         
         Returns:
             str: Respuesta del modelo
         """
-        model = model or self.model
+        model = self.models.select(model or self.model, alternatives)
         
         payload = {
             "model": model,
             "messages": messages,
             "stream": False,
+            "keep_alive": keep_alive if keep_alive is not None else self.models.keep_alive_for(model),
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens
@@ -213,19 +327,135 @@ class OllamaClient:
         }
         
         try:
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
-                timeout=self.timeout
-            )
-            response.raise_for_status()
-            data = response.json()
+            with tracing.start_span(
+                "llm.ollama.chat",
+                category="llm",
+                attributes={"llm.provider": "ollama", "llm.model": model, "llm.messages": len(messages)}
+            ) as span, metrics.LLM_LATENCY.time(provider="ollama", operation="chat"):
+                response = requests.post(
+                    f"{self.base_url}/api/chat",
+                    json=payload,
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                self.models.loaded(model)
+                data = response.json()
+                _set_token_attributes(span, data)
             
             return data.get("message", {}).get("content", "")
         
         except Exception as e:
+            metrics.LLM_ERRORS.inc(provider="ollama", operation="chat")
             logger.error(f"Error chatting with Ollama: {e}")
             raise
+    
+    def embed(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """
+        Embeddings de varios textos en una sola llamada a /api/embed
+        
+        Args:
+            texts: Textos a vectorizar
+            model: Modelo de embeddings (default: env EMBEDDING_MODEL)
+        
+        Returns:
+            List[List[float]]: Un vector por texto, en el mismo orden
+        """
+        if not texts:
+            return []
+        model = model or self.embed_model
+        
+        try:
+            with tracing.start_span(
+                "llm.ollama.embed",
+                category="llm",
+                attributes={"llm.provider": "ollama", "llm.model": model, "llm.inputs": len(texts)}
+            ) as span, metrics.LLM_LATENCY.time(provider="ollama", operation="embed"):
+                response = requests.post(
+                    f"{self.base_url}/api/embed",
+                    json={"model": model, "input": texts, "keep_alive": self.models.keep_alive_for(model)},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                self.models.loaded(model)
+                data = response.json()
+                _set_token_attributes(span, data)
+            
+            return data.get("embeddings", [])
+        
+        except Exception as e:
+            metrics.LLM_ERRORS.inc(provider="ollama", operation="embed")
+            logger.error(f"Error embedding with Ollama: {e}")
+            raise
+
+
+class _OllamaStream:
+    """Fragmentos de /api/generate en streaming; `close()` corta la conexión"""
+    
+    def __init__(self, response: requests.Response, span: Any):
+        self._response = response
+        self._lines = response.iter_lines()
+        self._span = span
+        self._lock = threading.Lock()
+        self.closed = False
+        # Tokens reportados por Ollama en el fragmento final
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+    
+    def __iter__(self) -> "_OllamaStream":
+        return self
+    
+    def __next__(self) -> str:
+        try:
+            for line in self._lines:
+                if line:
+                    chunk = json.loads(line.decode('utf-8'))
+                    if chunk.get("done"):
+                        _set_token_attributes(self._span, chunk)
+                        self.prompt_tokens = chunk.get("prompt_eval_count")
+                        self.completion_tokens = chunk.get("eval_count")
+                    if "response" in chunk:
+                        return chunk["response"]
+        except Exception:
+            if self.closed:
+                # Lectura interrumpida por close() desde otro hilo
+                raise StopIteration
+            self.close()
+            raise
+        self.close()
+        raise StopIteration
+    
+    def close(self):
+        """Cerrar el stream; Ollama deja de generar al perder la conexión"""
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        # close() no despierta a un hilo bloqueado leyendo el socket; shutdown() sí
+        # (HTTPResponse.shutdown desde urllib3 2.3). Sin conexión, la respuesta
+        # ya se leyó entera y urllib3 la devolvió al pool
+        raw = self._response.raw
+        if raw.connection is not None:
+            try:
+                if hasattr(raw, "shutdown"):
+                    raw.shutdown()
+                else:
+                    raw.connection.sock.shutdown(socket.SHUT_RDWR)
+            except Exception as e:
+                logger.warning(f"Could not shut down Ollama stream socket, generation may keep running: {e}")
+        self._response.close()
+        self._span.end()
+
+
+def _set_token_attributes(span: Any, chunk: Dict[str, Any]):
+    """Tokens y tiempo de carga del modelo reportados por Ollama en la respuesta final"""
+    load_duration = chunk.get("load_duration")
+    span.set_attributes({
+        "llm.prompt_tokens": chunk.get("prompt_eval_count"),
+        "llm.completion_tokens": chunk.get("eval_count"),
+        "llm.load_ms": load_duration / 1e6 if load_duration is not None else None,
+    })
+    if load_duration is not None:
+        metrics.LLM_MODEL_LOAD.observe(load_duration / 1e9, model=chunk.get("model", ""))
 
 
 class LLMRouter:
@@ -233,15 +463,38 @@ class LLMRouter:
     Router que decide entre Ollama (local) y modelos cloud
     
     Prioriza Ollama si está disponible, fallback a cloud si no.
+    
+    Las peticiones idénticas concurrentes (mismo prompt, system y
+    parámetros) comparten una sola llamada al proveedor (single-flight),
+    tanto entre hilos como entre corrutinas de `agenerate`. Cada llamada a
+    un proveedor espera turno en `LLMScheduler` (límite de concurrencia,
+    prioridad, equidad por sesión/agente y presupuesto de tokens).
+    
+    Al crearse precarga en segundo plano los modelos de OLLAMA_WARM_MODELS;
+    con `alternatives` la petición va al primer modelo ya cargado en memoria.
+    
+    Con `hedge=True`, si el proveedor en curso no da el primer token dentro
+    de su p95 aprendido (`LatencyTracker`), se lanza el siguiente en paralelo
+    y gana el primero que termina; `deadline` limita la llamada completa.
     """
     
     def __init__(self):
         """Inicializar router con Ollama y clientes cloud"""
         self.ollama = OllamaClient()
         self.use_ollama = self.ollama.is_available()
+        self.coalesce = os.getenv("LLM_COALESCE", "true").lower() == "true"
+        self.hedge = os.getenv("LLM_HEDGE", "false").lower() == "true"
+        self._flights = SingleFlight("llm.generate")
+        self._async_flights = AsyncSingleFlight("llm.agenerate")
+        self.scheduler = get_llm_scheduler()
+        self.latency = LatencyTracker()
+        # Llamadas y tokens por sesión y agente (resumen de sesión)
+        self.sessions = get_session_tracker()
         
         if self.use_ollama:
             logger.info("LLMRouter: Using Ollama (local)")
+            if self.ollama.models.warmup_on_start:
+                self.ollama.models.warmup(background=True)
         else:
             logger.info("LLMRouter: Ollama unavailable, will use cloud models")
     
@@ -251,7 +504,14 @@ class LLMRouter:
         system: Optional[str] = None,
         temperature: float = 0.7,
         max_tokens: int = 2000,
-        prefer_local: bool = True
+        prefer_local: bool = True,
+        coalesce: bool = True,
+        priority: str = LLMPriority.NORMAL,
+        session_id: Optional[str] = None,
+        agent_name: Optional[str] = None,
+        alternatives: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        hedge: Optional[bool] = None
     ) -> str:
         """
         Generar texto con router automático
@@ -262,81 +522,445 @@ class LLMRouter:
             temperature: Temperatura
             max_tokens: Máximo de tokens
             prefer_local: Si True, intenta Ollama primero
+            coalesce: Si True, comparte la llamada con peticiones idénticas en curso
+            priority: Clase en la cola del proveedor (interactive, normal, background)
+            session_id: Sesión para el reparto equitativo de turnos (default: SESSION_ID)
+            agent_name: Agente para el reparto equitativo de turnos
+            alternatives: Modelos Ollama aceptables en lugar de OLLAMA_MODEL; se
+                usa el primero ya cargado en memoria para evitar una carga en frío
+            deadline: Segundos máximos para toda la llamada, incluida la cola y
+                los fallbacks (None = sin límite)
+            hedge: Lanzar el siguiente proveedor en paralelo si el actual no da
+                el primer token a tiempo (default: LLM_HEDGE)
         
         Returns:
             str: Texto generado
-        """
-        if prefer_local and self.use_ollama:
-            try:
-                return self.ollama.generate(
-                    prompt=prompt,
-                    system=system,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
-            except Exception as e:
-                logger.warning(f"Ollama failed, falling back to cloud: {e}")
         
-        # Fallback a cloud (Anthropic, OpenAI, etc.)
-        return self._generate_cloud(prompt, system, temperature, max_tokens)
+        Raises:
+            TimeoutError: Si no hay respuesta dentro de `deadline`
+        """
+        request = _LLMRequest(
+            prompt, system, temperature, max_tokens, prefer_local,
+            LLMPriority(priority), _fairness_key(session_id, agent_name), alternatives,
+            deadline, self.hedge if hedge is None else hedge, session_id, agent_name
+        )
+        with tracing.start_span(
+            "llm.router.generate",
+            category="llm",
+            attributes={
+                "llm.max_tokens": max_tokens,
+                "llm.priority": request.priority.value,
+                "llm.deadline": deadline,
+                "llm.hedge": request.hedge,
+            }
+        ) as span:
+            if not (coalesce and self.coalesce):
+                return self._generate(span, request)
+            
+            result, shared = self._flights.do(request.key(), lambda: self._generate(span, request))
+            if shared:
+                span.set_attribute("llm.coalesced", True)
+            return result
     
-    def _generate_cloud(
+    async def agenerate(
         self,
         prompt: str,
-        system: Optional[str],
-        temperature: float,
-        max_tokens: int
+        system: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        prefer_local: bool = True,
+        coalesce: bool = True,
+        priority: str = LLMPriority.NORMAL,
+        session_id: Optional[str] = None,
+        agent_name: Optional[str] = None,
+        alternatives: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        hedge: Optional[bool] = None
     ) -> str:
         """
-        Generar con modelos cloud (fallback)
+        Versión asyncio de `generate` (la llamada corre en un hilo del executor)
         
-        Prioridad: Anthropic > OpenAI > Gemini
+        Las corrutinas con la misma petición esperan una sola tarea, que a su
+        vez se agrupa con las llamadas síncronas idénticas de otros hilos.
         """
-        # Intentar Anthropic
+        import asyncio
+        
+        def call():
+            return asyncio.to_thread(
+                self.generate, prompt, system, temperature, max_tokens, prefer_local, coalesce,
+                priority, session_id, agent_name, alternatives, deadline, hedge
+            )
+        
+        if not (coalesce and self.coalesce):
+            return await call()
+        
+        key = _LLMRequest(
+            prompt, system, temperature, max_tokens, prefer_local, LLMPriority(priority), "", alternatives,
+            deadline, self.hedge if hedge is None else hedge
+        ).key()
+        result, _ = await self._async_flights.do(key, call)
+        return result
+    
+    def coalescing_stats(self) -> Dict[str, Dict[str, int]]:
+        """Llamadas ejecutadas y agrupadas por modo (hilos y asyncio)"""
+        return {"thread": self._flights.stats(), "asyncio": self._async_flights.stats()}
+    
+    def latency_stats(self) -> Dict[str, Dict[str, float]]:
+        """Latencia aprendida hasta el primer token y retraso de hedging por proveedor"""
+        return self.latency.stats()
+    
+    def _providers(self, span: Any, request: "_LLMRequest") -> List[str]:
+        """Proveedores a intentar, en orden: Ollama (si corresponde) > Anthropic > OpenAI"""
+        providers = []
+        if request.prefer_local and self.use_ollama:
+            providers.append("ollama")
+        elif request.prefer_local:
+            metrics.LLM_FALLBACKS.inc(source="ollama", reason="unavailable")
+            span.set_attribute("llm.fallback", "unavailable")
+        
         anthropic_key = os.getenv("ANTHROPIC_API_KEY")
         if anthropic_key and anthropic_key != "sk-ant-REPLACE_ME":
-            try:
-                import anthropic
-                client = anthropic.Anthropic(api_key=anthropic_key)
-                
-                messages = [{"role": "user", "content": prompt}]
-                
-                response = client.messages.create(
-                    model="claude-3-5-sonnet-20241022",
-                    max_tokens=max_tokens,
-                    temperature=temperature,
-                    system=system or "",
-                    messages=messages
-                )
-                
-                return response.content[0].text
-            except Exception as e:
-                logger.warning(f"Anthropic failed: {e}")
-        
-        # Intentar OpenAI
+            providers.append("anthropic")
         openai_key = os.getenv("OPENAI_API_KEY")
         if openai_key and openai_key != "sk-REPLACE_ME":
+            providers.append("openai")
+        return providers
+    
+    def _generate(self, span: Any, request: "_LLMRequest") -> str:
+        """Intentar los proveedores en orden, uno tras otro o con hedging"""
+        providers = self._providers(span, request)
+        deadline_at = time.monotonic() + request.deadline if request.deadline is not None else None
+        if request.hedge and len(providers) > 1:
+            return self._generate_hedged(span, request, providers, deadline_at)
+        
+        for provider in providers:
+            attempt = _Attempt(provider, deadline_at)
+            if attempt.expired():
+                break
             try:
-                from openai import OpenAI
-                client = OpenAI(api_key=openai_key)
+                result, attributes = self._call(attempt, request)
+                self._completed(span, request, attributes)
+                return result
+            except Exception as e:
+                self._attempt_failed(span, attempt, e)
+        
+        if deadline_at is not None and time.monotonic() >= deadline_at:
+            raise TimeoutError(f"LLM deadline of {request.deadline}s exceeded")
+        raise Exception("No LLM provider available (Ollama, Anthropic, OpenAI all failed)")
+    
+    def _generate_hedged(
+        self,
+        span: Any,
+        request: "_LLMRequest",
+        providers: List[str],
+        deadline_at: Optional[float]
+    ) -> str:
+        """
+        Hedging: el siguiente proveedor arranca si el último lanzado no da el
+        primer token dentro de su retraso de hedging, o en cuanto falla
+        """
+        results: "queue.Queue[Tuple[_Attempt, Any, Optional[BaseException]]]" = queue.Queue()
+        pending = list(providers)
+        launched: List[_Attempt] = []
+        finished = set()
+        
+        def launch(hedged: bool):
+            attempt = _Attempt(pending.pop(0), deadline_at, hedged)
+            launched.append(attempt)
+            # Cada intento en su hilo, con el span del router como padre
+            context = contextvars.copy_context()
+            threading.Thread(
+                target=context.run,
+                args=(self._run_attempt, attempt, request, results),
+                name=f"llm-{attempt.provider}",
+                daemon=True
+            ).start()
+            return attempt
+        
+        launch(hedged=False)
+        running = 1
+        try:
+            while True:
+                last = launched[-1]
+                now = time.monotonic()
+                wait = deadline_at - now if deadline_at is not None else None
+                if pending and not last.first_token.is_set():
+                    hedge_in = last.started + self.latency.hedge_delay(last.provider) - now
+                    wait = hedge_in if wait is None else min(wait, hedge_in)
                 
-                messages = []
-                if system:
-                    messages.append({"role": "system", "content": system})
-                messages.append({"role": "user", "content": prompt})
+                try:
+                    attempt, result, error = results.get(timeout=max(0.0, wait) if wait is not None else None)
+                except queue.Empty:
+                    if deadline_at is not None and time.monotonic() >= deadline_at:
+                        raise TimeoutError(f"LLM deadline of {request.deadline}s exceeded")
+                    if pending and not last.first_token.is_set():
+                        backup = launch(hedged=True)
+                        running += 1
+                        span.set_attribute("llm.hedged", True)
+                        logger.debug(f"{last.provider} slow, hedging with {backup.provider}")
+                    continue
                 
-                response = client.chat.completions.create(
-                    model="gpt-4",
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens
-                )
+                running -= 1
+                finished.add(attempt)
+                if error is None:
+                    text, attributes = result
+                    self._completed(span, request, attributes)
+                    for other in launched:
+                        if other.hedged:
+                            metrics.LLM_HEDGES.inc(
+                                provider=other.provider, outcome="won" if other is attempt else "lost"
+                            )
+                    return text
                 
-                return response.choices[0].message.content
-            except Exception as e:
-                logger.warning(f"OpenAI failed: {e}")
+                self._attempt_failed(span, attempt, error)
+                if running == 0:
+                    if not pending or (deadline_at is not None and time.monotonic() >= deadline_at):
+                        break
+                    # Fallback inmediato: no hay nada en curso
+                    launch(hedged=False)
+                    running = 1
+        finally:
+            # Cancelar a los perdedores (Ollama corta la generación; cloud se descarta)
+            for attempt in launched:
+                if attempt not in finished and not attempt.first_token.is_set():
+                    # Cota inferior de su latencia: sin ella el percentil solo
+                    # vería las respuestas rápidas y el hedging se dispararía cada vez antes
+                    self.latency.observe(attempt.provider, time.monotonic() - attempt.started)
+                attempt.cancel()
         
+        if deadline_at is not None and time.monotonic() >= deadline_at:
+            raise TimeoutError(f"LLM deadline of {request.deadline}s exceeded")
         raise Exception("No LLM provider available (Ollama, Anthropic, OpenAI all failed)")
+    
+    def _run_attempt(self, attempt: "_Attempt", request: "_LLMRequest", results: "queue.Queue[Any]"):
+        try:
+            results.put((attempt, self._call(attempt, request), None))
+        except BaseException as e:
+            results.put((attempt, None, e))
+    
+    def _call(self, attempt: "_Attempt", request: "_LLMRequest") -> Tuple[str, Dict[str, Any]]:
+        """Llamar al proveedor del intento; retorna el texto y los atributos del span"""
+        call = {"ollama": self._call_ollama, "anthropic": self._call_anthropic, "openai": self._call_openai}
+        result = call[attempt.provider](attempt, request)
+        # Un intento que ya perdió no cuenta como éxito
+        attempt.check()
+        return result
+    
+    def _completed(self, span: Any, request: "_LLMRequest", attributes: Dict[str, Any]):
+        """Respuesta ganadora: atributos del span y tokens en el resumen de la sesión"""
+        span.set_attributes(attributes)
+        self.sessions.record_llm(
+            request.session_id or os.getenv("SESSION_ID", "unknown"),
+            request.agent_name or "unknown",
+            attributes.get("llm.prompt_tokens"),
+            attributes.get("llm.completion_tokens")
+        )
+    
+    def _attempt_failed(self, span: Any, attempt: "_Attempt", error: BaseException):
+        """Registrar el fallo de un proveedor antes de pasar al siguiente"""
+        if isinstance(error, _Cancelled):
+            return
+        if attempt.provider == "ollama":
+            metrics.LLM_FALLBACKS.inc(source="ollama", reason="error")
+            span.set_attribute("llm.fallback", "error")
+            logger.warning(f"Ollama failed, falling back to cloud: {error}")
+        else:
+            metrics.LLM_ERRORS.inc(provider=attempt.provider, operation="generate")
+            metrics.LLM_FALLBACKS.inc(source=attempt.provider, reason="error")
+            logger.warning(f"{attempt.provider.capitalize()} failed: {error}")
+    
+    def _call_ollama(self, attempt: "_Attempt", request: "_LLMRequest") -> Tuple[str, Dict[str, Any]]:
+        """Ollama en streaming: el primer fragmento marca el primer token"""
+        model = self.ollama.models.select(self.ollama.model, request.alternatives)
+        with self.scheduler.slot(
+            "ollama", request.priority, request.fairness_key, request.cost, timeout=attempt.remaining()
+        ):
+            attempt.check()
+            stream = self.ollama.generate(
+                prompt=request.prompt,
+                model=model,
+                system=request.system,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                stream=True,
+                timeout=attempt.timeout(self.ollama.timeout)
+            )
+            attempt.on_cancel(stream.close)
+            parts = []
+            for part in stream:
+                if not parts:
+                    self._first_token(attempt)
+                parts.append(part)
+        return "".join(parts), {
+            "llm.provider": "ollama",
+            "llm.model": model,
+            "llm.prompt_tokens": stream.prompt_tokens,
+            "llm.completion_tokens": stream.completion_tokens,
+        }
+    
+    def _call_anthropic(self, attempt: "_Attempt", request: "_LLMRequest") -> Tuple[str, Dict[str, Any]]:
+        """Anthropic (sin streaming: el primer token llega con la respuesta)"""
+        import anthropic
+        client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=attempt.timeout(600.0))
+        
+        messages = [{"role": "user", "content": request.prompt}]
+        
+        with self.scheduler.slot(
+            "anthropic", request.priority, request.fairness_key, request.cost, timeout=attempt.remaining()
+        ) as slot, metrics.LLM_LATENCY.time(provider="anthropic", operation="generate"):
+            attempt.check()
+            response = client.messages.create(
+                model="claude-3-5-sonnet-20241022",
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                system=request.system or "",
+                messages=messages
+            )
+            slot.used(response.usage.input_tokens + response.usage.output_tokens)
+        self._first_token(attempt)
+        
+        return response.content[0].text, {
+            "llm.provider": "anthropic",
+            "llm.model": response.model,
+            "llm.prompt_tokens": response.usage.input_tokens,
+            "llm.completion_tokens": response.usage.output_tokens,
+        }
+    
+    def _call_openai(self, attempt: "_Attempt", request: "_LLMRequest") -> Tuple[str, Dict[str, Any]]:
+        """OpenAI (sin streaming: el primer token llega con la respuesta)"""
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=attempt.timeout(600.0))
+        
+        messages = []
+        if request.system:
+            messages.append({"role": "system", "content": request.system})
+        messages.append({"role": "user", "content": request.prompt})
+        
+        with self.scheduler.slot(
+            "openai", request.priority, request.fairness_key, request.cost, timeout=attempt.remaining()
+        ) as slot, metrics.LLM_LATENCY.time(provider="openai", operation="generate"):
+            attempt.check()
+            response = client.chat.completions.create(
+                model="gpt-4",
+                messages=messages,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            )
+            if response.usage:
+                slot.used(response.usage.total_tokens)
+        self._first_token(attempt)
+        
+        return response.choices[0].message.content, {
+            "llm.provider": "openai",
+            "llm.model": response.model,
+            "llm.prompt_tokens": response.usage.prompt_tokens if response.usage else None,
+            "llm.completion_tokens": response.usage.completion_tokens if response.usage else None,
+        }
+    
+    def _first_token(self, attempt: "_Attempt"):
+        """Primer token de un intento: alimenta el percentil del proveedor"""
+        if attempt.first_token.is_set() or attempt.cancelled.is_set():
+            return
+        attempt.first_token.set()
+        elapsed = time.monotonic() - attempt.started
+        self.latency.observe(attempt.provider, elapsed)
+        metrics.LLM_FIRST_TOKEN.observe(elapsed, provider=attempt.provider)
+
+
+class _Cancelled(Exception):
+    """Intento cancelado porque otro proveedor respondió antes"""
+
+
+class _Attempt:
+    """Llamada a un proveedor dentro de una petición del router"""
+    __slots__ = ("provider", "deadline_at", "hedged", "started", "first_token", "cancelled", "_on_cancel")
+    
+    def __init__(self, provider: str, deadline_at: Optional[float], hedged: bool = False):
+        self.provider = provider
+        self.deadline_at = deadline_at
+        self.hedged = hedged
+        self.started = time.monotonic()
+        self.first_token = threading.Event()
+        self.cancelled = threading.Event()
+        self._on_cancel: List[Callable[[], None]] = []
+    
+    def remaining(self) -> Optional[float]:
+        """Segundos hasta el deadline (None = sin límite)"""
+        return max(0.0, self.deadline_at - time.monotonic()) if self.deadline_at is not None else None
+    
+    def expired(self) -> bool:
+        return self.deadline_at is not None and time.monotonic() >= self.deadline_at
+    
+    def timeout(self, default: float) -> float:
+        """Timeout HTTP: el del proveedor, recortado al deadline"""
+        remaining = self.remaining()
+        return default if remaining is None else max(0.001, min(default, remaining))
+    
+    def check(self):
+        """Abandonar si otro proveedor ya respondió mientras se esperaba turno"""
+        if self.cancelled.is_set():
+            raise _Cancelled(self.provider)
+    
+    def on_cancel(self, callback: Callable[[], None]):
+        self._on_cancel.append(callback)
+        if self.cancelled.is_set():
+            callback()
+    
+    def cancel(self):
+        self.cancelled.set()
+        for callback in self._on_cancel:
+            callback()
+
+
+class _LLMRequest:
+    """Parámetros de una petición del router (clave de single-flight y de cola)"""
+    __slots__ = (
+        "prompt", "system", "temperature", "max_tokens", "prefer_local", "priority", "fairness_key", "cost",
+        "alternatives", "deadline", "hedge", "session_id", "agent_name"
+    )
+    
+    def __init__(
+        self,
+        prompt: str,
+        system: Optional[str],
+        temperature: float,
+        max_tokens: int,
+        prefer_local: bool,
+        priority: LLMPriority,
+        fairness_key: str,
+        alternatives: Optional[List[str]] = None,
+        deadline: Optional[float] = None,
+        hedge: bool = False,
+        session_id: Optional[str] = None,
+        agent_name: Optional[str] = None
+    ):
+        self.prompt = prompt
+        self.system = system
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.prefer_local = prefer_local
+        self.priority = priority
+        self.fairness_key = fairness_key
+        self.alternatives = tuple(alternatives or ())
+        self.deadline = deadline
+        self.hedge = hedge
+        self.session_id = session_id
+        self.agent_name = agent_name
+        # Tokens estimados para el presupuesto de los proveedores cloud
+        self.cost = estimate_tokens(prompt) + estimate_tokens(system) + max_tokens
+    
+    def key(self) -> tuple:
+        """Clave normalizada para agrupar peticiones idénticas"""
+        return (
+            self.prompt.strip(), (self.system or "").strip(), round(float(self.temperature), 3),
+            int(self.max_tokens), bool(self.prefer_local), self.priority, self.alternatives,
+            self.deadline, self.hedge
+        )
+
+
+def _fairness_key(session_id: Optional[str], agent_name: Optional[str]) -> str:
+    """Clave de reparto de turnos: sesión y agente"""
+    return f"{session_id or os.getenv('SESSION_ID', '')}/{agent_name or ''}"
 
 
 # Singleton global
@@ -0,0 +1,328 @@
+"""
+Ollama Models - Residencia de modelos en memoria de Ollama
+
+Ollama carga un modelo en memoria con la primera petición y lo descarga tras
+`keep_alive` sin uso (5 minutos por defecto), así que la primera llamada tras
+un rato inactivo paga varios segundos de carga y alternar entre modelos puede
+expulsar al anterior. `OllamaModelManager`:
+
+1. Precarga (warmup) los modelos configurados con un prompt vacío, que en
+   Ollama solo carga el modelo.
+2. Sabe qué modelos están cargados consultando `/api/ps` (cacheado
+   `OLLAMA_PS_TTL` segundos y actualizado con cada llamada propia).
+3. Envía `keep_alive` por modelo en cada petición.
+4. Si el llamador acepta modelos alternativos, elige uno ya cargado.
+
+Configuración:
+    OLLAMA_KEEP_ALIVE         keep_alive por defecto (default: 30m; -1 = siempre)
+    OLLAMA_KEEP_ALIVE_MODELS  Por modelo: "qwen2.5-coder:latest=1h,mistral:latest=5m"
+    OLLAMA_WARM_MODELS        Modelos a precargar (default: OLLAMA_MODEL)
+    OLLAMA_WARMUP             Precargar al crear el LLMRouter (default: true)
+    OLLAMA_PS_TTL             Segundos de validez de /api/ps (default: 10)
+
+Uso independiente:
+    python src/utils/ollama_models.py ps
+    python src/utils/ollama_models.py warmup [modelo ...]
+    python src/utils/ollama_models.py unload <modelo>
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import requests
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/utils/ollama_models.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils import metrics
+from src.utils.lazy_imports import logger
+
+KeepAlive = Union[str, int, float]
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+# Ollama devuelve nanosegundos en expires_at; datetime solo admite microsegundos
+_FRACTION = re.compile(r"(\.\d{6})\d+")
+
+
+def normalize_model(name: str) -> str:
+    """Nombre canónico de un modelo (`llama3.2` -> `llama3.2:latest`)"""
+    name = name.strip()
+    return name if ":" in name else f"{name}:latest"
+
+
+def parse_keep_alive(value: KeepAlive) -> Optional[float]:
+    """
+    Segundos que Ollama mantiene el modelo tras una petición
+
+    Args:
+        value: keep_alive como lo acepta Ollama (`"30m"`, `"1h30m"`, `300`, `-1`)
+
+    Returns:
+        Segundos (0 = descargar ya) o None si es indefinido (valor negativo)
+    """
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = value.strip()
+        if re.fullmatch(r"-?\d+(\.\d+)?", text):
+            seconds = float(text)
+        else:
+            negative = text.startswith("-")
+            parts = _DURATION_PART.findall(text.lstrip("-"))
+            if not parts or "".join(n + u for n, u in parts) != text.lstrip("-"):
+                raise ValueError(f"keep_alive inválido: {value!r}")
+            seconds = sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+            seconds = -seconds if negative else seconds
+    return None if seconds < 0 else seconds
+
+
+def _coerce_keep_alive(value: str) -> KeepAlive:
+    """Ollama interpreta los números como segundos y el resto como duración"""
+    value = value.strip()
+    return int(value) if re.fullmatch(r"-?\d+", value) else value
+
+
+def _seconds_until(expires_at: Optional[str]) -> Optional[float]:
+    """Segundos hasta `expires_at` de /api/ps (None si no se puede leer)"""
+    if not expires_at:
+        return None
+    try:
+        moment = datetime.fromisoformat(_FRACTION.sub(r"\1", expires_at).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return (moment - datetime.now(timezone.utc)).total_seconds()
+
+
+class OllamaModelManager:
+    """Precarga, keep_alive y residencia de modelos de una instancia de Ollama"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        default_model: Optional[str] = None,
+        timeout: int = 120
+    ):
+        """
+        Inicializar gestor de modelos
+
+        Args:
+            base_url: URL base de Ollama (default: env OLLAMA_URL)
+            default_model: Modelo por defecto (default: env OLLAMA_MODEL)
+            timeout: Timeout de la precarga en segundos (default: 120)
+        """
+        self.base_url = base_url or os.getenv("OLLAMA_URL", "http://ollama:11434")
+        self.default_model = normalize_model(default_model or os.getenv("OLLAMA_MODEL", "llama3.2:latest"))
+        self.timeout = timeout
+        self.keep_alive = _coerce_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+        self.keep_alive_models: Dict[str, KeepAlive] = {}
+        for entry in os.getenv("OLLAMA_KEEP_ALIVE_MODELS", "").split(","):
+            if "=" in entry:
+                name, value = entry.rsplit("=", 1)
+                self.keep_alive_models[normalize_model(name)] = _coerce_keep_alive(value)
+        warm = [m for m in os.getenv("OLLAMA_WARM_MODELS", "").split(",") if m.strip()]
+        self.warm_models = [normalize_model(m) for m in warm] or [self.default_model]
+        self.warmup_on_start = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+        self.ps_ttl = float(os.getenv("OLLAMA_PS_TTL", "10"))
+
+        self._lock = threading.Lock()
+        # Modelo -> instante (monotonic) estimado de descarga; inf = indefinido
+        self._resident: Dict[str, float] = {}
+        self._refreshed = 0.0
+
+    def keep_alive_for(self, model: str) -> KeepAlive:
+        """keep_alive a enviar en las peticiones a `model`"""
+        return self.keep_alive_models.get(normalize_model(model), self.keep_alive)
+
+    def _expiry(self, model: str, remaining: Optional[float] = None) -> float:
+        if remaining is None:
+            remaining = parse_keep_alive(self.keep_alive_for(model))
+        return float("inf") if remaining is None else time.monotonic() + remaining
+
+    def refresh(self) -> Dict[str, float]:
+        """
+        Consultar en Ollama los modelos cargados (/api/ps)
+
+        Returns:
+            Dict[str, float]: Modelo -> segundos hasta su descarga (inf = indefinido)
+        """
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=5)
+            response.raise_for_status()
+            running = response.json().get("models", [])
+        except Exception as e:
+            logger.debug(f"Could not list running Ollama models: {e}")
+            # Sin /api/ps se sigue con lo conocido hasta el siguiente intento
+            self._refreshed = time.monotonic()
+            return self.resident(refresh=False)
+
+        resident = {}
+        for entry in running:
+            name = entry.get("name") or entry.get("model")
+            if name:
+                model = normalize_model(name)
+                resident[model] = self._expiry(model, _seconds_until(entry.get("expires_at")))
+        with self._lock:
+            self._resident = resident
+            self._refreshed = time.monotonic()
+        return self.resident(refresh=False)
+
+    def resident(self, refresh: Optional[bool] = None) -> Dict[str, float]:
+        """
+        Modelos cargados según la última consulta y las llamadas propias
+
+        Args:
+            refresh: True fuerza /api/ps, False nunca lo consulta y None lo
+                consulta si la información tiene más de `ps_ttl` segundos
+
+        Returns:
+            Dict[str, float]: Modelo -> segundos hasta su descarga (inf = indefinido)
+        """
+        if refresh or (refresh is None and time.monotonic() - self._refreshed > self.ps_ttl):
+            return self.refresh()
+        now = time.monotonic()
+        with self._lock:
+            return {model: expires - now for model, expires in self._resident.items() if expires > now}
+
+    def is_resident(self, model: str) -> bool:
+        """True si `model` está cargado en memoria"""
+        return normalize_model(model) in self.resident()
+
+    def select(self, model: Optional[str] = None, alternatives: Optional[Iterable[str]] = None) -> str:
+        """
+        Elegir el modelo de una petición
+
+        Args:
+            model: Modelo pedido (default: modelo por defecto)
+            alternatives: Otros modelos aceptables, en orden de preferencia
+
+        Returns:
+            str: `model` si está cargado o no hay alternativas; si no, la
+            primera alternativa ya cargada (o `model` si ninguna lo está)
+        """
+        model = normalize_model(model or self.default_model)
+        if not alternatives:
+            return model
+
+        resident = self.resident()
+        for candidate in [model, *(normalize_model(m) for m in alternatives)]:
+            if candidate in resident:
+                metrics.CACHE_HITS.inc(cache="ollama.models")
+                return candidate
+        metrics.CACHE_MISSES.inc(cache="ollama.models")
+        return model
+
+    def loaded(self, model: str):
+        """Registrar que una petición a `model` acaba de terminar bien"""
+        model = normalize_model(model)
+        with self._lock:
+            was_resident = self._resident.get(model, 0.0) > time.monotonic()
+            self._resident[model] = self._expiry(model)
+            if not was_resident:
+                # Cargar un modelo puede haber expulsado a otros: releer /api/ps
+                self._refreshed = 0.0
+
+    def warmup(self, models: Optional[Iterable[str]] = None, background: bool = False) -> Dict[str, bool]:
+        """
+        Precargar modelos con un prompt vacío
+
+        Args:
+            models: Modelos a precargar (default: OLLAMA_WARM_MODELS)
+            background: Si True, precarga en un hilo y retorna de inmediato
+
+        Returns:
+            Dict[str, bool]: Modelo -> precargado (vacío si background)
+        """
+        models = [normalize_model(m) for m in (models or self.warm_models)]
+        if background:
+            threading.Thread(target=self.warmup, args=(models,), name="ollama-warmup", daemon=True).start()
+            return {}
+
+        results = {}
+        # De uno en uno: cargas simultáneas compiten por memoria y disco
+        for model in models:
+            if self.is_resident(model):
+                results[model] = True
+                continue
+            started = time.perf_counter()
+            try:
+                response = requests.post(
+                    f"{self.base_url}/api/generate",
+                    json={"model": model, "prompt": "", "stream": False, "keep_alive": self.keep_alive_for(model)},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                self.loaded(model)
+                results[model] = True
+                logger.info(f"Ollama model warmed up: {model} ({time.perf_counter() - started:.1f}s)")
+            except Exception as e:
+                results[model] = False
+                logger.warning(f"Could not warm up Ollama model {model}: {e}")
+        return results
+
+    def unload(self, model: str) -> bool:
+        """
+        Descargar un modelo de memoria (keep_alive = 0)
+
+        Args:
+            model: Modelo a descargar
+
+        Returns:
+            bool: True si Ollama aceptó la petición
+        """
+        model = normalize_model(model)
+        try:
+            response = requests.post(
+                f"{self.base_url}/api/generate",
+                json={"model": model, "prompt": "", "stream": False, "keep_alive": 0},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        except Exception as e:
+            logger.warning(f"Could not unload Ollama model {model}: {e}")
+            return False
+        with self._lock:
+            self._resident.pop(model, None)
+        return True
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Modelos cargados en Ollama: consulta, precarga y descarga")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ps", help="Modelos cargados y tiempo hasta su descarga")
+    warmup = subparsers.add_parser("warmup", help="Precargar modelos (default: OLLAMA_WARM_MODELS)")
+    warmup.add_argument("models", nargs="*")
+    unload = subparsers.add_parser("unload", help="Descargar un modelo de memoria")
+    unload.add_argument("model")
+    args = parser.parse_args(argv)
+
+    manager = OllamaModelManager()
+    if args.command == "ps":
+        resident = manager.refresh()
+        if not resident:
+            print("📭 Ningún modelo cargado")
+        for model, remaining in sorted(resident.items()):
+            until = "indefinido" if remaining == float("inf") else f"{remaining / 60:.1f} min"
+            print(f"🧠 {model} (descarga en {until})")
+    elif args.command == "warmup":
+        results = manager.warmup(args.models or None)
+        for model, ok in results.items():
+            print(f"{'✅' if ok else '❌'} {model}")
+        sys.exit(0 if all(results.values()) else 1)
+    else:
+        ok = manager.unload(args.model)
+        print(f"{'✅' if ok else '❌'} {normalize_model(args.model)}")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+"""
+Ollama Pull - Descarga de modelos con progreso, reintentos y precarga en paralelo
+
+`/api/pull` emite NDJSON: `{"status": "pulling manifest"}`, una línea por
+avance de cada capa (`{"status": "pulling <digest>", "digest": ..., "total": N,
+"completed": M}`), `verifying sha256 digest`, `writing manifest` y por último
+`{"status": "success"}`; los fallos llegan como `{"error": "..."}` dentro de
+un stream con HTTP 200. `OllamaPullManager`:
+
+1. Convierte esas líneas en `PullProgress` (bytes completados/totales sumando
+   las capas, velocidad) para callbacks como `ProgressBar`.
+2. Solo da una descarga por buena si el stream termina en `success`; un
+   `error`, un stream cortado o `OLLAMA_PULL_STALL_TIMEOUT` segundos sin
+   datos son fallos.
+3. Reintenta con backoff exponencial. Ollama conserva las capas parciales en
+   disco, así que cada reintento continúa donde se quedó el anterior. Los
+   errores permanentes (modelo inexistente, nombre inválido) no se reintentan.
+4. `prefetch()` descarga una lista de modelos en paralelo: empieza con una
+   descarga y añade otra mientras el ancho de banda agregado siga creciendo
+   (al menos `OLLAMA_PULL_MIN_GAIN`), hasta `OLLAMA_PULL_CONCURRENCY`. Los
+   modelos ya instalados se omiten salvo con `update=True`.
+
+Configuración:
+    OLLAMA_PULL_RETRIES        Reintentos por modelo (default: 3)
+    OLLAMA_PULL_BACKOFF        Segundos antes del primer reintento; se duplica (default: 2)
+    OLLAMA_PULL_STALL_TIMEOUT  Segundos sin datos antes de abortar un intento (default: 120)
+    OLLAMA_PULL_CONCURRENCY    Máximo de descargas simultáneas en prefetch (default: 4)
+    OLLAMA_PULL_PROBE_SECONDS  Segundos de medición antes de añadir otra descarga
+                               (default: 3; 0 = usar OLLAMA_PULL_CONCURRENCY sin medir)
+    OLLAMA_PULL_MIN_GAIN       Mejora mínima del ancho de banda para añadir otra (default: 0.2)
+
+Uso independiente:
+    python src/utils/ollama_pull.py llama3.2:latest qwen2.5-coder:latest
+    python src/utils/ollama_pull.py nomic-embed-text --update --concurrency 2
+"""
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, TextIO, Tuple
+
+import requests
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/utils/ollama_pull.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils import metrics
+from src.utils.lazy_imports import logger
+from src.utils.ollama_models import normalize_model
+
+# Errores de Ollama que no se arreglan reintentando
+PERMANENT_ERRORS = ("file does not exist", "manifest unknown", "invalid model name", "unauthorized")
+
+
+@dataclass(frozen=True)
+class PullProgress:
+    """Estado de la descarga de un modelo tras una línea de `/api/pull`"""
+    model: str
+    status: str
+    completed: int = 0
+    total: int = 0
+    attempt: int = 1
+    bytes_per_second: float = 0.0
+    done: bool = False
+    error: Optional[str] = None
+
+    @property
+    def fraction(self) -> float:
+        """Fracción descargada (0.0 mientras no se conoce el tamaño)"""
+        if self.done and self.error is None:
+            return 1.0
+        return self.completed / self.total if self.total else 0.0
+
+
+@dataclass(frozen=True)
+class PullResult:
+    """Resultado de descargar un modelo"""
+    model: str
+    ok: bool
+    attempts: int = 0
+    downloaded: int = 0
+    # Bytes que ya estaban en disco (descargas interrumpidas) y no se volvieron a bajar
+    resumed: int = 0
+    total: int = 0
+    seconds: float = 0.0
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+ProgressCallback = Callable[[PullProgress], None]
+
+
+class PullError(Exception):
+    """Fallo de un intento de descarga"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def _is_permanent(message: str) -> bool:
+    message = message.lower()
+    return any(marker in message for marker in PERMANENT_ERRORS)
+
+
+class _BandwidthLimiter:
+    """Límite de descargas simultáneas que crece mientras crezca el ancho de banda agregado"""
+
+    def __init__(self, max_concurrency: int, probe_seconds: float, min_gain: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.probe_seconds = probe_seconds
+        self.min_gain = min_gain
+        # Sin sondeo se usa directamente el máximo
+        self.limit = 1 if probe_seconds > 0 else self.max_concurrency
+        self.saturated = self.limit >= self.max_concurrency
+        self.active = 0
+        self._cond = threading.Condition()
+        self._level_started = time.monotonic()
+        self._level_bytes = 0
+        self._best_rate = 0.0
+
+    def _start_level(self):
+        self._level_started = time.monotonic()
+        self._level_bytes = 0
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+            if self.active == self.limit:
+                # Solo se mide con el nivel completo
+                self._start_level()
+
+    def release(self):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify()
+
+    def record(self, nbytes: int):
+        """Sumar bytes descargados y, si toca, decidir si se añade otra descarga"""
+        with self._cond:
+            self._level_bytes += nbytes
+            if self.saturated or self.active < self.limit:
+                return
+            elapsed = time.monotonic() - self._level_started
+            if elapsed < self.probe_seconds:
+                return
+            rate = self._level_bytes / elapsed
+            if rate >= self._best_rate * (1 + self.min_gain):
+                self._best_rate = rate
+                self.limit += 1
+                self.saturated = self.limit >= self.max_concurrency
+                self._cond.notify()
+            else:
+                # La última descarga añadida no mejoró el total: el enlace está saturado
+                self.limit = max(1, self.limit - 1)
+                self.saturated = True
+                logger.debug(f"Ollama pull bandwidth saturated at {rate / 1e6:.1f} MB/s, concurrency {self.limit}")
+            self._start_level()
+
+
+class _PullState:
+    """Acumulado de una descarga entre intentos"""
+    __slots__ = ("model", "started", "attempt", "layers", "downloaded", "resumed")
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started = time.monotonic()
+        self.attempt = 0
+        # digest -> (completados, total)
+        self.layers: Dict[str, Tuple[int, int]] = {}
+        self.downloaded = 0
+        self.resumed = 0
+
+    def totals(self) -> Tuple[int, int]:
+        completed = sum(done for done, _ in self.layers.values())
+        total = sum(size for _, size in self.layers.values())
+        return completed, total
+
+    def progress(self, status: str, done: bool = False, error: Optional[str] = None) -> PullProgress:
+        completed, total = self.totals()
+        elapsed = time.monotonic() - self.started
+        return PullProgress(
+            model=self.model, status=status, completed=completed, total=total, attempt=self.attempt,
+            bytes_per_second=self.downloaded / elapsed if elapsed > 0 else 0.0, done=done, error=error
+        )
+
+
+class OllamaPullManager:
+    """Descargas de modelos de una instancia de Ollama"""
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        retries: Optional[int] = None,
+        backoff: Optional[float] = None,
+        stall_timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None
+    ):
+        """
+        Inicializar gestor de descargas
+
+        Args:
+            base_url: URL base de Ollama (default: env OLLAMA_URL)
+            retries: Reintentos por modelo (default: env OLLAMA_PULL_RETRIES)
+            backoff: Segundos antes del primer reintento (default: env OLLAMA_PULL_BACKOFF)
+            stall_timeout: Segundos sin datos antes de abortar (default: env OLLAMA_PULL_STALL_TIMEOUT)
+            max_concurrency: Descargas simultáneas en prefetch (default: env OLLAMA_PULL_CONCURRENCY)
+        """
+        self.base_url = base_url or os.getenv("OLLAMA_URL", "http://ollama:11434")
+        self.retries = retries if retries is not None else int(os.getenv("OLLAMA_PULL_RETRIES", "3"))
+        self.backoff = backoff if backoff is not None else float(os.getenv("OLLAMA_PULL_BACKOFF", "2"))
+        self.stall_timeout = stall_timeout or float(os.getenv("OLLAMA_PULL_STALL_TIMEOUT", "120"))
+        self.max_concurrency = max_concurrency or int(os.getenv("OLLAMA_PULL_CONCURRENCY", "4"))
+        self.probe_seconds = float(os.getenv("OLLAMA_PULL_PROBE_SECONDS", "3"))
+        self.min_gain = float(os.getenv("OLLAMA_PULL_MIN_GAIN", "0.2"))
+
+    def installed(self) -> Set[str]:
+        """Modelos ya descargados (/api/tags); vacío si no se puede consultar"""
+        try:
+            response = requests.get(f"{self.base_url}/api/tags", timeout=10)
+            response.raise_for_status()
+            return {normalize_model(m.get("name") or m.get("model", "")) for m in response.json().get("models", [])}
+        except Exception as e:
+            logger.warning(f"Could not list installed Ollama models: {e}")
+            return set()
+
+    def _pull_once(
+        self,
+        state: _PullState,
+        on_progress: Optional[ProgressCallback],
+        limiter: Optional[_BandwidthLimiter]
+    ):
+        """Un intento de descarga; lanza PullError si no termina en `success`"""
+        response = requests.post(
+            f"{self.base_url}/api/pull",
+            json={"model": state.model, "name": state.model, "stream": True},
+            timeout=(10, self.stall_timeout),
+            stream=True
+        )
+        with response:
+            if response.status_code >= 400:
+                try:
+                    message = response.json().get("error", response.reason)
+                except ValueError:
+                    message = response.reason
+                retryable = response.status_code >= 500 or response.status_code in (408, 429)
+                raise PullError(f"HTTP {response.status_code}: {message}", retryable and not _is_permanent(message))
+
+            # Capas ya vistas en este intento: la primera línea de cada una trae
+            # lo que Ollama ya tenía en disco, que no cuenta como descargado
+            seen: Set[str] = set()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    message = data["error"]
+                    raise PullError(message, retryable=not _is_permanent(message))
+
+                status = data.get("status", "")
+                digest = data.get("digest")
+                if digest and data.get("total"):
+                    completed = int(data.get("completed", 0))
+                    known = state.layers.get(digest, (0, 0))[0]
+                    if digest not in seen:
+                        seen.add(digest)
+                        state.resumed += max(0, completed - known)
+                        previous = completed
+                    else:
+                        previous = known
+                    state.layers[digest] = (completed, int(data["total"]))
+                    delta = completed - previous
+                    if delta > 0:
+                        state.downloaded += delta
+                        metrics.OLLAMA_PULL_BYTES.inc(delta, model=state.model)
+                        if limiter is not None:
+                            limiter.record(delta)
+
+                if status == "success":
+                    return
+                if on_progress is not None:
+                    on_progress(state.progress(status))
+        raise PullError("stream ended before success")
+
+    def pull(
+        self,
+        model: str,
+        on_progress: Optional[ProgressCallback] = None,
+        limiter: Optional[_BandwidthLimiter] = None
+    ) -> PullResult:
+        """
+        Descargar (o actualizar) un modelo con reintentos
+
+        Args:
+            model: Nombre del modelo
+            on_progress: Callback con cada avance (p.ej. `ProgressBar()`)
+            limiter: Límite compartido de prefetch (uso interno)
+
+        Returns:
+            PullResult: `ok` solo si Ollama terminó con `success`
+        """
+        state = _PullState(normalize_model(model))
+        error = None
+        while state.attempt <= self.retries:
+            state.attempt += 1
+            try:
+                logger.info(f"Pulling Ollama model: {state.model} (attempt {state.attempt})")
+                self._pull_once(state, on_progress, limiter)
+                error = None
+                break
+            except (PullError, requests.RequestException, ValueError) as e:
+                error = str(e)
+                retryable = getattr(e, "retryable", True)
+                if not retryable or state.attempt > self.retries:
+                    break
+                delay = self.backoff * 2 ** (state.attempt - 1)
+                logger.warning(f"Pull of {state.model} failed ({error}), retrying in {delay:.0f}s")
+                metrics.OLLAMA_PULLS.inc(outcome="retry")
+                if on_progress is not None:
+                    on_progress(state.progress(f"retrying in {delay:.0f}s"))
+                time.sleep(delay)
+
+        completed, total = state.totals()
+        result = PullResult(
+            model=state.model, ok=error is None, attempts=state.attempt, downloaded=state.downloaded,
+            resumed=state.resumed, total=total, seconds=time.monotonic() - state.started, error=error
+        )
+        metrics.OLLAMA_PULLS.inc(outcome="success" if result.ok else "error")
+        if result.ok:
+            logger.info(f"Ollama model pulled: {state.model} ({result.seconds:.1f}s, {state.attempt} attempt(s))")
+        else:
+            logger.error(f"Error pulling model {state.model}: {error}")
+        if on_progress is not None:
+            on_progress(state.progress("success" if result.ok else "error", done=True, error=error))
+        return result
+
+    def prefetch(
+        self,
+        models: Iterable[str],
+        on_progress: Optional[ProgressCallback] = None,
+        update: bool = False,
+        max_concurrency: Optional[int] = None
+    ) -> Dict[str, PullResult]:
+        """
+        Descargar varios modelos en paralelo
+
+        Args:
+            models: Modelos a descargar (se normalizan y se eliminan duplicados)
+            on_progress: Callback con cada avance de cualquier modelo
+            update: Si True, también vuelve a pedir los ya instalados
+            max_concurrency: Máximo de descargas simultáneas (default: OLLAMA_PULL_CONCURRENCY)
+
+        Returns:
+            Dict[str, PullResult]: Modelo -> resultado, en el orden pedido
+        """
+        wanted = list(dict.fromkeys(normalize_model(m) for m in models))
+        results: Dict[str, PullResult] = {}
+        if not update and wanted:
+            installed = self.installed()
+            for model in wanted:
+                if model in installed:
+                    results[model] = PullResult(model=model, ok=True, skipped=True)
+        pending = deque(m for m in wanted if m not in results)
+        limit = max_concurrency or self.max_concurrency
+        limiter = _BandwidthLimiter(min(limit, len(pending)) or 1, self.probe_seconds, self.min_gain)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                limiter.acquire()
+                try:
+                    with lock:
+                        if not pending:
+                            return
+                        model = pending.popleft()
+                    result = self.pull(model, on_progress, limiter)
+                    with lock:
+                        results[model] = result
+                finally:
+                    limiter.release()
+
+        threads = [
+            threading.Thread(target=worker, name=f"ollama-pull-{i}", daemon=True)
+            for i in range(min(limit, len(pending)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return {model: results[model] for model in wanted}
+
+
+def _phase(status: str) -> str:
+    """Fase de una línea de estado (`pulling 6a0746a1ec1a` -> `pulling`)"""
+    return "pulling" if status.startswith("pulling ") and status != "pulling manifest" else status
+
+
+def _human(nbytes: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if nbytes < 1024 or unit == "GB":
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GB"
+
+
+class ProgressBar:
+    """
+    Callback que dibuja una barra por modelo
+
+    En una terminal redibuja las barras como mucho cada `interval` segundos;
+    si la salida no es una terminal (logs de CI) escribe una línea por cada
+    10% de avance o cambio de fase.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, width: int = 24, interval: float = 0.2):
+        self.stream = stream or sys.stderr
+        self.width = width
+        self.interval = interval
+        self.tty = self.stream.isatty()
+        self._lock = threading.Lock()
+        self._latest: Dict[str, PullProgress] = {}
+        self._reported: Dict[str, Tuple[str, int]] = {}
+        self._drawn = 0
+        self._last_draw = 0.0
+
+    def format(self, progress: PullProgress) -> str:
+        """Línea de texto de un modelo"""
+        if progress.done:
+            icon = "✅" if progress.error is None else "❌"
+        else:
+            icon = "📥"
+        filled = int(progress.fraction * self.width)
+        bar = "█" * filled + "░" * (self.width - filled)
+        size = f"{_human(progress.completed)}/{_human(progress.total)}" if progress.total else ""
+        rate = f"{_human(progress.bytes_per_second)}/s" if progress.bytes_per_second and not progress.done else ""
+        status = progress.error or _phase(progress.status)
+        retry = f" (intento {progress.attempt})" if progress.attempt > 1 else ""
+        parts = [f"{icon} {progress.model:<28} {bar} {progress.fraction * 100:5.1f}%", size, rate, status + retry]
+        return " ".join(part for part in parts if part)
+
+    def __call__(self, progress: PullProgress):
+        with self._lock:
+            self._latest[progress.model] = progress
+            if self.tty:
+                now = time.monotonic()
+                if progress.done or now - self._last_draw >= self.interval:
+                    self._redraw()
+                    self._last_draw = now
+                return
+            step = (_phase(progress.status), int(progress.fraction * 10))
+            if self._reported.get(progress.model) != step:
+                self._reported[progress.model] = step
+                self.stream.write(self.format(progress) + "\n")
+                self.stream.flush()
+
+    def _redraw(self):
+        if self._drawn:
+            self.stream.write(f"\x1b[{self._drawn}F")
+        for progress in self._latest.values():
+            self.stream.write(self.format(progress) + "\x1b[K\n")
+        self._drawn = len(self._latest)
+        self.stream.flush()
+
+
+def main(argv: Optional[List[str]] = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Descargar modelos de Ollama en paralelo con progreso y reintentos")
+    parser.add_argument("models", nargs="+", help="Modelos a descargar")
+    parser.add_argument("--update", action="store_true", help="Volver a pedir también los modelos ya instalados")
+    parser.add_argument("--concurrency", type=int, help="Máximo de descargas simultáneas (default: OLLAMA_PULL_CONCURRENCY)")
+    parser.add_argument("--retries", type=int, help="Reintentos por modelo (default: OLLAMA_PULL_RETRIES)")
+    parser.add_argument("--no-progress", action="store_true", help="Sin barra de progreso")
+    args = parser.parse_args(argv)
+
+    manager = OllamaPullManager(retries=args.retries)
+    on_progress = None if args.no_progress else ProgressBar()
+    results = manager.prefetch(args.models, on_progress=on_progress, update=args.update, max_concurrency=args.concurrency)
+
+    print("")
+    for model, result in results.items():
+        if result.skipped:
+            print(f"⏭️  {model} ya instalado")
+        elif result.ok:
+            rate = result.downloaded / result.seconds if result.seconds else 0.0
+            resumed = f", {_human(result.resumed)} reanudados" if result.resumed else ""
+            print(f"✅ {model} ({_human(result.downloaded)} en {result.seconds:.0f}s, {_human(rate)}/s{resumed})")
+        else:
+            print(f"❌ {model}: {result.error} ({result.attempts} intento(s))")
+    sys.exit(0 if all(r.ok for r in results.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
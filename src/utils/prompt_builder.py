@@ -0,0 +1,504 @@
+"""
+Prompt Builder - Contexto del proyecto (RAG) dentro de un presupuesto de tokens
+
+`LLMRouter.generate` recibe el prompt tal cual; `PromptBuilder` le añade los
+fragmentos de `context_embeddings` más útiles para la consulta sin pasarse
+del presupuesto, porque cada token de contexto se paga en tiempo de
+procesamiento del prompt antes del primer token:
+
+1. Recuperación: los `top_k` fragmentos más parecidos a la consulta
+   (pgvector en PostgreSQL, fuerza bruta en SQLite). El resultado se guarda
+   en caché por (sesión, consulta) durante `CONTEXT_CACHE_TTL` segundos: un
+   agente que itera sobre la misma tarea no vuelve a calcular el embedding
+   ni a consultar la base de datos.
+2. Deduplicación: los fragmentos solapados del mismo documento se recortan
+   para no enviar dos veces el mismo texto (el más relevante queda entero)
+   y los duplicados exactos de otras fuentes se descartan.
+3. Empaquetado: se eligen por relevancia por token (similitud / tokens) de
+   forma voraz hasta llenar el presupuesto; si un único fragmento suma más
+   relevancia que todo lo elegido, se envía solo ese.
+
+Configuración:
+    CONTEXT_MAX_TOKENS      Tokens del prompt completo: system, contexto y solicitud (default: 8000)
+    CONTEXT_TOP_K           Fragmentos recuperados por consulta (default: 20)
+    CONTEXT_MIN_SCORE       Similitud mínima de un fragmento (default: 0.0)
+    CONTEXT_CHUNK_SIZE      Caracteres por fragmento al indexar (default: 1000)
+    CONTEXT_CHUNK_OVERLAP   Caracteres de solape entre fragmentos (default: 200)
+    CONTEXT_CACHE_TTL       Segundos que se reutiliza una recuperación (default: 300)
+    CONTEXT_CACHE_SIZE      Recuperaciones en caché (default: 256)
+
+Uso:
+    builder = PromptBuilder()
+    builder.index_files(["docs/ARCHITECTURE.md", "src/api/routes.py"])
+    answer = builder.generate("¿Cómo se autentican las rutas?", session_id="sess-1")
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from src.utils import metrics
+from src.utils.lazy_imports import logger
+from src.utils.llm_scheduler import estimate_tokens
+from src.utils.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from src.storage.base import StorageBackend
+    from src.utils.ollama_client import LLMRouter
+
+# Tokens de la cabecera de cada fragmento en el prompt
+_CHUNK_OVERHEAD = 8
+# Textos por llamada de embeddings al indexar
+_EMBED_BATCH = 32
+_CACHE_NAME = "rag.retrieval"
+
+
+@dataclass
+class ContextChunk:
+    """Fragmento recuperado con su relevancia y su coste en tokens"""
+    id: int
+    content: str
+    source: Optional[str]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    score: float = 0.0
+    tokens: int = 0
+
+    @property
+    def path(self) -> str:
+        """Documento del fragmento (ruta o, si no la hay, la fuente)"""
+        return self.metadata.get("path") or self.source or f"#{self.id}"
+
+    @property
+    def span(self) -> Optional[Tuple[int, int]]:
+        """Posición (inicio, fin) en caracteres dentro del documento, si se conoce"""
+        start, end = self.metadata.get("start"), self.metadata.get("end")
+        return (start, end) if isinstance(start, int) and isinstance(end, int) else None
+
+    @property
+    def density(self) -> float:
+        """Relevancia por token de prompt"""
+        return self.score / (self.tokens + _CHUNK_OVERHEAD)
+
+
+@dataclass
+class PackedPrompt:
+    """Prompt con el contexto empaquetado y lo que costó"""
+    prompt: str
+    system: Optional[str]
+    chunks: List[ContextChunk]
+    tokens: int
+    context_tokens: int
+    candidates: int
+
+
+class PromptBuilder:
+    """Recupera, deduplica y empaqueta contexto del proyecto antes de llamar al router"""
+
+    def __init__(
+        self,
+        router: Optional["LLMRouter"] = None,
+        storage: Optional["StorageBackend"] = None,
+        embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        budget: Optional[int] = None,
+        top_k: Optional[int] = None,
+        min_score: Optional[float] = None,
+        cache_ttl: Optional[float] = None,
+        cache_size: Optional[int] = None,
+        count_tokens: Callable[[str], int] = estimate_tokens
+    ):
+        """
+        Inicializar builder
+
+        Args:
+            router: LLMRouter para `generate` (default: el global)
+            storage: Backend con `context_embeddings` (default: DATABASE_URL)
+            embed: Función textos -> embeddings (default: `OllamaClient.embed` del router)
+            budget: Tokens máximos del prompt completo (default: CONTEXT_MAX_TOKENS)
+            top_k: Fragmentos recuperados por consulta (default: CONTEXT_TOP_K)
+            min_score: Similitud mínima para considerar un fragmento (default: CONTEXT_MIN_SCORE)
+            cache_ttl: Segundos que se reutiliza una recuperación (default: CONTEXT_CACHE_TTL)
+            cache_size: Recuperaciones en caché (default: CONTEXT_CACHE_SIZE)
+            count_tokens: Contador de tokens de un texto (default: ~4 caracteres por token)
+        """
+        self._router = router
+        self._storage = storage
+        self._embed = embed
+        self.budget = budget or int(os.getenv("CONTEXT_MAX_TOKENS", "8000"))
+        self.top_k = top_k or int(os.getenv("CONTEXT_TOP_K", "20"))
+        self.min_score = min_score if min_score is not None else float(os.getenv("CONTEXT_MIN_SCORE", "0.0"))
+        self.cache_ttl = cache_ttl if cache_ttl is not None else float(os.getenv("CONTEXT_CACHE_TTL", "300"))
+        self.cache_size = cache_size or int(os.getenv("CONTEXT_CACHE_SIZE", "256"))
+        self.chunk_size = int(os.getenv("CONTEXT_CHUNK_SIZE", "1000"))
+        self.chunk_overlap = int(os.getenv("CONTEXT_CHUNK_OVERLAP", "200"))
+        self.count_tokens = count_tokens
+
+        self._lock = threading.Lock()
+        # (sesión, consulta, fuente, top_k) -> (expira, fragmentos deduplicados)
+        self._cache: "OrderedDict[tuple, Tuple[float, List[ContextChunk]]]" = OrderedDict()
+        # Se incrementa al reindexar: lo recuperado antes no se guarda en caché
+        self._generation = 0
+        self._flights = SingleFlight("rag.retrieve")
+
+    @property
+    def router(self) -> "LLMRouter":
+        if self._router is None:
+            from src.utils.ollama_client import get_llm_router
+            self._router = get_llm_router()
+        return self._router
+
+    @property
+    def storage(self) -> "StorageBackend":
+        if self._storage is None:
+            from src.storage import get_storage
+            self._storage = get_storage()
+        return self._storage
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings de `texts` con la función configurada"""
+        if self._embed is None:
+            self._embed = self.router.ollama.embed
+        return self._embed(texts)
+
+    # --- Recuperación ----------------------------------------------------
+
+    def retrieve(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        source: Optional[str] = None,
+        top_k: Optional[int] = None
+    ) -> List[ContextChunk]:
+        """
+        Fragmentos relevantes para `query`, ya deduplicados
+
+        Args:
+            query: Consulta (tarea o pregunta del agente)
+            session_id: Sesión para la caché (default: SESSION_ID)
+            source: Limitar a una fuente
+            top_k: Fragmentos a recuperar (default: self.top_k)
+
+        Returns:
+            Fragmentos por relevancia descendente
+        """
+        top_k = top_k or self.top_k
+        key = (session_id or os.getenv("SESSION_ID", ""), _normalize(query), source, top_k)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(key)
+                metrics.CACHE_HITS.inc(cache=_CACHE_NAME)
+                return list(entry[1])
+        metrics.CACHE_MISSES.inc(cache=_CACHE_NAME)
+
+        # Consultas idénticas concurrentes comparten el embedding y la búsqueda
+        chunks, _ = self._flights.do(key, lambda: self._search(key, query, source, top_k))
+        return list(chunks)
+
+    def _search(self, key: tuple, query: str, source: Optional[str], top_k: int) -> List[ContextChunk]:
+        generation = self._generation
+        embedding = self.embed([query])[0]
+        rows = self.storage.search_context(embedding, top_k, source=source)
+        chunks = self.dedupe([
+            ContextChunk(chunk_id, content, chunk_source, metadata or {}, float(score), self.count_tokens(content))
+            for chunk_id, content, metadata, chunk_source, score in rows
+        ])
+        with self._lock:
+            if generation == self._generation and self.cache_ttl > 0:
+                self._cache[key] = (time.monotonic() + self.cache_ttl, chunks)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return chunks
+
+    def invalidate(self):
+        """Vaciar la caché de recuperaciones (p.ej. tras cambiar el índice)"""
+        with self._lock:
+            self._cache.clear()
+            self._generation += 1
+
+    # --- Deduplicación y empaquetado -------------------------------------
+
+    def dedupe(self, chunks: List[ContextChunk]) -> List[ContextChunk]:
+        """
+        Quitar el texto repetido entre fragmentos
+
+        Se recorren por relevancia descendente: de un fragmento solapado con
+        otros ya aceptados del mismo documento solo queda lo que no cubren;
+        los duplicados exactos y los contenidos en otro fragmento se descartan.
+
+        Args:
+            chunks: Fragmentos recuperados
+
+        Returns:
+            Fragmentos sin texto repetido, por relevancia descendente
+        """
+        accepted: List[ContextChunk] = []
+        spans: Dict[str, List[Tuple[int, int]]] = {}
+        seen = set()
+        for chunk in sorted(chunks, key=lambda c: c.score, reverse=True):
+            span = chunk.span
+            pieces = [chunk]
+            if span is not None and len(chunk.content) == span[1] - span[0]:
+                covered = spans.setdefault(chunk.path, [])
+                pieces = [
+                    self._piece(chunk, start, end)
+                    for start, end in _subtract(span, covered)
+                    if chunk.content[start - span[0]:end - span[0]].strip()
+                ]
+                covered.append(span)
+
+            for piece in pieces:
+                digest = hashlib.sha1(_normalize(piece.content).encode("utf-8")).digest()
+                if digest in seen or any(piece.content in other.content for other in accepted):
+                    continue
+                seen.add(digest)
+                accepted.append(piece)
+        return accepted
+
+    def _piece(self, chunk: ContextChunk, start: int, end: int) -> ContextChunk:
+        """Parte [start, end) de un fragmento con posiciones conocidas"""
+        offset = chunk.metadata["start"]
+        if (start, end) == chunk.span:
+            return chunk
+        text = chunk.content[start - offset:end - offset]
+        return replace(chunk, content=text, metadata=dict(chunk.metadata, start=start, end=end),
+                       tokens=self.count_tokens(text))
+
+    def pack(self, chunks: List[ContextChunk], budget: int) -> List[ContextChunk]:
+        """
+        Elegir fragmentos por relevancia por token hasta llenar `budget`
+
+        Args:
+            chunks: Fragmentos candidatos (deduplicados)
+            budget: Tokens disponibles para el contexto
+
+        Returns:
+            Fragmentos elegidos, agrupados por documento y en su orden dentro de él
+        """
+        candidates = [c for c in chunks if c.score >= self.min_score and c.score > 0]
+        chosen: List[ContextChunk] = []
+        used = 0
+        for chunk in sorted(candidates, key=lambda c: c.density, reverse=True):
+            cost = chunk.tokens + _CHUNK_OVERHEAD
+            if used + cost <= budget:
+                chosen.append(chunk)
+                used += cost
+
+        # Voraz por densidad puede perder contra el mejor fragmento grande que cabe solo
+        fitting = [c for c in candidates if c.tokens + _CHUNK_OVERHEAD <= budget]
+        if fitting:
+            best = max(fitting, key=lambda c: c.score)
+            if best.score > sum(c.score for c in chosen):
+                chosen = [best]
+
+        # Documentos por su mejor fragmento; dentro de cada uno, en orden de aparición
+        rank: Dict[str, float] = {}
+        for chunk in chosen:
+            rank[chunk.path] = max(rank.get(chunk.path, 0.0), chunk.score)
+        return sorted(chosen, key=lambda c: (-rank[c.path], c.path, (c.span or (0, 0))[0]))
+
+    def build(
+        self,
+        query: str,
+        prompt: Optional[str] = None,
+        system: Optional[str] = None,
+        session_id: Optional[str] = None,
+        source: Optional[str] = None,
+        budget: Optional[int] = None
+    ) -> PackedPrompt:
+        """
+        Construir el prompt con el contexto que cabe en el presupuesto
+
+        Args:
+            query: Consulta con la que se recupera el contexto
+            prompt: Solicitud al modelo (default: la consulta)
+            system: System prompt (cuenta para el presupuesto)
+            session_id: Sesión para la caché de recuperación (default: SESSION_ID)
+            source: Limitar el contexto a una fuente
+            budget: Tokens del prompt completo (default: self.budget)
+
+        Returns:
+            PackedPrompt con el prompt final y los fragmentos usados
+        """
+        request = prompt if prompt is not None else query
+        budget = budget or self.budget
+        fixed = self.count_tokens(request) + self.count_tokens(system) + _CHUNK_OVERHEAD
+        candidates = self.retrieve(query, session_id=session_id, source=source)
+        chunks = self.pack(candidates, max(0, budget - fixed))
+        if not chunks:
+            return PackedPrompt(request, system, [], fixed, 0, len(candidates))
+
+        blocks: List[str] = []
+        previous: Optional[ContextChunk] = None
+        for chunk in chunks:
+            # Trozos contiguos del mismo documento se leen como uno solo
+            if previous is not None and previous.path == chunk.path and previous.span and chunk.span \
+                    and previous.span[1] == chunk.span[0]:
+                blocks[-1] += chunk.content
+            else:
+                blocks.append(f"[{chunk.path}]\n{chunk.content}")
+            previous = chunk
+
+        context_tokens = sum(c.tokens + _CHUNK_OVERHEAD for c in chunks)
+        text = "Contexto del proyecto:\n\n" + "\n\n".join(blocks) + f"\n\n---\n\n{request}"
+        return PackedPrompt(text, system, chunks, fixed + context_tokens, context_tokens, len(candidates))
+
+    def generate(
+        self,
+        query: str,
+        prompt: Optional[str] = None,
+        system: Optional[str] = None,
+        session_id: Optional[str] = None,
+        source: Optional[str] = None,
+        budget: Optional[int] = None,
+        **kwargs: Any
+    ) -> str:
+        """
+        Generar con el router usando el prompt con contexto
+
+        Args:
+            query: Consulta con la que se recupera el contexto
+            prompt: Solicitud al modelo (default: la consulta)
+            system: System prompt
+            session_id: Sesión (caché de recuperación y reparto de turnos)
+            source: Limitar el contexto a una fuente
+            budget: Tokens del prompt completo (default: self.budget)
+            **kwargs: Opciones de `LLMRouter.generate` (temperature, max_tokens, priority...)
+
+        Returns:
+            str: Texto generado
+        """
+        packed = self.build(query, prompt=prompt, system=system, session_id=session_id, source=source, budget=budget)
+        logger.debug(
+            f"RAG prompt: {len(packed.chunks)}/{packed.candidates} chunks, "
+            f"{packed.context_tokens} context tokens, {packed.tokens}/{budget or self.budget} total"
+        )
+        return self.router.generate(prompt=packed.prompt, system=system, session_id=session_id, **kwargs)
+
+    # --- Indexación ------------------------------------------------------
+
+    def chunk_text(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Posiciones (inicio, fin) de los fragmentos de un documento
+
+        Los cortes se mueven al último salto de línea de la segunda mitad del
+        fragmento para no partir párrafos ni funciones cuando se puede.
+        """
+        size = max(1, self.chunk_size)
+        overlap = min(max(0, self.chunk_overlap), size // 2)
+        spans: List[Tuple[int, int]] = []
+        start = 0
+        while start < len(text):
+            end = min(len(text), start + size)
+            if end < len(text):
+                newline = text.rfind("\n", start + size // 2, end)
+                if newline != -1:
+                    end = newline + 1
+            spans.append((start, end))
+            if end >= len(text):
+                break
+            start = max(start + 1, end - overlap)
+        return spans
+
+    def index_text(
+        self,
+        text: str,
+        source: str,
+        path: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        replace_source: bool = True
+    ) -> int:
+        """
+        Fragmentar, vectorizar y guardar un documento
+
+        Args:
+            text: Contenido del documento
+            source: Fuente (p.ej. la ruta); identifica el documento al reindexar
+            path: Ruta que se muestra en el prompt (default: source)
+            metadata: Metadata extra de cada fragmento
+            replace_source: Borrar antes los fragmentos de `source`
+
+        Returns:
+            int: Fragmentos guardados
+        """
+        spans = self.chunk_text(text)
+        rows: List[Tuple[str, List[float], Dict[str, Any], Optional[str]]] = []
+        for batch_start in range(0, len(spans), _EMBED_BATCH):
+            batch = spans[batch_start:batch_start + _EMBED_BATCH]
+            contents = [text[start:end] for start, end in batch]
+            for index, (content, embedding, (start, end)) in enumerate(zip(contents, self.embed(contents), batch)):
+                rows.append((content, embedding, dict(
+                    metadata or {}, path=path or source, start=start, end=end, chunk=batch_start + index
+                ), source))
+
+        if replace_source:
+            self.storage.delete_context(source)
+        self.storage.insert_context_chunks(rows)
+        self.invalidate()
+        return len(rows)
+
+    def index_files(self, paths: Iterable[str], root: Optional[str] = None) -> int:
+        """
+        Indexar archivos de texto (la fuente de cada uno es su ruta relativa a `root`)
+
+        Args:
+            paths: Rutas de los archivos
+            root: Directorio base para las rutas guardadas (default: directorio actual)
+
+        Returns:
+            int: Fragmentos guardados en total
+        """
+        base = Path(root or ".").resolve()
+        total = 0
+        for path in paths:
+            file_path = Path(path).resolve()
+            try:
+                text = file_path.read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Skipping {path}: {e}")
+                continue
+            try:
+                name = str(file_path.relative_to(base))
+            except ValueError:
+                name = str(file_path)
+            total += self.index_text(text, source=name)
+        return total
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamaño de la caché y llamadas de recuperación agrupadas"""
+        with self._lock:
+            cached = len(self._cache)
+        return {
+            "cached_queries": cached,
+            "cache_size": self.cache_size,
+            "retrievals": self._flights.calls,
+            "coalesced_retrievals": self._flights.collapsed,
+        }
+
+
+def _normalize(text: str) -> str:
+    """Texto sin diferencias de mayúsculas ni espacios (clave de caché y de duplicados)"""
+    return re.sub(r"\s+", " ", text).strip().casefold()
+
+
+def _subtract(span: Tuple[int, int], covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Partes de `span` que no cubre ningún intervalo de `covered`"""
+    pieces = [span]
+    for cover_start, cover_end in covered:
+        remaining = []
+        for start, end in pieces:
+            if cover_end <= start or cover_start >= end:
+                remaining.append((start, end))
+                continue
+            if start < cover_start:
+                remaining.append((start, cover_start))
+            if cover_end < end:
+                remaining.append((cover_end, end))
+        pieces = remaining
+    return pieces
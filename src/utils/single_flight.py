@@ -0,0 +1,146 @@
+"""
+Single Flight - Agrupación de llamadas idénticas en curso
+
+Cuando varios llamadores piden lo mismo a la vez, solo el primero (líder)
+ejecuta la llamada; el resto espera y recibe el mismo resultado o la misma
+excepción. Una vez terminada la llamada, la siguiente petición con esa clave
+vuelve a ejecutarse (no es una caché).
+
+- `SingleFlight`: hilos (un `threading.Event` por llamada en curso)
+- `AsyncSingleFlight`: corrutinas de un event loop; la llamada corre en una
+  tarea propia, así cancelar al líder no cancela a los demás
+
+Uso:
+    flights = SingleFlight("llm.generate")
+    result, shared = flights.do(key, lambda: call_llm(prompt))
+
+    result, shared = await async_flights.do(key, lambda: acall_llm(prompt))
+
+Las llamadas agrupadas se cuentan en `stats()` y en la métrica
+`sdd_coalesced_calls_total{flight=...}`.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from src.utils import metrics
+
+
+class _Call:
+    """Llamada en curso compartida por el líder y los que esperan"""
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Agrupa llamadas idénticas concurrentes entre hilos"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Ejecutar `func` una sola vez por clave entre los llamadores concurrentes
+
+        Args:
+            key: Clave normalizada de la petición
+            func: Llamada a ejecutar si no hay una igual en curso
+
+        Returns:
+            (resultado, compartido): `compartido` es True si el resultado
+            viene de la llamada de otro hilo
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+                leader = True
+            else:
+                call.waiters += 1
+                self.collapsed += 1
+                leader = False
+
+        if not leader:
+            metrics.COALESCED_CALLS.inc(flight=self.name)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, call.waiters > 0
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> Dict[str, int]:
+        """Llamadas ejecutadas, agrupadas y en curso"""
+        return {"calls": self.calls, "collapsed": self.collapsed, "in_flight": self.in_flight()}
+
+
+class AsyncSingleFlight:
+    """Agrupa llamadas idénticas concurrentes entre corrutinas"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[Tuple[int, Hashable], "asyncio.Task[Any]"] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecutar `func()` una sola vez por clave entre las corrutinas concurrentes
+
+        Args:
+            key: Clave normalizada de la petición
+            func: Función que retorna el awaitable a ejecutar
+
+        Returns:
+            (resultado, compartido) como `SingleFlight.do`
+        """
+        loop = asyncio.get_running_loop()
+        task_key = (id(loop), key)
+        task = self._tasks.get(task_key)
+        shared = task is not None
+        if shared:
+            self.collapsed += 1
+            metrics.COALESCED_CALLS.inc(flight=self.name)
+        else:
+            self.calls += 1
+            task = self._tasks[task_key] = loop.create_task(func())
+            task.add_done_callback(lambda done: self._finished(task_key, done))
+
+        # shield: cancelar a un llamador no cancela la llamada compartida
+        return await asyncio.shield(task), shared
+
+    def _finished(self, task_key: Tuple[int, Hashable], task: "asyncio.Task[Any]"):
+        if self._tasks.get(task_key) is task:
+            del self._tasks[task_key]
+        # Si todos los llamadores se cancelaron nadie lee la excepción
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    def stats(self) -> Dict[str, int]:
+        """Llamadas ejecutadas, agrupadas y en curso"""
+        return {"calls": self.calls, "collapsed": self.collapsed, "in_flight": self.in_flight()}
@@ -0,0 +1,558 @@
+"""
+Tracing - Spans estilo OpenTelemetry para sesiones de agentes
+
+Enlaza las llamadas LLM, las decisiones auditadas y el ciclo de vida de los
+checkpoints HITL en trazas, para saber si una sesión lenta esperó al modelo,
+a PostgreSQL o a una persona. Solo usa la stdlib.
+
+- Desactivado por defecto (`TRACING_ENABLED=false`): `start_span` devuelve un
+  span no-op compartido.
+- El contexto (`trace_id`, `span_id`, `session_id`) viaja en `audit_log.context`
+  y en el JSON de `hitl_checkpoints.data` bajo la clave `trace`, de modo que
+  quien aprueba un checkpoint en otro proceso continúa la misma traza.
+- `TRACEPARENT` (W3C) permite que un proceso padre fije la traza.
+- Los spans se exportan en formato OTLP/JSON a `TRACING_EXPORT_PATH`
+  (default: .local/traces) y, si se define `OTEL_EXPORTER_OTLP_ENDPOINT`,
+  a un collector OTLP/HTTP.
+
+Uso:
+    from src.utils import tracing
+
+    with tracing.start_span("llm.router.generate", category="llm") as span:
+        span.set_attribute("llm.provider", "ollama")
+
+CLI:
+    python src/utils/tracing.py collector [--port 4318]   # Collector OTLP/HTTP local
+    python src/utils/tracing.py report <session_id>       # Camino crítico por sesión
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import threading
+import contextvars
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+if __package__ in (None, ""):
+    # Ejecución como script: python src/utils/tracing.py
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.utils.lazy_imports import logger
+
+SERVICE_NAME = "sdd-dev-template"
+
+# Categorías del desglose de camino crítico
+CATEGORIES = ("llm", "db", "human", "other")
+
+
+class _State:
+    __slots__ = ("enabled",)
+
+    def __init__(self):
+        self.enabled = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+
+
+_state = _State()
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("sdd_current_span", default=None)
+
+
+def enable():
+    _state.enabled = True
+
+
+def disable():
+    _state.enabled = False
+
+
+def is_enabled() -> bool:
+    return _state.enabled
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+def _session_id() -> str:
+    return os.getenv("SESSION_ID", "unknown")
+
+
+def _parse_traceparent(value: Optional[str]) -> Optional[Dict[str, str]]:
+    """Contexto remoto desde una cabecera W3C `traceparent`"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return {"trace_id": parts[1], "span_id": parts[2]}
+
+
+class Span:
+    """Span activo; se exporta al terminar"""
+    __slots__ = ("name", "trace_id", "span_id", "parent_span_id", "start_ns", "end_ns",
+                 "attributes", "status", "_token")
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_span_id: Optional[str],
+        attributes: Dict[str, Any],
+        start_ns: Optional[int] = None
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id(8)
+        self.parent_span_id = parent_span_id
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_error(self, error: BaseException):
+        self.status = "error"
+        self.attributes["error.type"] = type(error).__name__
+        self.attributes["error.message"] = str(error)[:500]
+
+    def context(self) -> Dict[str, str]:
+        """Contexto propagable (se guarda en audit_log y checkpoints)"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "session_id": self.attributes.get("session.id", _session_id()),
+        }
+
+    def end(self, end_ns: Optional[int] = None):
+        if self.end_ns is None:
+            self.end_ns = end_ns if end_ns is not None else time.time_ns()
+            _buffer.add(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self._token = None
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    """Span compartido cuando el tracing está desactivado"""
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        pass
+
+    def record_error(self, error: BaseException):
+        pass
+
+    def context(self) -> None:
+        return None
+
+    def end(self, end_ns: Optional[int] = None):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def start_span(
+    name: str,
+    category: str = "other",
+    attributes: Optional[Dict[str, Any]] = None,
+    parent: Optional[Dict[str, str]] = None,
+    start_ns: Optional[int] = None,
+    session_id: Optional[str] = None
+):
+    """
+    Crear un span (usar como context manager, o llamar a `end()`)
+
+    Args:
+        name: Nombre del span (p.ej. "audit.log_decision")
+        category: Categoría para el camino crítico: llm, db, human u other
+        attributes: Atributos iniciales
+        parent: Contexto remoto {"trace_id", "span_id"} (default: span actual,
+            o `TRACEPARENT` del entorno)
+        start_ns: Inicio explícito en ns desde epoch (spans retroactivos)
+        session_id: Sesión del span (default: la del padre remoto o SESSION_ID)
+    """
+    if not _state.enabled:
+        return _NOOP_SPAN
+
+    if parent is None:
+        current = _current_span.get()
+        if current is not None:
+            parent = {"trace_id": current.trace_id, "span_id": current.span_id,
+                      "session_id": current.attributes.get("session.id")}
+        else:
+            parent = _parse_traceparent(os.getenv("TRACEPARENT"))
+
+    trace_id = parent["trace_id"] if parent else _new_id(16)
+    parent_span_id = parent.get("span_id") if parent else None
+    span_attributes = {
+        "sdd.category": category,
+        "session.id": session_id or (parent or {}).get("session_id") or _session_id(),
+    }
+    if attributes:
+        span_attributes.update({k: v for k, v in attributes.items() if v is not None})
+    return Span(name, trace_id, parent_span_id, span_attributes, start_ns)
+
+
+def current_span():
+    """Span activo en el contexto actual (o el span no-op)"""
+    return _current_span.get() or _NOOP_SPAN
+
+
+def current_context() -> Optional[Dict[str, str]]:
+    """Contexto propagable del span activo, o None"""
+    span = _current_span.get()
+    return span.context() if span is not None else None
+
+
+# --- Exportación OTLP/JSON ---------------------------------------------------
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _from_otlp_value(value: Dict[str, Any]) -> Any:
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "doubleValue" in value:
+        return float(value["doubleValue"])
+    if "boolValue" in value:
+        return bool(value["boolValue"])
+    return value.get("stringValue")
+
+
+def encode_otlp(spans: Iterable[Span]) -> Dict[str, Any]:
+    """Spans como payload OTLP/JSON (`ExportTraceServiceRequest`)"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "src.utils.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    **({"parentSpanId": span.parent_span_id} if span.parent_span_id else {}),
+                    "name": span.name,
+                    "kind": 1,
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+                    "status": {"code": 2 if span.status == "error" else 1},
+                } for span in spans],
+            }],
+        }]
+    }
+
+
+def decode_otlp(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Spans planos desde un payload OTLP/JSON"""
+    spans = []
+    for resource_spans in payload.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                spans.append({
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_span_id": span.get("parentSpanId") or None,
+                    "name": span["name"],
+                    "start_ns": int(span["startTimeUnixNano"]),
+                    "end_ns": int(span["endTimeUnixNano"]),
+                    "attributes": {a["key"]: _from_otlp_value(a["value"]) for a in span.get("attributes", [])},
+                })
+    return spans
+
+
+class _SpanBuffer:
+    """Acumula spans terminados y los exporta por lotes"""
+
+    def __init__(self):
+        self.batch_size = int(os.getenv("TRACING_BATCH_SIZE", "64"))
+        self.flush_interval = float(os.getenv("TRACING_FLUSH_INTERVAL", "2"))
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._flusher: Optional[threading.Thread] = None
+
+    def add(self, span: Span):
+        with self._lock:
+            self._spans.append(span)
+            full = len(self._spans) >= self.batch_size
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="tracing-flush", daemon=True)
+                self._flusher.start()
+        if full:
+            self.flush()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not spans:
+            return
+        payload = encode_otlp(spans)
+        try:
+            _export_file(payload)
+        except Exception as e:
+            logger.warning(f"No se pudieron exportar {len(spans)} spans a archivo: {e}")
+        endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+        if endpoint:
+            try:
+                _export_http(endpoint, payload)
+            except Exception as e:
+                logger.warning(f"No se pudieron exportar {len(spans)} spans a {endpoint}: {e}")
+
+
+def _export_path() -> Path:
+    return Path(os.getenv("TRACING_EXPORT_PATH", ".local/traces"))
+
+
+def _export_file(payload: Dict[str, Any]):
+    """Una línea OTLP/JSON por lote en el archivo del día"""
+    path = _export_path()
+    path.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(payload, separators=(",", ":")) + "\n"
+    # Un solo write en modo append: las líneas de procesos concurrentes no se mezclan
+    with open(path / f"traces_{datetime.now().strftime('%Y%m%d')}.jsonl", "a") as f:
+        f.write(line)
+
+
+def _export_http(endpoint: str, payload: Dict[str, Any]):
+    import urllib.request
+
+    url = endpoint.rstrip("/")
+    if not url.endswith("/v1/traces"):
+        url += "/v1/traces"
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=2) as response:
+        response.read()
+
+
+_buffer = _SpanBuffer()
+
+
+def flush():
+    """Exportar los spans pendientes"""
+    _buffer.flush()
+
+
+atexit.register(flush)
+
+
+# --- Camino crítico -------------------------------------------------------------
+
+def load_spans(paths: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Leer spans de archivos OTLP/JSON (default: todos los de TRACING_EXPORT_PATH)"""
+    if not paths:
+        paths = [str(p) for p in sorted(_export_path().glob("traces_*.jsonl"))]
+    spans = []
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    spans.extend(decode_otlp(json.loads(line)))
+    return spans
+
+
+def critical_path(spans: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], int]]:
+    """
+    Camino crítico de una traza
+
+    Desde el final de cada span se retrocede eligiendo el hijo que termina
+    más tarde; el tiempo no cubierto por hijos se atribuye al propio span.
+
+    Returns:
+        Lista de (span, ns atribuidos en el camino crítico)
+    """
+    by_id = {s["span_id"]: s for s in spans}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for span in spans:
+        parent = span["parent_span_id"] if span["parent_span_id"] in by_id else None
+        children.setdefault(parent, []).append(span)
+
+    contributions: List[Tuple[Dict[str, Any], int]] = []
+
+    def walk(span: Dict[str, Any], window_end: int):
+        cursor = min(span["end_ns"], window_end)
+        kids = sorted(children.get(span["span_id"], []), key=lambda s: s["end_ns"], reverse=True)
+        own = 0
+        for child in kids:
+            if child["start_ns"] >= cursor or child["end_ns"] <= span["start_ns"]:
+                continue
+            child_end = min(child["end_ns"], cursor)
+            own += max(0, cursor - child_end)
+            walk(child, child_end)
+            cursor = max(child["start_ns"], span["start_ns"])
+        own += max(0, cursor - span["start_ns"])
+        contributions.append((span, own))
+
+    # Raíces en orden temporal; las que se solapan solo aportan su parte nueva
+    horizon = 0
+    for root in sorted(children.get(None, []), key=lambda s: s["start_ns"]):
+        if root["end_ns"] <= horizon:
+            continue
+        clipped = dict(root, start_ns=max(root["start_ns"], horizon))
+        walk(clipped, clipped["end_ns"])
+        horizon = root["end_ns"]
+    return contributions
+
+
+def session_breakdown(spans: List[Dict[str, Any]], session_id: str) -> Dict[str, Any]:
+    """
+    Desglose del camino crítico de una sesión por categoría y por span
+
+    Acepta también un `trace_id` en lugar del `session_id`.
+    """
+    traces = {s["trace_id"] for s in spans
+              if s["attributes"].get("session.id") == session_id or s["trace_id"] == session_id}
+    selected = [s for s in spans if s["trace_id"] in traces]
+
+    by_category = {c: 0 for c in CATEGORIES}
+    by_name: Dict[str, int] = {}
+    for span, own in critical_path(selected):
+        category = span["attributes"].get("sdd.category", "other")
+        by_category[category if category in by_category else "other"] += own
+        by_name[span["name"]] = by_name.get(span["name"], 0) + own
+
+    return {
+        "session_id": session_id,
+        "traces": len(traces),
+        "spans": len(selected),
+        "critical_path_ns": sum(by_category.values()),
+        "by_category": by_category,
+        "by_span": dict(sorted(by_name.items(), key=lambda kv: kv[1], reverse=True)),
+    }
+
+
+def serve_collector(host: str = "127.0.0.1", port: int = 4318, output: Optional[str] = None):
+    """Collector OTLP/HTTP mínimo: acepta POST /v1/traces (JSON) y lo agrega a un archivo"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    output_path = Path(output or _export_path() / "collector.jsonl")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    lock = threading.Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def log_message(self, format: str, *args: Any):
+            pass
+
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self.send_error(400, "Se espera OTLP/JSON")
+                return
+            with lock, open(output_path, "a") as f:
+                f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+    server = ThreadingHTTPServer((host, port), CollectorHandler)
+    print(f"📡 Collector OTLP en http://{host}:{port}/v1/traces → {output_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def _format_ns(ns: int) -> str:
+    seconds = ns / 1e9
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    return f"{seconds * 1e3:.1f} ms"
+
+
+def main():
+    """CLI de tracing"""
+    parser = argparse.ArgumentParser(prog="tracing.py", description="Trazas de sesiones SDD")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    collector = sub.add_parser("collector", help="Collector OTLP/HTTP local")
+    collector.add_argument("--host", default="127.0.0.1")
+    collector.add_argument("--port", type=int, default=4318)
+    collector.add_argument("--output", help="Archivo JSONL de salida")
+
+    report = sub.add_parser("report", help="Camino crítico de una sesión")
+    report.add_argument("session_id", help="session_id o trace_id")
+    report.add_argument("files", nargs="*", help="Archivos OTLP/JSON (default: TRACING_EXPORT_PATH)")
+    report.add_argument("--json", action="store_true", help="Salida JSON")
+
+    args = parser.parse_args()
+
+    if args.command == "collector":
+        serve_collector(args.host, args.port, args.output)
+        return
+
+    breakdown = session_breakdown(load_spans(args.files), args.session_id)
+    if args.json:
+        print(json.dumps(breakdown, indent=2))
+        return
+    if not breakdown["spans"]:
+        print(f"❌ Sin spans para {args.session_id}")
+        sys.exit(1)
+
+    total = breakdown["critical_path_ns"] or 1
+    print(f"\n🧭 Camino crítico de {args.session_id}: {_format_ns(breakdown['critical_path_ns'])} "
+          f"({breakdown['traces']} trazas, {breakdown['spans']} spans)\n")
+    icons = {"llm": "🤖", "db": "🗄️ ", "human": "👤", "other": "⚙️ "}
+    for category, ns in breakdown["by_category"].items():
+        print(f"  {icons[category]} {category:<6} {_format_ns(ns):>10}  {ns / total:6.1%}")
+    print("\n  Spans con más tiempo en el camino crítico:")
+    for name, ns in list(breakdown["by_span"].items())[:10]:
+        print(f"    {name:<32} {_format_ns(ns):>10}  {ns / total:6.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Regresiones de src/utils/fast_json.py
+
+Ejecutar: python -m pytest -q tests
+"""
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.utils import fast_json
+
+
+@pytest.fixture(params=["backend", "stdlib"])
+def dumps(request):
+    # Backend activo (orjson si está instalado) y la ruta de la stdlib
+    if request.param == "stdlib":
+        return fast_json._stdlib_dumps
+    return fast_json.dumps
+
+
+def test_integers_wider_than_64_bits(dumps):
+    context = {"a": 2 ** 70, "b": -(2 ** 64), "nested": [2 ** 100]}
+    assert json.loads(dumps(context)) == context
+
+
+def test_backends_serialize_the_same_values(dumps):
+    context = {"when": datetime(2026, 1, 2, 3, 4, 5), "tags": {"x"}, 1: "int key"}
+    assert json.loads(dumps(context)) == {"when": "2026-01-02T03:04:05", "tags": "{'x'}", "1": "int key"}
@@ -0,0 +1,108 @@
+"""
+Regresiones del backend SQLite (src/storage/sqlite.py)
+
+Ejecutar: python -m pytest -q tests
+"""
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.storage.sqlite import SQLiteStorage
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    # Lote grande y sin confirmación por tiempo: todo queda en la transacción abierta
+    monkeypatch.setenv("SQLITE_BATCH_SIZE", "1000")
+    monkeypatch.setenv("SQLITE_COMMIT_INTERVAL_MS", "60000")
+    backend = SQLiteStorage(f"sqlite:///{tmp_path / 'sdd.db'}")
+    yield backend
+    backend.close()
+
+
+def _log(storage: SQLiteStorage, n: int):
+    for i in range(n):
+        storage.insert_decision(
+            "agent", "write", f"decisión {i}", b'{"n": %d}' % i, None, 0.9, datetime.now(), "s1", None
+        )
+
+
+def _count(storage: SQLiteStorage) -> int:
+    # Otra conexión: solo ve lo confirmado
+    with sqlite3.connect(storage.path) as conn:
+        return conn.execute("SELECT count(*) FROM audit_log").fetchone()[0]
+
+
+def _failing_checkpoint(storage: SQLiteStorage):
+    # checkpoint_name NOT NULL: la escritura HITL falla dentro de la transacción del lote
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.insert_checkpoint(None, "agent", "pending", 1, None, None, {}, datetime.now(), None, None, None)
+
+
+def test_failed_hitl_write_keeps_batched_decisions(storage):
+    _log(storage, 3)
+    _failing_checkpoint(storage)
+    storage.flush()
+    assert _count(storage) == 3
+
+
+def test_batch_commits_with_next_hitl_write(storage):
+    _log(storage, 5)
+    _failing_checkpoint(storage)
+    storage.insert_checkpoint("deploy", "agent", "pending", 1, None, None, {}, datetime.now(), None, None, None)
+    assert _count(storage) == 5
+
+
+def test_failed_write_without_batch_leaves_no_open_transaction(storage):
+    _failing_checkpoint(storage)
+    assert not storage._connection().in_transaction
+
+
+def test_failed_decision_keeps_previous_ones(storage):
+    _log(storage, 4)
+    with pytest.raises(UnicodeDecodeError):
+        storage.insert_decision("agent", "write", "rota", b"\xff", None, 0.9, datetime.now(), "s1", None)
+    storage.flush()
+    assert _count(storage) == 4
+
+
+def test_after_commit_waits_for_batch(storage):
+    committed = []
+    storage.after_commit(lambda: committed.append("idle"))
+    assert committed == ["idle"]
+
+    storage.insert_blobs([("d1", "raw", b"x", 1)], datetime.now())
+    storage.after_commit(lambda: committed.append("batch"))
+    _failing_checkpoint(storage)
+    assert committed == ["idle"]
+    storage.flush()
+    assert committed == ["idle", "batch"]
+
+
+def test_expired_checkpoints_count_by_creating_session(storage):
+    overdue = datetime(2000, 1, 1)
+    for stored in ({"session_id": "a"}, {"session_id": "a"}, {"trace": {"session_id": "b"}}, {}):
+        storage.insert_checkpoint("deploy", "agent", "pending", 1, 1, overdue, stored, overdue, None, None, None)
+
+    assert storage.expire_overdue_checkpoints(2, 10, "sweeper", "sweeper-session") == {
+        "a": 2, "b": 1, "sweeper-session": 1
+    }
+    with sqlite3.connect(storage.path) as conn:
+        logged = dict(conn.execute("SELECT session_id, count(*) FROM audit_log GROUP BY session_id"))
+    assert logged == {"a": 2, "b": 1, "sweeper-session": 1}
+
+
+def test_batch_size_one_commits_each_decision(tmp_path, monkeypatch):
+    monkeypatch.setenv("SQLITE_BATCH_SIZE", "1")
+    monkeypatch.setenv("SQLITE_COMMIT_INTERVAL_MS", "60000")
+    backend = SQLiteStorage(f"sqlite:///{tmp_path / 'sdd.db'}")
+    try:
+        _log(backend, 3)
+        assert _count(backend) == 3
+    finally:
+        backend.close()